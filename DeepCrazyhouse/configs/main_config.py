@@ -74,6 +74,9 @@ main_config = {
     # layer name of the policy output layer without softmax applied (e.g. flatten0 for legacy crazyhouse networks
     # policy_out for newer networks)
     "policy_output": "policy_out",
+    # layer name of the policy output of the inference models (see training/inference_export.py) which already
+    # selects the NB_LABELS moves from the policy planes and applies the softmax
+    "policy_softmax_output": "policy_softmax",
     "auxiliary_output": "auxiliary_out",
     "wdl_output": "wdl_out",
     "plys_to_end_output": "plys_to_end_out",
@@ -34,9 +34,42 @@ class TrainConfig:
     info_cpu_count: str = "cpu_count defines the number of cpu cores to use for data processing while training."
     cpu_count: int = 4
 
+    info_amp_dtype: str = "amp_dtype enables automatic mixed precision for the forward pass and the losses of the" \
+                          " training loop. Use 'bf16' or 'fp16' (the gradients are scaled by a GradScaler). An empty" \
+                          " string trains in full fp32 precision."
+    amp_dtype: str = ""
+
+    info_compile_mode: str = "compile_mode compiles the model of the training step with torch.compile() using the given" \
+                             " mode (e.g. 'default', 'reduce-overhead', 'max-autotune'). An empty string disables the" \
+                             " compilation."
+    compile_mode: str = ""
+
+    info_use_channels_last: str = "use_channels_last converts the model weights and the input batches to the" \
+                                  " channels_last memory format which is faster for convolutions on tensor cores."
+    use_channels_last: bool = False
+
+    info_use_fused_optimizer: str = "use_fused_optimizer uses the fused implementation of the optimizer if the" \
+                                    " installed pytorch version supports it for the training device."
+    use_fused_optimizer: bool = False
+
     info_device_id: str = "device_id sets the GPU device to use for training."
     device_id: int = 0
 
+    info_dist_backend: str = "dist_backend sets the torch.distributed backend for the training with several processes" \
+                             " (e.g. 'nccl', 'gloo'). An empty string uses nccl for gpu and gloo for cpu training."
+    dist_backend: str = ""
+
+    info_gradient_accumulation_steps: str = "gradient_accumulation_steps splits the batch of every process into this" \
+                                            " number of micro batches whose gradients are accumulated before the" \
+                                            " optimizer step. The effective batch size stays batch_size."
+    gradient_accumulation_steps: int = 1
+
+    info_world_size: str = "world_size defines the number of data-parallel training processes which are started by" \
+                           " the RL loop (engine/src/rl/rl_training.py). Every process uses the GPU device_id + rank." \
+                           " batch_size is the total batch size of all processes. For train_cli.py start the" \
+                           " processes with torchrun instead (also across several nodes)."
+    world_size: int = 1
+
     info_discount: str = "discount describes the discounting value to use for discounting the value target " \
                          "until reaching the final terminal value."
     discount: float = 1.0
@@ -56,6 +89,12 @@ class TrainConfig:
                                        "during training."
     export_grad_histograms: bool = True
 
+    info_inference_export_variants: str = "inference_export_variants is a comma separated list of the optimized " \
+                                          "inference models (fp32, fp16, int8) which are exported next to the best " \
+                                          "model (see inference_export.py). int8 is calibrated on the first training" \
+                                          " part. An empty string disables the export."
+    inference_export_variants: str = ""
+
     info_framework: str = "framework sets the deep learning framework to use. Currently only 'pytorch' is available." \
                      "mxnet and gluon have been deprecated."
     framework: str = 'pytorch'
@@ -128,10 +167,25 @@ class TrainConfig:
                                         " output."
     plys_to_end_loss_factor: float = 0.002
 
+    info_nb_prefetch_parts: str = "nb_prefetch_parts defines how many decoded dataset parts the prefetch pipeline" \
+                                  " keeps ready in addition to the shuffle buffer (only used with" \
+                                  " use_prefetch_pipeline=True)."
+    nb_prefetch_parts: int = 2
+
+    info_prefetch_memory_mb: str = "prefetch_memory_mb limits the memory in MB of the prefetch pipeline. Half of it is" \
+                                   " used for the shuffle buffer across parts and the other half for the prefetched" \
+                                   " parts. At least one part is always loaded even if it is larger."
+    prefetch_memory_mb: int = 4096
+
     info_q_value_ratio: str = "q_value_ratio defines the ratio for mixing the value return with the corresponding " \
                               "q-value for a ratio of 0 no q-value information will be used."
     q_value_ratio: float = 0.0
 
+    info_sample_weights_in_loader: str = "sample_weights_in_loader computes the phase weight of every training" \
+                                         " sample once per dataset part in the loader instead of gathering them" \
+                                         " for each batch on the training device."
+    sample_weights_in_loader: bool = False
+
     info_seed: str = "seed sets a specific seed value for reproducibility."
     seed: int = 42
 
@@ -156,6 +210,11 @@ class TrainConfig:
                                         "used, defined in the model_config.py file"
     use_custom_architecture: bool = False
 
+    info_use_memmap_shards: str = "use_memmap_shards loads the training and validation data from memory mapped .shard" \
+                                  " files (see preprocessing/shard_format.py) instead of the compressed .zip files." \
+                                  " The planes are converted to float32 and normalized for each batch."
+    use_memmap_shards: bool = False
+
     info_use_mlp_wdl_ply: str = "use_mlp_wdl_ply adds a small mlp to infer the value loss from wdl and plys_to_end" \
                                 "_output"
     use_mlp_wdl_ply: bool = False
@@ -165,6 +224,11 @@ class TrainConfig:
                         " environments with three outcomes WIN, DRAW, LOSS)"
     use_wdl: bool = True
 
+    info_use_prefetch_pipeline: str = "use_prefetch_pipeline decodes the next dataset parts in a background thread" \
+                                      " while training and shuffles the samples across parts with a bounded shuffle" \
+                                      " buffer instead of loading one part after another."
+    use_prefetch_pipeline: bool = False
+
     info_use_spike_recovery: str = "use_spike_recovery loads a previous checkpoint if the loss increased significantly."
     use_spike_recovery: bool = True
     info_val_loss_factor: str = "val_loss_factor weights the value loss a lot lower than the policy loss in order to" \
@@ -7,7 +7,6 @@ Created on 14.10.18
 Abstract class for defining a playing agent.
 """
 from abc import ABC, abstractmethod
-from copy import deepcopy
 import numpy as np
 from DeepCrazyhouse.src.domain.abstract_cls.abs_game_state import AbsGameState
 
@@ -69,9 +68,10 @@ class AbsAgent(ABC):
 
             if value > 0:
                 # check for draw and decline if value is greater 0
-                state_future = deepcopy(state)
-                state_future.apply_move(selected_move)
-                if state_future.get_pythonchess_board().can_claim_threefold_repetition():
+                state.apply_move(selected_move)
+                is_repetition = state.get_pythonchess_board().can_claim_threefold_repetition()
+                state.undo_move()
+                if is_repetition:
                     policy[idx] = 0
                     idx = policy.argmax()
                     selected_move = legal_moves[idx]
@@ -25,7 +25,11 @@ class AbsGameState(ABC):
         """Force the child to implement apply_move method"""
 
     @abstractmethod
-    def get_state_planes(self):
+    def undo_move(self):
+        """Force the child to implement undo_move method"""
+
+    @abstractmethod
+    def get_state_planes(self, out=None):
         """Force the child to implement get_state_planes method"""
         # return board_to_planes(self.board, 0, normalize=True)
 
@@ -0,0 +1,38 @@
+"""
+@file: abs_inference_backend.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Abstract class for a neural network backend which can be plugged into the InferenceServer.
+"""
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class AbsInferenceBackend(ABC):
+    """Abstract class for all inference backends (e.g. MXNet executors, ONNX Runtime, TorchScript)"""
+
+    @abstractmethod
+    def predict_batch(self, state_planes: np.ndarray) -> tuple:
+        """
+        Runs the network on a batch of board representations.
+        :param state_planes: Input planes of shape (batch_size, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH).
+         The batch size is at most get_batch_size().
+        :return: value_preds - Numpy array of shape (batch_size,)
+                 policy_preds - Numpy array of shape (batch_size, NB_LABELS) holding probabilities
+                                (the softmax has already been applied)
+        """
+
+    @abstractmethod
+    def get_batch_size(self) -> int:
+        """Force the child to return the maximum supported batch size"""
+
+    def predict_single(self, x: np.ndarray) -> list:
+        """
+        Gets the model prediction of a single input sample.
+        :param x: Plane representation of a single board state
+        :return: [Value Prediction, Policy Prediction] as a list of numpy arrays
+        """
+        value_preds, policy_preds = self.predict_batch(np.expand_dims(x, axis=0))
+        return [value_preds[0], policy_preds[0]]
@@ -0,0 +1,227 @@
+"""
+@file: inference_backends.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Inference backends for the models which are exported by the PyTorch trainer (see trainer_agent_pytorch.export_model()).
+OnnxRuntimeAPI runs an .onnx model on the CPU execution provider of ONNX Runtime and TorchScriptAPI runs a
+torch_cpu script module (.pt). Both copy the input planes into preallocated buffers and return softmax probabilities
+like the MXNet NeuralNetAPI, so that they can be plugged into the InferenceServer and all agents.
+The backend is selected by create_inference_backend(), onnxruntime and torch are only imported when they are used.
+"""
+import glob
+import os
+import re
+from time import perf_counter
+import numpy as np
+from DeepCrazyhouse.configs.main_config import main_config
+from DeepCrazyhouse.src.domain.abstract_cls.abs_inference_backend import AbsInferenceBackend
+from DeepCrazyhouse.src.domain.variants.constants import BOARD_HEIGHT, BOARD_WIDTH, NB_CHANNELS_TOTAL, NB_LABELS
+from DeepCrazyhouse.src.domain.variants.plane_policy_representation import FLAT_PLANE_IDX
+
+BACKENDS = ["mxnet", "onnxruntime", "torch_cpu"]
+
+
+def find_model_file(model_dir: str, extension: str, batch_size: int) -> str:
+    """
+    Finds the model file for the given batch size. A model with a dynamic batch size is preferred, otherwise the
+    model with the smallest batch size which is at least batch_size is chosen (files named "*-bsize-<N>.<extension>").
+    :param model_dir: Directory of the exported model, "default" uses main_config["model_weights_dir"]. The path of a
+     model file is returned as it is.
+    :param extension: File extension, e.g. ".onnx"
+    :param batch_size: Maximum batch size which will be requested
+    :return: Path of the model file
+    """
+    if model_dir == "default":
+        model_dir = main_config["model_weights_dir"]
+    if os.path.isfile(model_dir):
+        return model_dir
+    paths = sorted(glob.glob(os.path.join(model_dir, "*" + extension)))
+    fixed_sizes = {}
+    for path in paths:
+        match = re.search(r"bsize-(\d+)", os.path.basename(path))
+        if match is None:
+            return path
+        fixed_sizes[path] = int(match.group(1))
+    valid_paths = [path for path in fixed_sizes if fixed_sizes[path] >= batch_size]
+    if not valid_paths:
+        raise Exception(
+            "No %s model with a batch size of at least %d was found in your given model directory: %s"
+            % (extension, batch_size, model_dir)
+        )
+    return min(valid_paths, key=fixed_sizes.get)
+
+
+def policy_logits_to_probs(policy_logits: np.ndarray) -> np.ndarray:
+    """
+    Converts the policy output of a PyTorch model into probabilities of the NB_LABELS moves
+    :param policy_logits: Policy logits of shape (batch_size, NB_LABELS) or the flattened policy planes
+    :return: Numpy array of shape (batch_size, NB_LABELS)
+    """
+    if policy_logits.shape[1] != NB_LABELS:
+        policy_logits = policy_logits[:, FLAT_PLANE_IDX]  # select_policy_from_plane style
+    policy_logits = policy_logits - policy_logits.max(axis=1, keepdims=True)
+    policy_probs = np.exp(policy_logits)
+    policy_probs /= policy_probs.sum(axis=1, keepdims=True)
+    return policy_probs
+
+
+class OnnxRuntimeAPI(AbsInferenceBackend):
+    """Runs an ONNX model on the CPU execution provider of ONNX Runtime"""
+
+    def __init__(self, batch_size=1, model_dir="default", nb_threads=0):
+        """
+        Constructor
+        :param batch_size: Maximum batch size which is used for inference
+        :param model_dir: Directory with the .onnx file or the file itself. Models with a fixed batch size are padded to
+         it.
+        :param nb_threads: Number of intra-op threads of ONNX Runtime, 0 uses the default of ONNX Runtime
+        """
+        import onnxruntime as ort
+
+        self.batch_size = batch_size
+        self.model_path = find_model_file(model_dir, ".onnx", batch_size)
+        self.model_name = os.path.basename(self.model_path).replace(".onnx", "")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = nb_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        outputs = {output.name: output for output in self.session.get_outputs()}
+        value_output = outputs.get(main_config["value_output"], self.session.get_outputs()[0])
+        # the inference models of training/inference_export.py already return the probabilities of the NB_LABELS moves
+        self.has_policy_softmax = main_config["policy_softmax_output"] in outputs
+        policy_output = outputs.get(main_config["policy_softmax_output"], outputs.get(main_config["policy_output"],
+                                                                                      self.session.get_outputs()[1]))
+        # a symbolic batch dimension (e.g. "batch_size") allows every batch length
+        self.fixed_batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        buffer_size = self.fixed_batch_size or batch_size
+        self.input_buffer = np.zeros((buffer_size, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH), np.float32)
+        self.value_buffer = np.zeros((buffer_size, *value_output.shape[1:]), np.float32)
+        self.policy_buffer = np.zeros((buffer_size, *policy_output.shape[1:]), np.float32)
+
+        # one io binding for each batch length which points into the preallocated buffers
+        self.io_bindings = []
+        for length in range(1, batch_size + 1):
+            length = self.fixed_batch_size or length
+            io_binding = self.session.io_binding()
+            io_binding.bind_input(model_input.name, "cpu", 0, np.float32, [length, *self.input_buffer.shape[1:]],
+                                  self.input_buffer.ctypes.data)
+            for name, buffer in [(value_output.name, self.value_buffer), (policy_output.name, self.policy_buffer)]:
+                io_binding.bind_output(name, "cpu", 0, np.float32, [length, *buffer.shape[1:]], buffer.ctypes.data)
+            self.io_bindings.append(io_binding)
+
+    def predict_batch(self, state_planes: np.ndarray):
+        """
+        Gets the model predictions for a batch of input samples
+        :param state_planes: Plane representations of at most batch_size board states
+        :return: value_preds - Numpy array of the value predictions
+                 policy_preds - Numpy array of the policy probabilities for each sample
+        """
+        length = len(state_planes)
+        self.input_buffer[:length] = state_planes
+        self.session.run_with_iobinding(self.io_bindings[length - 1])
+        if self.has_policy_softmax:
+            return self.value_buffer[:length].reshape(-1).copy(), self.policy_buffer[:length].copy()
+        return self.value_buffer[:length].reshape(-1).copy(), policy_logits_to_probs(self.policy_buffer[:length])
+
+    def get_batch_size(self):
+        """Make the batch_size public access"""
+        return self.batch_size
+
+    def get_model_name(self):
+        """Make the model_name public access"""
+        return self.model_name
+
+
+class TorchScriptAPI(AbsInferenceBackend):
+    """Runs a torch_cpu script module which has been exported by torch.jit.trace()"""
+
+    def __init__(self, batch_size=1, model_dir="default", nb_threads=0):
+        """
+        Constructor
+        :param batch_size: Maximum batch size which is used for inference
+        :param model_dir: Directory with the .pt files, e.g. the torch_cpu directory of export_model()
+        :param nb_threads: Number of intra-op threads of PyTorch, 0 keeps the current setting
+        """
+        import torch
+
+        self.torch = torch
+        self.batch_size = batch_size
+        self.model_path = find_model_file(model_dir, ".pt", batch_size)
+        self.model_name = os.path.basename(self.model_path).replace(".pt", "")
+        if nb_threads > 0:
+            torch.set_num_threads(nb_threads)
+        self.model = torch.jit.load(self.model_path, map_location="cpu").eval()
+        self.input_buffer = np.zeros((batch_size, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH), np.float32)
+        self.input_tensor = torch.from_numpy(self.input_buffer)  # shares the memory of the input buffer
+
+    def predict_batch(self, state_planes: np.ndarray):
+        """
+        Gets the model predictions for a batch of input samples
+        :param state_planes: Plane representations of at most batch_size board states
+        :return: value_preds - Numpy array of the value predictions
+                 policy_preds - Numpy array of the policy probabilities for each sample
+        """
+        length = len(state_planes)
+        self.input_buffer[:length] = state_planes
+        with self.torch.inference_mode():
+            outputs = self.model(self.input_tensor[:length])
+        return outputs[0].numpy().reshape(-1).copy(), policy_logits_to_probs(outputs[1].numpy())
+
+    def get_batch_size(self):
+        """Make the batch_size public access"""
+        return self.batch_size
+
+    def get_model_name(self):
+        """Make the model_name public access"""
+        return self.model_name
+
+
+def create_inference_backend(backend="mxnet", ctx="cpu", batch_size=1, model_architecture_dir="default",
+                             model_weights_dir="default", nb_threads=0) -> AbsInferenceBackend:
+    """
+    Creates the inference backend which is used by the agents
+    :param backend: One of BACKENDS
+    :param ctx: Context of the MXNet backend "cpu" or "gpu". The other backends always run on the CPU.
+    :param batch_size: Maximum batch size which is used for inference
+    :param model_architecture_dir: Directory of the MXNet symbol file
+    :param model_weights_dir: Directory of the MXNet .params file or of the exported .onnx / .pt model
+    :param nb_threads: Number of intra-op threads of ONNX Runtime and PyTorch, 0 uses the default
+    :return: Inference backend
+    """
+    # Too many arguments (6/5)
+    if backend == "mxnet":
+        from DeepCrazyhouse.src.domain.agent.neural_net_api import NeuralNetAPI
+
+        return NeuralNetAPI(ctx=ctx, batch_size=batch_size, model_architecture_dir=model_architecture_dir,
+                            model_weights_dir=model_weights_dir)
+    if backend == "onnxruntime":
+        return OnnxRuntimeAPI(batch_size=batch_size, model_dir=model_weights_dir, nb_threads=nb_threads)
+    if backend == "torch_cpu":
+        return TorchScriptAPI(batch_size=batch_size, model_dir=model_weights_dir, nb_threads=nb_threads)
+    raise Exception("Unknown inference backend %s. Available backends: %s" % (backend, BACKENDS))
+
+
+def measure_latency(backend: AbsInferenceBackend, batch_size: int, nb_iterations: int, nb_warmup=5, seed=42):
+    """
+    Measures the latency of predict_batch() for a single batch size
+    :param backend: Inference backend which supports at least batch_size
+    :param batch_size: Number of positions per batch
+    :param nb_iterations: Number of measured batches
+    :param nb_warmup: Number of batches which are run before the measurement
+    :param seed: Seed for the random input planes
+    :return: Numpy array of the latencies in ms
+    """
+    planes = np.random.default_rng(seed).random((batch_size, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH))
+    planes = planes.astype(np.float32)
+    for _ in range(nb_warmup):
+        backend.predict_batch(planes)
+    latencies = np.zeros(nb_iterations)
+    for idx in range(nb_iterations):
+        t_start = perf_counter()
+        backend.predict_batch(planes)
+        latencies[idx] = (perf_counter() - t_start) * 1000
+    return latencies
@@ -14,11 +14,12 @@ from multiprocessing import Queue
 import mxnet as mx
 import numpy as np
 from DeepCrazyhouse.configs.main_config import main_config
+from DeepCrazyhouse.src.domain.abstract_cls.abs_inference_backend import AbsInferenceBackend
 from DeepCrazyhouse.src.domain.variants.constants import BOARD_HEIGHT, BOARD_WIDTH, NB_CHANNELS_TOTAL, NB_LABELS
 from DeepCrazyhouse.src.domain.variants.plane_policy_representation import FLAT_PLANE_IDX
 
 
-class NeuralNetAPI:
+class NeuralNetAPI(AbsInferenceBackend):
     """Groups every a lot of helpers to be used on NN handling"""
 
     def __init__(self, ctx="cpu", batch_size=1, select_policy_form_planes: bool = True,
@@ -142,6 +143,26 @@ class NeuralNetAPI:
 
         queue.put([pred[0].asnumpy()[0], policy_preds[0]])
 
+    def predict_batch(self, state_planes: np.ndarray):
+        """
+        Gets the model predictions for a batch of input samples using the executor bound to the given batch length.
+        :param state_planes: Plane representations of at most batch_size board states
+        :return: value_preds - Numpy array of the value predictions
+                 policy_preds - Numpy array of the policy probabilities for each sample
+        """
+        state_planes_mxnet = mx.nd.array(state_planes, ctx=self.ctx)
+        pred = self.executors[len(state_planes) - 1].forward(is_train=False, data=state_planes_mxnet)
+
+        if self.select_policy_form_planes:
+            # when trained with mxnet symbol then softmax is already applied
+            policy_preds = pred[1].asnumpy()[:, FLAT_PLANE_IDX]
+        else:
+            # for the policy prediction we still have to apply the softmax activation
+            #  because it's not done by the neural net if trained in gluon style
+            policy_preds = pred[1].softmax().asnumpy()
+
+        return pred[0].asnumpy().reshape(-1), policy_preds
+
     def get_batch_size(self):
         """Make the batch_size public access"""
         return self.batch_size
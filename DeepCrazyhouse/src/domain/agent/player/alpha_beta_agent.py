@@ -6,27 +6,52 @@ Created on 24.03.19
 
 Classical negamax search with alpha beta pruning.
 For more details see: https://en.wikipedia.org/wiki/Negamax
+The search is run by iterative deepening. The best move of every searched position is kept in a search table and is
+tried first in the next iteration (principal variation move ordering). The remaining moves are ordered by the prior
+policy of the neural network.
+The network evaluations of the current search are kept in a position keyed dictionary in front of the shared
+evaluation cache. All candidate children of a node are evaluated together in a single forward pass before the node
+searches its first child.
+The moves of the root node can be split across several worker threads (root splitting) which share the alpha bound,
+the search table and the evaluations.
 """
 import math
 import logging
-import copy
+from threading import Lock, Thread, local
 from time import time
 import numpy as np
 
-
 from DeepCrazyhouse.src.domain.abstract_cls.abs_agent import AbsAgent
 from DeepCrazyhouse.src.domain.abstract_cls.abs_game_state import AbsGameState
-from DeepCrazyhouse.src.domain.agent.neural_net_api import NeuralNetAPI
+from DeepCrazyhouse.src.domain.abstract_cls.abs_inference_backend import AbsInferenceBackend
+from DeepCrazyhouse.src.domain.agent.player.util.eval_cache import EvalCache
+from DeepCrazyhouse.src.domain.variants.constants import BOARD_HEIGHT, BOARD_WIDTH, NB_CHANNELS_TOTAL
+from DeepCrazyhouse.src.domain.variants.game_state import GameState
 from DeepCrazyhouse.src.domain.variants.output_representation import value_to_centipawn, get_probs_of_move_list
-from DeepCrazyhouse.src.domain.util import get_check_move_indices
+
+# bound types of the search table entries
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+# minimum prior probability of a move to be searched, the move with the highest prior is always searched
+MIN_PRIOR = 0.1
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the move time is exceeded. The current iteration of the search is discarded."""
+
+
+class _ThreadNodeCounter(local):
+    """Number of nodes which have been visited by the current thread"""
+
+    nodes = 0
 
 
-class AlphaBetaAgent(AbsAgent):
+class AlphaBetaAgent(AbsAgent):  # Too many instance attributes (18/7)
     """
     Alpha beta agent which has the option to clip moves to make the search tractable for NN engines
     """
 
-    def __init__(self, net: NeuralNetAPI, depth=5, nb_candidate_moves=7, include_check_moves=False):
+    def __init__(self, net: AbsInferenceBackend, depth=5, nb_candidate_moves=7, include_check_moves=False, nb_workers=1,
+                 eval_cache=None, movetime_ms=None):  # Too many arguments (8/5)
         """
         Constructor
         :param net: Neural network inference service
@@ -34,69 +59,292 @@ class AlphaBetaAgent(AbsAgent):
         :param nb_candidate_moves: Number of moves to consider at each depth during search which are clipped according
         to the neural network policy
         :param include_check_moves: Defines if checking moves shall always be considered
+        :param nb_workers: Number of threads which search the moves of the root node in parallel
+        :param eval_cache: EvalCache which keeps the network evaluations across searches. It can be shared with the
+         other agents. If None, the evaluations are only kept for the current search.
+        :param movetime_ms: Time limit for a search in milliseconds. If None, every search reaches the full depth.
         """
         AbsAgent.__init__(self)
         self.t_start_eval = None
         self.net = net
         self.nodes = 0
+        self.thread_nodes = _ThreadNodeCounter()  # the workers count their nodes separately, see _search_root()
         self.depth = depth
         self.nb_candidate_moves = nb_candidate_moves
-        self.best_moves = [None] * depth
-        self.sel_mv_idx = [None] * depth
         self.include_check_moves = include_check_moves
+        self.nb_workers = nb_workers
+        self.eval_cache = eval_cache if eval_cache is not None else EvalCache(size_mb=0)
+        self.movetime_ms = movetime_ms
+        # evaluations of the current search: transposition key -> (value, legal moves, prior policy of the legal moves)
+        self.evaluations = {}
+        # search results: transposition key -> (depth, value, bound type, index of the best move)
+        self.search_table = {}
+        self.history = None  # occurrences of all earlier positions of the game for the repetition detection
+        self.net_lock = Lock()  # the network is shared by all workers
+        self.root_lock = Lock()  # protects the alpha bound of the root node
+        self.root_alpha = -math.inf
+        self.batch_planes = np.zeros(
+            (net.get_batch_size(), NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH), np.float32
+        )
+
+    def update_movetime(self, time_ms_per_move):
+        """
+        Update move time allocation.
+        :param time_ms_per_move:  Sets self.movetime_ms to this value
+        :return:
+        """
+        self.movetime_ms = time_ms_per_move
+
+    def _check_time(self):
+        """ Raises SearchTimeout if the move time is exceeded"""
+        if self.movetime_ms is not None and (time() - self.t_start_eval) * 1000 > self.movetime_ms:
+            raise SearchTimeout()
+
+    def _is_draw(self, state: GameState):
+        """
+        Checks if a draw can be claimed by threefold repetition or the fifty move rule
+        :param state: Game state of the search thread which has applied all moves from the root node onwards
+        :return: True, if the draw can be claimed
+        """
+        transposition_key = state.get_transposition_key()
+        if self.history[transposition_key] + state.position.count(transposition_key) >= 2:
+            return True
+        return state.get_pythonchess_board().can_claim_fifty_moves()
+
+    def _evaluate_children(self, state: GameState, moves: list):
+        """
+        Evaluates all positions after the given moves which haven't been evaluated yet with as few calls of the neural
+        network as possible and stores the results in the evaluations of the current search and in the evaluation
+        cache.
+        Terminal children are skipped because negamax() returns their value without the network.
+        :param state: Game state of the parent position
+        :param moves: Moves of the children to evaluate. An empty list evaluates the parent position itself.
+        :return:
+        """
+        # the batch array is shared, so the workers collect their positions in their own lists
+        keys, input_keys, fullmove_numbers, planes, legal_moves, mirror_policy = [], [], [], [], [], []
+        for move in moves or [None]:
+            if move is not None:
+                state.apply_move(move)
+            try:
+                transposition_key = state.get_transposition_key()
+                if transposition_key not in self.evaluations and transposition_key not in keys and \
+                        (move is None or not (state.is_loss() or self._is_draw(state))):
+                    cur_legal_moves = state.get_legal_moves()
+                    input_key = state.get_input_key()
+                    cached = self.eval_cache.lookup(input_key, cur_legal_moves, state.mirror_policy())
+                    if cached is not None:
+                        self.evaluations[transposition_key] = (cached[0], cur_legal_moves, cached[1])
+                    else:
+                        keys.append(transposition_key)
+                        input_keys.append(input_key)
+                        fullmove_numbers.append(state.get_fullmove_number())
+                        planes.append(state.get_state_planes())
+                        legal_moves.append(cur_legal_moves)
+                        mirror_policy.append(state.mirror_policy())
+            finally:
+                if move is not None:
+                    state.undo_move()
+
+        batch_size = len(self.batch_planes)
+        for start in range(0, len(keys), batch_size):
+            end = min(start + batch_size, len(keys))
+            with self.net_lock:
+                self.batch_planes[:end - start] = planes[start:end]
+                value_preds, policy_preds = self.net.predict_batch(self.batch_planes[:end - start])
+            for idx in range(start, end):
+                p_vec_small = None
+                if legal_moves[idx]:  # stalemate positions only need the value
+                    p_vec_small = get_probs_of_move_list(policy_preds[idx - start], legal_moves[idx],
+                                                         mirror_policy[idx])
+                    self.eval_cache.store(input_keys[idx], value_preds[idx - start], policy_preds[idx - start],
+                                          p_vec_small, fullmove_numbers[idx])
+                self.evaluations[keys[idx]] = (float(value_preds[idx - start]), legal_moves[idx], p_vec_small)
+
+    def _get_candidate_moves(self, state: GameState, legal_moves: list, p_vec_small: np.ndarray, is_root: bool):
+        """
+        Returns the indices of the moves which are searched in the order in which they are searched
+        :param state: Game state of the position
+        :param legal_moves: Legal moves of the position
+        :param p_vec_small: Prior policy of the legal moves
+        :param is_root: True for the root node where the number of candidate moves isn't limited
+        :return: List of move indices
+        """
+        mv_idces = [int(mv_idx) for mv_idx in np.argsort(p_vec_small)[::-1]]
+        if not is_root:
+            mv_idces = mv_idces[: self.nb_candidate_moves]
+        mv_idces = mv_idces[:1] + [mv_idx for mv_idx in mv_idces[1:] if p_vec_small[mv_idx] > MIN_PRIOR]
+
+        if self.include_check_moves:
+            chess_board = state.get_pythonchess_board()
+            mv_idces += [mv_idx for mv_idx, move in enumerate(legal_moves)
+                         if mv_idx not in mv_idces and chess_board.gives_check(move)]
+
+        # search the best move of the previous iteration first
+        entry = self.search_table.get(state.get_transposition_key())
+        if entry is not None and entry[3] in mv_idces:
+            mv_idces.remove(entry[3])
+            mv_idces.insert(0, entry[3])
+        return mv_idces
 
-    def negamax(self, state, depth, alpha=-math.inf, beta=math.inf, color=1, all_moves=1):
+    def negamax(self, state, depth, alpha=-math.inf, beta=math.inf):
         """
         Evaluates all nodes at a given depth and back-propagates their values to their respective parent nodes.
         In order to keep the number nof nodes manageable for neural network evaluation
-        :param all_moves: All possible moves
         :param state: Game state object
         :param depth: Number of depth to reach during search
         :param alpha: Current alpha value which is used for pruning
         :param beta: Current beta value which is used for pruning
-        :param color: Integer color value 1 for white, -1 for black
         :return: best_value - Best value for the current player until search depth
         """
-
-        if state.is_loss():  # check for draw is neglected for now due to bad runtime
+        self.thread_nodes.nodes += 1
+        if state.is_loss():
             return -1
 
-        if state.get_pythonchess_board().can_claim_draw():
+        if self._is_draw(state):
             return 0
 
-        [value, policy_vec] = self.net.predict_single(state.get_state_planes())  # start a brand new tree
+        transposition_key = state.get_transposition_key()
+        if transposition_key not in self.evaluations:
+            self._evaluate_children(state, [])
+        value, legal_moves, p_vec_small = self.evaluations[transposition_key]
 
         if depth == 0:
             return value  # the value is always returned in the view of the current player
+        if not legal_moves:  # stalemate
+            return 0
 
-        best_value = -math.inf  # initialization
+        alpha_orig = alpha
+        entry = self.search_table.get(transposition_key)
+        if entry is not None and entry[0] >= depth:
+            _, value, bound, _ = entry
+            if bound == EXACT:
+                return value
+            if bound == LOWER_BOUND:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
 
-        legal_moves = state.get_legal_moves()
-        p_vec_small = get_probs_of_move_list(policy_vec, state.get_legal_moves(), state.mirror_policy())
+        self._check_time()
+        mv_idces = self._get_candidate_moves(state, legal_moves, p_vec_small, is_root=False)
+        self._evaluate_children(state, [legal_moves[mv_idx] for mv_idx in mv_idces])
+
+        best_value = -math.inf  # initialization
+        best_idx = mv_idces[0]
+        for mv_idx in mv_idces:  # each child of position
+            state.apply_move(legal_moves[mv_idx])
+            try:
+                value = -self.negamax(state, depth - 1, -beta, -alpha)
+            finally:
+                state.undo_move()
+            if value > best_value:
+                best_value = value
+                best_idx = mv_idx
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
 
-        if all_moves > 0:
-            mv_idces = list(np.argsort(p_vec_small)[::-1])
+        if best_value <= alpha_orig:
+            bound = UPPER_BOUND
+        elif best_value >= beta:
+            bound = LOWER_BOUND
         else:
-            mv_idces = list(np.argsort(p_vec_small)[::-1][: self.nb_candidate_moves])
+            bound = EXACT
+        self.search_table[transposition_key] = (depth, best_value, bound, best_idx)
+        return best_value
 
-        if self.include_check_moves:
-            check_idces, _ = get_check_move_indices(state.get_pythonchess_board(), state.get_legal_moves())
-            mv_idces += check_idces
+    def _search_root_moves(self, state: GameState, depth: int, mv_idces: list, results: list, errors: list,
+                           node_counts: list):  # Too many arguments (6/5)
+        """
+        Searches the given moves of the root node with the shared alpha bound of the root node
+        :param state: Own game state of the calling thread which is set to the root position
+        :param depth: Depth of the current iteration
+        :param mv_idces: Indices of the root moves to search
+        :param results: List to which the (value, move index) pairs are appended
+        :param errors: List to which a raised exception is appended
+        :param node_counts: List to which the number of visited nodes of the calling thread is appended
+        :return:
+        """
+        legal_moves = self.evaluations[state.get_transposition_key()][1]
+        self.thread_nodes.nodes = 0
+        try:
+            for mv_idx in mv_idces:
+                state.apply_move(legal_moves[mv_idx])
+                try:
+                    value = -self.negamax(state, depth - 1, -math.inf, -self.root_alpha)
+                finally:
+                    state.undo_move()
+                with self.root_lock:
+                    self.root_alpha = max(self.root_alpha, value)
+                    results.append((value, mv_idx))
+        except Exception as err:  # pylint: disable=broad-except
+            errors.append(err)
+        finally:
+            node_counts.append(self.thread_nodes.nodes)
 
-        for mv_idx in mv_idces:  # each child of position
-            if p_vec_small[mv_idx] > 0.1:
-                mv = legal_moves[mv_idx]
-                state_child = copy.deepcopy(state)
-                state_child.apply_move(mv)
-                value = -self.negamax(state_child, depth - 1, -beta, -alpha, -color, all_moves - 1)
-                if value > best_value:
-                    self.best_moves[-depth] = mv
-                    self.sel_mv_idx[-depth] = mv_idx
-                    best_value = value
-                alpha = max(alpha, value)
-                if alpha >= beta:
-                    break
-        return best_value
+    def _search_root(self, state: GameState, depth: int):
+        """
+        Runs a single iteration of the iterative deepening on the root node.
+        The first move is searched alone to get a good alpha bound, afterwards the remaining moves are split across
+        the workers.
+        :param state: Game state of the root position
+        :param depth: Depth of the iteration
+        :return: best_value - Value of the root node
+                 best_idx - Index of the best move
+        """
+        transposition_key = state.get_transposition_key()
+        _, legal_moves, p_vec_small = self.evaluations[transposition_key]
+        mv_idces = self._get_candidate_moves(state, legal_moves, p_vec_small, is_root=True)
+        self._evaluate_children(state, [legal_moves[mv_idx] for mv_idx in mv_idces])
+
+        results, errors, node_counts = [], [], []
+        self.root_alpha = -math.inf
+        self._search_root_moves(state, depth, mv_idces[:1], results, errors, node_counts)
+        nb_workers = min(self.nb_workers, len(mv_idces) - 1)
+        if nb_workers > 1:
+            workers = [Thread(target=self._search_root_moves,
+                              args=(GameState(state.get_pythonchess_board().copy()), depth,
+                                    mv_idces[1 + worker_id::nb_workers], results, errors, node_counts), daemon=True)
+                       for worker_id in range(nb_workers)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        elif not errors:
+            self._search_root_moves(state, depth, mv_idces[1:], results, errors, node_counts)
+        # the node counts of the workers are only summed after they have been joined
+        self.nodes += sum(node_counts)
+        if errors:
+            raise errors[0]
+
+        # a move which doesn't improve alpha returns an upper bound, so the move which was found first wins on ties
+        best_value, best_idx = results[0]
+        for value, mv_idx in results[1:]:
+            if value > best_value:
+                best_value, best_idx = value, mv_idx
+        self.search_table[transposition_key] = (depth, best_value, EXACT, best_idx)
+        return best_value, best_idx
+
+    def _get_pv(self, state: GameState, depth: int):
+        """
+        Returns the principal variation by following the best moves of the search table from the root position
+        :param state: Game state of the root position
+        :param depth: Maximum length of the principal variation
+        :return: List of moves
+        """
+        pv = []
+        while len(pv) < depth:
+            transposition_key = state.get_transposition_key()
+            entry = self.search_table.get(transposition_key)
+            if entry is None or transposition_key not in self.evaluations:
+                break
+            pv.append(self.evaluations[transposition_key][1][entry[3]])
+            state.apply_move(pv[-1])
+        for _ in pv:
+            state.undo_move()
+        return pv
 
     def evaluate_board_state(self, state: AbsGameState) -> tuple:
         """
@@ -105,21 +353,35 @@ class AlphaBetaAgent(AbsAgent):
         :return:
         """
         self.t_start_eval = time()
-        value = self.negamax(
-            state, depth=self.depth, alpha=-math.inf, beta=math.inf, color=1 if state.board.turn else -1
-        )
+        self.nodes = 0
+        self.search_table = {}
+        self.evaluations = {}
+        # the search runs on copies of the game state, so the earlier positions of the game are counted separately
+        self.history = state.position.get_history()
+        root_state = GameState(state.get_pythonchess_board().copy())
+        self._evaluate_children(root_state, [])
+        value, legal_moves, p_vec_small = self.evaluations[root_state.get_transposition_key()]
+        best_idx, depth = int(p_vec_small.argmax()), 0
+
+        for cur_depth in range(1, self.depth + 1):
+            try:
+                value, best_idx = self._search_root(root_state, cur_depth)
+            except SearchTimeout:
+                break  # continue with the results of the last finished iteration
+            depth = cur_depth
 
-        legal_moves = state.get_legal_moves()
         policy = np.zeros(len(legal_moves))
-        policy[self.sel_mv_idx[0]] = 1
+        policy[best_idx] = 1
         centipawn = value_to_centipawn(value)
-        # depth = 1
         nodes = self.nodes
         time_e = time() - self.t_start_eval  # In uci the depth is given using half-moves notation also called plies
         time_elapsed_s = time_e * 1000
         nps = nodes / time_e
-        pv = self.best_moves[0].uci()
+        if depth > 0:
+            pv = " ".join(move.uci() for move in self._get_pv(root_state, depth))
+        else:
+            pv = legal_moves[best_idx].uci()
 
-        logging.info(f"{self.best_moves}")
+        logging.info(f"PV: {pv}")
         logging.info(f"Value: {value}, Centipawn: {centipawn}")
-        return value, legal_moves, policy, centipawn, self.depth, nodes, time_elapsed_s, nps, pv
+        return value, legal_moves, policy, centipawn, depth, nodes, time_elapsed_s, nps, pv
@@ -17,24 +17,28 @@ import collections
 import cProfile
 import io
 import logging
-import math
 import pstats
-from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
-from multiprocessing import Pipe
+from threading import Condition, Event, Lock, Thread
 from time import time
 import numpy as np
 
-from DeepCrazyhouse.src.domain.agent.neural_net_api import NeuralNetAPI
 from DeepCrazyhouse.src.domain.abstract_cls.abs_agent import AbsAgent
-from DeepCrazyhouse.src.domain.agent.player.util.net_pred_service import NetPredService
+from DeepCrazyhouse.src.domain.abstract_cls.abs_inference_backend import AbsInferenceBackend
+from DeepCrazyhouse.src.domain.agent.player.util.eval_cache import EvalCache
+from DeepCrazyhouse.src.domain.agent.player.util.inference_server import InferenceServer
 from DeepCrazyhouse.src.domain.agent.player.util.node import Node
-from DeepCrazyhouse.src.domain.variants.constants import BOARD_HEIGHT, BOARD_WIDTH, NB_CHANNELS_TOTAL, NB_LABELS
+from DeepCrazyhouse.src.domain.agent.player.util.node_store import NO_CHILD, NodeStore
+from DeepCrazyhouse.src.domain.agent.player.util.puct import select_puct_child
+from DeepCrazyhouse.src.domain.agent.player.util.transposition_table import TranspositionTable
+from DeepCrazyhouse.src.domain.variants.constants import BOARD_HEIGHT, BOARD_WIDTH, NB_CHANNELS_TOTAL
 from DeepCrazyhouse.src.domain.variants.game_state import GameState
 from DeepCrazyhouse.src.domain.variants.output_representation import get_probs_of_move_list, value_to_centipawn
+from DeepCrazyhouse.src.domain.variants.position import compute_hash
 from DeepCrazyhouse.src.domain.util import get_check_move_mask
 
-DTYPE = np.float
+# interval in seconds in which the main thread checks the time management while the search workers are running
+SEARCH_POLL_INTERVAL = 0.005
 
 
 def profile(fnc):
@@ -63,7 +67,7 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
 
     def __init__(
         self,
-        nets: [NeuralNetAPI],
+        nets: [AbsInferenceBackend],
         threads=16,
         batch_size=8,
         playouts_empty_pockets=256,
@@ -86,15 +90,19 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
         use_transposition_table=True,
         opening_guard_moves=0,
         u_init_divisor=1,
-    ):  # Too many arguments (21/5) - Too many local variables (29/15)
+        use_array_tree=False,
+        max_batch_wait_us=500,
+        tt_size_mb=64,
+        tt_replacement="visits",
+        nb_collectors=0,
+        eval_cache=None,
+    ):  # Too many arguments (27/5) - Too many local variables (29/15)
         """
         Constructor of the MCTSAgent.
-        :param nets: NeuralNetAPI handle which is used to communicate with the neural network
+        :param nets: Inference backends (e.g. NeuralNetAPI) which are used to communicate with the neural network
         :param threads: Number of threads to evaluate the nodes in parallel
-        :param batch_size: Fixed batch_size which is used in the network prediction service.
-                           The batch_size coordinates the prediction flow for the network-prediction service.
-                           Using a mxnet executor object which uses a fixed batch_size is faster than accepting
-                           arbitrary batch_sizes.
+        :param batch_size: Maximum batch_size which is used by the inference server. The inference server evaluates
+                           up to batch_size requests of the search threads together.
         :param playouts_empty_pockets: Number of playouts/simulations which will be done if the Crazyhouse-Pockets of
                                         both players are empty.
         :param playouts_filled_pockets: Number of playouts/simulations which will be done if at least one player has a
@@ -145,12 +153,32 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
         :param u_init_divisor: Division factor for calculating the u-value in select_node(). Default value is 1.0 to
                                 avoid division by 0. Values smaller 1.0 increases the chance of exploring each node at
                                 least once. This value must be greater 0.
+        :param use_array_tree: If set True, the search tree is kept in a NodeStore which holds all node statistics in
+                               preallocated contiguous arrays indexed by integer node ids instead of allocating a Node
+                               object with its own arrays, lock and python-chess board for every expanded position.
+        :param max_batch_wait_us: Maximum time in microseconds for which the inference server waits for a batch to be
+                                  filled before a smaller batch is evaluated. Higher values increase the throughput of
+                                  the network but also increase the latency of every single playout.
+        :param tt_size_mb: Memory budget of the transposition table in MB (uci option "Hash"). The table keeps its
+                           entries across moves. It only bounds the look-up entries and not the size of the search tree.
+        :param tt_replacement: Replacement scheme of the transposition table for full buckets: "visits" keeps the nodes
+                               with the most visits and "depth" the nodes which are closest to the root.
+        :param nb_collectors: If greater 0, the search runs in the batch collecting mode with this number of collector
+                              threads instead of the search threads and inference servers. Every collector descends
+                              batch_size times from the root node under virtual loss, evaluates all collected leaf
+                              positions with a single call of the network and backs up all paths afterwards.
+                              The collectors are assigned round robin to the networks and share them by a lock.
+        :param eval_cache: EvalCache which is consulted before every network evaluation. It can be shared with the
+                           other agents. If None, the evaluations aren't cached.
         """
 
         super().__init__(temperature, temperature_moves, verbose)
         self.root_node = None  # the root node contains all references to its child nodes
         self.max_depth = 10  # stores the links for all nodes
-        self.node_lookup = {}  # stores a lookup for all possible board states after the opposite player played its move
+        # stores a lookup for all possible board states after the opposite player played its move
+        self.node_lookup = TranspositionTable(tt_size_mb, tt_replacement)
+        # keeps the network evaluations across moves, a budget of 0 MB disables the cache
+        self.eval_cache = eval_cache if eval_cache is not None else EvalCache(size_mb=0)
         self.nets = nets  # get the network reference
         self.virtual_loss = virtual_loss
 
@@ -163,29 +191,27 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
         self.cpuct = cpuct
         self.max_search_depth = max_search_depth
         self.threads = threads
+        self.nb_collectors = nb_collectors
         # check for possible issues when giving an illegal batch_size and number of threads combination
-        if batch_size > threads:
+        if nb_collectors > 0:
+            if batch_size > min(net.get_batch_size() for net in nets):
+                raise Exception(
+                    "The given batch_size %d is higher than the batch size of the neural network" % batch_size
+                )
+        elif batch_size > threads:
             raise Exception(
                 "info string The given batch_size %d is higher than the number of threads %d. "
                 "The maximum legal batch_size is the same as the number of threads (here: %d) "
                 % (batch_size, threads, threads)
             )
 
-        if threads % batch_size != 0:
+        elif threads % batch_size != 0:
             raise Exception(
                 "You requested an illegal combination of threads %d and batch_size %d."
                 " The batch_size must be a divisor of the number of threads" % (threads, batch_size)
             )
 
         self.batch_size = batch_size
-        self.my_pipe_endings = []  # create pip endings for itself and the prediction service
-        pip_endings_external = []
-
-        for i in range(threads):
-            ending1, ending2 = Pipe()
-            self.my_pipe_endings.append(ending1)
-            pip_endings_external.append(ending2)
-
         self.nb_playouts_empty_pockets = playouts_empty_pockets
         self.nb_playouts_filled_pockets = playouts_filled_pockets
         self.dirichlet_alpha = dirichlet_alpha
@@ -198,39 +224,57 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
         # temporary variables
         # time counter - n° of nodes stored to measure the nps - priority policy for the root node
         self.t_start_eval = self.total_nodes_pre_search = self.root_node_prior_policy = None
-        # allocate shared memory for communicating with the network prediction service
-        self.batch_state_planes = np.zeros((self.threads, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH), DTYPE)
-        self.batch_value_results = np.zeros(self.threads, DTYPE)
-        self.batch_policy_results = np.zeros((self.threads, NB_LABELS), DTYPE)
-        # initialize the NetworkPredictionService and give the pointers to the shared memory
-        self.net_pred_services = []
-        nb_pipes = self.threads // len(nets)
-
-        for i, net in enumerate(nets):  # create multiple gpu-access points
-            net_pred_service = NetPredService(
-                pip_endings_external[i * nb_pipes : (i + 1) * nb_pipes],
-                net,
-                batch_size,
-                self.batch_state_planes,
-                self.batch_value_results,
-                self.batch_policy_results,
-            )
-            self.net_pred_services.append(net_pred_service)
-
-        self.transposition_table = collections.Counter()
-        self.send_batches = False
+        # can be set from another thread to stop the current search early, it must be cleared before the next search
+        self.stop_event = Event()
+        # create one inference server for every network, each search thread gets a request slot on one of them
+        self.nb_slots_per_server = self.threads // len(nets)
+        self.inference_servers = [
+            InferenceServer(net, self.nb_slots_per_server, batch_size, max_batch_wait_us) for net in nets
+        ]
+        # in the batch collecting mode every collector encodes its leaf positions into its own batch array
+        self.collector_planes = [
+            np.zeros((batch_size, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH), np.float32)
+            for _ in range(nb_collectors)
+        ]
+        self.net_locks = [Lock() for _ in nets]  # the collectors which share a network wait for each other
+
+        self.transposition_table = collections.Counter()  # occurrences of the earlier positions of the game
         self.use_pruning = use_pruning
         self.time_buffer_ms = 0
+        # True while the search only ends on the stop event (ponder, infinite and depth searches)
+        self.is_unbounded_search = False
         self.use_time_management = use_time_management
-        if self.use_pruning:  # pruning is incompatible with transposition usage
-            self.use_transposition_table = False
-        else:
-            self.use_transposition_table = use_transposition_table
+        self.use_transposition_table = use_transposition_table
         self.opening_guard_moves = opening_guard_moves
         self.use_future_q_values = use_future_q_values
         if u_init_divisor <= 0 or u_init_divisor > 1:
             raise Exception("The value for the u-value initial divisor must be in (0,1]")
         self.u_init_divisor = u_init_divisor
+        # the node store is only used in the array tree mode
+        self.node_store = NodeStore() if use_array_tree else None
+
+        # the search workers are started once and are reused for every search
+        # all search variables below are protected by the search condition
+        self.search_workers = []
+        self.search_cond = Condition()
+        self.search_generation = 0  # is increased for every new search to wake up the workers
+        self.search_active = False  # signals the workers to keep on running playouts
+        self.nb_active_workers = 0
+        self.search_playouts = self.search_playout_limit = self.search_max_depth = 0
+        self.search_last_result = self.search_first_playout_time = self.search_error = None
+        self.search_state = None  # game state of the root node
+
+    def _create_node(self, board, value, p_vec_small, legal_moves, is_leaf=False, transposition_key=None,
+                     clip_low_visit=True):  # Too many arguments (8/5)
+        """
+        Creates a new node for the search tree in the active tree mode. The arguments are the same as for Node().
+        :return: Node object or a StoreNode view if use_array_tree is active
+        """
+        if self.node_store is None:
+            return Node(board, value, p_vec_small, legal_moves, is_leaf, transposition_key, clip_low_visit)
+        node_id = self.node_store.add_node(board, value, p_vec_small, legal_moves, is_leaf, transposition_key,
+                                           clip_low_visit)
+        return self.node_store.get_node(node_id)
 
     def evaluate_board_state(self, state: GameState):  # Probably is better to be refactored
         """
@@ -242,35 +286,50 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
         # Too many local variables (28/15) - Too many branches (25/12) - Too many statements (75/50)
         self.t_start_eval = time()  # store the time at which the search started
 
-        if not self.net_pred_services[0].running:  # check if the net prediction service has already been started
-            for net_pred_service in self.net_pred_services:  # start the prediction daemon thread
-                net_pred_service.start()
+        # check if the inference servers are running, the collectors call the networks directly
+        if not self.nb_collectors:
+            for inference_server in self.inference_servers:
+                if not inference_server.running:  # (re)start the daemon thread, e.g. after an error of the backend
+                    inference_server.start()
+
+        if not self.search_workers:
+            self._start_search_workers()
 
         legal_moves = state.get_legal_moves()  # list of all possible legal move in the current board position
 
         if not legal_moves:  # consistency check
             raise Exception("The given board state has no legal move available")
 
-        key = state.get_transposition_key() + (
-            state.get_fullmove_number(),
-        )  # check first if the the current tree can be reused
-
-        if not self.use_pruning and key in self.node_lookup:
+        self.node_lookup.new_search()
+        # occurrences of all earlier positions of the game for the repetition detection during the search
+        self.transposition_table = state.position.get_history()
+        # check first if the the current tree can be reused
+        reused_node = None
+        if not self.use_pruning:
+            # keep the subtree after the own last move and the reply of the opponent
+            reused_node = self._get_reused_subtree(state)
+            if reused_node is None:
+                reused_node = self.node_lookup.get(state.get_transposition_key(), state.get_fullmove_number())
+
+        if reused_node is not None:
+            if self.node_store is not None:
+                reused_node = self._compact_node_store(reused_node)
             chess_board = state.get_pythonchess_board()
-            self.root_node = self.node_lookup[key]  # if key in self.node_lookup:
+            self.root_node = reused_node
             if self.enhance_captures:
                 self._enhance_captures(chess_board, legal_moves, self.root_node.policy_prob)
-                # enhance checks for all direct child nodes
-                for child_node in self.root_node.child_nodes:
-                    if child_node:
-                        self._enhance_captures(child_node.board, child_node.legal_moves, child_node.policy_prob)
-
             if self.enhance_checks:
                 self._enhance_checks(chess_board, legal_moves, self.root_node.policy_prob)
-                # enhance checks for all direct child nodes
-                for child_node in self.root_node.child_nodes:
-                    if child_node:
-                        self._enhance_checks(child_node.board, child_node.legal_moves, child_node.policy_prob)
+            if self.enhance_captures or self.enhance_checks:
+                # enhance captures and checks for all direct child nodes, the nodes don't store their boards
+                for move, child_node in zip(self.root_node.legal_moves, self.root_node.child_nodes):
+                    if child_node and not child_node.is_leaf:
+                        child_board = chess_board.copy(stack=False)
+                        child_board.push(move)
+                        if self.enhance_captures:
+                            self._enhance_captures(child_board, child_node.legal_moves, child_node.policy_prob)
+                        if self.enhance_checks:
+                            self._enhance_checks(child_board, child_node.legal_moves, child_node.policy_prob)
 
             logging.debug(
                 "Reuse the search tree. Number of nodes in search tree: %d",
@@ -281,6 +340,10 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
             logging.debug("Starting a brand new search tree...")
             self.root_node = None
             self.total_nodes_pre_search = 0
+            if self.node_store is not None:
+                # the nodes of the old tree can't be reached anymore
+                self.node_lookup.clear()
+                self.node_store.clear()
 
         if len(legal_moves) == 1:  # check for fast way out
             max_depth_reached = 1  # if there's only a single legal move you only must go 1 depth
@@ -289,9 +352,10 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
                 # conduct all necessary steps for fastest way out
                 self._expand_root_node_single_move(state, legal_moves)
 
-            # increase the move time buffer
-            # subtract half a second as a constant for possible delay
-            self.time_buffer_ms += max(self.movetime_ms - 500, 0)
+            if not self.is_unbounded_search:
+                # increase the move time buffer
+                # subtract half a second as a constant for possible delay
+                self.time_buffer_ms += max(self.movetime_ms - 500, 0)
         else:
             if self.root_node is None:
                 self._expand_root_node_multiple_moves(state, legal_moves)  # run a single expansion on the root node
@@ -304,6 +368,12 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
             max_depth_reached = self._run_mcts_search(state)
             t_elapsed = time() - self.t_start_eval
             print("info string move overhead is %dms" % (t_elapsed * 1000 - self.movetime_ms))
+            print("info string %s" % self.node_lookup.get_info_string())
+            if self.eval_cache.is_enabled():
+                print("info string %s" % self.eval_cache.get_info_string())
+            if self.verbose:
+                for inference_server in self.inference_servers:
+                    print("info string %s" % inference_server.get_info_string())
 
         # receive the policy vector based on the MCTS search
         p_vec_small = self.root_node.get_mcts_policy(self.q_value_weight)  # , xth_n_max=xth_n_max, is_root=True)
@@ -319,7 +389,8 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
                 p_vec_small = self.root_node.get_mcts_policy(self.q_value_weight)
 
         # if self.use_pruning is False:
-        self.node_lookup[key] = self.root_node  # store the current root in the lookup table
+        # store the current root in the lookup table
+        self.node_lookup.store(state.get_transposition_key(), state.get_fullmove_number(), self.root_node, 0)
         best_child_idx = p_vec_small.argmax()  # select the q-value according to the mcts best child value
         value = self.root_node.q_value[best_child_idx]
         # value = orig_q[best_child_idx]
@@ -405,9 +476,15 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
         """
 
         is_leaf = False  # initialize is_leaf by default to false
-        [value, policy_vec] = self.nets[0].predict_single(state.get_state_planes())  # start a brand new tree
-        # extract a sparse policy vector with normalized probabilities
-        p_vec_small = get_probs_of_move_list(policy_vec, legal_moves, state.mirror_policy())
+        input_key = state.get_input_key()
+        cached = self.eval_cache.lookup(input_key, legal_moves, state.mirror_policy())
+        if cached is not None:
+            value, p_vec_small = cached
+        else:
+            [value, policy_vec] = self.nets[0].predict_single(state.get_state_planes())  # start a brand new tree
+            # extract a sparse policy vector with normalized probabilities
+            p_vec_small = self._store_evaluation(input_key, state.get_fullmove_number(), value, policy_vec,
+                                                 legal_moves, state.mirror_policy())
         chess_board = state.get_pythonchess_board()
         if self.enhance_captures:
             self._enhance_captures(chess_board, legal_moves, p_vec_small)
@@ -416,7 +493,8 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
             self._enhance_checks(chess_board, legal_moves, p_vec_small)
 
         # create a new root node
-        self.root_node = Node(chess_board, value, p_vec_small, legal_moves, is_leaf, clip_low_visit=False)
+        self.root_node = self._create_node(None, value, p_vec_small, legal_moves, is_leaf,
+                                           state.get_transposition_key(), clip_low_visit=False)
 
     def _expand_root_node_single_move(self, state, legal_moves):
         """
@@ -431,10 +509,11 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
         p_vec_small = np.array([1], np.float32)  # we can create the move probability vector without the NN this time
 
         # create a new root node
-        self.root_node = Node(state.get_pythonchess_board(), value, p_vec_small, legal_moves, clip_low_visit=False)
+        self.root_node = self._create_node(None, value, p_vec_small, legal_moves,
+                                           transposition_key=state.get_transposition_key(), clip_low_visit=False)
 
         if self.root_node.child_nodes[0] is None:  # check a child node if it doesn't exists already
-            state_child = deepcopy(state)
+            state_child = GameState(state.get_pythonchess_board().copy())
             state_child.apply_move(legal_moves[0])
             is_leaf = False  # initialize is_leaf by default to false
             # we don't need to check for is_lost() because the game is already over
@@ -451,7 +530,7 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
                 p_vec_small_child = None
             # check if you can claim a draw - it's assumed that the draw is always claimed
             elif (
-                self.can_claim_threefold_repetition(state.get_transposition_key(), [0])
+                self.can_claim_threefold_repetition(state_child)
                 or state.get_pythonchess_board().can_claim_fifty_moves()
             ):
                 value = 0
@@ -468,34 +547,168 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
                 )
 
             # create a new child node
-            child_node = Node(state.get_pythonchess_board(), value, p_vec_small_child, legal_moves_child, is_leaf)
+            child_node = self._create_node(None, value, p_vec_small_child, legal_moves_child, is_leaf,
+                                           state_child.get_transposition_key())
             self.root_node.child_nodes[0] = child_node  # connect the child to the root
             # assign the value of the root node as the q-value for the child
             # here we must invert the invert the value because it's the value prediction of the next state
             self.root_node.q_value[0] = -value
 
+    def _compact_node_store(self, reused_node):
+        """
+        Releases all nodes of the NodeStore which can't be reached from the reused subtree anymore and updates the
+        nodes of the look-up table to the new node ids. Look-up entries outside of the subtree are removed.
+        :param reused_node: StoreNode of the new root node
+        :return: StoreNode of the new root node after the compaction
+        """
+        id_map = self.node_store.compact(reused_node.node_id)
+        self.node_lookup.remap_nodes(
+            lambda node: None if id_map[node.node_id] == NO_CHILD else self.node_store.get_node(id_map[node.node_id])
+        )
+        return self.node_store.get_node(0)
+
+    def _get_reused_subtree(self, state):
+        """
+        Looks up the node of the given state in the last search tree. This is the case if the state was reached by
+        playing a move from the last root node followed by the reply of the opponent.
+        :param state: Current game state
+        :return: Node which can be used as the new root node or None if the state isn't part of the last search tree
+        """
+        if self.root_node is None:
+            return None
+
+        board = state.get_pythonchess_board().copy()
+        if len(board.move_stack) < 2:
+            return None
+        opponent_move = board.pop()
+        own_move = board.pop()
+        if compute_hash(board) != self.root_node.transposition_key:
+            return None
+
+        node = self.root_node
+        for move in (own_move, opponent_move):
+            if node.is_leaf or move not in node.legal_moves:
+                return None
+            node = node.child_nodes[node.legal_moves.index(move)]
+            if node is None:
+                return None
+
+        if node.is_leaf:
+            return None
+        return node
+
+    def _start_search_workers(self):
+        """
+        Starts the search worker threads. Each worker owns one request slot on an inference server and keeps on
+        running playouts as long as the search is active. In the batch collecting mode the workers are the collectors.
+        :return:
+        """
+        for worker_id in range(self.nb_collectors or self.threads):
+            worker = Thread(target=self._search_worker, args=(worker_id,), daemon=True)
+            worker.start()
+            self.search_workers.append(worker)
+
+    def _search_worker(self, worker_id):
+        """
+        Main loop of a search worker. The worker waits for the start of a new search and runs playouts on the current
+        root node until the search is stopped or one of the playout and depth limits has been reached.
+        :param worker_id: Id of the worker which defines its inference server and request slot
+        :return:
+        """
+        generation = 0
+        while True:
+            with self.search_cond:
+                while self.search_generation == generation:
+                    self.search_cond.wait()
+                generation = self.search_generation
+            # every worker applies and reverts the moves of its playouts on its own copy of the root position
+            state = GameState(self.search_state.get_pythonchess_board().copy())
+
+            while self.search_active:
+                try:
+                    if self.nb_collectors:
+                        nb_playouts, cur_value, cur_depth, chosen_nodes = self._run_batch_playouts(state, worker_id)
+                    else:
+                        nb_playouts = 1
+                        cur_value, cur_depth, chosen_nodes = self._run_single_playout(
+                            state, parent_node=self.root_node, worker_id=worker_id, depth=1, chosen_nodes=[]
+                        )
+                except Exception as err:  # pylint: disable=broad-except
+                    with self.search_cond:
+                        self.search_error = err
+                        self.search_active = False
+                    break
+
+                with self.search_cond:
+                    self.search_playouts += nb_playouts
+                    if self.search_first_playout_time is None:
+                        self.search_first_playout_time = time()
+                    self.search_max_depth = max(self.search_max_depth, cur_depth)
+                    self.search_last_result = (cur_value, cur_depth, chosen_nodes)
+                    if (
+                        self.search_playouts >= self.search_playout_limit
+                        or self.search_max_depth >= self.max_search_depth
+                    ):
+                        self.search_active = False
+                        self.search_cond.notify_all()
+
+            with self.search_cond:
+                self.nb_active_workers -= 1
+                self.search_cond.notify_all()
+
+    def _start_search(self, state, nb_playouts):
+        """
+        Wakes up all search workers for a new search on the current root node
+        :param state: Game state of the root node
+        :param nb_playouts: Number of playouts after which the workers stop on their own
+        :return:
+        """
+        with self.search_cond:
+            self.search_state = state
+            self.search_playouts = 0
+            self.search_playout_limit = nb_playouts
+            self.search_max_depth = 1
+            self.search_last_result = self.search_first_playout_time = self.search_error = None
+            self.nb_active_workers = self.nb_collectors or self.threads
+            self.search_active = True
+            self.search_generation += 1
+            self.search_cond.notify_all()
+
+    def _stop_search(self):
+        """
+        Stops the search and waits until every worker has finished its current playout.
+        This is the only point where the workers are synchronized.
+        :return:
+        """
+        with self.search_cond:
+            self.search_active = False
+            while self.nb_active_workers > 0:
+                self.search_cond.wait()
+        if self.search_error is not None:
+            raise self.search_error
+
     def _run_mcts_search(self, state):
         """
         Runs a new or continues the mcts on the current search tree.
+        The playouts are done by the search workers while this thread only handles the time management.
         :param state: Input state given by the user
         :return: max_depth_reached (int) - The longest search path length after the whole search
         """
 
-        self.node_lookup = {}  # clear the look up table
+        # the look up entries of earlier moves are replaced first because they are aged by node_lookup.new_search()
         self.root_node_prior_policy = deepcopy(self.root_node.policy_prob)  # safe the prior policy of the root node
         # apply dirichlet noise to the prior probabilities in order to ensure
         #  that every move can possibly be visited
         self.root_node.apply_dirichlet_noise_to_prior_policy(epsilon=self.dirichlet_epsilon, alpha=self.dirichlet_alpha)
         # store what depth has been reached at maximum in the current search tree
         max_depth_reached = 1  # default is 1, in case only 1 move is available
-        futures = []
 
         if state.are_pocket_empty():  # set the number of playouts accordingly
             nb_playouts = self.nb_playouts_empty_pockets
         else:
             nb_playouts = self.nb_playouts_filled_pockets
 
-        t_elapsed_ms = cur_playouts = 0
+        t_elapsed_ms = 0
         old_time = time()
         cpuct_init = self.cpuct
 
@@ -504,30 +717,21 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
         else:
             time_checked = time_checked_early = True
 
-        while (
-            max_depth_reached < self.max_search_depth and cur_playouts < nb_playouts and t_elapsed_ms < self.movetime_ms
-        ):  # and np.abs(self.root_node.q_value.mean()) < 0.99:
-
-            # start searching
-            with ThreadPoolExecutor(max_workers=self.threads) as executor:
-                for i in range(self.threads):
-                    # calculate the thread id based on the current playout
-                    futures.append(
-                        executor.submit(
-                            self._run_single_playout, parent_node=self.root_node, pipe_id=i, depth=1, chosen_nodes=[]
-                        )
-                    )
-
-            cur_playouts += self.threads
-            time_show_info = time() - old_time
-
-            for i, future in enumerate(futures):
-                cur_value, cur_depth, chosen_nodes = future.result()
-
-                if cur_depth > max_depth_reached:
-                    max_depth_reached = cur_depth
-                # Print the explored line of the last line for every x seconds if verbose is true
-                if self.verbose and time_show_info > 0.5 and i == len(futures) - 1:
+        self._start_search(state, nb_playouts)
+        try:
+            # the movetime can be changed from another thread during the search, e.g. on a ponderhit
+            while t_elapsed_ms < self.movetime_ms and not self.stop_event.is_set():
+                with self.search_cond:
+                    if self.search_active:
+                        self.search_cond.wait(SEARCH_POLL_INTERVAL)
+                    if not self.search_active:
+                        break  # the playout or depth limit has been reached
+                    last_result = self.search_last_result
+
+                time_show_info = time() - old_time
+                # Print the explored line of the last playout for every x seconds if verbose is true
+                if self.verbose and time_show_info > 0.5 and last_result is not None:
+                    cur_value, cur_depth, chosen_nodes = last_result
                     mv_list = self._create_mv_list(chosen_nodes)
                     str_moves = self._mv_list_to_str(mv_list)
                     print(
@@ -537,57 +741,56 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
                     logging.debug("Update info")
                     old_time = time()
 
-            t_elapsed = time() - self.t_start_eval  # update the current search time
-            t_elapsed_ms = t_elapsed * 1000
-            if time_show_info > 1:
-                node_searched = int(self.root_node.n_sum - self.total_nodes_pre_search)
-                print("info nps %d time %d" % (int((node_searched / t_elapsed)), t_elapsed_ms))
+                t_elapsed = time() - self.t_start_eval  # update the current search time
+                t_elapsed_ms = t_elapsed * 1000
+                if time_show_info > 1:
+                    node_searched = int(self.root_node.n_sum - self.total_nodes_pre_search)
+                    print("info nps %d time %d" % (int((node_searched / t_elapsed)), t_elapsed_ms))
+                    old_time = time()
+
+                if self.is_unbounded_search:
+                    continue  # the time management starts after a ponderhit has set a bounded movetime
+
+                if not time_checked_early and t_elapsed_ms > self.movetime_ms / 2:
+                    if (
+                        self.root_node.policy_prob.max() > 0.9
+                        and self.root_node.policy_prob.argmax() == self.root_node.q_value.argmax()
+                    ):
+                        self.time_buffer_ms += (self.movetime_ms - t_elapsed_ms) * 0.9
+                        print("info early break up")
+                        break
+                    else:
+                        time_checked_early = True
 
-            if not time_checked_early and t_elapsed_ms > self.movetime_ms / 2:
                 if (
-                    self.root_node.policy_prob.max() > 0.9
-                    and self.root_node.policy_prob.argmax() == self.root_node.q_value.argmax()
+                    self.time_buffer_ms > 2500
+                    and not time_checked
+                    and t_elapsed_ms > self.movetime_ms * 0.9
+                    and self.root_node.q_value[self.root_node.child_number_visits.argmax()]
+                    < self.root_node.initial_value + 0.01
                 ):
-                    self.time_buffer_ms += (self.movetime_ms - t_elapsed_ms) * 0.9
-                    print("info early break up")
-                    break
-                else:
-                    time_checked_early = True
-
-            if (
-                self.time_buffer_ms > 2500
-                and not time_checked
-                and t_elapsed_ms > self.movetime_ms * 0.9
-                and self.root_node.q_value[self.root_node.child_number_visits.argmax()]
-                < self.root_node.initial_value + 0.01
-            ):
-                print("info increase time")
-                time_checked = True
-                time_bonus = self.time_buffer_ms / 4
-                self.time_buffer_ms -= time_bonus  # increase the movetime
-                self.movetime_ms += time_bonus * 0.75
-                self.root_node.initial_value = self.root_node.q_value[self.root_node.child_number_visits.argmax()]
-
-                if self.time_buffer_ms < 0:
-                    self.movetime_ms += self.time_buffer_ms
-                    self.time_buffer_ms = 0
+                    print("info increase time")
+                    time_checked = True
+                    time_bonus = self.time_buffer_ms / 4
+                    self.time_buffer_ms -= time_bonus  # increase the movetime
+                    self.movetime_ms += time_bonus * 0.75
+                    self.root_node.initial_value = self.root_node.q_value[self.root_node.child_number_visits.argmax()]
+
+                    if self.time_buffer_ms < 0:
+                        self.movetime_ms += self.time_buffer_ms
+                        self.time_buffer_ms = 0
+        finally:
+            self._stop_search()
+
+        max_depth_reached = max(max_depth_reached, self.search_max_depth)
+        if self.search_first_playout_time is not None:
+            t_first_playout_ms = (self.search_first_playout_time - self.t_start_eval) * 1000
+            print("info string first playout after %dms" % t_first_playout_ms)
         self.cpuct = cpuct_init
         return max_depth_reached
 
-    def perform_action(self, state_in: GameState):
-        """
-        Return a value, best move with according to the mcts search.
-        This method is used when using the mcts agent as a player.
-        :param state_in: Requested games state
-        :return: value - Board value prediction
-                selected_move - Python chess move object according to mcts
-                confidence - Confidence for selecting this move
-                selected_child_idx - Child index which correspond to the selected child
-        """
-        # create a deepcopy of the state in order not to change the given input parameter
-        return super().perform_action(deepcopy(state_in))
-
-    def _run_single_playout(self, parent_node: Node, pipe_id=0, depth=1, chosen_nodes=None):
+    def _run_single_playout(self, state: GameState, parent_node: Node, worker_id=0, depth=1, chosen_nodes=None,
+                            path_nodes=None):
         """
         This function works recursively until a leaf or terminal node is reached.
         It ends by back-propagating the value of the new expanded node or by propagating the value of a terminal state.
@@ -598,16 +801,18 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
         :param chosen_nodes: List of moves which have been taken in the current path.
                         For each selected child node this list is expanded by one move recursively.
         :param chosen_nodes: List of all nodes that this thread has explored with respect to the root node
+        :param path_nodes: List of the parent nodes of the current path. The statistics of the whole path are updated
+                           in one pass after the leaf has been evaluated.
         :return: -value: The inverse value prediction of the current board state. The flipping by -1 each turn is needed
                         because the point of view changes each half-move
                 depth: Current depth reach by this evaluation
                 mv_list: List of moves which have been selected
         """
-        # Probably is better to be refactored
-        # Too many arguments (6/5) - Too many local variables (27/15) - Too many branches (28/12) -
-        # Too many statements (86/50)
+        # Too many arguments (7/5) - Too many local variables (21/15)
         if chosen_nodes is None:  # select a legal move on the chess board
             chosen_nodes = []
+        if path_nodes is None:
+            path_nodes = []
         node, move, child_idx = self._select_node(parent_node)
 
         if move is None:
@@ -619,191 +824,328 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
 
         # append the selected move to the move list
         chosen_nodes.append(child_idx)  # append the chosen child idx to the chosen_nodes list
+        path_nodes.append(parent_node)
 
         if node is None:
-            state = GameState(deepcopy(parent_node.board))  # get the board from the parent node
-            state.apply_move(move)  # apply the selected move on the board
+            state.apply_move(move)  # apply the selected move on the board of this worker
 
             # get the transposition-key which is used as an identifier for the board positions in the look-up table
             transposition_key = state.get_transposition_key()
             # check if the addressed fen exist in the look-up table
             # note: It's important to use also the halfmove-counter here, otherwise the system can create an infinite
             # feed-back-loop
-            key = transposition_key + (state.get_fullmove_number(),)
-
-            if self.use_transposition_table and key in self.node_lookup:
-
-                node = self.node_lookup[key]  # get the node from the look-up list
-
-                # get the prior value from the leaf node which has already been expanded
-                value = node.initial_value
-
-                # clip the visit nodes for all nodes in the search tree except the director opp. move
-                clip_low_visit = self.use_pruning
-
-                new_node = Node(
-                    node.board,
-                    value,
-                    node.policy_prob,
-                    node.legal_moves,
-                    node.is_leaf,
-                    key,
-                    clip_low_visit,
-                )  # create a new node
-
-                with parent_node.lock:
-                    parent_node.child_nodes[child_idx] = new_node  # add the new node to its parent
+            fullmove_number = state.get_fullmove_number()
+            if self.use_transposition_table:
+                node = self.node_lookup.get(transposition_key, fullmove_number)  # get the node from the look-up table
 
+            if node is not None:
+                value = self._add_transposition_node(parent_node, child_idx, node, transposition_key)
             else:
                 # expand and evaluate the new board state (the node wasn't found in the look-up table)
                 # its value will be back-propagated through the tree and flipped after every layer
-                my_pipe = self.my_pipe_endings[pipe_id]  # receive a free available pipe
-
-                if self.send_batches:
-                    my_pipe.send(state.get_state_planes())
-                    # this pipe waits for the predictions of the network inference service
-                    [value, policy_vec] = my_pipe.recv()
-                else:
-                    state_planes = state.get_state_planes()
-                    self.batch_state_planes[pipe_id] = state_planes
-                    my_pipe.send(pipe_id)
-                    result_channel = my_pipe.recv()
-                    value = np.array(self.batch_value_results[result_channel])
-                    policy_vec = np.array(self.batch_policy_results[result_channel])
-
-                is_leaf = is_won = False  # initialize is_leaf by default to false and check if the game is won
-                # check if the current player has won the game
-                # (we don't need to check for is_lost() because the game is already over
-                #  if the current player checkmated his opponent)
-                if state.is_check():
-                    if state.is_loss():
-                        is_won = True
-
-                # needed for e.g. atomic because the king explodes and is not in check mate anymore
-                if state.is_variant_loss():
-                    is_won = True
-
-                if is_won:
-                    value = -1
-                    is_leaf = True
-                    legal_moves = []
-                    p_vec_small = None
-                    # establish a mate in one connection in order to stop exploring different alternatives
-                    parent_node.set_check_mate_node_idx(child_idx)
-                # get the value from the leaf node (the current function is called recursively)
-                # check if you can claim a draw - it's assumed that the draw is always claimed
-                elif (
-                    self.can_claim_threefold_repetition(transposition_key, chosen_nodes)
-                    or state.get_pythonchess_board().can_claim_fifty_moves() is True
-                ):
-                    value = 0
-                    is_leaf = True
-                    legal_moves = []
-                    p_vec_small = None
-                else:
-                    legal_moves = state.get_legal_moves()  # get the current legal move of its board state
-
-                    if not legal_moves:
-                        # stalemate occurred which is very rare for crazyhouse
-                        if state.uci_variant == "giveaway":
-                            value = 1
-                        else:
-                            value = 0
-                        is_leaf = True
-                        legal_moves = []
-                        p_vec_small = None
-                        # raise Exception("No legal move is available for state: %s" % state)
+                value, legal_moves = self._get_terminal_value(state, parent_node, child_idx)
+                p_vec_small = None
+                if value is None:
+                    input_key = state.get_input_key()
+                    cached = self.eval_cache.lookup(input_key, legal_moves, state.mirror_policy())
+                    if cached is not None:
+                        value, p_vec_small = cached
                     else:
-                        try:  # extract a sparse policy vector with normalized probabilities
-                            p_vec_small = get_probs_of_move_list(
-                                policy_vec, legal_moves, mirror_policy=state.mirror_policy(), normalize=True
-                            )
-                        except KeyError:
-                            raise Exception("Key Error for state: %s" % state)
-
-                # clip the visit nodes for all nodes in the search tree except the director opp. move
-                clip_low_visit = self.use_pruning and depth != 1  # and depth > 4
-                new_node = Node(
-                    state.get_pythonchess_board(),
-                    value,
-                    p_vec_small,
-                    legal_moves,
-                    is_leaf,
-                    transposition_key,
-                    clip_low_visit,
-                )  # create a new node
-
-                if depth == 1:
-                    # disable uncertain moves from being visited by giving them a very bad score
-                    if not is_leaf and self.use_pruning:
-                        if self.root_node_prior_policy[child_idx] < 1e-3 and value * -1 < self.root_node.initial_value:
-                            with parent_node.lock:
-                                value = 99
-
-                    # for performance reasons only apply check enhancement on depth 1 for now
-                    chess_board = state.get_pythonchess_board()
-                    if self.enhance_checks:
-                        self._enhance_checks(chess_board, legal_moves, p_vec_small)
-
-                    if self.enhance_captures:
-                        self._enhance_captures(chess_board, legal_moves, p_vec_small)
-
-                if not self.use_pruning:
-                    self.node_lookup[key] = new_node  # include a reference to the new node in the look-up table
-
-                with parent_node.lock:
-                    parent_node.child_nodes[child_idx] = new_node  # add the new node to its parent
+                        inference_server = self.inference_servers[worker_id // self.nb_slots_per_server]
+                        slot_id = worker_id % self.nb_slots_per_server
+                        # encode the board state directly into the batch array of the inference server
+                        state.get_state_planes(out=inference_server.get_slot_planes(slot_id))
+                        # this call waits until the inference server has evaluated the batch containing the request
+                        value, policy_vec = inference_server.predict(slot_id)
+                        p_vec_small = self._store_evaluation(input_key, fullmove_number, value, policy_vec,
+                                                             legal_moves, state.mirror_policy())
+
+                value = self._add_new_node(parent_node, child_idx, depth, transposition_key, fullmove_number, value,
+                                           legal_moves, p_vec_small, state.get_pythonchess_board())
+            state.undo_move()  # on an error the worker starts the next search with a new copy of the state
         elif node.is_leaf:  # check if we have reached a leaf node
             value = node.initial_value
         else:
             # get the value from the leaf node (the current function is called recursively)
-            value, depth, chosen_nodes = self._run_single_playout(node, pipe_id, depth + 1, chosen_nodes)
-        # revert the virtual loss and apply the predicted value by the network to the node
-        parent_node.revert_virtual_loss_and_update(child_idx, self.virtual_loss, -value)
+            state.apply_move(move)
+            value, depth, chosen_nodes = self._run_single_playout(state, node, worker_id, depth + 1, chosen_nodes,
+                                                                  path_nodes)
+            state.undo_move()
+        if parent_node is path_nodes[0]:
+            # revert the virtual loss and apply the predicted value by the network to all nodes of the path
+            # the sign of the value flips on every level because the player changes every turn
+            self._backup_path(path_nodes, chosen_nodes, -value)
         # invert the value prediction for the parent of the above node layer because the player's changes every turn
         return -value, depth, chosen_nodes
 
-    def check_for_duplicate(self, transposition_key, chosen_nodes):
+    def _get_terminal_value(self, state: GameState, parent_node: Node, child_idx: int):
+        """
+        Checks if the position after the selected move has ended the game or if a draw can be claimed.
+        A won position establishes a mate in one connection on its parent node.
+        :param state: Game state of the search thread after the selected move has been applied
+        :param parent_node: Parent node of the new position
+        :param child_idx: Index of the selected child of the parent node
+        :return: value - Value of the terminal position from the point of view of the side to move or None if the
+                         position must be evaluated by the network
+                 legal_moves - Legal moves of the position, the list is empty for terminal positions
         """
+        is_won = False  # check if the current player has won the game
+        # (we don't need to check for is_lost() because the game is already over
+        #  if the current player checkmated his opponent)
+        if state.is_check():
+            if state.is_loss():
+                is_won = True
+
+        # needed for e.g. atomic because the king explodes and is not in check mate anymore
+        if state.is_variant_loss():
+            is_won = True
+
+        if is_won:
+            # establish a mate in one connection in order to stop exploring different alternatives
+            parent_node.set_check_mate_node_idx(child_idx)
+            return -1, []
+        # check if you can claim a draw - it's assumed that the draw is always claimed
+        if self.can_claim_threefold_repetition(state) or state.get_pythonchess_board().can_claim_fifty_moves() is True:
+            return 0, []
+
+        legal_moves = state.get_legal_moves()  # get the current legal move of its board state
+        if not legal_moves:
+            # stalemate occurred which is very rare for crazyhouse
+            if state.uci_variant == "giveaway":
+                return 1, []
+            return 0, []
+        return None, legal_moves
+
+    def _add_new_node(self, parent_node: Node, child_idx: int, depth: int, transposition_key, fullmove_number, value,
+                      legal_moves, p_vec_small, chess_board):  # Too many arguments (10/5)
+        """
+        Creates the node of a newly evaluated position, stores it in the look-up table and attaches it to its parent
+        :param parent_node: Parent node of the new position
+        :param child_idx: Index of the new node among the child nodes of its parent
+        :param depth: Depth of the new node
+        :param transposition_key: Transposition key of the new position
+        :param fullmove_number: Full move number of the new position
+        :param value: Value prediction of the network or the value of the terminal position
+        :param legal_moves: Legal moves of the new position, the list is empty for terminal positions
+        :param p_vec_small: Normalized policy of the legal moves or None for terminal positions
+        :param chess_board: Python-chess board of the new position (only needed on depth 1)
+        :return: value - Value which is back-propagated for the new node
+        """
+        is_leaf = p_vec_small is None
+        # clip the visit nodes for all nodes in the search tree except the director opp. move
+        clip_low_visit = self.use_pruning and depth != 1  # and depth > 4
+        new_node = self._create_node(
+            None,  # the node is identified by its transposition key, the board is rebuilt from the path
+            value,
+            p_vec_small,
+            legal_moves,
+            is_leaf,
+            transposition_key,
+            clip_low_visit,
+        )  # create a new node
+
+        if depth == 1 and not is_leaf:
+            # disable uncertain moves from being visited by giving them a very bad score
+            if self.use_pruning:
+                if self.root_node_prior_policy[child_idx] < 1e-3 and value * -1 < self.root_node.initial_value:
+                    value = 99
+
+            # for performance reasons only apply check enhancement on depth 1 for now
+            if self.enhance_checks:
+                self._enhance_checks(chess_board, legal_moves, p_vec_small)
 
-        :param transposition_key: Transposition key which defines the board state by all its pieces and pocket state.
-                                  The move counter is disregarded.
-        :param chosen_nodes: List of moves which have been taken in the current path.
+            if self.enhance_captures:
+                self._enhance_captures(chess_board, legal_moves, p_vec_small)
+
+        # include a reference to the new node in the look-up table
+        self.node_lookup.store(transposition_key, fullmove_number, new_node, depth)
+
+        # a single assignment doesn't need the lock of the parent
+        parent_node.child_nodes[child_idx] = new_node  # add the new node to its parent
+        return value
+
+    def _store_evaluation(self, input_key, fullmove_number, value, policy_vec, legal_moves, mirror_policy):
+        """
+        Extracts the policy of the legal moves from a network prediction and stores the evaluation in the cache
+        :param input_key: Input key of the evaluated position (see GameState.get_input_key())
+        :param fullmove_number: Full move number of the evaluated position
+        :param value: Value prediction of the network
+        :param policy_vec: Policy prediction of the network
+        :param legal_moves: Legal moves of the evaluated position
+        :param mirror_policy: True, if the policy prediction is given from the point of view of the black player
+        :return: p_vec_small - Normalized policy of the legal moves
+        """
+        try:  # extract a sparse policy vector with normalized probabilities
+            p_vec_small = get_probs_of_move_list(policy_vec, legal_moves, mirror_policy=mirror_policy, normalize=True)
+        except KeyError:
+            raise Exception("Key Error for the legal moves: %s" % legal_moves)
+        self.eval_cache.store(input_key, value, policy_vec, p_vec_small, fullmove_number)
+        return p_vec_small
+
+    def _add_transposition_node(self, parent_node: Node, child_idx: int, node: Node, transposition_key):
+        """
+        Attaches a new node to its parent which reuses the prior policy and value of a node from the look-up table
+        :param parent_node: Parent node of the new position
+        :param child_idx: Index of the new node among the child nodes of its parent
+        :param node: Node of the same position which has been found in the look-up table
+        :param transposition_key: Transposition key of the new position
+        :return: value - Prior value of the already expanded node
+        """
+        # clip the visit nodes for all nodes in the search tree except the director opp. move
+        clip_low_visit = self.use_pruning
+
+        new_node = self._create_node(
+            None,
+            node.initial_value,
+            node.policy_prob,
+            node.legal_moves,
+            node.is_leaf,
+            transposition_key,
+            clip_low_visit,
+        )  # create a new node
+
+        # a single assignment doesn't need the lock of the parent
+        parent_node.child_nodes[child_idx] = new_node  # add the new node to its parent
+        return node.initial_value
+
+    def _run_batch_playouts(self, state: GameState, collector_id: int):
+        """
+        Collects up to batch_size new leaf positions by descending batch_size times from the root node, evaluates them
+        with a single call of the network and backs up all search paths afterwards.
+        The virtual loss of the pending paths steers the following descents to other leaves. A descent which selects
+        an edge that is already waiting for the network is a collision and is backed up with the value of that leaf.
+        Terminal positions, leaf nodes and transpositions don't need the network and are backed up with the batch.
+        :param state: Game state of the collector which is set to the root position
+        :param collector_id: Id of the collector which defines its batch array and its network
+        :return: nb_playouts - Number of backed up paths
+                 value - Value of the longest path from the point of view of the root node
+                 depth - Length of the longest path
+                 chosen_nodes - Child indices of the longest path
+        """
+        # Too many local variables (26/15) - Too many branches (13/12)
+        planes = self.collector_planes[collector_id]
+        pending = {}  # batch index of every (parent node, child index) which waits for the network
+        leaves = []  # arguments of _add_new_node() for every batch index
+        paths = []  # path nodes, chosen nodes, value and batch index of every descent
+
+        for _ in range(self.batch_size):
+            parent_node, path_nodes, chosen_nodes = self.root_node, [], []
+            while True:
+                node, move, child_idx = self._select_node(parent_node)
+                parent_node.apply_virtual_loss_to_child(child_idx, self.virtual_loss)
+                path_nodes.append(parent_node)
+                chosen_nodes.append(child_idx)
+                if node is None or node.is_leaf:
+                    break
+                state.apply_move(move)
+                parent_node = node
+
+            depth = len(path_nodes)
+            value = batch_idx = None
+            if node is not None:
+                value = node.initial_value
+            elif (parent_node, child_idx) in pending:
+                batch_idx = pending[(parent_node, child_idx)]
+            else:
+                state.apply_move(move)
+                transposition_key = state.get_transposition_key()
+                fullmove_number = state.get_fullmove_number()
+                if self.use_transposition_table:
+                    node = self.node_lookup.get(transposition_key, fullmove_number)
+
+                if node is not None:
+                    value = self._add_transposition_node(parent_node, child_idx, node, transposition_key)
+                else:
+                    value, legal_moves = self._get_terminal_value(state, parent_node, child_idx)
+                    input_key = cached = None
+                    if value is None:
+                        input_key = state.get_input_key()
+                        cached = self.eval_cache.lookup(input_key, legal_moves, state.mirror_policy())
+                    if value is not None or cached is not None:
+                        p_vec_small = None
+                        if cached is not None:
+                            value, p_vec_small = cached
+                        value = self._add_new_node(parent_node, child_idx, depth, transposition_key, fullmove_number,
+                                                   value, legal_moves, p_vec_small, state.get_pythonchess_board())
+                    else:
+                        batch_idx = len(leaves)
+                        pending[(parent_node, child_idx)] = batch_idx
+                        state.get_state_planes(out=planes[batch_idx])
+                        chess_board = None
+                        if depth == 1 and (self.enhance_checks or self.enhance_captures):
+                            chess_board = state.get_pythonchess_board().copy(stack=False)
+                        leaves.append((parent_node, child_idx, depth, transposition_key, fullmove_number, legal_moves,
+                                       input_key, state.mirror_policy(), chess_board))
+                state.undo_move()
+
+            for _ in range(depth - 1):  # return to the root position
+                state.undo_move()
+            paths.append((path_nodes, chosen_nodes, value, batch_idx))
+
+        leaf_values = []
+        if leaves:
+            net_idx = collector_id % len(self.nets)
+            # the network of this collector might be shared with other collectors
+            with self.net_locks[net_idx]:
+                value_preds, policy_preds = self.nets[net_idx].predict_batch(planes[:len(leaves)])
+            for leaf, value_pred, policy_pred in zip(leaves, value_preds, policy_preds):
+                parent_node, child_idx, depth, transposition_key, fullmove_number, legal_moves, input_key, \
+                    mirror_policy, chess_board = leaf
+                p_vec_small = self._store_evaluation(input_key, fullmove_number, value_pred, policy_pred, legal_moves,
+                                                     mirror_policy)
+                leaf_values.append(self._add_new_node(parent_node, child_idx, depth, transposition_key,
+                                                      fullmove_number, value_pred, legal_moves, p_vec_small,
+                                                      chess_board))
+
+        result = None
+        for path_nodes, chosen_nodes, value, batch_idx in paths:
+            if batch_idx is not None:
+                value = leaf_values[batch_idx]
+            # the value of the leaf is given from the point of view of the side to move at the leaf
+            # the sign of the value flips on every level because the player changes every turn
+            if len(path_nodes) % 2 == 1:
+                value = -value
+            self._backup_path(path_nodes, chosen_nodes, value)
+            if result is None or len(path_nodes) > result[1]:
+                result = (value, len(path_nodes), chosen_nodes)
+        return (len(paths),) + result
+
+    def _backup_path(self, path_nodes: [Node], child_idcs: [int], value):
+        """
+        Reverts the virtual loss and applies the value on every edge of a search path
+        :param path_nodes: Parent nodes of the path starting at the root node
+        :param child_idcs: Index of the selected child for each parent node
+        :param value: Value of the first edge from the perspective of the root node
         :return:
         """
-        node = self.root_node.child_nodes[chosen_nodes[0]]
-        # iterate over all accessed nodes during the current search of the thread and check for same transposition key
-        for node_idx in chosen_nodes[1:-1]:
-            if node.transposition_key == transposition_key:
-                return True
-            node = node.child_nodes[node_idx]
-            if node is None:
-                break
-        return False
+        if self.node_store is not None:
+            self.node_store.backup(path_nodes, child_idcs, value, self.virtual_loss)
+            return
+        for node, child_idx in zip(path_nodes, child_idcs):
+            node.revert_virtual_loss_and_update(child_idx, self.virtual_loss, value)
+            value = -value
 
-    def can_claim_threefold_repetition(self, transposition_key, chosen_nodes):
+    @staticmethod
+    def check_for_duplicate(state: GameState):
+        """
+        Checks if the current position already occurred in the current search path
+        :param state: Game state of the search thread which has applied all moves from the root node onwards
+        :return: True, if the position is a repetition within the search path
+        """
+        return state.position.count() > 0
+
+    def can_claim_threefold_repetition(self, state: GameState):
         """
         Checks if a three fold repetition event can be claimed in the current search path.
         This method makes use of the class transposition table and checks for board occurrences in the local search path
-        of the current thread as well.
-        :param transposition_key: Transposition key which defines the board state by all its pieces and pocket state.
-                                  The move counter is disregarded.
-        :param chosen_nodes: List of integer indices which correspond to the child node indices chosen from the
-                            root node downwards.
+        of the current thread as well. Both are hash counters, so the check doesn't depend on the search depth.
+        :param state: Game state of the search thread which has applied all moves from the root node onwards.
+                      Its hash stack contains the positions of the search path including the root position.
         :return: True, if threefold repetition can be claimed, else False
         """
-
-        search_occurrence_counter = 0  # set the number of occurrences by default to 0
-        node = self.root_node.child_nodes[chosen_nodes[0]]
-        # iterate over all accessed nodes during the current search of the thread and check for same transposition key
-        for node_idx in chosen_nodes[1:-1]:
-            if node.transposition_key == transposition_key:
-                search_occurrence_counter += 1
-            node = node.child_nodes[node_idx]
-            if node is None:
-                break
-        # use all occurrences in the class transposition table as well as the locally found equalities
-        return (self.transposition_table[transposition_key] + search_occurrence_counter) >= 2
+        transposition_key = state.get_transposition_key()
+        # use all occurrences in the class transposition table as well as the occurrences in the search path
+        return (self.transposition_table[transposition_key] + state.position.count(transposition_key)) >= 2
 
     def _select_node(self, parent_node: Node):
         """
@@ -819,31 +1161,10 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
             child_idx = parent_node.check_mate_node
         else:
             # find the move according to the q- and u-values for each move
-            # pb_c_base = 19652
-            # pb_c_init = self.cpuct
-            cpuct = math.log((parent_node.n_sum + 19652 + 1) / 19652) + self.cpuct
-
-            # pb_u_base = 19652 / 10
-            # pb_u_init = 1
-            # pb_u_low = self.u_init_divisor
-            # u_init = np.exp((-parent_node.n_sum + 1965 + 1) / 1965) / np.exp(1) * (1 - self.u_init_divisor) + self.u_init_divisor
-
-            # calculate the current u values
             # it's not worth to save the u values as a node attribute because u is updated every time n_sum changes
-            u_value = (
-                cpuct
-                * parent_node.policy_prob
-                * (np.sqrt(parent_node.n_sum) / (self.u_init_divisor + parent_node.child_number_visits))
-            )
-
-            # if parent_node.n_sum % 10 == 0:
-            #     prob = parent_node.q_value + u_value
-            #     child_idx = prob.argmax()
-            #     prob[child_idx] = 0
-            #     child_idx = prob.argmax()
-            #     # child_idx = np.random.randint(parent_node.nb_direct_child_nodes)
-            # else:
-            child_idx = (parent_node.q_value + u_value).argmax()
+            child_idx = select_puct_child(parent_node.q_value, parent_node.policy_prob,
+                                          parent_node.child_number_visits, parent_node.n_sum, self.cpuct,
+                                          self.u_init_divisor)
 
         return parent_node.child_nodes[child_idx], parent_node.legal_moves[child_idx], child_idx
 
@@ -980,13 +1301,28 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
             node = node.child_nodes[child_idx]
         return mv_list
 
-    def update_movetime(self, time_ms_per_move):
+    def clear_search_tree(self):
+        """
+        Discards the search tree and the transposition table, so that the next search starts with a new root node
+        which doesn't contain the visits of earlier searches.
+        :return:
+        """
+        self.root_node = None
+        self.node_lookup.clear()
+        if self.node_store is not None:
+            self.node_store.clear()
+
+    def update_movetime(self, time_ms_per_move, is_unbounded=False):
         """
         Update move time allocation.
         :param time_ms_per_move:  Sets self.movetime_ms to this value
+        :param is_unbounded: Set True if the search only ends on the stop event, e.g. for "go ponder" and
+         "go infinite". The time buffer isn't changed during such a search.
         :return:
         """
         self.movetime_ms = time_ms_per_move
+        # the movetime is set first, so a running search never uses the unbounded movetime for its time management
+        self.is_unbounded_search = is_unbounded
 
     def set_max_search_depth(self, max_search_depth: int):
         """
@@ -995,11 +1331,3 @@ class MCTSAgent(AbsAgent):  # Too many instance attributes (31/7)
         :return:
         """
         self.max_search_depth = max_search_depth
-
-    def update_transposition_table(self, transposition_key):
-        """
-        :param transposition_key: (gamestate.get_transposition_key(),)
-        :return:
-        """
-
-        self.transposition_table.update(transposition_key)
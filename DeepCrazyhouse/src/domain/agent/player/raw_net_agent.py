@@ -9,17 +9,20 @@ No mcts search is being done.
 """
 from time import time
 from DeepCrazyhouse.src.domain.abstract_cls.abs_game_state import AbsGameState
-from DeepCrazyhouse.src.domain.agent.neural_net_api import NeuralNetAPI
+from DeepCrazyhouse.src.domain.abstract_cls.abs_inference_backend import AbsInferenceBackend
 from DeepCrazyhouse.src.domain.abstract_cls.abs_agent import AbsAgent
+from DeepCrazyhouse.src.domain.agent.player.util.eval_cache import EvalCache
 from DeepCrazyhouse.src.domain.variants.output_representation import get_probs_of_move_list, value_to_centipawn
 
 
 class RawNetAgent(AbsAgent):
     """ Builds the raw network"""
 
-    def __init__(self, net: NeuralNetAPI, temperature=0.0, temperature_moves=4, verbose=True):
+    def __init__(self, net: AbsInferenceBackend, temperature=0.0, temperature_moves=4, verbose=True, eval_cache=None):
         super().__init__(temperature, temperature_moves, verbose)
         self._net = net
+        # the same position is requested again after every position command of the fast mode
+        self._eval_cache = eval_cache if eval_cache is not None else EvalCache(size_mb=0)
 
     def evaluate_board_state(self, state: AbsGameState):  # Too few public methods (1/2)
         """
@@ -40,9 +43,15 @@ class RawNetAgent(AbsAgent):
         """
 
         t_start_eval = time()
-        pred_value, pred_policy = self._net.predict_single(state.get_state_planes())
         legal_moves = list(state.get_legal_moves())
-        p_vec_small = get_probs_of_move_list(pred_policy, legal_moves, state.mirror_policy())
+        input_key = state.get_input_key()
+        cached = self._eval_cache.lookup(input_key, legal_moves, state.mirror_policy())
+        if cached is not None:
+            pred_value, p_vec_small = cached
+        else:
+            pred_value, pred_policy = self._net.predict_single(state.get_state_planes())
+            p_vec_small = get_probs_of_move_list(pred_policy, legal_moves, state.mirror_policy())
+            self._eval_cache.store(input_key, pred_value, pred_policy, p_vec_small, state.get_fullmove_number())
         # define the remaining return variables
         time_e = time() - t_start_eval
         centipawn = value_to_centipawn(pred_value)
@@ -0,0 +1,189 @@
+"""
+@file: eval_cache.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Bounded cache of neural network evaluations which is shared by the RawNetAgent, the AlphaBetaAgent and the MCTSAgent.
+The entries are identified by GameState.get_input_key() which combines the Zobrist hash of the position with the move
+counters and the repetition count of the input planes. Unlike the transposition table of the search the cache keeps its
+entries across moves and searches until the memory budget is exhausted, then the least recently used entries are
+removed.
+Every entry holds the value prediction and either the sparse policy of the legal moves ("sparse") or the full policy
+vector ("full"). Both policies are compressed to float16 and the sparse policy is normalized again on look-up.
+The entries of opening positions can be saved to a file and loaded again after the engine has been restarted. The file
+is only loaded for the same network and input representation.
+"""
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+from DeepCrazyhouse.src.domain.variants.constants import MODE, VERSION
+from DeepCrazyhouse.src.domain.variants.output_representation import get_probs_of_move_list
+
+POLICY_MODES = ["sparse", "full"]
+# the cached evaluations depend on the input planes of the network
+INPUT_VERSION = "mode %d version %d" % (MODE, VERSION)
+# rough memory estimate of an entry without its policy array (dictionary slot, key, tuple, value and array header)
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class EvalCache:  # Too many instance attributes (9/7)
+    """Thread-safe least recently used cache of network evaluations"""
+
+    def __init__(self, size_mb=64, policy_mode="sparse", persist_file=None, persist_max_fullmove=10, model_name=""):
+        """
+        Constructor
+        :param size_mb: Memory budget of the cache in MB. The cache is disabled for 0.
+        :param policy_mode: "sparse" stores the policy of the legal moves, "full" stores the complete policy vector
+        :param persist_file: Optional .npz file for the entries of opening positions. It's loaded by the constructor
+         and written by save().
+        :param persist_max_fullmove: Entries of positions up to this full move number are saved in the persist file
+        :param model_name: Name of the network whose evaluations are cached (see get_model_name() of the inference
+         backends). A persist file of another network is ignored.
+        """
+        if policy_mode not in POLICY_MODES:
+            raise Exception("Unknown policy mode %s. Available modes: %s" % (policy_mode, POLICY_MODES))
+        self.max_bytes = size_mb * 2 ** 20
+        self.policy_mode = policy_mode
+        self.persist_file = persist_file
+        self.persist_max_fullmove = persist_max_fullmove
+        self.model_name = model_name
+        self.lock = Lock()
+        self._entries = OrderedDict()  # key -> (value, policy, is_opening), the most recently used entry comes last
+        self.nb_bytes = 0
+        self.nb_hits = self.nb_misses = 0
+        if persist_file and os.path.isfile(persist_file):
+            self.load(persist_file)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_enabled(self):
+        """ Returns True, if the cache has a memory budget"""
+        return self.max_bytes > 0
+
+    def clear(self):
+        """ Removes all entries and resets the statistics"""
+        with self.lock:
+            self._entries.clear()
+            self.nb_bytes = 0
+            self.nb_hits = self.nb_misses = 0
+
+    def lookup(self, key: int, legal_moves: list, mirror_policy: bool):
+        """
+        Returns the cached evaluation of a position
+        :param key: Input key of the position (see GameState.get_input_key())
+        :param legal_moves: Legal moves of the position
+        :param mirror_policy: True, if the policy is given from the point of view of the black player
+        :return: value - Value prediction of the network
+                 p_vec_small - Normalized float32 policy of the legal moves. It's a new array which can be modified.
+                 The method returns None, if the position isn't cached.
+        """
+        if not self.max_bytes:
+            return None
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.nb_misses += 1
+                return None
+            self.nb_hits += 1
+            self._entries.move_to_end(key)
+        value, policy, _ = entry
+        if self.policy_mode == "sparse":
+            # the rounding to float16 changes the sum of the probabilities
+            p_vec_small = policy.astype(np.float32)
+            p_vec_small /= max(p_vec_small.sum(), np.finfo(np.float32).tiny)
+            return value, p_vec_small
+        return value, get_probs_of_move_list(policy, legal_moves, mirror_policy)
+
+    def store(self, key: int, value, policy_vec: np.ndarray, p_vec_small: np.ndarray, fullmove_number=None):
+        """
+        Stores the evaluation of a position and removes the least recently used entries if the budget is exceeded
+        :param key: Input key of the position (see GameState.get_input_key())
+        :param value: Value prediction of the network
+        :param policy_vec: Full policy vector of the network
+        :param p_vec_small: Policy of the legal moves
+        :param fullmove_number: Full move number of the position which decides if the entry is saved by save()
+        :return:
+        """
+        if not self.max_bytes:
+            return
+        policy = (p_vec_small if self.policy_mode == "sparse" else policy_vec).astype(np.float16)
+        is_opening = fullmove_number is not None and fullmove_number <= self.persist_max_fullmove
+        self._add(key, float(value), policy, is_opening)
+
+    def _add(self, key: int, value: float, policy: np.ndarray, is_opening: bool):
+        """ Adds a compressed entry and evicts the least recently used entries if the budget is exceeded"""
+        with self.lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.nb_bytes -= old_entry[1].nbytes + ENTRY_OVERHEAD_BYTES
+            self._entries[key] = (value, policy, is_opening)
+            self.nb_bytes += policy.nbytes + ENTRY_OVERHEAD_BYTES
+            while self.nb_bytes > self.max_bytes:
+                _, (_, old_policy, _) = self._entries.popitem(last=False)
+                self.nb_bytes -= old_policy.nbytes + ENTRY_OVERHEAD_BYTES
+
+    def hit_rate(self):
+        """ Returns the ratio of successful look-ups"""
+        nb_probes = self.nb_hits + self.nb_misses
+        return self.nb_hits / nb_probes if nb_probes else 0.0
+
+    def get_info_string(self):
+        """Returns a summary of the hit rate and memory usage for the uci info string"""
+        return "eval cache hits %d misses %d hit rate %.3f entries %d memory %.1f of %.1f MB" % (
+            self.nb_hits,
+            self.nb_misses,
+            self.hit_rate(),
+            len(self._entries),
+            self.nb_bytes / 2 ** 20,
+            self.max_bytes / 2 ** 20,
+        )
+
+    def save(self, persist_file=None):
+        """
+        Saves the entries of opening positions to a .npz file
+        :param persist_file: Output file, by default the persist file of the constructor
+        :return: Number of saved entries
+        """
+        persist_file = persist_file or self.persist_file
+        if not persist_file:
+            return 0
+        with self.lock:
+            entries = [(key, value, policy) for key, (value, policy, is_opening) in self._entries.items() if is_opening]
+        policies = [policy for _, _, policy in entries]
+        np.savez_compressed(
+            persist_file,
+            policy_mode=self.policy_mode,
+            model_name=self.model_name,
+            input_version=INPUT_VERSION,
+            keys=np.array([key for key, _, _ in entries], np.uint64),
+            values=np.array([value for _, value, _ in entries], np.float32),
+            offsets=np.cumsum([0] + [len(policy) for policy in policies]),
+            policies=np.concatenate(policies) if policies else np.zeros(0, np.float16),
+        )
+        return len(entries)
+
+    def load(self, persist_file):
+        """
+        Loads the entries of a file which has been written by save(). The loaded entries are saved again by save().
+        The file is ignored if it has been written for another policy mode, network or input representation.
+        :param persist_file: Input .npz file
+        :return: Number of loaded entries
+        """
+        data = np.load(persist_file)
+        expected = {"policy_mode": self.policy_mode, "model_name": self.model_name, "input_version": INPUT_VERSION}
+        for name, expected_value in expected.items():
+            file_value = str(data[name]) if name in data.files else None
+            if file_value != expected_value:
+                logging.warning("The eval cache file %s uses the %s %s instead of %s and is ignored",
+                                persist_file, name, file_value, expected_value)
+                return 0
+        offsets = data["offsets"]
+        policies = data["policies"]
+        for idx, (key, value) in enumerate(zip(data["keys"].tolist(), data["values"].tolist())):
+            self._add(key, value, policies[offsets[idx]:offsets[idx + 1]].copy(), True)
+        return len(data["keys"])
@@ -0,0 +1,245 @@
+"""
+@file: inference_server.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Dynamic micro-batching inference server for the search workers of the MCTSAgent.
+Every search worker owns one slot of shared numpy memory. A worker writes its input planes into its slot, pushes the
+slot id into the request ring and waits on the completion event of its slot.
+The server thread collects requests until either max_batch_size requests are available or the oldest request has been
+waiting for max_wait_us microseconds. Afterwards the whole batch is evaluated by the given inference backend.
+"""
+from collections import deque
+from threading import Event, Thread
+from time import perf_counter
+import numpy as np
+from DeepCrazyhouse.src.domain.abstract_cls.abs_inference_backend import AbsInferenceBackend
+from DeepCrazyhouse.src.domain.variants.constants import BOARD_HEIGHT, BOARD_WIDTH, NB_CHANNELS_TOTAL, NB_LABELS
+
+# bin edges of the batch fill ratio histogram (the last bin also contains completely filled batches)
+BATCH_FILL_BINS = np.linspace(0, 1, 11)
+# bin edges of the queue latency histogram in microseconds
+QUEUE_LATENCY_BINS_US = [0, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, np.inf]
+
+
+class Histogram:
+    """Fixed bin histogram which is only updated by a single thread"""
+
+    def __init__(self, bin_edges):
+        """
+        :param bin_edges: Monotonically increasing bin edges. A value v is counted in bin i if
+         bin_edges[i] <= v < bin_edges[i+1]. Values outside of the edges are counted in the first or last bin.
+        """
+        self.bin_edges = np.asarray(bin_edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.bin_edges) - 1, dtype=np.int64)
+        self.total = 0.0
+
+    def add(self, values):
+        """
+        Adds a single value or a numpy array of values to the histogram
+        :param values: Value(s) to count
+        :return:
+        """
+        values = np.atleast_1d(values)
+        idcs = np.clip(np.searchsorted(self.bin_edges, values, side="right") - 1, 0, len(self.counts) - 1)
+        np.add.at(self.counts, idcs, 1)
+        self.total += float(values.sum())
+
+    def reset(self):
+        """Sets all counts back to 0"""
+        self.counts[:] = 0
+        self.total = 0.0
+
+    def nb_values(self):
+        """Returns the number of values which have been added"""
+        return int(self.counts.sum())
+
+    def mean(self):
+        """Returns the mean of all added values"""
+        nb_values = self.nb_values()
+        return self.total / nb_values if nb_values > 0 else 0.0
+
+    def quantile(self, quantile: float):
+        """
+        Returns the upper bin edge of the bin which contains the given quantile
+        :param quantile: Quantile in [0,1]
+        :return: Upper bin edge
+        """
+        nb_values = self.nb_values()
+        if nb_values == 0:
+            return 0.0
+        idx = np.searchsorted(np.cumsum(self.counts), quantile * nb_values)
+        return self.bin_edges[min(idx, len(self.counts) - 1) + 1]
+
+    def __str__(self):
+        return " ".join(
+            "[%g,%g):%d" % (self.bin_edges[i], self.bin_edges[i + 1], count) for i, count in enumerate(self.counts)
+        )
+
+
+class InferenceServer:  # Too many instance attributes (15/7)
+    """Collects the inference requests of the search workers and evaluates them in dynamic batches"""
+
+    def __init__(self, backend: AbsInferenceBackend, nb_slots: int, max_batch_size: int, max_wait_us=500):
+        """
+        Constructor
+        :param backend: Inference backend which evaluates the batches
+        :param nb_slots: Number of request slots, usually one for every search worker
+        :param max_batch_size: Maximum number of requests which are evaluated together. It must not exceed the batch
+         size of the backend.
+        :param max_wait_us: Maximum time in microseconds for which the oldest request waits for the batch to be filled.
+        """
+        if max_batch_size > backend.get_batch_size():
+            raise Exception(
+                "The given max_batch_size %d is higher than the batch size %d of the inference backend"
+                % (max_batch_size, backend.get_batch_size())
+            )
+        self.backend = backend
+        self.nb_slots = nb_slots
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_us * 1e-6
+        # shared memory of all slots
+        self.state_planes = np.zeros((nb_slots, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH), np.float32)
+        self.value_results = np.zeros(nb_slots, np.float32)
+        self.policy_results = np.zeros((nb_slots, NB_LABELS), np.float32)
+        self.request_times = np.zeros(nb_slots)
+        self.completion_events = [Event() for _ in range(nb_slots)]
+        self.pending_slots = np.zeros(nb_slots, bool)  # requests whose results haven't been set yet
+        # deque.append() and deque.popleft() are atomic, so neither the workers nor the server need to lock the ring
+        self.request_ring = deque()
+        self.new_request = Event()
+        self.batch_fill_histogram = Histogram(BATCH_FILL_BINS)
+        self.queue_latency_histogram = Histogram(QUEUE_LATENCY_BINS_US)
+        self.error = None
+        self.running = False
+        self.thread_inference = None
+
+    def start(self):
+        """
+        Starts a new inference thread. A server whose thread has been stopped or has exited after an error of the
+        backend can be started again, the error and the requests of the old thread are discarded.
+        :return:
+        """
+        self.stop()
+        self.error = None
+        self.request_ring.clear()
+        self.running = True
+        self.thread_inference = Thread(target=self._provide_inference, daemon=True)
+        self.thread_inference.start()
+
+    def stop(self):
+        """Stops the inference thread after the current batch"""
+        self.running = False
+        self.new_request.set()
+        if self.thread_inference is not None and self.thread_inference.is_alive():
+            self.thread_inference.join()
+
+    def get_slot_planes(self, slot_id: int):
+        """
+        Returns a view on the input planes of the given slot inside the batch array.
+        Workers can encode their board state directly into this view to avoid a copy.
+        :param slot_id: Slot of the calling worker
+        :return: Planes of shape (NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH)
+        """
+        return self.state_planes[slot_id]
+
+    def predict(self, slot_id: int, state_planes=None):
+        """
+        Requests the prediction for a single board state and blocks until the result is available.
+        A slot must only be used by one thread at a time.
+        :param slot_id: Slot of the calling worker
+        :param state_planes: Plane representation of the board state. None if the planes have already been written
+         into get_slot_planes(slot_id).
+        :return: [Value Prediction, Policy Prediction]
+        """
+        if state_planes is not None:
+            self.state_planes[slot_id] = state_planes
+        event = self.completion_events[slot_id]
+        event.clear()
+        self.pending_slots[slot_id] = True
+        self.request_times[slot_id] = perf_counter()
+        self.request_ring.append(slot_id)
+        self.new_request.set()
+        # the thread sets running to False before it releases the waiting workers for the last time, so a request
+        # which was added afterwards doesn't wait forever
+        if self.running:
+            event.wait()
+        if self.error is not None:
+            raise Exception("The inference backend failed: %s" % self.error)
+        if self.pending_slots[slot_id]:
+            raise Exception("The inference server has been stopped before the request was evaluated")
+        return np.array(self.value_results[slot_id]), np.array(self.policy_results[slot_id])
+
+    def _wait_for_request(self, timeout=None):
+        """
+        Waits until a new request has been pushed into the ring or the timeout has passed
+        :param timeout: Timeout in seconds, None for no timeout
+        :return:
+        """
+        self.new_request.clear()
+        # a request might have been added or the server stopped before the event was cleared
+        if not self.request_ring and self.running:
+            self.new_request.wait(timeout)
+
+    def _collect_batch(self):
+        """
+        Collects the slot ids for the next batch
+        :return: List of slot ids, which is empty if the server has been stopped
+        """
+        while not self.request_ring:
+            if not self.running:
+                return []
+            self._wait_for_request()
+
+        slot_ids = []
+        deadline = None
+        while len(slot_ids) < self.max_batch_size:
+            if self.request_ring:
+                slot_ids.append(self.request_ring.popleft())
+                if deadline is None:
+                    deadline = self.request_times[slot_ids[0]] + self.max_wait_s
+                continue
+            remaining = deadline - perf_counter()
+            if remaining <= 0 or len(slot_ids) == self.nb_slots:
+                break
+            self._wait_for_request(remaining)
+        return slot_ids
+
+    def _provide_inference(self):
+        """
+        Main loop of the inference thread
+        :return:
+        """
+        while self.running:
+            slot_ids = self._collect_batch()
+            if not slot_ids:
+                continue
+
+            t_batch_start = perf_counter()
+            self.queue_latency_histogram.add((t_batch_start - self.request_times[slot_ids]) * 1e6)
+            self.batch_fill_histogram.add(len(slot_ids) / self.max_batch_size)
+            try:
+                value_preds, policy_preds = self.backend.predict_batch(self.state_planes[slot_ids])
+                self.value_results[slot_ids] = value_preds
+                self.policy_results[slot_ids] = policy_preds
+                self.pending_slots[slot_ids] = False
+            except Exception as err:  # pylint: disable=broad-except
+                self.error = err
+                self.running = False
+
+            # give the workers the signal that their results have been set
+            for slot_id in slot_ids:
+                self.completion_events[slot_id].set()
+
+        # release all workers which are still waiting
+        for event in self.completion_events:
+            event.set()
+
+    def get_info_string(self):
+        """Returns a summary of the batch fill ratio and queue latency for the uci info string"""
+        return "batch fill %.2f queue latency mean %dus p90 <%gus" % (
+            self.batch_fill_histogram.mean(),
+            self.queue_latency_histogram.mean(),
+            self.queue_latency_histogram.quantile(0.9),
+        )
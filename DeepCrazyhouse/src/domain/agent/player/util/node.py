@@ -30,7 +30,7 @@ class Node:  # Too many instance attributes (14/7)
     ):  # Too many arguments (8/5)
 
         self.lock = Lock()  # lock object for this node to protect its member variables
-        self.board = board  # python-chess board object representing the current position
+        self.board = board  # python-chess board of the position (optional, nodes are identified by their key)
         self.initial_value = value  # store the initial value prediction of the current board position
 
         if is_leaf:
@@ -133,7 +133,8 @@ class Node:  # Too many instance attributes (14/7)
         if not self.is_leaf:
             with self.lock:
                 dirichlet_noise = np.random.dirichlet([alpha] * self.nb_direct_child_nodes)
-                self.policy_prob = (1 - epsilon) * self.policy_prob + epsilon * dirichlet_noise
+                # in place, because the policy of a StoreNode is a view on the arrays of its NodeStore
+                self.policy_prob[:] = (1 - epsilon) * self.policy_prob + epsilon * dirichlet_noise
 
     def apply_virtual_loss_to_child(self, child_idx, virtual_loss):
         """
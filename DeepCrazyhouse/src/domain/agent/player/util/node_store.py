@@ -0,0 +1,499 @@
+"""
+@file: node_store.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Array backed storage for the MCTS search tree.
+All node and edge statistics are kept in large preallocated numpy pages which are indexed by integer node ids.
+The board of a node is stored as its FEN string instead of a python-chess object.
+StoreNode provides the same interface as Node, so that the MCTSAgent can run on top of both tree representations.
+"""
+from threading import Lock
+import chess
+import numpy as np
+from DeepCrazyhouse.src.domain.agent.player.util.node import Node
+from DeepCrazyhouse.src.domain.util import encode_move, decode_move
+from DeepCrazyhouse.src.domain.variants.output_representation import get_move_codes
+
+# number of nodes per page of the node arrays
+NODE_PAGE_SIZE = 2 ** 16
+# number of edges per page of the edge arrays (a single node must fit into one page)
+EDGE_PAGE_SIZE = 2 ** 20
+# number of locks which are shared by all nodes (must be a power of 2)
+NB_LOCKS = 256
+# marks an edge whose child node hasn't been expanded yet
+NO_CHILD = -1
+# search paths with at least this number of edges are updated by vectorized operations in NodeStore.backup()
+MIN_BATCHED_BACKUP_LENGTH = 16
+
+
+class NodeStore:  # Too many instance attributes (16/7)
+    """
+    Preallocated contiguous storage for all nodes of a search tree.
+    New pages are only appended, existing pages are never reallocated. Therefore numpy views on the statistics of a
+    node stay valid until the store is compacted.
+    """
+
+    def __init__(self, board_type=None, chess960=False):
+        """
+        Constructor
+        :param board_type: Python-chess board class which is used to rebuild the boards from their FEN keys.
+         If None, the class of the first added board is used.
+        :param chess960: True, if the boards shall be created in chess960 mode
+        """
+        self.board_type = board_type
+        self.chess960 = chess960
+        # protects the allocation of new node ids and edge ranges
+        self._alloc_lock = Lock()
+        # lock striping: a node with id x uses the lock x % NB_LOCKS for its visit and value statistics
+        self.locks = [Lock() for _ in range(NB_LOCKS)]
+        self.nb_nodes = self.nb_edges = 0
+        # per node arrays
+        self._n_sum = []
+        self._initial_value = []
+        self._is_leaf = []
+        self._check_mate_idx = []
+        self._nb_total_expanded = []
+        self._edge_page = []
+        self._edge_offset = []
+        self._nb_children = []
+        # compact board keys and transposition keys of each node
+        self._fens = []
+        self._transposition_keys = []
+        # cached StoreNode view of each node, so that the views on its arrays are only created once
+        self._views = []
+        # per edge arrays
+        self.child_number_visits = []
+        self.action_value = []
+        self.q_value = []
+        self.policy_prob = []
+        self.child_id = []
+        self.move = []
+
+    def clear(self):
+        """
+        Removes all nodes from the store. The allocated pages are kept for the next search tree.
+        :return:
+        """
+        with self._alloc_lock:
+            self.nb_nodes = self.nb_edges = 0
+
+    def compact(self, root_id: int):
+        """
+        Removes all nodes which can't be reached from the given root node, e.g. after the subtree of a node of the last
+        search tree has been reused. The reachable nodes are copied in breadth first order into new pages and the old
+        pages are released as soon as there are no views on them anymore. All StoreNode objects of the old node ids
+        become invalid. Must not be called during a search.
+        :param root_id: Node id of the new root node which gets the id 0
+        :return: id_map - Numpy array which maps every old node id to its new id or NO_CHILD for a removed node
+        """
+        with self._alloc_lock:
+            nb_nodes = self.nb_nodes
+            nb_children = np.concatenate(self._nb_children)[:nb_nodes].astype(np.int64)
+            edge_start = np.concatenate(self._edge_page)[:nb_nodes].astype(np.int64) * EDGE_PAGE_SIZE + \
+                np.concatenate(self._edge_offset)[:nb_nodes]
+            child_id = np.concatenate(self.child_id)
+
+            id_map = np.full(nb_nodes, NO_CHILD, np.int64)
+            id_map[root_id] = 0
+            order = [root_id]
+            for node_id in order:  # the list is extended while it is traversed
+                children = child_id[edge_start[node_id]:edge_start[node_id] + nb_children[node_id]]
+                for child in children[children != NO_CHILD].tolist():
+                    if id_map[child] == NO_CHILD:  # transpositions can be reached by several edges
+                        id_map[child] = len(order)
+                        order.append(child)
+            order = np.array(order, np.int64)
+
+            # the edges of a node must be contiguous, so the same page rule as in _allocate() is applied
+            new_nb_children = nb_children[order]
+            new_edge_start = np.zeros(len(order), np.int64)
+            nb_edges = 0
+            for idx, nb_node_children in enumerate(new_nb_children.tolist()):
+                if nb_edges % EDGE_PAGE_SIZE + nb_node_children > EDGE_PAGE_SIZE:
+                    nb_edges = (nb_edges // EDGE_PAGE_SIZE + 1) * EDGE_PAGE_SIZE
+                new_edge_start[idx] = nb_edges
+                nb_edges += nb_node_children
+            edge_idcs = np.arange(new_nb_children.sum()) - \
+                np.repeat(np.cumsum(new_nb_children) - new_nb_children, new_nb_children)
+            old_edges = np.repeat(edge_start[order], new_nb_children) + edge_idcs
+            new_edges = np.repeat(new_edge_start, new_nb_children) + edge_idcs
+
+            nb_node_pages = max(1, -(-len(order) // NODE_PAGE_SIZE))
+            for pages in (self._n_sum, self._initial_value, self._is_leaf, self._check_mate_idx,
+                          self._nb_total_expanded, self._nb_children):
+                new_values = np.zeros(nb_node_pages * NODE_PAGE_SIZE, pages[0].dtype)
+                new_values[:len(order)] = np.concatenate(pages)[order]
+                pages[:] = np.split(new_values, nb_node_pages)
+            for pages, new_values in ((self._edge_page, new_edge_start // EDGE_PAGE_SIZE),
+                                      (self._edge_offset, new_edge_start % EDGE_PAGE_SIZE)):
+                pages[:] = np.split(np.pad(new_values, (0, nb_node_pages * NODE_PAGE_SIZE - len(order)))
+                                    .astype(pages[0].dtype), nb_node_pages)
+            for pages in (self._fens, self._transposition_keys):
+                old_values = [value for page in pages for value in page]
+                new_values = [old_values[node_id] for node_id in order.tolist()]
+                new_values += [None] * (nb_node_pages * NODE_PAGE_SIZE - len(order))
+                pages[:] = [new_values[start:start + NODE_PAGE_SIZE]
+                            for start in range(0, len(new_values), NODE_PAGE_SIZE)]
+            self._views = [[None] * NODE_PAGE_SIZE for _ in range(nb_node_pages)]
+
+            nb_edge_pages = max(1, -(-nb_edges // EDGE_PAGE_SIZE))
+            for pages in (self.child_number_visits, self.action_value, self.q_value, self.policy_prob, self.child_id,
+                          self.move):
+                old_values = child_id if pages is self.child_id else np.concatenate(pages)
+                new_values = np.zeros(nb_edge_pages * EDGE_PAGE_SIZE, pages[0].dtype)
+                new_values[new_edges] = old_values[old_edges]
+                pages[:] = np.split(new_values, nb_edge_pages)
+            # map the child ids of the expanded edges to the new node ids
+            new_child_id = np.concatenate(self.child_id)
+            expanded = new_edges[child_id[old_edges] != NO_CHILD]
+            new_child_id[expanded] = id_map[new_child_id[expanded]]
+            self.child_id[:] = np.split(new_child_id, nb_edge_pages)
+
+            self.nb_nodes = len(order)
+            self.nb_edges = nb_edges
+        return id_map
+
+    def _add_node_page(self):
+        self._n_sum.append(np.zeros(NODE_PAGE_SIZE, np.int64))
+        self._initial_value.append(np.zeros(NODE_PAGE_SIZE, np.float64))
+        self._is_leaf.append(np.zeros(NODE_PAGE_SIZE, bool))
+        self._check_mate_idx.append(np.zeros(NODE_PAGE_SIZE, np.int32))
+        self._nb_total_expanded.append(np.zeros(NODE_PAGE_SIZE, np.int64))
+        self._edge_page.append(np.zeros(NODE_PAGE_SIZE, np.int32))
+        self._edge_offset.append(np.zeros(NODE_PAGE_SIZE, np.int32))
+        self._nb_children.append(np.zeros(NODE_PAGE_SIZE, np.int32))
+        self._fens.append([None] * NODE_PAGE_SIZE)
+        self._transposition_keys.append([None] * NODE_PAGE_SIZE)
+        self._views.append([None] * NODE_PAGE_SIZE)
+
+    def _add_edge_page(self):
+        self.child_number_visits.append(np.zeros(EDGE_PAGE_SIZE, np.float64))
+        self.action_value.append(np.zeros(EDGE_PAGE_SIZE, np.float64))
+        self.q_value.append(np.zeros(EDGE_PAGE_SIZE, np.float64))
+        self.policy_prob.append(np.zeros(EDGE_PAGE_SIZE, np.float32))
+        self.child_id.append(np.zeros(EDGE_PAGE_SIZE, np.int64))
+        self.move.append(np.zeros(EDGE_PAGE_SIZE, np.int32))
+
+    def _allocate(self, nb_children):
+        """
+        Reserves a new node id and a contiguous edge range for its child nodes.
+        :param nb_children: Number of direct child nodes
+        :return: node_id, edge_page, edge_offset
+        """
+        if nb_children > EDGE_PAGE_SIZE:
+            raise Exception("A node with %d child nodes doesn't fit into a single edge page" % nb_children)
+        with self._alloc_lock:
+            node_id = self.nb_nodes
+            if node_id // NODE_PAGE_SIZE >= len(self._n_sum):
+                self._add_node_page()
+            self.nb_nodes += 1
+
+            edge_page = self.nb_edges // EDGE_PAGE_SIZE
+            edge_offset = self.nb_edges % EDGE_PAGE_SIZE
+            if edge_offset + nb_children > EDGE_PAGE_SIZE:
+                # the edges of a node must be contiguous: continue on the next page
+                edge_page += 1
+                edge_offset = 0
+                self.nb_edges = edge_page * EDGE_PAGE_SIZE
+            if edge_page >= len(self.child_id):
+                self._add_edge_page()
+            self.nb_edges += nb_children
+        return node_id, edge_page, edge_offset
+
+    def add_node(self, board, value, p_vec_small: np.ndarray, legal_moves: [chess.Move], is_leaf=False,
+                 transposition_key=None, clip_low_visit=True):  # Too many arguments (8/5)
+        """
+        Adds a new node to the store. The arguments are the same as for the constructor of Node.
+        :return: Integer id of the new node
+        """
+        nb_children = 0 if is_leaf else len(p_vec_small)
+        node_id, edge_page, edge_offset = self._allocate(nb_children)
+        page, idx = divmod(node_id, NODE_PAGE_SIZE)
+
+        self._n_sum[page][idx] = 1  # if the node was created it must have been visited once
+        self._initial_value[page][idx] = value
+        self._is_leaf[page][idx] = is_leaf
+        self._check_mate_idx[page][idx] = NO_CHILD
+        self._nb_total_expanded[page][idx] = 0
+        self._edge_page[page][idx] = edge_page
+        self._edge_offset[page][idx] = edge_offset
+        self._nb_children[page][idx] = nb_children
+        if board is not None:
+            if self.board_type is None:
+                self.board_type = type(board)
+                self.chess960 = board.chess960
+            self._fens[page][idx] = board.fen()
+        else:
+            self._fens[page][idx] = None
+        self._transposition_keys[page][idx] = transposition_key
+        self._views[page][idx] = None  # the id might have belonged to a node of an earlier tree
+
+        if nb_children > 0:
+            edges = slice(edge_offset, edge_offset + nb_children)
+            self.child_number_visits[edge_page][edges] = 0
+            self.action_value[edge_page][edges] = 0
+            self.q_value[edge_page][edges] = -1
+            self.policy_prob[edge_page][edges] = p_vec_small
+            self.child_id[edge_page][edges] = NO_CHILD
+            self.move[edge_page][edges] = get_move_codes(legal_moves)
+            if clip_low_visit:
+                self.q_value[edge_page][edges][p_vec_small < 1e-3] = -9999
+        return node_id
+
+    def get_node(self, node_id: int):
+        """
+        Returns a Node compatible view on the given node id
+        :param node_id: Integer id of the node
+        :return: StoreNode object
+        """
+        node_id = int(node_id)
+        page, idx = divmod(node_id, NODE_PAGE_SIZE)
+        node = self._views[page][idx]
+        if node is None:
+            node = StoreNode(self, node_id)
+            self._views[page][idx] = node
+        return node
+
+    def get_board(self, node_id: int):
+        """
+        Rebuilds the python-chess board of a node from its FEN key
+        :param node_id: Integer id of the node
+        :return: New python-chess board object
+        """
+        fen = self._fens[node_id // NODE_PAGE_SIZE][node_id % NODE_PAGE_SIZE]
+        if fen is None:
+            return None
+        return self.board_type(fen, chess960=self.chess960)
+
+    def apply_virtual_loss(self, node, child_idx: int, virtual_loss):
+        """
+        Applies the virtual loss to a child of the given node (see Node.apply_virtual_loss_to_child())
+        :param node: StoreNode of this store
+        :param child_idx: Index of the selected child
+        :param virtual_loss: Virtual loss value
+        :return:
+        """
+        with node.lock:
+            node._n_sum[node._idx] += virtual_loss
+            visits = node.child_number_visits.item(child_idx) + virtual_loss
+            action_value = node.action_value.item(child_idx) - virtual_loss
+            node.child_number_visits[child_idx] = visits
+            node.action_value[child_idx] = action_value
+            node.q_value[child_idx] = action_value / visits
+
+    def backup(self, path_nodes: list, child_idcs: list, value, virtual_loss):
+        """
+        Reverts the virtual loss and applies the value on all edges of a search path.
+        Long paths which lie on a single node and edge page are updated by one vectorized operation per statistic
+        while the striped locks of all their nodes are held. The locks are acquired in ascending order, so that two
+        paths can't deadlock. Short paths are updated edge by edge under the lock of each node because the fixed
+        costs of the fancy indexing are higher than the savings (see tools/benchmarks/virtual_loss_benchmark.py).
+        :param path_nodes: StoreNodes of the path starting at the root node
+        :param child_idcs: Index of the selected child for each node of the path
+        :param value: Value of the first edge from the perspective of the root node. The sign alternates every level.
+        :param virtual_loss: Virtual loss value which has been applied on each edge
+        :return:
+        """
+        node_page = path_nodes[0]._page
+        edge_page = path_nodes[0]._edge_page
+        if len(path_nodes) < MIN_BATCHED_BACKUP_LENGTH or any(
+                node._page != node_page or node._edge_page != edge_page for node in path_nodes):
+            for node, child_idx in zip(path_nodes, child_idcs):
+                with node.lock:
+                    node._revert_virtual_loss_and_update(child_idx, virtual_loss, value)
+                value = -value
+            return
+
+        # the nodes of a path are unique, therefore the fancy indexed updates don't contain duplicate indices
+        node_idcs = np.fromiter((node._idx for node in path_nodes), np.int64, len(path_nodes))
+        edges = np.fromiter((node._edges.start + child_idx for node, child_idx in zip(path_nodes, child_idcs)),
+                            np.int64, len(path_nodes))
+        values = np.full(len(path_nodes), value + virtual_loss, np.float64)
+        values[1::2] = virtual_loss - value
+        visits = self.child_number_visits[edge_page]
+        action_value = self.action_value[edge_page]
+        locks = [self.locks[stripe] for stripe in sorted({node.node_id & (NB_LOCKS - 1) for node in path_nodes})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            self._n_sum[node_page][node_idcs] -= virtual_loss - 1
+            visits[edges] -= virtual_loss - 1
+            action_value[edges] += values
+            self.q_value[edge_page][edges] = action_value[edges] / visits[edges]
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def memory_usage(self):
+        """
+        Returns the number of bytes which are allocated by the numpy pages of the store
+        (the FEN strings are not included).
+        """
+        nb_bytes = 0
+        for pages in (self._n_sum, self._initial_value, self._is_leaf, self._check_mate_idx, self._nb_total_expanded,
+                      self._edge_page, self._edge_offset, self._nb_children, self.child_number_visits,
+                      self.action_value, self.q_value, self.policy_prob, self.child_id, self.move):
+            nb_bytes += sum(page.nbytes for page in pages)
+        return nb_bytes
+
+
+class MoveList:
+    """Read-only sequence which decodes the integer encoded moves of a node on access"""
+
+    __slots__ = ("_codes",)
+
+    def __init__(self, codes: np.ndarray):
+        self._codes = codes
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [decode_move(code) for code in self._codes[idx]]
+        return decode_move(self._codes[idx])
+
+    def __iter__(self):
+        for code in self._codes:
+            yield decode_move(code)
+
+    def index(self, move: chess.Move):
+        """ Returns the index of the given move in the list """
+        return int(np.flatnonzero(self._codes == encode_move(move))[0])
+
+
+class ChildList:
+    """Sequence of the child nodes of a StoreNode. Child nodes which haven't been expanded yet are returned as None."""
+
+    __slots__ = ("_store", "_ids")
+
+    def __init__(self, store: NodeStore, ids: np.ndarray):
+        self._store = store
+        self._ids = ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, idx):
+        node_id = self._ids.item(idx)
+        if node_id == NO_CHILD:
+            return None
+        return self._store.get_node(node_id)
+
+    def __setitem__(self, idx, node):
+        self._ids[idx] = NO_CHILD if node is None else node.node_id
+
+    def __iter__(self):
+        for idx in range(len(self._ids)):
+            yield self[idx]
+
+
+class StoreNode(Node):
+    """
+    Lightweight view on a single node inside a NodeStore.
+    It exposes the same attributes as Node, but all statistics are read from and written to the contiguous arrays
+    of the store. The edge statistics are numpy views which are created once in the constructor, so they must only be
+    modified in place. NodeStore.get_node() returns the same StoreNode object for a node id until the id is reused.
+    """
+
+    def __init__(self, store: NodeStore, node_id: int):  # pylint: disable=super-init-not-called
+        node_id = int(node_id)
+        self.store = store
+        self.node_id = node_id
+        self._page, self._idx = divmod(node_id, NODE_PAGE_SIZE)
+        self._edge_page = int(store._edge_page[self._page][self._idx])
+        start = int(store._edge_offset[self._page][self._idx])
+        self._edges = slice(start, start + int(store._nb_children[self._page][self._idx]))
+        self._n_sum = store._n_sum[self._page]
+        self.lock = store.locks[node_id & (NB_LOCKS - 1)]  # shared lock which protects the statistics of this node
+        # views on the edge arrays of the store
+        self.child_number_visits = store.child_number_visits[self._edge_page][self._edges]  # visits of the children
+        self.action_value = store.action_value[self._edge_page][self._edges]  # total action value of the children
+        self.q_value = store.q_value[self._edge_page][self._edges]  # mean action value of the children
+        self.policy_prob = store.policy_prob[self._edge_page][self._edges]  # prior probabilities of the children
+        # legal moves and child nodes (unexpanded children are None), ordered in the same way as the edges
+        self.legal_moves = MoveList(store.move[self._edge_page][self._edges])
+        self.child_nodes = ChildList(store, store.child_id[self._edge_page][self._edges])
+
+    def __eq__(self, other):
+        return isinstance(other, StoreNode) and other.store is self.store and other.node_id == self.node_id
+
+    def __hash__(self):
+        return hash((id(self.store), self.node_id))
+
+    def apply_virtual_loss_to_child(self, child_idx, virtual_loss):
+        """ Applies the virtual loss under the lock of this node (see NodeStore.apply_virtual_loss())"""
+        self.store.apply_virtual_loss(self, child_idx, virtual_loss)
+
+    def revert_virtual_loss_and_update(self, child_idx, virtual_loss, value):
+        """ Reverts the virtual loss and applies the value for a single edge (see NodeStore.backup())"""
+        with self.lock:
+            self._revert_virtual_loss_and_update(child_idx, virtual_loss, value)
+
+    def _revert_virtual_loss_and_update(self, child_idx, virtual_loss, value):
+        """ Same as revert_virtual_loss_and_update() for callers which already hold the lock of this node"""
+        self._n_sum[self._idx] -= virtual_loss - 1
+        visits = self.child_number_visits.item(child_idx) - (virtual_loss - 1)
+        action_value = self.action_value.item(child_idx) + virtual_loss + value
+        self.child_number_visits[child_idx] = visits
+        self.action_value[child_idx] = action_value
+        self.q_value[child_idx] = action_value / visits
+
+    @property
+    def board(self):
+        """ Rebuilds the python-chess board of this node """
+        return self.store.get_board(self.node_id)
+
+    @property
+    def initial_value(self):
+        """ Initial value prediction of the neural network """
+        return self.store._initial_value[self._page][self._idx]
+
+    @initial_value.setter
+    def initial_value(self, value):
+        self.store._initial_value[self._page][self._idx] = value
+
+    @property
+    def n_sum(self):
+        """ Total number of visits of this node """
+        return self._n_sum.item(self._idx)
+
+    @n_sum.setter
+    def n_sum(self, value):
+        self._n_sum[self._idx] = value
+
+    @property
+    def nb_total_expanded_child_nodes(self):
+        """ Number of all direct children and grand children which have been expanded """
+        return self.store._nb_total_expanded[self._page][self._idx]
+
+    @nb_total_expanded_child_nodes.setter
+    def nb_total_expanded_child_nodes(self, value):
+        self.store._nb_total_expanded[self._page][self._idx] = value
+
+    @property
+    def is_leaf(self):
+        """ True, if the node is a terminal node """
+        return self.store._is_leaf[self._page].item(self._idx)
+
+    @property
+    def nb_direct_child_nodes(self):
+        """ Number of legal moves in this position """
+        return len(self.legal_moves)
+
+    @property
+    def transposition_key(self):
+        """ Identifier of the board state excluding the move counters """
+        return self.store._transposition_keys[self._page][self._idx]
+
+    @property
+    def check_mate_node(self):
+        """ Child index of a direct checkmate or None """
+        child_idx = self.store._check_mate_idx[self._page].item(self._idx)
+        return None if child_idx == NO_CHILD else child_idx
+
+    @check_mate_node.setter
+    def check_mate_node(self, child_idx):
+        self.store._check_mate_idx[self._page][self._idx] = NO_CHILD if child_idx is None else child_idx
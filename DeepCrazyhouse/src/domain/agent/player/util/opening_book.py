@@ -0,0 +1,156 @@
+"""
+@file: opening_book.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Compact opening book with the MCTS visit distributions and values of common opening positions.
+The book is created offline by tools/opening_book/create_opening_book.py and is memory-mapped by the engine, so that
+opening it doesn't depend on the size of the book.
+The positions are identified by their Zobrist hash (see position.compute_hash()), so transpositions share an entry.
+
+File layout (little endian):
+    header:  magic (8 bytes) | number of positions (uint64) | number of moves (uint64)
+    keys:    uint64 [positions]      sorted Zobrist hashes
+    values:  float32 [positions]     value of the position from the point of view of the side to move
+    offsets: uint32 [positions + 1]  index of the first move of every position
+    moves:   uint16 [moves]          encoded moves (see encode_book_move())
+    visits:  uint32 [moves]          MCTS visits of every move
+"""
+import numpy as np
+import chess
+
+from DeepCrazyhouse.src.domain.variants.position import compute_hash
+
+BOOK_MAGIC = b"CABOOK01"
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("nb_positions", "<u8"), ("nb_moves", "<u8")])
+DROP_FLAG = 1 << 15
+
+
+def encode_book_move(move: chess.Move) -> int:
+    """
+    Encodes a move as 16 bit integer: from square (6 bits) | to square (6 bits) | promotion or drop piece (3 bits) |
+    drop flag (1 bit). Unlike domain.util.encode_move() which needs 18 bits, the code fits into the uint16 move array
+    of the book.
+    :param move: Python-chess move
+    :return: Integer code of the move
+    """
+    code = move.from_square | (move.to_square << 6)
+    if move.drop:
+        return code | (move.drop << 12) | DROP_FLAG
+    if move.promotion:
+        code |= move.promotion << 12
+    return code
+
+
+def decode_book_move(code: int) -> chess.Move:
+    """
+    Decodes a move which was encoded by encode_book_move()
+    :param code: Integer code of the move
+    :return: Python-chess move
+    """
+    from_square, to_square, piece = code & 63, (code >> 6) & 63, (code >> 12) & 7
+    if code & DROP_FLAG:
+        return chess.Move(to_square, to_square, drop=piece)
+    return chess.Move(from_square, to_square, promotion=piece or None)
+
+
+def write_opening_book(book_file: str, entries):
+    """
+    Writes an opening book file
+    :param book_file: Output file
+    :param entries: Iterable of (Zobrist hash, value, moves, visits) tuples. For duplicate hashes the first entry is
+     kept.
+    :return: Number of positions in the book
+    """
+    positions = {}
+    for key, value, moves, visits in entries:
+        positions.setdefault(int(key), (value, moves, visits))
+    keys = sorted(positions)
+
+    offsets = np.zeros(len(keys) + 1, "<u4")
+    offsets[1:] = np.cumsum([len(positions[key][1]) for key in keys])
+    header = np.array([(BOOK_MAGIC, len(keys), offsets[-1])], HEADER_DTYPE)
+    with open(book_file, "wb") as book:
+        book.write(header.tobytes())
+        book.write(np.array(keys, "<u8").tobytes())
+        book.write(np.array([positions[key][0] for key in keys], "<f4").tobytes())
+        book.write(offsets.tobytes())
+        book.write(np.array([encode_book_move(move) for key in keys for move in positions[key][1]], "<u2").tobytes())
+        book.write(np.array([visits for key in keys for visits in positions[key][2]], "<u4").tobytes())
+    return len(keys)
+
+
+class OpeningBook:
+    """Read-only memory-mapped opening book"""
+
+    def __init__(self, book_file: str):
+        """
+        Constructor
+        :param book_file: File which has been written by write_opening_book()
+        """
+        header = np.fromfile(book_file, HEADER_DTYPE, count=1)
+        if len(header) != 1 or header["magic"][0] != BOOK_MAGIC:
+            raise Exception("The file %s isn't an opening book" % book_file)
+        nb_positions, nb_moves = int(header["nb_positions"][0]), int(header["nb_moves"][0])
+        offset = HEADER_DTYPE.itemsize
+        arrays = []
+        for dtype, size in [("<u8", nb_positions), ("<f4", nb_positions), ("<u4", nb_positions + 1), ("<u2", nb_moves),
+                            ("<u4", nb_moves)]:
+            arrays.append(np.memmap(book_file, dtype, mode="r", offset=offset, shape=(size,)) if size else
+                          np.zeros(0, dtype))
+            offset += np.dtype(dtype).itemsize * size
+        self.keys, self.values, self.offsets, self.moves, self.visits = arrays
+
+    def __len__(self):
+        return len(self.keys)
+
+    def probe(self, board: chess.Board):
+        """
+        Looks up the given position
+        :param board: Python-chess board
+        :return: moves - Legal book moves of the position
+                 visits - Numpy array of the visits of each move
+                 value - Value of the position from the point of view of the side to move
+                 The method returns None if the position isn't in the book.
+        """
+        key = compute_hash(board)
+        idx = int(np.searchsorted(self.keys, key))
+        if idx == len(self.keys) or int(self.keys[idx]) != key:
+            return None
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        moves, visits = [], []
+        for code, nb_visits in zip(self.moves[start:end].tolist(), self.visits[start:end].tolist()):
+            move = decode_book_move(code)
+            if nb_visits > 0 and board.is_legal(move):  # protects against hash collisions
+                moves.append(move)
+                visits.append(nb_visits)
+        if not moves:
+            return None
+        return moves, np.array(visits, np.float64), float(self.values[idx])
+
+    def select_move(self, board: chess.Board, temperature=0.0, rng=np.random):
+        """
+        Selects a book move of the given position
+        :param board: Python-chess board
+        :param temperature: 0 plays the most visited move, otherwise the move is sampled from the visit distribution
+         which is scaled by the exponent 1/temperature
+        :param rng: Random generator for the sampling
+        :return: move - Selected move
+                 value - Value of the position from the point of view of the side to move
+                 probability - Probability of the selected move
+                 nb_visits - Total number of visits of the position
+                 The method returns None if the position isn't in the book.
+        """
+        entry = self.probe(board)
+        if entry is None:
+            return None
+        moves, visits, value = entry
+        if temperature <= 0.01:
+            policy = np.zeros(len(moves))
+            policy[visits.argmax()] = 1
+        else:
+            policy = visits ** (1 / temperature)
+            policy /= policy.sum()
+        idx = int(rng.choice(len(moves), p=policy))
+        return moves[idx], value, float(visits[idx] / visits.sum()), int(visits.sum())
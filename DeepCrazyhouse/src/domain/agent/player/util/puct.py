@@ -0,0 +1,79 @@
+"""
+@file: puct.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Selection kernel of the MCTS which returns the child with the highest PUCT score Q + U:
+    U = cpuct * P * sqrt(n_sum) / (u_init_divisor + N)
+The exploration factor cpuct * sqrt(n_sum) is a scalar which is computed once in python.
+For few child nodes a plain python loop is faster than the overhead of the numpy calls.
+For more child nodes the score is computed by in-place ufuncs in a scratch buffer of the calling thread, so that no
+temporary arrays are allocated.
+"""
+import math
+from threading import local
+import numpy as np
+
+# up to this number of child nodes the python loop is used (measured with tools/benchmarks/puct_benchmark.py)
+MAX_CHILDREN_PYTHON_LOOP = 16
+# initial size of the scratch buffers which grow on demand
+SCRATCH_SIZE = 256
+
+# every search thread gets its own scratch buffer because several threads select on the same node at the same time
+_thread_data = local()
+
+
+def get_cpuct(n_sum, cpuct_init, cpuct_base=19652):
+    """
+    Returns the cpuct value which grows logarithmically with the number of visits of the parent node
+    :param n_sum: Number of visits of the parent node
+    :param cpuct_init: Constant part of cpuct
+    :param cpuct_base: Number of visits after which cpuct has increased by log(2)
+    :return: cpuct
+    """
+    return math.log((n_sum + cpuct_base + 1) / cpuct_base) + cpuct_init
+
+
+def _get_scratch(size: int) -> np.ndarray:
+    """ Returns the scratch buffer of the calling thread with at least the given size"""
+    scratch = getattr(_thread_data, "scratch", None)
+    if scratch is None or len(scratch) < size:
+        scratch = np.empty(max(size, SCRATCH_SIZE), np.float64)
+        _thread_data.scratch = scratch
+    return scratch
+
+
+def select_puct_child(q_value: np.ndarray, policy_prob: np.ndarray, child_number_visits: np.ndarray, n_sum,
+                      cpuct_init, u_init_divisor) -> int:  # Too many arguments (6/5)
+    """
+    Returns the index of the child with the highest PUCT score
+    :param q_value: Q-values of the child nodes
+    :param policy_prob: Prior probabilities of the child nodes
+    :param child_number_visits: Visits of the child nodes
+    :param n_sum: Number of visits of the parent node
+    :param cpuct_init: Constant part of cpuct (see get_cpuct())
+    :param u_init_divisor: Offset of the visits in the denominator of the u-value
+    :return: Index of the selected child node
+    """
+    n_sum = int(n_sum)
+    exploration = get_cpuct(n_sum, cpuct_init) * math.sqrt(n_sum)
+    nb_children = len(policy_prob)
+
+    if nb_children <= MAX_CHILDREN_PYTHON_LOOP:
+        best_idx = 0
+        best_score = -math.inf
+        for idx, (q_val, prob, visits) in enumerate(zip(q_value.tolist(), policy_prob.tolist(),
+                                                        child_number_visits.tolist())):
+            score = q_val + exploration * prob / (u_init_divisor + visits)
+            if score > best_score:
+                best_idx = idx
+                best_score = score
+        return best_idx
+
+    score = _get_scratch(nb_children)[:nb_children]
+    np.add(child_number_visits, u_init_divisor, out=score)
+    np.divide(policy_prob, score, out=score)
+    score *= exploration
+    score += q_value
+    return int(score.argmax())
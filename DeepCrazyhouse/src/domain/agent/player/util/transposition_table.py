@@ -0,0 +1,168 @@
+"""
+@file: transposition_table.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Fixed size transposition table for the MCTS search which maps the Zobrist hash of a position to its search node.
+The entries are kept in buckets of BUCKET_SIZE slots which are addressed by the hash. If a bucket is full, the new
+entry replaces the entry with the lowest priority. Entries of previous searches are replaced first (aging),
+afterwards either the deepest node ("depth") or the node with the fewest visits ("visits").
+"""
+from threading import Lock
+
+# number of slots per bucket
+BUCKET_SIZE = 2
+# number of locks which are shared by all buckets (must be a power of 2)
+NB_LOCKS = 64
+# rough memory estimate of a single entry including its node with the statistics of about 30 child nodes
+ENTRY_SIZE_BYTES = 1024
+REPLACEMENT_SCHEMES = ["visits", "depth"]
+
+
+class TranspositionTable:  # Too many instance attributes (12/7)
+    """Bounded transposition table which is shared by all search threads"""
+
+    def __init__(self, size_mb=64, replacement="visits"):
+        """
+        Constructor
+        :param size_mb: Memory budget of the table in MB which defines the number of entries
+        :param replacement: Replacement scheme for full buckets, either "visits" or "depth"
+        """
+        if replacement not in REPLACEMENT_SCHEMES:
+            raise Exception("Unknown replacement scheme %s. Available schemes: %s" % (replacement, REPLACEMENT_SCHEMES))
+        self.replacement = replacement
+        self.nb_buckets = max(1, size_mb * 2 ** 20 // (ENTRY_SIZE_BYTES * BUCKET_SIZE))
+        self.capacity = self.nb_buckets * BUCKET_SIZE
+        self.locks = [Lock() for _ in range(NB_LOCKS)]
+        self.generation = 0  # is increased for every new search to age the entries of the previous searches
+        # statistics per lock stripe, so that every counter is only changed under the lock of its stripe
+        self._nb_probes = self._nb_hits = self._nb_entries = None
+        self._keys = self._move_numbers = self._nodes = self._depths = self._generations = None
+        self.clear()
+
+    def clear(self):
+        """
+        Removes all entries from the table
+        :return:
+        """
+        self._keys = [None] * self.capacity
+        self._move_numbers = [0] * self.capacity
+        self._nodes = [None] * self.capacity
+        self._depths = [0] * self.capacity
+        self._generations = [0] * self.capacity
+        self._nb_probes = [0] * NB_LOCKS
+        self._nb_hits = [0] * NB_LOCKS
+        self._nb_entries = [0] * NB_LOCKS
+
+    def new_search(self):
+        """
+        Ages all current entries and resets the hit statistics. Must be called before every new search.
+        :return:
+        """
+        self.generation += 1
+        self._nb_probes = [0] * NB_LOCKS
+        self._nb_hits = [0] * NB_LOCKS
+
+    @property
+    def nb_probes(self):
+        """ Number of look-ups since the start of the current search"""
+        return sum(self._nb_probes)
+
+    @property
+    def nb_hits(self):
+        """ Number of successful look-ups since the start of the current search"""
+        return sum(self._nb_hits)
+
+    @property
+    def nb_entries(self):
+        """ Number of used slots"""
+        return sum(self._nb_entries)
+
+    def _get_bucket(self, key: int):
+        """ Returns the first slot index of the bucket of the given key and the index of the lock which protects it"""
+        bucket = key % self.nb_buckets
+        return bucket * BUCKET_SIZE, bucket & (NB_LOCKS - 1)
+
+    def get(self, key: int, move_number: int):
+        """
+        Returns the node of the given position
+        :param key: Zobrist hash of the position
+        :param move_number: Full move number of the position. Identical positions with different move numbers are kept
+         apart, otherwise the search tree could contain cycles.
+        :return: Node object or None if the position isn't stored
+        """
+        start, stripe = self._get_bucket(key)
+        with self.locks[stripe]:
+            self._nb_probes[stripe] += 1
+            for slot in range(start, start + BUCKET_SIZE):
+                if self._keys[slot] == key and self._move_numbers[slot] == move_number:
+                    self._nb_hits[stripe] += 1
+                    self._generations[slot] = self.generation  # the entry is still in use
+                    return self._nodes[slot]
+        return None
+
+    def _get_priority(self, slot: int):
+        """ Returns the priority of the entry in the given slot. The entry with the lowest priority is replaced."""
+        if self._generations[slot] != self.generation:
+            return float("-inf"), self._generations[slot]
+        if self.replacement == "depth":
+            return 0, -self._depths[slot]
+        return 0, self._nodes[slot].n_sum
+
+    def store(self, key: int, move_number: int, node, depth: int):
+        """
+        Stores a node in the table
+        :param key: Zobrist hash of the position
+        :param move_number: Full move number of the position
+        :param node: Search node of the position
+        :param depth: Depth of the node in the current search tree
+        :return:
+        """
+        start, stripe = self._get_bucket(key)
+        with self.locks[stripe]:
+            victim = None
+            for slot in range(start, start + BUCKET_SIZE):
+                if self._keys[slot] is None or (self._keys[slot] == key and self._move_numbers[slot] == move_number):
+                    victim = slot
+                    break
+                if victim is None or self._get_priority(slot) < self._get_priority(victim):
+                    victim = slot
+            if self._keys[victim] is None:
+                self._nb_entries[stripe] += 1
+            self._keys[victim] = key
+            self._move_numbers[victim] = move_number
+            self._nodes[victim] = node
+            self._depths[victim] = depth
+            self._generations[victim] = self.generation
+
+    def remap_nodes(self, map_node):
+        """
+        Replaces the node of every entry, e.g. after the node ids of a NodeStore have been compacted.
+        Must not be called during a search.
+        :param map_node: Function which returns the new node of a stored node or None to remove the entry
+        :return:
+        """
+        for slot, node in enumerate(self._nodes):
+            if node is not None:
+                self._nodes[slot] = map_node(node)
+                if self._nodes[slot] is None:
+                    self._keys[slot] = None
+                    self._nb_entries[(slot // BUCKET_SIZE) & (NB_LOCKS - 1)] -= 1
+
+    def hit_rate(self):
+        """ Returns the ratio of successful look-ups since the start of the current search"""
+        return self.nb_hits / self.nb_probes if self.nb_probes else 0.0
+
+    def occupancy(self):
+        """ Returns the ratio of used slots"""
+        return self.nb_entries / self.capacity
+
+    def get_info_string(self):
+        """Returns a summary of the hit rate and occupancy for the uci info string"""
+        return "tt hits %.3f probes %d occupancy %.3f of %d entries" % (
+            self.hit_rate(),
+            self.nb_probes,
+            self.occupancy(),
+            self.capacity,
+        )
@@ -101,6 +101,37 @@ def get_row_col(position, mirror=False):
     return row, col
 
 
+def get_planes_buffer(shape, out=None):
+    """
+    Returns a zeroed plane buffer. If no buffer is given, a new float64 array is allocated as before.
+
+    :param shape: Shape of the plane representation
+    :param out: Optional preallocated buffer (e.g. float32 or int16) which is reset to 0 and returned
+    :return: Zeroed planes
+    """
+    if out is None:
+        return np.zeros(shape)
+    if out.shape != tuple(shape):
+        raise Exception("The given out buffer has shape %s but shape %s is required" % (out.shape, tuple(shape)))
+    out.fill(0)
+    return out
+
+
+def set_bitboard_planes(planes, bitboards, mirror=False):
+    """
+    Writes 64 bit square masks (bitboards) into 8x8 planes.
+    Each bitboard is unpacked with numpy in a single call. Mirroring the board vertically only changes the byte order
+     of the bitboard, because every byte of the bitboard holds one rank.
+
+    :param planes: Planes to fill of shape (len(bitboards), 8, 8) or (8, 8) for a single bitboard
+    :param bitboards: List of python-chess bitboards or a single bitboard
+    :param mirror: True, if the ranks shall be mirrored (same as get_row_col(mirror=True))
+    :return:
+    """
+    bitboards = np.array(bitboards, dtype=">u8" if mirror else "<u8", ndmin=1)
+    planes[...] = np.unpackbits(bitboards.view(np.uint8), bitorder="little").reshape(planes.shape)
+
+
 def get_board_position_index(row, col, mirror=False):
     """
     Maps a row and column index to the integer value [0, 63].
@@ -116,6 +147,31 @@ def get_board_position_index(row, col, mirror=False):
     return (row * 8) + col
 
 
+def encode_move(move: chess.Move) -> int:
+    """
+    Packs a python-chess move into a single integer.
+    Bits 0-5 hold the from square, bits 6-11 the to square, bits 12-14 the promotion piece type and
+     bits 15-17 the drop piece type.
+
+    :param move: Python chess move object
+    :return: Integer encoding of the move
+    """
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12) | ((move.drop or 0) << 15)
+
+
+def decode_move(move_code: int) -> chess.Move:
+    """
+    Inverse operation of encode_move().
+
+    :param move_code: Integer encoding of the move
+    :return: Python chess move object
+    """
+    move_code = int(move_code)
+    promotion = (move_code >> 12) & 7
+    drop = (move_code >> 15) & 7
+    return chess.Move(move_code & 63, (move_code >> 6) & 63, promotion if promotion else None, drop if drop else None)
+
+
 def mirror_field_index(row, col):
     """
     Mirrors a given row and column index
@@ -13,7 +13,7 @@ import chess
 from DeepCrazyhouse.src.domain.variants.constants import BOARD_WIDTH, BOARD_HEIGHT, NB_CHANNELS_TOTAL, PIECES,\
     NB_LAST_MOVES, NB_CHANNELS_PER_HISTORY_ITEM
 from DeepCrazyhouse.src.domain.util import opposite_colored_bishops, get_row_col, np, checkerboard,\
-    get_board_position_index, checkers, gives_check
+    get_board_position_index, checkers, gives_check, get_planes_buffer, set_bitboard_planes
 
 NORMALIZE_MOBILITY = 64
 NORMALIZE_PIECE_NUMBER = 8
@@ -33,7 +33,7 @@ CHANNEL_MOBILITY = 32
 CHANNEL_MATERIAL_COUNT = 33
 
 
-def board_to_planes(board: chess.Board, normalize=True, last_moves=None):
+def board_to_planes(board: chess.Board, normalize=True, last_moves=None, out=None):
     """
     Gets the plane representation of a given board state.
 
@@ -97,13 +97,14 @@ def board_to_planes(board: chess.Board, normalize=True, last_moves=None):
     :param board: Board handle (Python-chess object)
     :param normalize: True if the inputs shall be normalized to the range [0.-1.]
     :param last_moves: List of last last moves. The most recent move is the first entry.
+    :param out: Optional preallocated buffer (e.g. float32 or int16) to write the planes into
     :return: planes - the plane representation of the current board state
     """
 
     # return the plane representation of the given board
     # return variants.board_to_planes(board, board_occ, normalize, mode=MODE_CHESS)
 
-    planes = np.zeros((NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH))
+    planes = get_planes_buffer((NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH), out)
 
     # channel will be incremented by 1 at first plane
     channel = 0
@@ -117,16 +118,10 @@ def board_to_planes(board: chess.Board, normalize=True, last_moves=None):
     assert (channel == CHANNEL_PIECES)
     # Fill in the piece positions
     # Channel: 0 - 11
-    # Iterate over both color starting with WHITE
-    for color in colors:
-        # the PIECE_TYPE is an integer list in python-chess
-        for piece_type in chess.PIECE_TYPES:
-            # iterate over the piece mask and receive every position square of it
-            for pos in board.pieces(piece_type, color):
-                row, col = get_row_col(pos, mirror=mirror)
-                # set the bit at the right position
-                planes[channel, row, col] = 1
-            channel += 1
+    # Iterate over both color starting with the player to move
+    bitboards = [board.pieces_mask(piece_type, color) for color in colors for piece_type in chess.PIECE_TYPES]
+    set_bitboard_planes(planes[channel:channel + len(bitboards)], bitboards, mirror)
+    channel += len(bitboards)
 
     # Channel: 12
     # En Passant Square
@@ -176,15 +171,8 @@ def board_to_planes(board: chess.Board, normalize=True, last_moves=None):
     # Channel: 20 - 21
     # All white pieces and black pieces in a single map
     assert(channel == CHANNEL_PIECE_MASK)
-    for color in colors:
-        # the PIECE_TYPE is an integer list in python-chess
-        for piece_type in chess.PIECE_TYPES:
-            # iterate over the piece mask and receive every position square of it
-            for pos in board.pieces(piece_type, color):
-                row, col = get_row_col(pos, mirror=mirror)
-                # set the bit at the right position
-                planes[channel, row, col] = 1
-        channel += 1
+    set_bitboard_planes(planes[channel:channel + 2], [board.occupied_co[color] for color in colors], mirror)
+    channel += 2
 
     # Channel: 22
     # Checkerboard
@@ -197,7 +185,8 @@ def board_to_planes(board: chess.Board, normalize=True, last_moves=None):
     # iterate over all pieces except the king
     assert(channel == CHANNEL_MATERIAL_DIFF)
     for piece_type in chess.PIECE_TYPES[:-1]:
-        material_count = len(board.pieces(piece_type, me)) - len(board.pieces(piece_type, you))
+        material_count = chess.popcount(board.pieces_mask(piece_type, me)) - \
+            chess.popcount(board.pieces_mask(piece_type, you))
         planes[channel, :, :] = material_count / NORMALIZE_PIECE_NUMBER if normalize else material_count
         channel += 1
 
@@ -213,23 +202,19 @@ def board_to_planes(board: chess.Board, normalize=True, last_moves=None):
     assert channel == CHANNEL_CHECKERS
     board_checkers = checkers(board)
     if board_checkers:
-        # iterate over the piece mask and receive every position square of it
-        for pos in chess.SquareSet(board_checkers):
-            row, col = get_row_col(pos, mirror=mirror)
-            # set the bit at the right position
-            planes[channel, row, col] = 1
+        set_bitboard_planes(planes[channel], board_checkers, mirror)
     channel += 1
 
     my_legal_moves = list(board.legal_moves)
 
     # Channel: 30 - 31
     assert channel == CHANNEL_CHECK_MOVES
+    from_mask = to_mask = chess.BB_EMPTY
     for move in my_legal_moves:
         if gives_check(board, move):
-            row, col = get_row_col(move.from_square, mirror=mirror)
-            planes[channel, row, col] = 1
-            row, col = get_row_col(move.to_square, mirror=mirror)
-            planes[channel+1, row, col] = 1
+            from_mask |= chess.BB_SQUARES[move.from_square]
+            to_mask |= chess.BB_SQUARES[move.to_square]
+    set_bitboard_planes(planes[channel:channel + 2], [from_mask, to_mask], mirror)
     channel += 2
 
     # Channel: 32
@@ -242,7 +227,7 @@ def board_to_planes(board: chess.Board, normalize=True, last_moves=None):
     # Material
     assert(channel == CHANNEL_MATERIAL_COUNT)
     for piece_type in chess.PIECE_TYPES[:-1]:
-        material_count = len(board.pieces(piece_type, me))
+        material_count = chess.popcount(board.pieces_mask(piece_type, me))
         planes[channel, :, :] = material_count / NORMALIZE_PIECE_NUMBER if normalize else material_count
         channel += 1
 
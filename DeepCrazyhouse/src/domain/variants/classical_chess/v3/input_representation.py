@@ -9,7 +9,8 @@ Input representation 3.0 - No legal move information, but with history again and
 import chess
 from DeepCrazyhouse.src.domain.variants.constants import BOARD_WIDTH, BOARD_HEIGHT, NB_CHANNELS_TOTAL,\
     NB_LAST_MOVES, NB_CHANNELS_PER_HISTORY_ITEM, MODE_CHESS
-from DeepCrazyhouse.src.domain.util import opposite_colored_bishops, get_row_col, np, checkerboard, checkers
+from DeepCrazyhouse.src.domain.util import opposite_colored_bishops, get_row_col, checkerboard, checkers, \
+    get_planes_buffer, set_bitboard_planes
 from DeepCrazyhouse.src.domain.variants.classical_chess.v2.input_representation import set_pieces, set_castling_rights,\
     set_ep_square
 from DeepCrazyhouse.configs.main_config import main_config
@@ -33,7 +34,7 @@ CHANNEL_MATERIAL_COUNT = 47
 
 
 def board_to_planes(board: chess.Board, board_occ, normalize=True, last_moves=None,
-                    normalize_50_move_rule=NORMALIZE_50_MOVE_RULE):
+                    normalize_50_move_rule=NORMALIZE_50_MOVE_RULE, out=None):
     """
     Gets the plane representation of a given board state.
 
@@ -101,12 +102,13 @@ def board_to_planes(board: chess.Board, board_occ, normalize=True, last_moves=No
     :param normalize: True if the inputs shall be normalized to the range [0.-1.]
     :param last_moves: List of last last moves. The most recent move is the first entry.
     :param normalize_50_move_rule: Normalizing factor for the 50 move rule counter
+    :param out: Optional preallocated buffer (e.g. float32 or int16) to write the planes into
     :return: planes - the plane representation of the current board state
     """
 
     # return the plane representation of the given board
     # return variants.board_to_planes(board, board_occ, normalize, mode=MODE_CHESS)
-    planes = np.zeros((NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH))
+    planes = get_planes_buffer((NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH), out)
 
     # channel will be incremented by 1 at first plane
     channel = 0
@@ -120,16 +122,10 @@ def board_to_planes(board: chess.Board, board_occ, normalize=True, last_moves=No
     assert channel == CHANNEL_PIECES
     # Fill in the piece positions
     # Channel: 0 - 11
-    # Iterate over both color starting with WHITE
-    for color in colors:
-        # the PIECE_TYPE is an integer list in python-chess
-        for piece_type in chess.PIECE_TYPES:
-            # iterate over the piece mask and receive every position square of it
-            for pos in board.pieces(piece_type, color):
-                row, col = get_row_col(pos, mirror=mirror)
-                # set the bit at the right position
-                planes[channel, row, col] = 1
-            channel += 1
+    # Iterate over both color starting with the player to move
+    bitboards = [board.pieces_mask(piece_type, color) for color in colors for piece_type in chess.PIECE_TYPES]
+    set_bitboard_planes(planes[channel:channel + len(bitboards)], bitboards, mirror)
+    channel += len(bitboards)
 
     assert channel == CHANNEL_REPETITION
     # Channel: 12 - 13
@@ -229,15 +225,8 @@ def set_additional_custom_features(planes, board, channel: int, mirror: bool, no
     # Channel: 37 - 38
     # All white pieces and black pieces in a single map
     assert channel == channel_piece_mask
-    for color in colors:
-        # the PIECE_TYPE is an integer list in python-chess
-        for piece_type in chess.PIECE_TYPES:
-            # iterate over the piece mask and receive every position square of it
-            for pos in board.pieces(piece_type, color):
-                row, col = get_row_col(pos, mirror=mirror)
-                # set the bit at the right position
-                planes[channel, row, col] = 1
-        channel += 1
+    set_bitboard_planes(planes[channel:channel + 2], [board.occupied_co[color] for color in colors], mirror)
+    channel += 2
     # Channel: 39
     # Checkerboard
     assert (channel == channel_checkerboard)
@@ -254,7 +243,8 @@ def set_additional_custom_features(planes, board, channel: int, mirror: bool, no
         piece_types = chess.PIECE_TYPES[:-1]
 
     for piece_type in piece_types:
-        material_count = len(board.pieces(piece_type, me)) - len(board.pieces(piece_type, you))
+        material_count = chess.popcount(board.pieces_mask(piece_type, me)) - \
+            chess.popcount(board.pieces_mask(piece_type, you))
         planes[channel, :, :] = material_count / NORMALIZE_PIECE_NUMBER if normalize else material_count
         channel += 1
     # Channel: 45
@@ -268,17 +258,13 @@ def set_additional_custom_features(planes, board, channel: int, mirror: bool, no
     assert channel == channel_checkers
     board_checkers = checkers(board)
     if board_checkers:
-        # iterate over the piece mask and receive every position square of it
-        for pos in chess.SquareSet(board_checkers):
-            row, col = get_row_col(pos, mirror=mirror)
-            # set the bit at the right position
-            planes[channel, row, col] = 1
+        set_bitboard_planes(planes[channel], board_checkers, mirror)
     channel += 1
     # Channel: 47 - 51
     # Material
     assert channel == channel_material_count
     for piece_type in piece_types:
-        material_count = len(board.pieces(piece_type, me))
+        material_count = chess.popcount(board.pieces_mask(piece_type, me))
         planes[channel, :, :] = material_count / NORMALIZE_PIECE_NUMBER if normalize else material_count
         channel += 1
     return channel
@@ -33,7 +33,7 @@ CHANNEL_NO_PROGRESS = 33
 CHANNEL_IS_960 = 50
 
 
-def board_to_planes(board: chess.Board, board_occ, normalize=True, last_moves=None):
+def board_to_planes(board: chess.Board, board_occ, normalize=True, last_moves=None, out=None):
     """
     Returns the plane representation 2.0 of a given board state for crazyhouse.
     This representation is based on the chess representation 1.0 and adds missing additional information for crazyhouse.
@@ -99,7 +99,7 @@ def board_to_planes(board: chess.Board, board_occ, normalize=True, last_moves=No
     Total: 51 planes
 
     """
-    planes = default_board_to_planes(board, board_occ, last_moves, MODE_CRAZYHOUSE, normalize)
+    planes = default_board_to_planes(board, board_occ, last_moves, MODE_CRAZYHOUSE, normalize, out)
     return planes
 
 
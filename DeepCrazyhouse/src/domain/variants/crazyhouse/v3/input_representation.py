@@ -21,7 +21,7 @@ CHANNEL_POCKETS = 52
 CHANNEL_PROMO = 62
 
 
-def board_to_planes(board: chess.Board, board_occ, normalize=True, last_moves=None):
+def board_to_planes(board: chess.Board, board_occ, normalize=True, last_moves=None, out=None):
     """
     Returns the plane representation 3.0 of a given board state for crazyhouse.
     This representation is based on the chess representation 3.0 and adds missing additional information for crazyhouse.
@@ -54,7 +54,7 @@ def board_to_planes(board: chess.Board, board_occ, normalize=True, last_moves=No
     Total: 64 planes
 
     """
-    planes = chess_v3.board_to_planes(board, board_occ, normalize, last_moves, NORMALIZE_50_MOVE_RULE)
+    planes = chess_v3.board_to_planes(board, board_occ, normalize, last_moves, NORMALIZE_50_MOVE_RULE, out)
     _set_crazyhouse_info(board, planes, normalize,
                          channel_prisoners=CHANNEL_POCKETS,
                          max_nb_prisoners=NORMALIZE_POCKETS,
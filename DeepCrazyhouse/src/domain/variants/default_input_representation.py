@@ -29,51 +29,43 @@ from DeepCrazyhouse.src.domain.variants.constants import (
     PIECES,
     chess,
     VARIANT_MAPPING_BOARDS)
-from DeepCrazyhouse.src.domain.util import get_board_position_index, get_row_col, np
+from DeepCrazyhouse.src.domain.util import get_board_position_index, get_row_col, get_planes_buffer, \
+    set_bitboard_planes, np
 from DeepCrazyhouse.src.domain.variants.constants import MODE, MODE_LICHESS
 
 
-def default_board_to_planes(board, board_occ, last_moves, mode, normalize):
-    """Default plane representation for all variants. See input_representation/board_to_planes() for details."""
-    # TODO: Remove board.mirror() for black by addressing the according color channel
+def default_board_to_planes(board, board_occ, last_moves, mode, normalize, out=None):
+    """
+    Default plane representation for all variants. See input_representation/board_to_planes() for details.
+    The planes are filled directly from the bitboards of the given board in the view of the player to move, so the board
+    doesn't need to be mirrored.
+    :param out: Optional preallocated buffer of shape (NB_CHANNELS_DEFAULT, BOARD_HEIGHT, BOARD_WIDTH) to write into
+    """
     # (I) Define the Input Representation for one position
-    planes_pos = np.zeros((NB_CHANNELS_POS, BOARD_HEIGHT, BOARD_WIDTH))
-    planes_const = np.zeros((NB_CHANNELS_CONST, BOARD_HEIGHT, BOARD_WIDTH))
-    if NB_CHANNELS_VARIANTS > 0:
-        planes_variants = np.zeros((NB_CHANNELS_VARIANTS, BOARD_HEIGHT, BOARD_WIDTH))
-    else:
-        planes_variants = None
+    planes = get_planes_buffer((NB_CHANNELS_DEFAULT, BOARD_HEIGHT, BOARD_WIDTH), out)
+    planes_pos = planes[:NB_CHANNELS_POS]
+    planes_const = planes[NB_CHANNELS_POS:NB_CHANNELS_POS + NB_CHANNELS_CONST]
     # check whose player turn it is and flip the board if it's black turn (except for racing kings)
     mirror_board = flip_board(board)
-    board_turn = board.turn
-    if mirror_board:
-        board = board.mirror()
-    _fill_position_planes(planes_pos, board, board_occ, mode)
-    _fill_constant_planes(planes_const, board, board_turn)
-    if mode == MODE_LICHESS:
-        _fill_variants_plane(board, planes_variants)
-    elif NB_CHANNELS_VARIANTS > 0:
-        if board.chess960 is True:
+    _fill_position_planes(planes_pos, board, board_occ, mode, mirror_board)
+    _fill_constant_planes(planes_const, board, board.turn)
+    if NB_CHANNELS_VARIANTS > 0:
+        channel = NB_CHANNELS_POS + NB_CHANNELS_CONST
+        planes_variants = planes[channel:channel + NB_CHANNELS_VARIANTS]
+        if mode == MODE_LICHESS:
+            _fill_variants_plane(board, planes_variants)
+        elif board.chess960 is True:
             planes_variants[:, :, :] = 1
-    # create the move planes
-    planes_moves = np.zeros((NB_CHANNELS_HISTORY, BOARD_HEIGHT, BOARD_WIDTH))
-    if last_moves:
-        for i, move in enumerate(last_moves):
-            if move:
-                if not move.drop:
-                    from_row, from_col = get_row_col(move.from_square, mirror=mirror_board)
-                    planes_moves[i * 2, from_row, from_col] = 1
-                to_row, to_col = get_row_col(move.to_square, mirror=mirror_board)
-                planes_moves[i * 2 + 1, to_row, to_col] = 1
-    # (VI) Merge the Matrix-Stack
-    if NB_CHANNELS_VARIANTS == 0:  # mode == MODE_CRAZYHOUSE (Version 1)
-        planes = np.concatenate((planes_pos, planes_const), axis=0)
-    else:  # mode = MODE_LICHESS | mode == MODE_CHESS
-        planes = np.concatenate((planes_pos, planes_const, planes_variants, planes_moves), axis=0)
-    # revert the board if the players turn was black
-    # ! DO NOT DELETE OR UNCOMMENT THIS BLOCK BECAUSE THE PARAMETER board IS CHANGED IN PLACE !
-    if mirror_board:
-        board = board.mirror()
+        # create the move planes
+        planes_moves = planes[channel + NB_CHANNELS_VARIANTS:]
+        if last_moves:
+            for i, move in enumerate(last_moves):
+                if move:
+                    if not move.drop:
+                        from_row, from_col = get_row_col(move.from_square, mirror=mirror_board)
+                        planes_moves[i * 2, from_row, from_col] = 1
+                    to_row, to_col = get_row_col(move.to_square, mirror=mirror_board)
+                    planes_moves[i * 2 + 1, to_row, to_col] = 1
     if normalize is True:
         planes *= DEFAULT_MATRIX_NORMALIZER
         # planes = normalize_input_planes(planes)
@@ -322,25 +314,16 @@ def set_pieces_on_board(board, planes, check_for_promo, promo_channel):
                     )
 
 
-def _fill_position_planes(planes_pos, board, board_occ=0, mode=MODE_CRAZYHOUSE):
+def _fill_position_planes(planes_pos, board, board_occ=0, mode=MODE_CRAZYHOUSE, mirror=False):
 
     # Fill in the piece positions
     me = board.turn
-    you = ~board.turn
-
-    # Iterate over both color starting with WHITE
-    for idx, color in enumerate([me, you]):
-        # the PIECE_TYPE is an integer list in python-chess
-        for piece_type in chess.PIECE_TYPES:
-            # define the channel by the piece_type (the input representation uses the same ordering as python-chess)
-            # we add an offset for the black pieces
-            # note that we subtract 1 because in python chess the PAWN has index 1 and not 0
-            channel = (piece_type - 1) + idx * len(chess.PIECE_TYPES)
-            # iterate over the piece mask and receive every position square of it
-            for pos in board.pieces(piece_type, color):
-                row, col = get_row_col(pos)
-                # set the bit at the right position
-                planes_pos[channel, row, col] = 1
+    you = not board.turn
+
+    # the channels are ordered by the piece_type (the input representation uses the same ordering as python-chess)
+    # starting with the pieces of the player to move
+    bitboards = [board.pieces_mask(piece_type, color) for color in [me, you] for piece_type in chess.PIECE_TYPES]
+    set_bitboard_planes(planes_pos[:len(bitboards)], bitboards, mirror)
 
     # (II) Fill in the Repetition Data
     # a game to test out if everything is working correctly is: https://lichess.org/jkItXBWy#73
@@ -363,7 +346,7 @@ def _fill_position_planes(planes_pos, board, board_occ=0, mode=MODE_CRAZYHOUSE):
     # mark the square where an en-passant capture is possible
     channel = CHANNEL_MAPPING_POS["ep_square"]
     if board.ep_square is not None:
-        row, col = get_row_col(board.ep_square)
+        row, col = get_row_col(board.ep_square, mirror=mirror)
         planes_pos[channel, row, col] = 1
 
     return planes_pos
@@ -376,7 +359,7 @@ def _set_crazyhouse_info(board, planes, normalize: bool, channel_prisoners: int,
     has been promoted.
     """
     me = board.turn
-    you = ~board.turn
+    you = not board.turn
 
     # Fill in the Prisoners / Pocket Pieces
     if board.uci_variant == "crazyhouse":
@@ -390,17 +373,11 @@ def _set_crazyhouse_info(board, planes, normalize: bool, channel_prisoners: int,
             # the prison for black begins 5 channels later
             planes[channel + 5, :, :] = your_pocket / max_nb_prisoners if normalize else your_pocket
     # (III) Fill in the promoted pieces
-    # iterate over all promoted pieces according to the mask and set the according bit
-    channel = channel_promo
     # mirror all bitboard entries for the black player
-    mirror = board.turn == chess.BLACK
-    for pos in chess.SquareSet(board.promoted):
-        row, col = get_row_col(pos, mirror=mirror)
-
-        if board.piece_at(pos).color == me:
-            planes[channel, row, col] = 1
-        else:
-            planes[channel + 1, row, col] = 1
+    if board.promoted:
+        mirror = board.turn == chess.BLACK
+        set_bitboard_planes(planes[channel_promo:channel_promo + 2],
+                            [board.promoted & board.occupied_co[me], board.promoted & board.occupied_co[you]], mirror)
 
 
 def _fill_constant_planes(planes_const, board, board_turn):
@@ -420,7 +397,7 @@ def _fill_constant_planes(planes_const, board, board_turn):
     channel = CHANNEL_MAPPING_CONST["castling"]
 
     me = board.turn
-    you = ~board.turn
+    you = not board.turn
     # WHITE
     # check for King Side Castling
     if board.has_kingside_castling_rights(me):
@@ -489,6 +466,12 @@ def flip_board(board) -> bool:
     return board.turn == chess.BLACK
 
 
+# number of channels of the default representation (without the FX-features of version 3)
+if NB_CHANNELS_VARIANTS == 0:  # mode == MODE_CRAZYHOUSE (Version 1)
+    NB_CHANNELS_DEFAULT = NB_CHANNELS_POS + NB_CHANNELS_CONST
+else:  # mode = MODE_LICHESS | mode == MODE_CHESS
+    NB_CHANNELS_DEFAULT = NB_CHANNELS_POS + NB_CHANNELS_CONST + NB_CHANNELS_VARIANTS + NB_CHANNELS_HISTORY
+
 # use a constant matrix for normalization to allow broad cast operations
 # in policy version 2, the king promotion moves were added to support antichess, this deprecates older nets
 DEFAULT_MATRIX_NORMALIZER = default_normalize_input_planes(np.ones((NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH)))
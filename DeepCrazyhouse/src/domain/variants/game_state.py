@@ -35,6 +35,7 @@ from DeepCrazyhouse.src.domain.variants.input_representation import board_to_pla
 from DeepCrazyhouse.src.domain.abstract_cls.abs_game_state import AbsGameState
 from DeepCrazyhouse.configs.main_config import main_config
 from DeepCrazyhouse.src.domain.variants.default_input_representation import flip_board
+from DeepCrazyhouse.src.domain.variants.position import Position
 
 
 def mirror_policy(board: chess.Board) -> bool:
@@ -50,14 +51,41 @@ class GameState(AbsGameState):
 
     def __init__(self, board: chess.Board):
         AbsGameState.__init__(self, board)
+        self.position = Position(board)
 
     def apply_move(self, move: chess.Move):
         """ Apply the move on the board"""
-        self.board.push(move)
+        self.position.make(move)
 
-    def get_state_planes(self):
-        """Transform the current board state to a plane"""
-        return board_to_planes(self.board, board_occ=self._board_occ, normalize=True, mode=main_config['mode'])
+    def undo_move(self):
+        """ Reverts the last move which was applied by apply_move()"""
+        return self.position.unmake()
+
+    def get_transposition_key(self):
+        """
+        Returns the incrementally updated Zobrist hash of the current board state excluding move counters
+        :return: 64 bit integer
+        """
+        return self.position.hash
+
+    def get_input_key(self):
+        """
+        Returns a key of all inputs of the neural network which is used by the evaluation cache.
+        The transposition key is combined with the move counters and the repetition count which are encoded in the
+        input planes as well.
+        :return: 64 bit integer
+        """
+        counters = (self.board.halfmove_clock << 20) | (self.board.fullmove_number << 2) | min(self._board_occ, 3)
+        return (self.position.hash ^ (counters * 0x9E3779B97F4A7C15)) & 0xFFFFFFFFFFFFFFFF
+
+    def get_state_planes(self, out=None):
+        """
+        Transform the current board state to a plane
+        :param out: Optional preallocated buffer to write the planes into, e.g. a slot of a batch array
+        :return: Plane representation of the board state
+        """
+        return board_to_planes(self.board, board_occ=self._board_occ, normalize=True, mode=main_config['mode'],
+                               out=out)
 
     def get_pythonchess_board(self):
         """ Get the board by calling a method"""
@@ -115,11 +143,13 @@ class GameState(AbsGameState):
     def new_game(self):
         """ Create a new board on the starting position"""
         self.board.reset()
+        self.position.refresh()
         self._fen_dic = {}
 
     def set_fen(self, fen):  # , remember_state=True
         """ Returns the fen of the current state"""
         self.board.set_fen(fen)
+        self.position.refresh()
 
     def is_check(self):
         """ Check if the king of the player of the turn is in check"""
@@ -8,6 +8,7 @@ Input representation for all available lichess chess variants board states (incl
 which is passed to the neural network
 """
 
+from multiprocessing import Pool
 import numpy as np
 import DeepCrazyhouse.src.domain.variants.classical_chess.v2.input_representation as chess_v2
 import DeepCrazyhouse.src.domain.variants.classical_chess.v3.input_representation as chess_v3
@@ -28,7 +29,7 @@ from DeepCrazyhouse.configs.main_config import main_config
 from DeepCrazyhouse.src.domain.variants.constants import MODE
 
 
-def board_to_planes(board, board_occ=0, normalize=True, mode=MODE_CRAZYHOUSE, last_moves=None):
+def board_to_planes(board, board_occ=0, normalize=True, mode=MODE_CRAZYHOUSE, last_moves=None, out=None):
     """
     Gets the plane representation of a given board state.
     (No history of past board positions is used.)
@@ -43,20 +44,66 @@ def board_to_planes(board, board_occ=0, normalize=True, mode=MODE_CRAZYHOUSE, la
                  2 - MODE_CHESS: Specification for chess only with chess960 support
                  (Visit variants.chess.input_representation for detailed documentation)
     :param last_moves: List of last moves. It is assumed that the most recent move is the first entry !
+    :param out: Optional preallocated buffer to write the planes into, e.g. a float32 array or an int16 array for
+                unnormalized planes. If None, a new float64 array is returned.
     :return: planes - the plane representation of the current board state
     """
     if mode == MODE_CHESS and VERSION == 2:
-        return chess_v2.board_to_planes(board, normalize, last_moves)
+        return chess_v2.board_to_planes(board, normalize, last_moves, out=out)
     if mode == MODE_CHESS and VERSION == 3:
-        return chess_v3.board_to_planes(board, board_occ, normalize, last_moves)
+        return chess_v3.board_to_planes(board, board_occ, normalize, last_moves, out=out)
     if mode == MODE_CRAZYHOUSE and VERSION == 2:
-        return crazyhouse_v2.board_to_planes(board, board_occ, normalize, last_moves)
+        return crazyhouse_v2.board_to_planes(board, board_occ, normalize, last_moves, out=out)
     if mode == MODE_CRAZYHOUSE and VERSION == 3:
-        return crazyhouse_v3.board_to_planes(board, board_occ, normalize, last_moves)
+        return crazyhouse_v3.board_to_planes(board, board_occ, normalize, last_moves, out=out)
     if mode == MODE_LICHESS and VERSION == 3:
-        return lichess_v3.board_to_planes(board, board_occ, normalize, last_moves)
+        return lichess_v3.board_to_planes(board, board_occ, normalize, last_moves, out=out)
 
-    return default_board_to_planes(board, board_occ, last_moves, mode, normalize)
+    return default_board_to_planes(board, board_occ, last_moves, mode, normalize, out)
+
+
+def boards_to_planes(boards, board_occs=None, normalize=True, mode=MODE_CRAZYHOUSE, last_moves=None, out=None,
+                     processes=1):  # Too many arguments (7/5)
+    """
+    Gets the plane representation of several board states and writes them into a single contiguous array.
+    This avoids allocating a new array for every position and the copy of a later np.stack() call.
+
+    :param boards: List of board handles (Python-chess objects)
+    :param board_occs: List of board occurrences for each board (by default 0 for all boards)
+    :param normalize: True if the inputs shall be normalized to the range [0.-1.]
+    :param mode: Input representation mode (see board_to_planes())
+    :param last_moves: List which contains the list of last moves for each board (see board_to_planes())
+    :param out: Optional preallocated buffer of shape (N, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH) with
+                N >= len(boards). If None, a float32 array is allocated for normalized inputs and an int16 array
+                otherwise.
+    :param processes: Number of worker processes. If > 1, the boards are split into chunks which are encoded in
+                      parallel. Must stay 1 if the caller is already running inside a multiprocessing pool worker.
+    :return: planes - array of shape (len(boards), NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH)
+    """
+    nb_boards = len(boards)
+    if board_occs is None:
+        board_occs = [0] * nb_boards
+    if last_moves is None:
+        last_moves = [None] * nb_boards
+    if out is None:
+        out = np.empty((nb_boards, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH),
+                       np.float32 if normalize else np.int16)
+    elif len(out) < nb_boards:
+        raise Exception("The given out buffer has only %d entries but %d boards were given" % (len(out), nb_boards))
+    planes = out[:nb_boards]
+
+    if processes > 1 and nb_boards > 1:
+        chunk_size = -(-nb_boards // processes)
+        params = [(boards[idx:idx + chunk_size], board_occs[idx:idx + chunk_size], normalize, mode,
+                   last_moves[idx:idx + chunk_size]) for idx in range(0, nb_boards, chunk_size)]
+        with Pool(processes=processes) as pool:
+            for chunk_idx, chunk_planes in enumerate(pool.starmap(boards_to_planes, params)):
+                planes[chunk_idx * chunk_size:chunk_idx * chunk_size + len(chunk_planes)] = chunk_planes
+        return planes
+
+    for idx, board in enumerate(boards):
+        board_to_planes(board, board_occs[idx], normalize, mode, last_moves[idx], out=planes[idx])
+    return planes
 
 
 def planes_to_board(planes, normalized_input=False, mode=MODE_CRAZYHOUSE):
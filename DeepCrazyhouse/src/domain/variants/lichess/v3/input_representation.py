@@ -6,11 +6,11 @@ Created on 17.08.23
 
 Input representation v3 which is compatible to all available lichess variants and passed to the neural network.
 """
-import numpy as np
 import chess
 from DeepCrazyhouse.src.domain.variants.default_input_representation import default_board_to_planes, default_planes_to_board
 from DeepCrazyhouse.src.domain.variants.constants import MODE_LICHESS, NB_CHANNELS_FX, BOARD_HEIGHT, BOARD_WIDTH
 from DeepCrazyhouse.src.domain.variants.classical_chess.v3.input_representation import set_additional_custom_features
+from DeepCrazyhouse.src.domain.util import get_planes_buffer
 
 NORMALIZE_POCKETS = 16
 NORMALIZE_PIECE_NUMBER = 8
@@ -33,7 +33,7 @@ CHANNEL_CHECKERS = 47 + 26
 CHANNEL_MATERIAL_COUNT = 48 + 26
 
 
-def board_to_planes(board, board_occ=0, normalize=True, last_moves=None):
+def board_to_planes(board, board_occ=0, normalize=True, last_moves=None, out=None):
     """
     Gets the plane representation of a given board state.
     (No history of past board positions is used.)
@@ -68,11 +68,14 @@ def board_to_planes(board, board_occ=0, normalize=True, last_moves=None):
     :param board_occ: Sets how often the board state has occurred before (by default 0)
     :param normalize: True if the inputs shall be normalized to the range [0.-1.]
     ;param last_moves: List of last moves played
+    :param out: Optional preallocated buffer (e.g. float32 or int16) to write the planes into
     :return: planes - the plane representation of the current board state
     """
 
     # return the plane representation of the given board
-    planes = default_board_to_planes(board, board_occ, normalize=False, mode=MODE_LICHESS, last_moves=last_moves)
+    planes = get_planes_buffer((CHANNEL_CUSTOM_FEATURES + NB_CHANNELS_FX, BOARD_HEIGHT, BOARD_WIDTH), out)
+    default_board_to_planes(board, board_occ, normalize=False, mode=MODE_LICHESS, last_moves=last_moves,
+                            out=planes[:CHANNEL_CUSTOM_FEATURES])
     # set color info and total move counter to 0
     planes[CHANNEL_COLOR_INFO, :, :] = 0
     planes[CHANNEL_TOTAL_MOVE_COUNTER, :, :] = 0
@@ -80,8 +83,6 @@ def board_to_planes(board, board_occ=0, normalize=True, last_moves=None):
     # mirror all bitboard entries for the black player
     mirror = board.turn == chess.BLACK and board.uci_variant != "racingkings"
 
-    planes_fx = np.zeros((NB_CHANNELS_FX, BOARD_HEIGHT, BOARD_WIDTH))
-    planes = np.concatenate((planes, planes_fx), axis=0)
 
     set_additional_custom_features(planes, board, CHANNEL_CUSTOM_FEATURES, mirror, normalize=False, include_king=True,
                                    channel_piece_mask=CHANNEL_PIECE_MASK, channel_checkerboard=CHANNEL_CHECKERBOARD,
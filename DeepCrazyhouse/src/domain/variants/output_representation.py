@@ -7,16 +7,83 @@ Created on 24.09.18
 Provides all methods to convert a move to policy representation and back
 Loads all needed constants for the Crazyhouse game internally.
 """
+import os
 import chess.variant
 import numpy as np
+from DeepCrazyhouse.src.domain.util import decode_move, encode_move
 from DeepCrazyhouse.src.domain.variants.constants import (
     LABELS,
     LABELS_MIRRORED,
     MV_LOOKUP,
-    MV_LOOKUP_MIRRORED,
     NB_LABELS,
 )
 
+# number of entries of the integer move lookup table (see encode_move(): 18 bits for from, to, promotion and drop)
+NB_MOVE_CODES = 1 << 18
+
+
+def build_move_index_lookup():
+    """
+    Builds a dense lookup table which maps the integer move encoding of encode_move() to the policy index.
+    Moves which aren't part of the policy are mapped to -1.
+
+    :return: Numpy array of shape (2, NB_MOVE_CODES). The first row is used for the non-mirrored policy and the second
+     row for the mirrored policy.
+    """
+    lookup = np.full((2, NB_MOVE_CODES), -1, dtype=np.int16)
+    for mirror, labels in enumerate([LABELS, LABELS_MIRRORED]):
+        for mv_idx, label in enumerate(labels):
+            lookup[mirror, encode_move(chess.Move.from_uci(label))] = mv_idx
+    return lookup
+
+
+def get_move_index_lookup(cache_file: str = None):
+    """
+    Returns the dense move index lookup table (see build_move_index_lookup()).
+    If a cache file is given, the table is loaded from this .npy file or created and saved if it doesn't exist yet.
+    A cached table which doesn't match the current LABELS is rebuilt.
+
+    :param cache_file: Optional path to a .npy file
+    :return: Numpy array of shape (2, NB_MOVE_CODES)
+    """
+    if cache_file is not None and os.path.isfile(cache_file):
+        lookup = np.load(cache_file)
+        label_codes = [encode_move(chess.Move.from_uci(label)) for label in LABELS]
+        if lookup.shape == (2, NB_MOVE_CODES) and np.array_equal(lookup[0, label_codes], np.arange(NB_LABELS)):
+            return lookup
+    lookup = build_move_index_lookup()
+    if cache_file is not None:
+        np.save(cache_file, lookup)
+    return lookup
+
+
+MV_INDEX_LOOKUP = get_move_index_lookup() if LABELS_MIRRORED is not None else None
+
+
+def get_move_codes(mv_list):
+    """
+    Converts a list of python chess moves into a numpy array of their integer encodings (see encode_move())
+    :param mv_list: List of python chess move objects
+    :return: Numpy int32 array
+    """
+    # same bit layout as encode_move(), inlined because this is called for every node expansion
+    return np.array([move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12) |
+                     ((move.drop or 0) << 15) for move in mv_list], dtype=np.int32)
+
+
+def get_move_indices(mv_list, mirror_policy: bool):
+    """
+    Returns the policy indices of all given moves with a single lookup.
+    :param mv_list: List of python chess move objects or a numpy array of integer move encodings
+    :param mirror_policy: Decides if the policy should be mirrored
+    :return: Numpy array of policy indices
+    """
+    move_codes = mv_list if isinstance(mv_list, np.ndarray) else get_move_codes(mv_list)
+    mv_idces = MV_INDEX_LOOKUP[int(mirror_policy)].take(move_codes)
+    if len(mv_idces) > 0 and mv_idces.min() < 0:
+        raise KeyError("The move %s isn't part of the policy" % decode_move(move_codes[int(np.argmin(mv_idces))]))
+    return mv_idces
+
 
 def move_to_policy(move, mirror_policy: bool = False):
     """
@@ -27,12 +94,11 @@ def move_to_policy(move, mirror_policy: bool = False):
     :return: Policy numpy vector in boolean format
     """
 
-    if mirror_policy is True:
-        mv_idx = MV_LOOKUP_MIRRORED[move.uci()]
-    else:
-        mv_idx = MV_LOOKUP[move.uci()]
+    mv_idx = MV_INDEX_LOOKUP[int(mirror_policy is True), encode_move(move)]
+    if mv_idx < 0:
+        raise KeyError(move.uci())
 
-    policy_vec = np.zeros(NB_LABELS, dtype=np.bool)
+    policy_vec = np.zeros(NB_LABELS, dtype=bool)
     # set the bit to 1 at the according move index
     policy_vec[mv_idx] = 1
 
@@ -142,30 +208,15 @@ def set_illegal_moves_to_zero(board: chess.variant.CrazyhouseBoard, policy_vec,
     if nb_legal_moves == 0:
         raise Exception("No legal move is available in the current position.")
 
+    # get the according label indices for all legal moves
+    mv_idces = get_move_indices(legal_moves, board.turn is not chess.WHITE)
+
     # fast routine if only 1 move is available
     if nb_legal_moves == 1:
-
-        move = legal_moves[0]
-
-        # get the according label index for the selected move
-        if board.turn is chess.WHITE:
-            idx = MV_LOOKUP[move.uci()]
-        else:
-            idx = MV_LOOKUP_MIRRORED[move.uci()]
-        policy_vec_out[idx] = 1
-
+        policy_vec_out[mv_idces] = 1
         return policy_vec_out, 1
 
-    # iterate over all legal move and get the move probabilities
-    for move in legal_moves:
-
-        # get the according label index for the selected move
-        if board.turn is chess.WHITE:
-            idx = MV_LOOKUP[move.uci()]
-        else:
-            idx = MV_LOOKUP_MIRRORED[move.uci()]
-
-        policy_vec_out[idx] = policy_vec[idx]
+    policy_vec_out[mv_idces] = policy_vec[mv_idces]
 
     # make sure that the probabilities sum up to 1. again
     if normalize is True:
@@ -185,27 +236,43 @@ def get_probs_of_move_list(policy_vec: np.ndarray, mv_list: [chess.Move], mirror
     :return: p_vec_small - A numpy vector which stores the probabilities for the given move list
     """
 
-    # allocate sufficient memory
-    p_vec_small = np.zeros(len(mv_list), np.float32)
-
-    for mv_idx, move in enumerate(mv_list):
-
-        if mirror_policy is True:
-            # find the according index in the mirrored vector
-            idx = MV_LOOKUP_MIRRORED[move.uci()]
-        else:
-            # use the non-mirrored look-up table instead
-            idx = MV_LOOKUP[move.uci()]
-
-        # set the right prob value
-        p_vec_small[mv_idx] = policy_vec[idx]
+    # gather the probabilities of all moves with a single fancy index
+    p_vec_small = np.asarray(policy_vec)[get_move_indices(mv_list, mirror_policy is True)].astype(np.float32)
 
     if normalize is True:
-        p_vec_small /= sum(p_vec_small)
+        p_vec_small /= p_vec_small.sum()
 
     return p_vec_small
 
 
+def get_probs_of_move_lists(policy_vecs: np.ndarray, mv_lists: list, mirror_policies: list, normalize: bool = True):
+    """
+    Batched version of get_probs_of_move_list() which gathers the sparse policies of a whole batch in one lookup.
+    :param policy_vecs: Policy predictions of shape (batch_size, NB_LABELS)
+    :param mv_lists: List of legal move lists (or integer move encodings) for each batch entry
+    :param mirror_policies: List of booleans which decide if the policy of the batch entry shall be mirrored
+    :param normalize: True, if the probabilities should be normalized for each batch entry
+    :return: List of numpy vectors which store the probabilities for the given move lists
+    """
+    move_codes = [mv_list if isinstance(mv_list, np.ndarray) else get_move_codes(mv_list) for mv_list in mv_lists]
+    lengths = np.array([len(codes) for codes in move_codes])
+    batch_idces = np.repeat(np.arange(len(move_codes)), lengths)
+    mirror_idces = np.repeat(np.array(mirror_policies, dtype=np.int32), lengths)
+    mv_idces = MV_INDEX_LOOKUP[mirror_idces, np.concatenate(move_codes)]
+    if len(mv_idces) > 0 and mv_idces.min() < 0:
+        raise KeyError("A move isn't part of the policy")
+
+    p_vec_flat = np.asarray(policy_vecs)[batch_idces, mv_idces].astype(np.float32)
+    offsets = np.cumsum(lengths)[:-1]
+    if normalize is True and len(p_vec_flat) > 0:
+        # reduceat() requires valid start indices, which is only the case for non-empty move lists
+        non_empty = lengths > 0
+        sums = np.ones(len(lengths), np.float32)
+        sums[non_empty] = np.add.reduceat(p_vec_flat, np.concatenate([[0], offsets])[non_empty])
+        p_vec_flat /= np.repeat(sums, lengths)
+    return np.split(p_vec_flat, offsets)
+
+
 def value_to_centipawn(value):
     """
     Converts a value in A0-notation to roughly a centi-pawn loss
@@ -200,7 +200,7 @@ def get_plane_index_from_move(move) -> [int, int, int]:
     movement_vector = get_movement_vector(move)
     from_row, from_col = get_row_col(move.from_square)
 
-    absolute_movement_vector = np.abs(movement_vector)
+    absolute_movement_vector = [abs(offset) for offset in movement_vector]
     # a knight move can be identified by its special movement behaviour
     # only the knight has a '1' and a '2' in its movement vector
     is_knight_move = (min(absolute_movement_vector) == 1) and (max(absolute_movement_vector) == 2)
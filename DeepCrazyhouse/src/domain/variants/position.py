@@ -0,0 +1,199 @@
+"""
+@file: position.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Lightweight search position with make/unmake of moves and an incrementally updated Zobrist hash.
+
+The position wraps a single python-chess board which keeps the bitboards, pockets, side to move and move counters.
+Instead of copying the board for every new position, the search applies the moves of its path with make() and
+reverts them with unmake(). The Zobrist hash of the position is updated from the squares, pockets and flags that
+changed by the move, so that a search node only needs to store the hash to identify its position.
+"""
+from collections import Counter
+from functools import lru_cache
+import chess
+import numpy as np
+
+ZOBRIST_SEED = 42
+_rng = np.random.default_rng(ZOBRIST_SEED)
+# keys for each color, piece type (index 0 is unused) and square
+PIECE_KEYS = _rng.integers(0, 2 ** 64, (2, 7, 64), dtype=np.uint64).tolist()
+# keys for promoted pieces in crazyhouse which turn back into pawns when they are captured
+PROMOTED_KEYS = _rng.integers(0, 2 ** 64, 64, dtype=np.uint64).tolist()
+# keys for each color, piece type and number of pieces in the pocket
+POCKET_KEYS = _rng.integers(0, 2 ** 64, (2, 7, 65), dtype=np.uint64).tolist()
+# keys for each color and number of remaining checks in three-check
+REMAINING_CHECKS_KEYS = _rng.integers(0, 2 ** 64, (2, 4), dtype=np.uint64).tolist()
+CASTLING_KEYS = _rng.integers(0, 2 ** 64, 64, dtype=np.uint64).tolist()
+EP_KEYS = _rng.integers(0, 2 ** 64, 64, dtype=np.uint64).tolist()
+TURN_KEY = int(_rng.integers(0, 2 ** 64, dtype=np.uint64))
+POCKET_PIECE_TYPES = [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]
+
+
+@lru_cache(maxsize=256)
+def _get_castling_key(castling_rights: int) -> int:
+    """ Returns the combined key of all rook squares with castling rights"""
+    key = 0
+    for square in chess.scan_forward(castling_rights):
+        key ^= CASTLING_KEYS[square]
+    return key
+
+
+def _get_bitboards(board: chess.Board) -> tuple:
+    """ Returns the piece bitboards (pawns to kings) followed by the white occupancy"""
+    return (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            board.occupied_co[chess.WHITE])
+
+
+def _get_piece_key(bitboards: tuple, square: int) -> int:
+    """
+    Returns the key of the piece on the given square
+    :param bitboards: Bitboards of _get_bitboards()
+    :param square: Square index
+    :return: Zobrist key or 0 for an empty square
+    """
+    mask = chess.BB_SQUARES[square]
+    for piece_type in chess.PIECE_TYPES:
+        if bitboards[piece_type - 1] & mask:
+            return PIECE_KEYS[1 if bitboards[6] & mask else 0][piece_type][square]
+    return 0
+
+
+def _get_ep_key(board: chess.Board) -> int:
+    """
+    Returns the key of the en-passant square if a pawn of the side to move can capture on it.
+    Python-chess sets the en-passant square after every double pawn push, which would distinguish transpositions.
+    """
+    ep_square = board.ep_square
+    if ep_square is not None and board.pawns & board.occupied_co[board.turn] & \
+            chess.BB_PAWN_ATTACKS[not board.turn][ep_square]:
+        return EP_KEYS[ep_square]
+    return 0
+
+
+def _get_pocket_counts(board: chess.Board, color: chess.Color):
+    """ Returns the number of pieces of each type in the pocket of the given color or None for boards without pockets"""
+    if not hasattr(board, "pockets"):
+        return None
+    pocket = board.pockets[color]
+    return [pocket.count(piece_type) for piece_type in POCKET_PIECE_TYPES]
+
+
+def compute_hash(board: chess.Board) -> int:
+    """
+    Computes the Zobrist hash of a board from scratch. The move counters aren't part of the hash.
+    :param board: Python-chess board of any supported variant
+    :return: 64 bit hash value
+    """
+    bitboards = _get_bitboards(board)
+    key = 0
+    for square in chess.scan_forward(board.occupied):
+        key ^= _get_piece_key(bitboards, square)
+    for square in chess.scan_forward(board.promoted):
+        key ^= PROMOTED_KEYS[square]
+    key ^= _get_castling_key(board.castling_rights) ^ _get_ep_key(board)
+    if board.turn == chess.BLACK:
+        key ^= TURN_KEY
+    for color in chess.COLORS:
+        pocket_counts = _get_pocket_counts(board, color)
+        if pocket_counts is not None:
+            for piece_type, count in zip(POCKET_PIECE_TYPES, pocket_counts):
+                key ^= POCKET_KEYS[color][piece_type][count]
+        if hasattr(board, "remaining_checks"):
+            key ^= REMAINING_CHECKS_KEYS[color][board.remaining_checks[color]]
+    return key
+
+
+class Position:
+    """Python-chess board with make/unmake of moves and an incremental Zobrist hash"""
+
+    def __init__(self, board: chess.Board, zobrist_hash=None):
+        """
+        Constructor
+        :param board: Python-chess board which is modified by make() and unmake()
+        :param zobrist_hash: Hash of the board if it's already known
+        """
+        self.board = board
+        self.hash = compute_hash(board) if zobrist_hash is None else zobrist_hash
+        self._hash_stack = []  # hashes of all earlier positions which have been left by make()
+        self._hash_counts = Counter()  # number of occurrences of each hash on the stack
+
+    def refresh(self):
+        """ Recomputes the hash after the board has been modified directly, e.g. by set_fen() or reset()"""
+        self.hash = compute_hash(self.board)
+        self._hash_stack = []
+        self._hash_counts = Counter()
+
+    def copy(self, stack=True):
+        """
+        Returns an independent copy of the position
+        :param stack: True, if the move stack of the board shall be copied as well (see chess.Board.copy())
+        :return: Position
+        """
+        return Position(self.board.copy(stack=stack), self.hash)
+
+    def make(self, move: chess.Move):
+        """
+        Applies the move on the board and updates the hash by the squares, pockets and flags which have changed
+        :param move: Legal move in the current position
+        :return:
+        """
+        board = self.board
+        turn = board.turn
+        bitboards = _get_bitboards(board)
+        occupied_black = board.occupied_co[chess.BLACK]
+        promoted = board.promoted
+        castling_rights = board.castling_rights
+        ep_key = _get_ep_key(board)
+        pocket_counts = _get_pocket_counts(board, turn)  # only the pocket of the moving side can change
+        remaining_checks = tuple(board.remaining_checks) if hasattr(board, "remaining_checks") else None
+
+        board.push(move)
+
+        new_bitboards = _get_bitboards(board)
+        key = self.hash ^ TURN_KEY ^ ep_key ^ _get_ep_key(board)
+        changed = occupied_black ^ board.occupied_co[chess.BLACK]
+        for old_bitboard, new_bitboard in zip(bitboards, new_bitboards):
+            changed |= old_bitboard ^ new_bitboard
+        for square in chess.scan_forward(changed):
+            key ^= _get_piece_key(bitboards, square) ^ _get_piece_key(new_bitboards, square)
+        for square in chess.scan_forward(promoted ^ board.promoted):
+            key ^= PROMOTED_KEYS[square]
+        if castling_rights != board.castling_rights:
+            key ^= _get_castling_key(castling_rights) ^ _get_castling_key(board.castling_rights)
+        if pocket_counts is not None:
+            for piece_type, count, new_count in zip(POCKET_PIECE_TYPES, pocket_counts,
+                                                    _get_pocket_counts(board, turn)):
+                if count != new_count:
+                    key ^= POCKET_KEYS[turn][piece_type][count] ^ POCKET_KEYS[turn][piece_type][new_count]
+        if remaining_checks is not None:
+            for color in chess.COLORS:
+                if remaining_checks[color] != board.remaining_checks[color]:
+                    key ^= REMAINING_CHECKS_KEYS[color][remaining_checks[color]] ^ \
+                           REMAINING_CHECKS_KEYS[color][board.remaining_checks[color]]
+        self._hash_stack.append(self.hash)
+        self._hash_counts[self.hash] += 1
+        self.hash = key
+
+    def unmake(self) -> chess.Move:
+        """
+        Reverts the last move which was applied by make()
+        :return: The reverted move
+        """
+        self.hash = self._hash_stack.pop()
+        self._hash_counts[self.hash] -= 1
+        return self.board.pop()
+
+    def count(self, zobrist_hash=None) -> int:
+        """
+        Returns how often a position occurred before the current position since the creation of this object
+        :param zobrist_hash: Hash of the position, by default the current position
+        :return: Number of occurrences on the hash stack
+        """
+        return self._hash_counts[self.hash if zobrist_hash is None else zobrist_hash]
+
+    def get_history(self) -> Counter:
+        """ Returns the number of occurrences of all earlier positions as a new Counter object"""
+        return +self._hash_counts
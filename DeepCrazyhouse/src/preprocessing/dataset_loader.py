@@ -13,6 +13,7 @@ import zarr
 from DeepCrazyhouse.configs.main_config import main_config
 from DeepCrazyhouse.src.domain.util import get_numpy_arrays, get_x_y_and_indices
 from DeepCrazyhouse.src.domain.variants.input_representation import MATRIX_NORMALIZER
+from DeepCrazyhouse.src.preprocessing.shard_format import open_shard
 
 
 def _load_dataset_file(dataset_filepath):
@@ -34,9 +35,21 @@ def _load_dataset_file(dataset_filepath):
     return get_numpy_arrays(zarr.group(store=zarr.ZipStore(dataset_filepath, mode="r")))
 
 
+def load_dataset_file(dataset_filepath: str) -> dict:
+    """
+    Loads a single dataset file, e.g. for the calibration or evaluation of a network
+    :param dataset_filepath: Path of a .zip (zarr) or a memory mappable .shard dataset file
+    :return: pgn_dataset_arrays_dict: dict of {specific dataset part: numpy-array} (see _load_dataset_file()).
+     The input planes x aren't normalized.
+    """
+    if dataset_filepath.endswith(".shard"):
+        return open_shard(dataset_filepath)
+    return _load_dataset_file(dataset_filepath)
+
+
 def load_pgn_dataset(
-    dataset_type="train", part_id=0, verbose=True, normalize=False, q_value_ratio=0, phase=None
-):
+    dataset_type="train", part_id=0, verbose=True, normalize=False, q_value_ratio=0, phase=None, memory_map=False
+):  # Too many arguments (7/5)
     """
     Loads one part of the pgn dataset in form of planes / multidimensional numpy array.
     It reads all files which are located either in the main_config['test_dir'] or main_config['test_dir']
@@ -49,6 +62,9 @@ def load_pgn_dataset(
     :param q_value_ratio: Ratio for mixing the value return with the corresponding q-value
     :param phase: if specified use planes dataset of this phase. If None, the phase specified in main_config is used
     For a ratio of 0 no q-value information will be used. Value must be in [0, 1]
+    :param memory_map: If True, the .shard files (see shard_format.py) of the directory are memory mapped instead of
+     decompressing the .zip files. The arrays are only read from disk when they are accessed. Use normalize=False to
+     keep x as a zero-copy int16 memory map and normalize each batch instead.
     :return: pgn_dataset_arrays_dict: dict of {specific dataset part: numpy-array} with the following keys
             start_indices - defines the index where each game starts
             x - the board representation for all games
@@ -56,17 +72,18 @@ def load_pgn_dataset(
             y_policy - the movement policy for the next_move played
             plys_to_end - array of how many plys to the end of the game for each position.
              This can be used to apply discounting
-            pgn_datasets - the dataset file handle (you can use .tree() to show the file structure)
+            pgn_datasets - the dataset file handle (you can use .tree() to show the file structure),
+             None for memory mapped shards
             phase_vector - array of the game phase of each position
     """
-
+    file_extension = "*.shard" if memory_map else "*.zip"
     if dataset_type in ["train", "val", "test", "mate_in_one"]:
         if phase is None:
-            zarr_filepaths = glob.glob(main_config[f"planes_{dataset_type}_dir"] + "**/*.zip")
+            zarr_filepaths = glob.glob(main_config[f"planes_{dataset_type}_dir"] + "**/" + file_extension)
         else:
             zarr_filepaths = glob.glob(main_config["default_dir"] +
                                        f"planes/{main_config['phase_definition']}/phase{phase}/{dataset_type}/" +
-                                       "**/*.zip")
+                                       "**/" + file_extension)
     else:
         raise Exception(
             'Invalid dataset type "%s" given. It must be either "train", "val", "test" or "mate_in_one"' % dataset_type
@@ -82,9 +99,13 @@ def load_pgn_dataset(
         logging.debug("loading: %s ...", pgn_datasets[part_id])
         logging.debug("")
 
-    pgn_dataset = zarr.group(store=zarr.ZipStore(pgn_datasets[part_id], mode="r"))
-    # Get the data
-    pgn_dataset_arrays_dict = get_numpy_arrays(pgn_dataset)
+    if memory_map:
+        pgn_dataset = None
+        pgn_dataset_arrays_dict = open_shard(pgn_datasets[part_id])
+    else:
+        pgn_dataset = zarr.group(store=zarr.ZipStore(pgn_datasets[part_id], mode="r"))
+        # Get the data
+        pgn_dataset_arrays_dict = get_numpy_arrays(pgn_dataset)
     start_indices = pgn_dataset_arrays_dict["start_indices"]
     x = pgn_dataset_arrays_dict["x"]
     y_value = pgn_dataset_arrays_dict["y_value"]
@@ -93,7 +114,7 @@ def load_pgn_dataset(
     y_best_move_q = pgn_dataset_arrays_dict["y_best_move_q"]
     phase_vector = pgn_dataset_arrays_dict["phase_vector"]
 
-    if verbose:
+    if verbose and pgn_dataset is not None:
         logging.info("STATISTICS:")
         try:
             for member in pgn_dataset["statistics"]:
@@ -115,7 +136,8 @@ def load_pgn_dataset(
         x = x.astype(np.float32)
         # the y-vectors need to be casted as well in order to be accepted by the network
         y_value = y_value.astype(np.float32)
-        y_policy = y_policy.astype(np.float32)
+        if y_policy.ndim == 2:  # sparse move indices of memory mapped shards stay integers
+            y_policy = y_policy.astype(np.float32)
         # apply rescaling using a predefined scaling constant (this makes use of vectorized operations)
         x *= MATRIX_NORMALIZER
 
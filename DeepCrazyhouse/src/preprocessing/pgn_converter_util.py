@@ -12,7 +12,7 @@ import logging
 import chess.pgn
 from DeepCrazyhouse.src.domain.variants.constants import NB_LAST_MOVES
 from DeepCrazyhouse.src.domain.variants.output_representation import move_to_policy
-from DeepCrazyhouse.src.domain.variants.input_representation import board_to_planes
+from DeepCrazyhouse.src.domain.variants.input_representation import boards_to_planes
 from DeepCrazyhouse.configs.main_config import main_config
 from DeepCrazyhouse.src.domain.variants.game_state import mirror_policy
 from DeepCrazyhouse.src.preprocessing.game_phase_detector import get_game_phase
@@ -91,7 +91,9 @@ def get_planes_from_move_sequence(board: chess.Board, y_init, all_moves, mate_in
     """
 
     fen_dic = {}  # A dictionary which maps the fen description to its number of occurrences
-    x = []
+    boards = []  # board states which are exported (without move stack)
+    board_occs = []
+    last_moves_list = []
     y_value = []
     y_policy = []
     plys_to_end = []  # save the number of plys until the end of the game for each position that was considered
@@ -129,13 +131,10 @@ def get_planes_from_move_sequence(board: chess.Board, y_init, all_moves, mate_in
                 if plys != 0:
                     last_moves[0:min(plys, NB_LAST_MOVES)] = all_moves[max(plys-NB_LAST_MOVES, 0):plys][::-1]
 
-                # receive the board and the evaluation of the current position in plane representation
-                # We don't want to store float values because the integer datatype is cheaper,
-                #  that's why normalize is set to false
-                x_cur = board_to_planes(board, board_occ, normalize=False, mode=main_config["mode"], last_moves=last_moves)
-
-                # add the evaluation of 1 position to the list
-                x.append(x_cur)
+                # remember the board state, it is converted to plane representation after the game has been replayed
+                boards.append(board.copy(stack=False))
+                board_occs.append(board_occ)
+                last_moves_list.append(last_moves)
                 y_value.append(y_init)
                 # add the next move defined in policy vector notation to the policy list
                 # the network always sees the board as if he's the white player, that's the move is mirrored fro black
@@ -147,9 +146,13 @@ def get_planes_from_move_sequence(board: chess.Board, y_init, all_moves, mate_in
         y_init *= -1  # flip the y_init value after each move
         board.push(move)  # push the next move on the board
 
+    x = []
     # check if there has been any moves and stack the lists
-    if x and y_value and y_policy:
-        x = np.stack(x, axis=0)
+    if boards and y_value and y_policy:
+        # encode all positions of the game into one array
+        # We don't want to store float values because the integer datatype is cheaper,
+        #  that's why normalize is set to false
+        x = boards_to_planes(boards, board_occs, normalize=False, mode=main_config["mode"], last_moves=last_moves_list)
         y_value = np.stack(y_value, axis=0)
         y_policy = np.stack(y_policy, axis=0)
 
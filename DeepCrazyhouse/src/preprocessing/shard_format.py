@@ -0,0 +1,132 @@
+"""
+@file: shard_format.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Flat, uncompressed training shard format which can be memory mapped without decompression or copying.
+
+Layout of a .shard file:
+    bytes 0-7   magic number b"CRZSHRD1"
+    bytes 8-15  header length in bytes (little endian uint64)
+    bytes 16-   JSON header {"arrays": {name: {"dtype": ..., "shape": [...], "offset": ...}}}
+The arrays follow the header in C order. Every array starts at a multiple of SHARD_ALIGNMENT bytes, so that each array
+begins on its own memory page.
+
+Usage: python shard_format.py --input-dir /data/planes/train/ --output-dir /data/shards/train/
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import numpy as np
+import zarr
+
+sys.path.append("../../../")
+from DeepCrazyhouse.src.domain.util import get_numpy_arrays
+
+SHARD_MAGIC = b"CRZSHRD1"
+SHARD_ALIGNMENT = 4096
+SHARD_ARRAYS = ["start_indices", "x", "y_value", "y_policy", "plys_to_end", "y_best_move_q", "phase_vector"]
+
+
+def _align(offset: int) -> int:
+    return -(-offset // SHARD_ALIGNMENT) * SHARD_ALIGNMENT
+
+
+def write_shard(filepath: str, arrays: dict):
+    """
+    Writes the given numpy arrays into a single shard file
+    :param filepath: Path of the shard file to create
+    :param arrays: Dictionary of {name: numpy array}. Entries which are None are skipped.
+    :return:
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items() if array is not None}
+    descriptors = {name: {"dtype": array.dtype.str, "shape": list(array.shape)} for name, array in arrays.items()}
+
+    # the header size depends on the offsets, so the offsets are computed for an upper bound of the header size
+    header_size = len(json.dumps({"arrays": descriptors})) + 32 * len(arrays) + 64
+    offset = _align(16 + header_size)
+    for name, array in arrays.items():
+        descriptors[name]["offset"] = offset
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({"arrays": descriptors}).encode("ascii")
+
+    with open(filepath, "wb") as file:
+        file.write(SHARD_MAGIC)
+        file.write(np.uint64(len(header)).tobytes())
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(descriptors[name]["offset"])
+            array.tofile(file)
+        file.truncate(offset)
+
+
+def read_shard_header(filepath: str) -> dict:
+    """
+    Reads the array descriptors of a shard file
+    :param filepath: Path of the shard file
+    :return: Dictionary of {name: {"dtype": ..., "shape": [...], "offset": ...}}
+    """
+    with open(filepath, "rb") as file:
+        if file.read(8) != SHARD_MAGIC:
+            raise Exception("The file %s is not a valid shard file" % filepath)
+        header_length = int(np.frombuffer(file.read(8), np.uint64)[0])
+        return json.loads(file.read(header_length).decode("ascii"))["arrays"]
+
+
+def open_shard(filepath: str, mode="c") -> dict:
+    """
+    Memory maps all arrays of a shard file. Nothing is read from disk until the arrays are accessed.
+    :param filepath: Path of the shard file
+    :param mode: Memory map mode. The default "c" (copy-on-write) returns writable arrays, which can be wrapped by
+     torch.from_numpy() without copying, while the file itself is never modified.
+    :return: Dictionary of {name: numpy.memmap}. Arrays which aren't part of the shard are set to None.
+    """
+    arrays = dict.fromkeys(SHARD_ARRAYS)
+    for name, descriptor in read_shard_header(filepath).items():
+        arrays[name] = np.memmap(filepath, dtype=np.dtype(descriptor["dtype"]), mode=mode,
+                                 offset=descriptor["offset"], shape=tuple(descriptor["shape"]))
+    return arrays
+
+
+def convert_zarr_to_shard(zarr_filepath: str, shard_filepath: str, sparse_policy=True):
+    """
+    Converts a single zarr dataset file into the shard format
+    :param zarr_filepath: Path of the .zip dataset file
+    :param shard_filepath: Path of the .shard file to create
+    :param sparse_policy: If True, one-hot encoded policy targets are stored as int16 move indices of shape (N,)
+     instead of (N, NB_LABELS). Policy distributions (e.g. from selfplay) are always kept.
+    :return: Number of positions in the shard
+    """
+    arrays = get_numpy_arrays(zarr.group(store=zarr.ZipStore(zarr_filepath, mode="r")))
+    arrays["x"] = arrays["x"].astype(np.int16, copy=False)
+    y_policy = arrays["y_policy"]
+    if sparse_policy and y_policy.ndim == 2:
+        policy_idces = y_policy.argmax(axis=1)
+        if np.array_equal(y_policy.sum(axis=1), np.ones(len(y_policy))) and \
+                (y_policy[np.arange(len(y_policy)), policy_idces] == 1).all():
+            arrays["y_policy"] = policy_idces.astype(np.int16)
+    write_shard(shard_filepath, arrays)
+    return len(arrays["x"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converts zarr dataset files into memory mappable shard files")
+    parser.add_argument("--input-dir", type=str, required=True, help="Directory containing the .zip dataset files")
+    parser.add_argument("--output-dir", type=str, required=True, help="Directory for the .shard files")
+    parser.add_argument("--dense-policy", action="store_true", help="Keep one-hot policy targets as dense vectors")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for zarr_filepath in sorted(glob.glob(os.path.join(args.input_dir, "**/*.zip"), recursive=True)):
+        shard_filepath = os.path.join(args.output_dir, os.path.basename(zarr_filepath).replace(".zip", ".shard"))
+        nb_positions = convert_zarr_to_shard(zarr_filepath, shard_filepath, not args.dense_policy)
+        logging.info("%s: %d positions", shard_filepath, nb_positions)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,351 @@
+"""
+@file: streaming_pgn_converter.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Streaming conversion of pgn files into plane representation dataset parts with bounded memory.
+
+In contrast to PGN2PlanesConverter the pgn file is never loaded as a whole: It is split at game boundaries into chunks
+of byte offsets. A persistent worker pool reads, filters and encodes the games of each chunk and returns the
+concatenated arrays of the chunk in a shared memory block, so that the planes don't have to be pickled. The main
+process copies the chunks into the current part and writes the part as soon as it holds nb_games_per_file games.
+The number of chunks in flight is bounded, so that the peak memory doesn't depend on the size of the pgn file.
+
+Usage: python streaming_pgn_converter.py --input-dir /data/pgn/train/ --output-dir /data/planes/train/ --processes 8
+"""
+import argparse
+import datetime
+import glob
+import io
+import logging
+import os
+import re
+import sys
+from multiprocessing import Pool, cpu_count, resource_tracker, shared_memory
+from threading import Semaphore
+from time import time
+import chess.pgn
+import numpy as np
+import zarr
+from numcodecs import Blosc
+
+sys.path.append("../../../")
+from DeepCrazyhouse.src.preprocessing.pgn_converter_util import NB_ITEMS_METADATA, get_planes_from_pgn
+from DeepCrazyhouse.src.preprocessing.pgn_to_planes_converter import export_main_data
+from DeepCrazyhouse.src.preprocessing.shard_format import write_shard
+
+GAME_START = b"[Event "
+# the arrays which every worker writes into the shared memory block of its chunk (in this order)
+CHUNK_ARRAYS = ["metadata", "game_lengths", "results", "x", "y_value", "y_policy", "plys_to_end", "phase_vector"]
+# game results as stored in the "results" array of a chunk
+RESULTS = {"1-0": 0, "0-1": 1, "1/2-1/2": 2}
+
+
+def split_pgn_file(filepath: str, chunk_size: int):
+    """
+    Splits a pgn file into chunks of roughly chunk_size bytes. Every chunk starts at the beginning of a game.
+    Only a small window around each split point is read.
+    :param filepath: Path of the pgn file
+    :param chunk_size: Approximate size of a chunk in bytes
+    :return: List of (start, end) byte offsets
+    """
+    file_size = os.path.getsize(filepath)
+    offsets = [0]
+    with open(filepath, "rb") as file:
+        while offsets[-1] + chunk_size < file_size:
+            file.seek(offsets[-1] + chunk_size)
+            file.readline()  # skip the rest of a partially read line
+            offset = None
+            while offset is None:
+                pos = file.tell()
+                line = file.readline()
+                if not line:
+                    offset = file_size
+                elif line.startswith(GAME_START):
+                    offset = pos
+            offsets.append(offset)
+    if offsets[-1] != file_size:
+        offsets.append(file_size)
+    return [(start, end) for start, end in zip(offsets[:-1], offsets[1:]) if end > start]
+
+
+def is_game_selected(game: str, headers, min_elo_both: dict, termination_conditions: list, use_all_games: bool,
+                     mate_in_one: bool, min_number_moves: int):  # Too many arguments (7/5)
+    """
+    Checks if a game fulfills the given conditions (see PGN2PlanesConverter for a description of the conditions)
+    :param game: Pgn text of the game
+    :param headers: Headers of the game
+    :param min_elo_both: Dictionary of the minimum elo of both players for each variant
+    :param termination_conditions: One of the termination conditions must be part of the termination header
+    :param use_all_games: If True, only unfinished games and games without the minimum number of moves are skipped
+    :param mate_in_one: If True, only games which ended in a checkmate are selected
+    :param min_number_moves: Minimum of number of moves which have to be played in a game to be selected
+    :return: True, if the game shall be converted
+    """
+    mv_hist_start = game.find("1. ")
+    if mv_hist_start == -1 or game.find(f"{min_number_moves:d}. ") == -1 or headers.get("Result") not in RESULTS:
+        return False
+    # look for a move with a "#" suffix, because an event name or an annotation might contain "#" as well
+    if mate_in_one and not re.search(r"\S#", game[mv_hist_start:]):
+        return False
+    if use_all_games:
+        return True
+    min_elo = min_elo_both.get(headers.get("Variant"), min_elo_both.get("Chess"))
+    white_elo, black_elo = headers.get("WhiteElo", "?"), headers.get("BlackElo", "?")
+    if white_elo == "?" or black_elo == "?" or int(white_elo) < min_elo or int(black_elo) < min_elo:
+        return False
+    cur_term_cond = headers.get("Termination", "Normal")
+    return any(term_cond in cur_term_cond for term_cond in termination_conditions)
+
+
+def convert_chunk(params):
+    """
+    Reads, filters and encodes all games of a chunk of a pgn file. This function is executed in the worker processes.
+    :param params: (pgn_filepath, start, end, filter_kwargs), see is_game_selected() for the filter arguments
+    :return: shm_name, layout, header_row - Name of the shared memory block (None if no game was selected),
+     list of (name, dtype, shape, offset) for each array of CHUNK_ARRAYS and the metadata keys of the first game
+    """
+    pgn_filepath, start, end, filter_kwargs = params
+    with open(pgn_filepath, "rb") as file:
+        file.seek(start)
+        content = file.read(end - start).decode("utf-8", "ignore")
+
+    games = {name: [] for name in CHUNK_ARRAYS}
+    header_row = None
+    for game in content.split(GAME_START.decode())[1:]:
+        game = GAME_START.decode() + game
+        headers = chess.pgn.read_headers(io.StringIO(game))
+        if headers is None or not is_game_selected(game, headers, **filter_kwargs):
+            continue
+        # 2019-09-28: fix for chess960 because in the default position lichess denotes FEN as "?"
+        game = game.replace('[FEN "?"]', '[FEN "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"]')
+        # a game index of 0 would add a row of header keys to the metadata of each game
+        metadata, _, x, y_value, y_policy, plys_to_end, phase_vector = get_planes_from_pgn(
+            (io.StringIO(game), 1, filter_kwargs["mate_in_one"]))
+        if len(y_value) == 0:  # only add games that had at least one valid move
+            continue
+        if header_row is None:
+            header_row = [key.encode("ascii", "ignore") for key in list(headers)[:NB_ITEMS_METADATA]]
+        for name, array in zip(CHUNK_ARRAYS, [metadata, [len(y_value)], [RESULTS[headers["Result"]]], x, y_value,
+                                              y_policy, plys_to_end, phase_vector]):
+            games[name].append(np.asarray(array))
+
+    if header_row is None:
+        return None, None, None
+    arrays = [np.concatenate(games[name]) for name in CHUNK_ARRAYS]
+    arrays[CHUNK_ARRAYS.index("x")] = arrays[CHUNK_ARRAYS.index("x")].astype(np.int16, copy=False)
+    layout = []
+    offset = 0
+    for name, array in zip(CHUNK_ARRAYS, arrays):
+        layout.append((name, array.dtype.str, array.shape, offset))
+        offset += -(-array.nbytes // 8) * 8
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (_, _, _, offset), array in zip(layout, arrays):
+        np.ndarray(array.shape, array.dtype, buffer=shm.buf, offset=offset)[...] = array
+    shm_name = shm.name
+    shm.close()
+    # the main process attaches to the block and unlinks it, so the worker must not track it
+    resource_tracker.unregister(shm._name, "shared_memory")  # pylint: disable=protected-access
+    return shm_name, layout, header_row
+
+
+def _receive_chunk(shm_name, layout):
+    """
+    Copies the arrays of a chunk out of its shared memory block and releases the block
+    :param shm_name: Name of the shared memory block
+    :param layout: Array layout of convert_chunk()
+    :return: Dictionary of {name: numpy array}
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return {name: np.ndarray(shape, np.dtype(dtype), buffer=shm.buf, offset=offset).copy()
+                for name, dtype, shape, offset in layout}
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class StreamingPGNConverter:
+    """
+    Converts pgn files into dataset parts (zarr .zip files or memory mappable .shard files) with a persistent worker
+    pool and bounded memory.
+    """
+
+    def __init__(self, nb_games_per_file=1000, max_nb_files=0, min_elo_both=None, termination_conditions=None,
+                 use_all_games=False, mate_in_one=False, min_number_moves=5, processes=None, chunk_size=2 ** 20,
+                 compression="lz4", clevel=5, use_shards=False):  # Too many arguments (12/5)
+        """
+        Constructor
+        :param nb_games_per_file: Number of selected games which are exported in one part
+        :param max_nb_files: Maximum number of parts to create per pgn file (if 0 convert all games)
+        :param min_elo_both: Dictionary for each variant to only select games in which both players have at least
+         this elo rating. (default: min_elo_both = {"Crazyhouse": 2000})
+        :param termination_conditions: only select games in which one of the given termination conditions is hold
+        :param use_all_games: If True, the elo and termination conditions are ignored
+        :param mate_in_one: If True, only games which ended in a checkmate are selected
+        :param min_number_moves: Minimum of number of moves which have to be played in a game to be selected
+        :param processes: Number of worker processes (if None os.cpu_count() is used)
+        :param chunk_size: Approximate size in bytes of the pgn chunks which are sent to the workers
+        :param compression: Blosc compressor of the zarr export
+        :param clevel: Compression level of the zarr export
+        :param use_shards: If True, the parts are written in the uncompressed shard format instead of zarr
+        """
+        self.nb_games_per_file = nb_games_per_file
+        self.max_nb_files = max_nb_files
+        self.filter_kwargs = {
+            "min_elo_both": {"Crazyhouse": 2000} if min_elo_both is None else min_elo_both,
+            "termination_conditions": ["Normal"] if termination_conditions is None else termination_conditions,
+            "use_all_games": use_all_games,
+            "mate_in_one": mate_in_one,
+            "min_number_moves": min_number_moves,
+        }
+        self.processes = cpu_count() if processes is None else processes
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.clevel = clevel
+        self.use_shards = use_shards
+
+    def convert_all_pgns(self, import_dir: str, export_dir: str):
+        """
+        Converts all pgn files of the import directory into a timestamp sub-directory of the export directory
+        :param import_dir: Directory containing the pgn files
+        :param export_dir: Directory for the dataset parts
+        :return: Total number of exported games
+        """
+        timestmp = datetime.datetime.fromtimestamp(time()).strftime("%Y-%m-%d-%H-%M-%S")
+        timestmp_dir = os.path.join(export_dir, timestmp)
+        os.makedirs(timestmp_dir, exist_ok=True)
+        total_games_exported = 0
+        with Pool(processes=self.processes) as pool:
+            for pgn_filepath in sorted(glob.glob(os.path.join(import_dir, "*.pgn"))):
+                total_games_exported += self.convert_pgn(pgn_filepath, timestmp_dir, pool)
+                logging.info("Total Games Exported: %d", total_games_exported)
+        return total_games_exported
+
+    def convert_pgn(self, pgn_filepath: str, export_dir: str, pool=None):
+        """
+        Converts a single pgn file into dataset parts. The games of a part are in the order in which the workers
+        finished their chunks.
+        :param pgn_filepath: Path of the pgn file
+        :param export_dir: Directory for the dataset parts
+        :param pool: Optional worker pool which is reused across pgn files
+        :return: Number of exported games
+        """
+        if pool is None:
+            with Pool(processes=self.processes) as own_pool:
+                return self.convert_pgn(pgn_filepath, export_dir, own_pool)
+
+        logging.info("PGN-Name: %s", pgn_filepath)
+        os.makedirs(export_dir, exist_ok=True)
+        t_start = time()
+        chunks = split_pgn_file(pgn_filepath, self.chunk_size)
+        # the task generator is consumed by the task handler thread of the pool, the semaphore blocks it as soon as
+        # 2 * processes chunks wait to be received
+        in_flight = Semaphore(2 * self.processes)
+        stop = []
+
+        def tasks():
+            for start, end in chunks:
+                in_flight.acquire()
+                if stop:
+                    return
+                yield pgn_filepath, start, end, self.filter_kwargs
+
+        part = []
+        nb_parts = nb_games_exported = 0
+        results = pool.imap_unordered(convert_chunk, tasks())
+        try:
+            for shm_name, layout, header_row in results:
+                in_flight.release()
+                if shm_name is None:
+                    continue
+                part.append((_receive_chunk(shm_name, layout), header_row))
+                if sum(len(chunk["game_lengths"]) for chunk, _ in part) >= self.nb_games_per_file:
+                    nb_games_exported += self._export_part(part, pgn_filepath, export_dir, nb_parts)
+                    nb_parts += 1
+                    part = []
+                    if nb_parts == self.max_nb_files:
+                        break
+            if part:
+                nb_games_exported += self._export_part(part, pgn_filepath, export_dir, nb_parts)
+        finally:
+            # after an early exit, stop the task generator and release the blocks of the chunks which are in flight
+            stop.append(True)
+            in_flight.release()
+            while True:
+                try:
+                    shm_name, layout, _ = results.next()
+                except StopIteration:
+                    break
+                except Exception:  # pylint: disable=broad-except
+                    continue  # the error of a failed chunk has already been raised or isn't of interest anymore
+                if shm_name is not None:
+                    _receive_chunk(shm_name, layout)
+        logging.info("%s: exported %d games in %.1fs", pgn_filepath, nb_games_exported, time() - t_start)
+        return nb_games_exported
+
+    def _export_part(self, part, pgn_filepath, export_dir, cur_part):
+        """
+        Concatenates the received chunks and writes them into one dataset part file
+        :param part: List of (chunk arrays, header_row)
+        :param pgn_filepath: Path of the converted pgn file
+        :param export_dir: Directory for the dataset parts
+        :param cur_part: Part index
+        :return: Number of exported games
+        """
+        arrays = {name: np.concatenate([chunk[name] for chunk, _ in part]) for name in CHUNK_ARRAYS}
+        game_lengths = arrays.pop("game_lengths")
+        results = arrays.pop("results")
+        start_indices = np.zeros(len(game_lengths), np.int32)  # describes where each game starts
+        start_indices[1:] = np.cumsum(game_lengths)[:-1]
+        header_row = np.zeros((1, NB_ITEMS_METADATA), dtype="S128")
+        header_row[0, :len(part[0][1])] = part[0][1]
+        metadata = np.concatenate([header_row, arrays.pop("metadata")])
+        filename = os.path.basename(pgn_filepath).replace(".pgn", "_%d" % cur_part)
+
+        if self.use_shards:
+            write_shard(os.path.join(export_dir, filename + ".shard"), dict(start_indices=start_indices, **arrays))
+        else:
+            store = zarr.ZipStore(os.path.join(export_dir, filename + ".zip"), mode="w")
+            zarr_file = zarr.group(store=store, overwrite=True)
+            compressor = Blosc(cname=self.compression, clevel=self.clevel, shuffle=Blosc.SHUFFLE)
+            zarr_file.create_dataset(name="metadata", data=metadata, shape=metadata.shape, dtype=metadata.dtype,
+                                     compression=compressor)
+            export_main_data(zarr_file, compressor, start_indices, arrays["x"], arrays["y_value"], arrays["y_policy"],
+                             arrays["plys_to_end"], arrays["phase_vector"])
+            zarr_file.create_group("/statistics")
+            for name, value in [("number_selected_games", len(game_lengths)),
+                                ("white_wins", np.sum(results == RESULTS["1-0"])),
+                                ("black_wins", np.sum(results == RESULTS["0-1"])),
+                                ("draws", np.sum(results == RESULTS["1/2-1/2"]))]:
+                zarr_file.create_dataset("/statistics/" + name, shape=(1,), dtype=np.int32, data=[value],
+                                         compression=compressor)
+            store.close()
+        logging.info("PART: %d [1-0: %d, 0-1: %d, 1/2-1/2: %d] - %d positions", cur_part,
+                     np.sum(results == RESULTS["1-0"]), np.sum(results == RESULTS["0-1"]),
+                     np.sum(results == RESULTS["1/2-1/2"]), len(arrays["x"]))
+        return len(game_lengths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming conversion of pgn files into dataset parts")
+    parser.add_argument("--input-dir", type=str, required=True, help="Directory containing the .pgn files")
+    parser.add_argument("--output-dir", type=str, required=True, help="Directory for the dataset parts")
+    parser.add_argument("--processes", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--games-per-file", type=int, default=1000, help="Number of games per dataset part")
+    parser.add_argument("--max-nb-files", type=int, default=0, help="Maximum number of parts per pgn (0: all)")
+    parser.add_argument("--min-elo", type=int, default=2000, help="Minimum elo of both players")
+    parser.add_argument("--use-all-games", action="store_true", help="Ignore the elo and termination conditions")
+    parser.add_argument("--shards", action="store_true", help="Write .shard files instead of zarr .zip files")
+    args = parser.parse_args()
+
+    StreamingPGNConverter(nb_games_per_file=args.games_per_file, max_nb_files=args.max_nb_files,
+                          min_elo_both={"Chess": args.min_elo, "Crazyhouse": args.min_elo},
+                          use_all_games=args.use_all_games, processes=args.processes,
+                          use_shards=args.shards).convert_all_pgns(args.input_dir, args.output_dir)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -4,126 +4,193 @@ Created on 02.01.2021
 @project: CrazyAra
 @author: queensgambit
 
-Script for creating INT8 quanitzation weights for the MXNet-CPU backend.
-
-References:
-https://cwiki.apache.org/confluence/display/MXNET/MXNet+Graph+Optimization+and+Quantization+based+on+subgraph+and+MKL-DNN
-https://medium.com/apache-mxnet/model-quantization-for-production-level-neural-network-inference-f54462ebba05
+Script for creating INT8 post-training quantized models of the PyTorch architectures
+(domain/neural_net/architectures/pytorch, e.g. RiseV3, AlphaVile and the AlphaZero ResNet).
+
+Two methods with static per-channel INT8 weights and calibrated activations are available:
+* fx: The model of a training checkpoint is quantized by torch.ao FX graph mode quantization and saved as TorchScript
+  module (model-int8-bsize-<N>.pt) next to the torch_cpu exports. Pass its file path to the TorchScriptAPI backend.
+* onnx: An exported float ONNX model is quantized by ONNX Runtime (QDQ format) and saved as <name>-int8.onnx next to
+  it, so it can be run by the OnnxRuntimeAPI backend.
+The calibration batches are streamed from a training part (.zip or .shard). Afterwards the policy accuracy and value
+MSE of the float and the quantized model are compared on a validation part and the CPU throughput is measured.
+
+Usage:
+python quantize_model.py --method fx --model-type risev3 --tar-file model-0100.tar --export-dir model/torch_cpu/
+       --calibration-file train/part_0.zip --val-file val/part_0.zip
+python quantize_model.py --method onnx --onnx-file model/onnx/model-v3.0.onnx --calibration-file train/part_0.zip
+       --val-file val/part_0.zip
 """
 
+import argparse
+import copy
+import logging
+import os
 import sys
-import glob
-import mxnet as mx
-from mxnet.contrib.quantization import *
-sys.path.insert(0,'../../../')
-from DeepCrazyhouse.configs.main_config import main_config
-from DeepCrazyhouse.src.preprocessing.dataset_loader import load_pgn_dataset
-
-
-def remove_labels(symbol, value_output_name, policy_output_name):
+from pathlib import Path
+import numpy as np
+import torch
+sys.path.insert(0, '../../../')
+from DeepCrazyhouse.configs.train_config import TrainConfig
+from DeepCrazyhouse.src.domain.abstract_cls.abs_inference_backend import AbsInferenceBackend
+from DeepCrazyhouse.src.domain.agent.inference_backends import OnnxRuntimeAPI, measure_latency,\
+    policy_logits_to_probs
+from DeepCrazyhouse.src.preprocessing.dataset_loader import load_dataset_file
+from DeepCrazyhouse.src.training.inference_export import get_input_batches, get_policy_accuracy_and_value_mse,\
+    predict_dataset, print_report, quantize_to_int8
+
+METHODS = ["fx", "onnx"]
+
+
+class TorchModuleAPI(AbsInferenceBackend):
+    """Runs a float or quantized PyTorch module on the CPU"""
+
+    def __init__(self, model, batch_size: int):
+        """
+        Constructor
+        :param model: Module which returns the value and the policy logits
+        :param batch_size: Maximum batch size
+        """
+        self.model = model
+        self.batch_size = batch_size
+
+    def predict_batch(self, state_planes: np.ndarray):
+        with torch.no_grad():
+            outputs = self.model(torch.from_numpy(np.ascontiguousarray(state_planes, np.float32)))
+        return outputs[0].numpy().reshape(-1), policy_logits_to_probs(outputs[1].numpy())
+
+    def get_batch_size(self):
+        return self.batch_size
+
+
+def quantize_fx(model: torch.nn.Module, calibration_file: str, nb_calibration_positions=4096, batch_size=64,
+                qconfig_backend="x86") -> torch.nn.Module:
     """
-    Removes the output labels for the mxnet symbol
-    :param symbol: Mxnet symbol
-    :param value_output_name: Layer name of the value output
-    :param policy_output_name: Layer name of the policy output
-    :return: symbol without labels
+    Quantizes a model statically to INT8 by FX graph mode quantization (per channel weights)
+    :param model: Float pytorch model, it isn't modified
+    :param calibration_file: Training part (.zip or .shard) for the calibration of the activation ranges
+    :param nb_calibration_positions: Number of positions which are used for the calibration
+    :param batch_size: Number of positions per calibration batch
+    :param qconfig_backend: Quantization backend of torch.ao, "x86" or "fbgemm" for x86 CPUs, "qnnpack" for ARM
+    :return: Quantized graph module
     """
-    value_out = symbol.get_internals()[value_output_name]
-    policy_out = symbol.get_internals()[policy_output_name]
-    policy_out = mx.sym.SoftmaxActivation(data=policy_out, name='softmax')
-    # group value_out and policy_out together
-    return mx.symbol.Group([value_out, policy_out])
-
-
-def save_params(fname, arg_params, aux_params, logger=None):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = qconfig_backend
+    try:
+        graph_module = torch.fx.symbolic_trace(copy.deepcopy(model).cpu().eval())
+    except Exception as e:  # pylint: disable=broad-except
+        raise Exception("The model can't be traced by torch.fx (%s). Export it to ONNX and use --method onnx "
+                        "instead." % e) from e
+    # the quantized convolutions return channels last tensors which can't be flattened by view()
+    for node in graph_module.graph.nodes:
+        if node.op == "call_method" and node.target == "view":
+            node.target = "reshape"
+    graph_module.recompile()
+
+    x_calib = load_dataset_file(calibration_file)["x"]
+    calibration_batches = get_input_batches(x_calib, batch_size, nb_calibration_positions)
+    first_batch = torch.from_numpy(next(calibration_batches))
+    prepared_model = prepare_fx(graph_module, get_default_qconfig_mapping(qconfig_backend), (first_batch,))
+    with torch.no_grad():
+        prepared_model(first_batch)
+        for batch in calibration_batches:
+            prepared_model(torch.from_numpy(batch))
+    return convert_fx(prepared_model)
+
+
+def save_quantized_script_module(quantized_model: torch.nn.Module, input_shape: tuple, batch_size: int,
+                                 export_dir: str) -> str:
     """
-    Saves the given parameters to a file
-    :param fname: Filename
-    :param arg_params: arg params / main parameters
-    :param aux_params: auxiliary parameters
-    :param logger: Logger object
-    :return: None
+    Exports a quantized model as TorchScript module like trainer_agent_pytorch.export_as_script_module()
+    :param quantized_model: Result of quantize_fx()
+    :param input_shape: Input shape without the batch dimension
+    :param batch_size: Batch size of the exported module
+    :param export_dir: Output directory
+    :return: Path of the .pt file
     """
-    if logger is not None:
-        logger.info('Saving params into file at %s' % fname)
-    save_dict = {('arg:%s' % k): v.as_in_context(cpu()) for k, v in arg_params.items()}
-    save_dict.update({('aux:%s' % k): v.as_in_context(cpu()) for k, v in aux_params.items()})
-    mx.nd.save(fname, save_dict)
+    script_path = os.path.join(export_dir, "model-int8-bsize-%d.pt" % batch_size)
+    with torch.no_grad():
+        torch.jit.trace(quantized_model, torch.zeros(batch_size, *input_shape)).save(script_path)
+    return script_path
 
 
-def save_symbol(fname, sym, logger=None):
+def create_report(float_backend: AbsInferenceBackend, int8_backend: AbsInferenceBackend, val_file: str,
+                  nb_positions=10000, batch_size=64, nb_iterations=20) -> list:
     """
-    Saves the given symbol to a file
-    :param fname: Filename
-    :param sym: Symbol object
-    :param logger: Logger object
-    :return: None
+    Compares the quantized model with the float model on the positions of a validation part
+    :param float_backend: Backend of the float model
+    :param int8_backend: Backend of the quantized model
+    :param val_file: Validation part (.zip or .shard)
+    :param nb_positions: Maximum number of validation positions
+    :param batch_size: Batch size for the prediction and the throughput measurement
+    :param nb_iterations: Number of measured batches
+    :return: List with the metrics of both models, the int8 entry contains the accuracy drop and the speed up
     """
-    if logger is not None:
-        logger.info('Saving symbol into file at %s' % fname)
-    sym.save(fname)
+    # Too many arguments (6/5)
+    dataset = load_dataset_file(val_file)
+    x, y_value, y_policy = dataset["x"], dataset["y_value"][:nb_positions], dataset["y_policy"][:nb_positions]
+    report = []
+    for name, backend in [("float", float_backend), ("int8", int8_backend)]:
+        values, policies = predict_dataset(backend.predict_batch, x, batch_size, nb_positions)
+        entry = dict(model=name, **get_policy_accuracy_and_value_mse(values, policies, y_value, y_policy))
+        entry["positions_per_s"] = batch_size * 1000 / float(np.median(measure_latency(backend, batch_size,
+                                                                                         nb_iterations)))
+        report.append(entry)
+    report[1]["policy_acc_drop"] = report[0]["policy_acc"] - report[1]["policy_acc"]
+    report[1]["value_mse_increase"] = report[1]["value_mse"] - report[0]["value_mse"]
+    report[1]["speed_up"] = report[1]["positions_per_s"] / report[0]["positions_per_s"]
+    return report
 
 
 def main():
-    # config
-    batch_size = 32
-    logger = logging.getLogger('logger')
-    logger.setLevel(logging.DEBUG)
-    ctx = mx.cpu(0)
-    calib_mode = 'entropy'
-    excluded_sym_names = ['stem_conv0']
-    num_calib_batches = 128
-    quantized_dtype = 'int8'
-
-
-    symbol_path = glob.glob(main_config["model_architecture_dir"] + "*")[0]
-    params_path = glob.glob(main_config["model_weights_dir"] + "*")[0]
-    print("symbol_path:", symbol_path)
-    print("params_path:", params_path)
-
-    epoch = int(params_path[-11:-7])
-    print(epoch)
-
-    # load calibration dataset
-    _, x_train, yv_train, yp_train, plys_to_end, _ = load_pgn_dataset(normalize=True)
-    calib_data = mx.io.NDArrayIter({'data': x_train},
-                                   {},
-                                   batch_size,
-                                   shuffle=True)
-
-    # construct the model name based on the parameter file
-    prefix = symbol_path.split("/")[-1].replace("-symbol.json", "")
-    sym = mx.sym.load(symbol_path)
-    sym = remove_labels(sym, main_config['value_output']+'_output', main_config['policy_output']+'_output')
-
-    # https://github.com/apache/incubator-mxnet/issues/6951
-    save_dict = mx.nd.load(params_path)
-    arg_params = {}
-    aux_params = {}
-    for key, val in save_dict.items():
-        param_type, name = key.split(":", 1)
-        if param_type == "arg":
-            arg_params[name] = val
-        if param_type == "aux":
-            aux_params[name] = val
-
-    # quantize model
-    sym = sym.get_backend_symbol('MKLDNN_QUANTIZE')
-    label_names = []
-    qsym, qarg_params, aux_params = quantize_model(sym=sym, arg_params=arg_params, aux_params=aux_params,
-                                                    ctx=ctx, excluded_sym_names=excluded_sym_names,
-                                                    excluded_op_names=excluded_sym_names,
-                                                    calib_mode=calib_mode, calib_data=calib_data,
-                                                    num_calib_examples=num_calib_batches * batch_size,
-                                                    quantized_dtype=quantized_dtype,
-                                                    quantize_mode='smart',
-                                                    label_names=label_names,
-                                                    logger=logger)
-
-    sym_name = '%s-symbol.json' % (prefix + '-int8')
-    save_symbol(sym_name, qsym, logger)
-    param_name = '%s-%04d.params' % (prefix + '-int8', epoch)
-    save_params(param_name, qarg_params, aux_params, logger)
+    parser = argparse.ArgumentParser(description="Creates INT8 post-training quantized models of the PyTorch "
+                                                 "architectures")
+    parser.add_argument("--method", default="fx", choices=METHODS, help="Quantization method")
+    parser.add_argument("--model-type", default=TrainConfig.model_type, help="Model type of the checkpoint (fx)")
+    parser.add_argument("--tar-file", help="Checkpoint of the trained model (fx)")
+    parser.add_argument("--onnx-file", help="Exported float ONNX model (onnx)")
+    parser.add_argument("--export-dir", default=None, help="Output directory of the TorchScript module (fx), by "
+                                                           "default the directory of the checkpoint")
+    parser.add_argument("--calibration-file", required=True, help="Training part (.zip or .shard) for the calibration")
+    parser.add_argument("--calibration-positions", type=int, default=4096, help="Number of calibration positions")
+    parser.add_argument("--val-file", required=True, help="Validation part (.zip or .shard) for the report")
+    parser.add_argument("--val-positions", type=int, default=10000, help="Number of validation positions")
+    parser.add_argument("--batch-size", type=int, default=64, help="Batch size of the exported module and the report")
+    parser.add_argument("--qconfig-backend", default="x86", help="Quantization backend of the fx method")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.method == "onnx":
+        if args.onnx_file is None:
+            raise Exception("The onnx method requires the --onnx-file of the float model")
+        int8_path = args.onnx_file.replace(".onnx", "-int8.onnx")
+        quantize_to_int8(args.onnx_file, int8_path, args.calibration_file, args.calibration_positions)
+        float_backend = OnnxRuntimeAPI(args.batch_size, args.onnx_file)
+        int8_backend = OnnxRuntimeAPI(args.batch_size, int8_path)
+    else:
+        if args.tar_file is None:
+            raise Exception("The fx method requires the --tar-file of the trained model")
+        from DeepCrazyhouse.src.training.train_cli_util import create_pytorch_model
+        from DeepCrazyhouse.src.training.trainer_agent_pytorch import load_torch_state
+
+        train_config = TrainConfig()
+        train_config.model_type = args.model_type
+        input_shape = load_dataset_file(args.val_file)["x"].shape[1:]
+        model = create_pytorch_model(input_shape, train_config)
+        load_torch_state(model, torch.optim.SGD(model.parameters(), lr=train_config.max_lr), Path(args.tar_file), 0,
+                         map_location="cpu")
+        model = model.cpu().eval()
+        quantized_model = quantize_fx(model, args.calibration_file, args.calibration_positions, args.batch_size,
+                                      args.qconfig_backend)
+        export_dir = args.export_dir or os.path.dirname(os.path.abspath(args.tar_file))
+        int8_path = save_quantized_script_module(quantized_model, input_shape, args.batch_size, export_dir)
+        float_backend = TorchModuleAPI(model, args.batch_size)
+        int8_backend = TorchModuleAPI(torch.jit.load(int8_path), args.batch_size)
+
+    logging.info("Saved the quantized model to %s", int8_path)
+    print_report(create_report(float_backend, int8_backend, args.val_file, args.val_positions, args.batch_size))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,73 @@
+"""
+@file: alpha_beta_agent_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the iterative deepening alpha beta search with its root moves split across several worker threads
+"""
+import unittest
+from threading import Lock, current_thread, main_thread
+import chess
+from DeepCrazyhouse.src.domain.agent.player.alpha_beta_agent import AlphaBetaAgent
+from DeepCrazyhouse.src.domain.variants.game_state import GameState
+from DeepCrazyhouse.src.tests.fixtures import DeterministicBackend
+
+FEN = "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3"
+
+
+def _create_agent(nb_workers: int, depth=3) -> AlphaBetaAgent:
+    """ Returns an agent whose root position has several candidate moves for the workers"""
+    return AlphaBetaAgent(DeterministicBackend(), depth=depth, nb_candidate_moves=4, nb_workers=nb_workers)
+
+
+class AlphaBetaAgentTests(unittest.TestCase):
+    """ Checks that the root splitting neither changes the search result nor loses errors or nodes"""
+
+    def test_evaluate_board_state_given_several_workers_expect_same_result_as_single_worker(self):
+        """ The workers must find the same value and best move as the sequential search"""
+        for depth in [2, 3]:
+            value, legal_moves, policy, _, reached_depth, _, _, _, _ = _create_agent(1, depth).evaluate_board_state(
+                GameState(chess.Board(FEN)))
+            self.assertEqual(reached_depth, depth)
+            for nb_workers in [2, 3]:
+                result = _create_agent(nb_workers, depth).evaluate_board_state(GameState(chess.Board(FEN)))
+                self.assertAlmostEqual(result[0], value, msg="depth %d workers %d" % (depth, nb_workers))
+                self.assertEqual(result[1][result[2].argmax()], legal_moves[policy.argmax()])
+
+    def test_evaluate_board_state_given_failing_worker_expect_exception(self):
+        """ An exception of a worker thread must be raised in the calling thread"""
+        agent = _create_agent(nb_workers=3)
+        negamax = agent.negamax
+
+        def failing_negamax(*args):
+            if current_thread() is not main_thread():
+                raise RuntimeError("worker failed")
+            return negamax(*args)
+
+        agent.negamax = failing_negamax
+        self.assertRaisesRegex(RuntimeError, "worker failed", agent.evaluate_board_state, GameState(chess.Board(FEN)))
+
+    def test_evaluate_board_state_given_several_workers_expect_all_nodes_counted(self):
+        """ The node counts of the workers must add up to the number of visited nodes"""
+        agent = _create_agent(nb_workers=3)
+        negamax = agent.negamax
+        lock = Lock()
+        nb_calls = [0]
+        threads = set()
+
+        def counting_negamax(*args):
+            with lock:
+                nb_calls[0] += 1
+                threads.add(current_thread())
+            return negamax(*args)
+
+        agent.negamax = counting_negamax
+        nodes = agent.evaluate_board_state(GameState(chess.Board(FEN)))[5]
+        self.assertGreater(len(threads), 1)
+        self.assertEqual(nodes, nb_calls[0])
+        self.assertEqual(agent.nodes, nodes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+@file: distributed_training_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the data-parallel training of TrainerAgentPytorch with the gloo backend over several CPU processes
+"""
+import os
+import tempfile
+import unittest
+import torch
+from DeepCrazyhouse.configs.train_config import TrainConfig, TrainObjects
+from DeepCrazyhouse.src.training.distributed import destroy_distributed, get_rank_part_ids, init_distributed,\
+    launch_processes
+from DeepCrazyhouse.src.training.trainer_agent_pytorch import TrainerAgentPytorch
+from DeepCrazyhouse.src.tests.torch_fixtures import NB_CHANNELS, NB_POLICY_OUTPUTS, SmallModel
+
+BATCH_SIZE = 32
+
+
+def _get_train_config(gradient_accumulation_steps: int) -> TrainConfig:
+    tc = TrainConfig()
+    tc.context = "cpu"
+    tc.dist_backend = "gloo"
+    tc.use_wdl = tc.use_plys_to_end = False
+    tc.log_metrics_to_tensorboard = False
+    tc.batch_size = BATCH_SIZE
+    tc.gradient_accumulation_steps = gradient_accumulation_steps
+    tc.nb_parts = 3
+    tc.total_it = 1
+    return tc
+
+
+def _train(tc: TrainConfig, rank=0, world_size=1, nb_steps=2):
+    """
+    Runs nb_steps optimizer steps on the same global batch. Every process gets its own samples of each micro batch.
+    :return: Model, trainer
+    """
+    torch.manual_seed(42)
+    model = SmallModel(use_batch_norm=False)
+    train_objects = TrainObjects()
+    train_objects.lr_schedule = lambda it: 0.01
+    train_objects.momentum_schedule = lambda it: 0.9
+    trainer = TrainerAgentPytorch(model, None, tc, train_objects, use_rtpt=False)
+    trainer.cur_it = trainer.batch_proc_tmp = 0
+    batch = [torch.rand(BATCH_SIZE, NB_CHANNELS, 8, 8), torch.rand(BATCH_SIZE) * 2 - 1,
+             torch.randint(0, NB_POLICY_OUTPUTS, (BATCH_SIZE,)).float(), torch.zeros(BATCH_SIZE)]
+    micro_batch_size = BATCH_SIZE // (world_size * tc.gradient_accumulation_steps)
+    for _ in range(nb_steps):
+        for accumulation_idx in range(tc.gradient_accumulation_steps):
+            start = (accumulation_idx * world_size + rank) * micro_batch_size
+            trainer.train_update([entry[start:start + micro_batch_size] for entry in batch])
+    return model, trainer
+
+
+def _run_process(rank: int, world_size: int, master_port: int, result_file: str):
+    """ Trains in one of the processes and stores the result of the main process"""
+    tc = _get_train_config(gradient_accumulation_steps=2)
+    init_distributed(tc, rank, world_size, master_port)
+    try:
+        model, trainer = _train(tc, rank, world_size)
+        # the processes have shards with a different number of batches
+        trainer._iterate_part_batches = lambda part_ids: ((None, idx) for idx in range(rank + 2))
+        nb_batches = len(list(trainer._iterate_train_batches()))
+        if rank == 0:
+            torch.save({"state_dict": model.state_dict(), "nb_batches": nb_batches, "cur_it": trainer.cur_it},
+                       result_file)
+    finally:
+        destroy_distributed()
+
+
+class DistributedTrainingTests(unittest.TestCase):
+    """ Checks that the data-parallel training matches the training of the whole batch in a single process"""
+
+    def test_get_rank_part_ids_expect_equal_number_of_parts_covering_all_parts(self):
+        """ Every process must get the same number of parts and no part may be left out"""
+        rank_part_ids = [get_rank_part_ids(list(range(10)), rank, 4) for rank in range(4)]
+        self.assertEqual([len(part_ids) for part_ids in rank_part_ids], [3, 3, 3, 3])
+        self.assertEqual(set(sum(rank_part_ids, [])), set(range(10)))
+
+    def test_train_update_given_two_gloo_processes_expect_weights_of_single_process(self):
+        """ Two processes with gradient accumulation must do the same updates as one process with the full batch"""
+        expected_model, _ = _train(_get_train_config(gradient_accumulation_steps=1))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result_file = os.path.join(tmp_dir, "result.pt")
+            launch_processes(_run_process, 2, (result_file,))
+            result = torch.load(result_file)
+        self.assertEqual(result["cur_it"], 2)
+        self.assertEqual(result["nb_batches"], 2)
+        for name, param in expected_model.state_dict().items():
+            torch.testing.assert_close(result["state_dict"][name], param, rtol=1e-5, atol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+@file: eval_cache_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the look-up, the memory budget and the persistence of the network evaluation cache
+"""
+import os
+import tempfile
+import unittest
+import chess
+import numpy as np
+from DeepCrazyhouse.src.domain.agent.player.util.eval_cache import EvalCache, ENTRY_OVERHEAD_BYTES
+from DeepCrazyhouse.src.domain.variants.constants import NB_LABELS
+from DeepCrazyhouse.src.domain.variants.game_state import GameState
+from DeepCrazyhouse.src.domain.variants.output_representation import get_probs_of_move_list
+
+
+class EvalCacheTests(unittest.TestCase):
+    """ Checks both policy modes, the eviction of the least recently used entries and the opening file"""
+
+    def test_lookup_given_both_policy_modes_expect_policy_of_legal_moves(self):
+        """ Both modes must return the stored value and the normalized policy of the legal moves"""
+        state = GameState(chess.Board())
+        legal_moves = state.get_legal_moves()
+        policy_vec = np.random.default_rng(42).random(NB_LABELS).astype(np.float32)
+        p_vec_small = get_probs_of_move_list(policy_vec, legal_moves, state.mirror_policy())
+        for policy_mode in ["sparse", "full"]:
+            cache = EvalCache(size_mb=1, policy_mode=policy_mode)
+            self.assertIsNone(cache.lookup(state.get_input_key(), legal_moves, state.mirror_policy()))
+            cache.store(state.get_input_key(), 0.25, policy_vec, p_vec_small)
+            value, cached_policy = cache.lookup(state.get_input_key(), legal_moves, state.mirror_policy())
+            self.assertEqual(value, 0.25)
+            np.testing.assert_allclose(cached_policy, p_vec_small, atol=1e-3)
+            self.assertAlmostEqual(cache.hit_rate(), 0.5)
+
+    def test_store_given_full_budget_expect_least_recently_used_entry_removed(self):
+        """ If the budget is exceeded, the entry which hasn't been used for the longest time is removed"""
+        cache = EvalCache(size_mb=1)
+        policy = np.ones(30, np.float32)
+        nb_entries = 2 ** 20 // (policy.astype(np.float16).nbytes + ENTRY_OVERHEAD_BYTES)
+        for key in range(nb_entries):
+            cache.store(key, 0.0, None, policy)
+        cache.lookup(0, [], False)  # key 0 is used again, so key 1 is the oldest entry now
+        cache.store(nb_entries, 0.0, None, policy)
+        self.assertEqual(len(cache), nb_entries)
+        self.assertIsNotNone(cache.lookup(0, [], False))
+        self.assertIsNone(cache.lookup(1, [], False))
+        self.assertLessEqual(cache.nb_bytes, cache.max_bytes)
+
+    def test_save_given_opening_entries_expect_only_opening_entries_loaded(self):
+        """ Only the entries up to the given full move number are kept between restarts"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            persist_file = os.path.join(tmp_dir, "eval_cache.npz")
+            cache = EvalCache(size_mb=1, persist_file=persist_file, persist_max_fullmove=10, model_name="model-a")
+            cache.store(2 ** 64 - 1, 0.5, None, np.array([0.25, 0.75], np.float32), fullmove_number=3)
+            cache.store(7, -0.5, None, np.array([1.0], np.float32), fullmove_number=30)
+            self.assertEqual(cache.save(), 1)
+
+            loaded_cache = EvalCache(size_mb=1, persist_file=persist_file, model_name="model-a")
+            self.assertEqual(len(loaded_cache), 1)
+            value, p_vec_small = loaded_cache.lookup(2 ** 64 - 1, [], False)
+            self.assertEqual(value, 0.5)
+            np.testing.assert_allclose(p_vec_small, [0.25, 0.75])
+            self.assertEqual(len(EvalCache(size_mb=1, policy_mode="full", persist_file=persist_file,
+                                           model_name="model-a")), 0)
+            # the evaluations of another network are ignored
+            self.assertEqual(len(EvalCache(size_mb=1, persist_file=persist_file, model_name="model-b")), 0)
+
+    def test_lookup_given_float16_sparse_policy_expect_normalized_float32_policy(self):
+        """ The float16 rounding error must not change the sum of the returned probabilities"""
+        cache = EvalCache(size_mb=1)
+        p_vec_small = np.full(7, 1 / 7, np.float32)
+        self.assertNotEqual(p_vec_small.astype(np.float16).astype(np.float32).sum(), np.float32(1))
+        cache.store(1, 0.0, None, p_vec_small)
+        _, cached_policy = cache.lookup(1, [], False)
+        self.assertEqual(cached_policy.dtype, np.float32)
+        self.assertAlmostEqual(float(cached_policy.sum()), 1.0, places=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+"""
+@file: fixtures.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Stub inference backends which are shared by the search tests
+"""
+import zlib
+import numpy as np
+from DeepCrazyhouse.src.domain.abstract_cls.abs_inference_backend import AbsInferenceBackend
+from DeepCrazyhouse.src.domain.variants.constants import NB_LABELS
+
+
+class ConstantBackend(AbsInferenceBackend):
+    """Backend which returns a value of 0 and a uniform policy"""
+
+    def __init__(self, batch_size=1):
+        self.batch_size = batch_size
+
+    def predict_batch(self, state_planes: np.ndarray):
+        return np.zeros(len(state_planes)), np.ones((len(state_planes), NB_LABELS)) / NB_LABELS
+
+    def get_batch_size(self):
+        return self.batch_size
+
+
+class DeterministicBackend(AbsInferenceBackend):
+    """Backend whose value and policy are pseudo random functions of the input planes"""
+
+    def __init__(self, batch_size=8):
+        self.batch_size = batch_size
+
+    def predict_batch(self, state_planes: np.ndarray):
+        seeds = [zlib.crc32(planes.tobytes()) for planes in state_planes]
+        values = np.array([np.random.default_rng(seed).uniform(-0.9, 0.9) for seed in seeds])
+        # a few moves of every position get a clearly higher probability than the others
+        policies = np.exp(np.stack([np.random.default_rng(seed).uniform(0, 6, NB_LABELS) for seed in seeds]))
+        return values, policies / policies.sum(axis=1, keepdims=True)
+
+    def get_batch_size(self):
+        return self.batch_size
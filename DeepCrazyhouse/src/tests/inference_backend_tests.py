@@ -0,0 +1,95 @@
+"""
+@file: inference_backend_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the ONNX Runtime and TorchScript backends against the PyTorch model which they have been exported from
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+from DeepCrazyhouse.src.domain.agent.inference_backends import find_model_file, policy_logits_to_probs
+from DeepCrazyhouse.src.domain.variants.constants import BOARD_HEIGHT, BOARD_WIDTH, NB_CHANNELS_TOTAL, NB_LABELS
+
+try:
+    import onnxruntime  # pylint: disable=unused-import
+    import torch
+    from torch import nn
+    from DeepCrazyhouse.src.domain.agent.inference_backends import OnnxRuntimeAPI, TorchScriptAPI
+
+    TORCH_AND_ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    TORCH_AND_ONNXRUNTIME_AVAILABLE = False
+
+
+def _get_small_model():
+    """ Returns a small model with a value and a policy head like the models of the PyTorch trainer"""
+
+    class SmallModel(nn.Module):
+        """ Convolutional body with a tanh value head and a policy head which returns logits"""
+
+        def __init__(self):
+            super().__init__()
+            self.body = nn.Sequential(nn.Conv2d(NB_CHANNELS_TOTAL, 8, 3, padding=1), nn.ReLU())
+            self.value_head = nn.Sequential(nn.Flatten(), nn.Linear(8 * BOARD_HEIGHT * BOARD_WIDTH, 1), nn.Tanh())
+            self.policy_head = nn.Sequential(nn.Flatten(), nn.Linear(8 * BOARD_HEIGHT * BOARD_WIDTH, NB_LABELS))
+
+        def forward(self, x):
+            x = self.body(x)
+            return self.value_head(x), self.policy_head(x)
+
+    torch.manual_seed(42)
+    return SmallModel().eval()
+
+
+class InferenceBackendTests(unittest.TestCase):
+    """ Checks the model selection and the predictions of the exported models"""
+
+    def test_find_model_file_given_fixed_batch_sizes_expect_smallest_sufficient_model(self):
+        """ Fixed batch size models must be large enough for the requested batch size"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for batch_size in [1, 8, 64]:
+                open(os.path.join(tmp_dir, "model-bsize-%d.pt" % batch_size), "w").close()
+            self.assertEqual(os.path.basename(find_model_file(tmp_dir, ".pt", 4)), "model-bsize-8.pt")
+            self.assertRaises(Exception, find_model_file, tmp_dir, ".pt", 128)
+            open(os.path.join(tmp_dir, "model-v3.0.pt"), "w").close()  # dynamic batch size
+            self.assertEqual(os.path.basename(find_model_file(tmp_dir, ".pt", 128)), "model-v3.0.pt")
+
+    def test_policy_logits_to_probs_expect_normalized_probabilities(self):
+        """ The softmax must be applied row by row"""
+        policy_probs = policy_logits_to_probs(np.random.default_rng(0).normal(0, 10, (3, NB_LABELS)))
+        np.testing.assert_allclose(policy_probs.sum(axis=1), np.ones(3), rtol=1e-6)
+
+    @unittest.skipUnless(TORCH_AND_ONNXRUNTIME_AVAILABLE, "torch and onnxruntime are required")
+    def test_predict_batch_given_exported_models_expect_predictions_of_pytorch_model(self):
+        """ Both backends must return the value and the softmax policy of the PyTorch model for every batch length"""
+        model = _get_small_model()
+        batch_size = 4
+        planes = np.random.default_rng(42).random((batch_size, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH))
+        planes = planes.astype(np.float32)
+        with torch.no_grad():
+            value_out, policy_out = model(torch.from_numpy(planes))
+        expected_values, expected_policies = value_out.numpy().reshape(-1), torch.softmax(policy_out, dim=1).numpy()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dummy_input = torch.ones(1, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH)
+            torch.onnx.export(model, dummy_input, os.path.join(tmp_dir, "model-v1.0.onnx"), input_names=["data"],
+                              output_names=["value_out", "policy_out"], dynamo=False,
+                              dynamic_axes={"data": {0: "batch_size"}, "value_out": {0: "batch_size"},
+                                            "policy_out": {0: "batch_size"}})
+            torch.jit.trace(model, dummy_input).save(os.path.join(tmp_dir, "model-bsize-%d.pt" % batch_size))
+
+            for backend in [OnnxRuntimeAPI(batch_size, tmp_dir), TorchScriptAPI(batch_size, tmp_dir)]:
+                for length in [1, batch_size]:
+                    values, policies = backend.predict_batch(planes[:length])
+                    np.testing.assert_allclose(values, expected_values[:length], atol=1e-5)
+                    np.testing.assert_allclose(policies, expected_policies[:length], atol=1e-6)
+                value, policy = backend.predict_single(planes[1])
+                self.assertAlmostEqual(float(value), expected_values[1], places=5)
+                np.testing.assert_allclose(policy, expected_policies[1], atol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
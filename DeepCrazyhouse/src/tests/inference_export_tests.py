@@ -0,0 +1,101 @@
+"""
+@file: inference_export_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the checkpoint loading, the batch normalisation folding and the fused policy output of the inference model
+export
+"""
+import copy
+import os
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+import torch
+from torch import nn
+from DeepCrazyhouse.src.domain.agent.inference_backends import OnnxRuntimeAPI
+from DeepCrazyhouse.src.domain.variants.constants import BOARD_HEIGHT, BOARD_WIDTH, NB_CHANNELS_TOTAL, NB_LABELS
+from DeepCrazyhouse.src.domain.variants.constants import NB_POLICY_MAP_CHANNELS
+from DeepCrazyhouse.src.training.inference_export import InferenceModel, export_inference_variants, fold_conv_bn
+from DeepCrazyhouse.src.training.trainer_agent_pytorch import load_torch_state, save_torch_state
+
+
+class PlanePolicyModel(nn.Module):
+    """ Small model with Conv2d + BatchNorm2d pairs and a select_policy_from_plane style policy output"""
+
+    def __init__(self):
+        super().__init__()
+        self.body = nn.Sequential(nn.Conv2d(NB_CHANNELS_TOTAL, 8, 3, padding=1, bias=False), nn.BatchNorm2d(8),
+                                  nn.ReLU(), nn.Conv2d(8, 8, 1), nn.BatchNorm2d(8), nn.ReLU())
+        self.value_head = nn.Sequential(nn.Flatten(), nn.Linear(8 * BOARD_HEIGHT * BOARD_WIDTH, 1), nn.Tanh())
+        self.policy_head = nn.Sequential(nn.Conv2d(8, NB_POLICY_MAP_CHANNELS, 3, padding=1), nn.Flatten())
+
+    def forward(self, x):
+        x = self.body(x)
+        return self.value_head(x), self.policy_head(x)
+
+
+def _get_model():
+    """ Returns a PlanePolicyModel in evaluation mode with non trivial batch normalisation statistics"""
+    torch.manual_seed(42)
+    model = PlanePolicyModel()
+    for module in model.modules():
+        if isinstance(module, nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.2, 0.2)
+    return model.eval()
+
+
+class InferenceExportTests(unittest.TestCase):
+    """ Checks that the optimized models return the same predictions as the original model"""
+
+    def test_fold_conv_bn_expect_same_predictions_without_batch_norm(self):
+        """ Both batch normalisation layers must be folded without changing the outputs"""
+        model = _get_model()
+        folded_model = copy.deepcopy(model)
+        self.assertEqual(fold_conv_bn(folded_model), 2)
+        self.assertFalse(any(isinstance(module, nn.BatchNorm2d) for module in folded_model.modules()))
+        x = torch.rand(4, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH)
+        with torch.no_grad():
+            values, policies = InferenceModel(model)(x)
+            folded_values, folded_policies = InferenceModel(folded_model)(x)
+        self.assertEqual(tuple(policies.shape), (4, NB_LABELS))
+        np.testing.assert_allclose(policies.sum(dim=1).numpy(), np.ones(4), rtol=1e-5)
+        np.testing.assert_allclose(folded_values.numpy(), values.numpy(), atol=1e-5)
+        np.testing.assert_allclose(folded_policies.numpy(), policies.numpy(), atol=1e-6)
+
+    def test_export_inference_variants_expect_softmax_policy_in_onnx_runtime(self):
+        """ The ONNX Runtime backend must return the fused probabilities of the exported fp32 model"""
+        model = _get_model()
+        planes = np.random.default_rng(0).random((3, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH)).astype(np.float32)
+        with torch.no_grad():
+            values, policies = InferenceModel(model)(torch.from_numpy(planes))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            onnx_paths = export_inference_variants(model, planes.shape[1:], tmp_dir, "model", ["fp32"])
+            backend = OnnxRuntimeAPI(batch_size=3, model_dir=onnx_paths["fp32"])
+            self.assertTrue(backend.has_policy_softmax)
+            onnx_values, onnx_policies = backend.predict_batch(planes)
+        np.testing.assert_allclose(onnx_values, values.numpy().reshape(-1), atol=1e-5)
+        np.testing.assert_allclose(onnx_policies, policies.numpy(), atol=1e-6)
+
+    def test_load_torch_state_given_cpu_map_location_expect_same_weights(self):
+        """ The export loads the checkpoint on the cpu, so it must work without a GPU"""
+        model = _get_model()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tar_file = Path(os.path.join(tmp_dir, "model.tar"))
+            save_torch_state(model, torch.optim.SGD(model.parameters(), lr=0.1), tar_file)
+            torch.manual_seed(0)
+            loaded_model = PlanePolicyModel()
+            load_torch_state(loaded_model, torch.optim.SGD(loaded_model.parameters(), lr=0.1), tar_file, 0,
+                             map_location="cpu")
+        for name, tensor in model.state_dict().items():
+            self.assertEqual(loaded_model.state_dict()[name].device.type, "cpu")
+            torch.testing.assert_close(loaded_model.state_dict()[name], tensor)
+
+
+if __name__ == "__main__":
+    unittest.main()
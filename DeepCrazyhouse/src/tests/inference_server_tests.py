@@ -0,0 +1,107 @@
+"""
+@file: inference_server_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the dynamic batching of the inference server
+"""
+import unittest
+from threading import Thread
+import numpy as np
+from DeepCrazyhouse.src.domain.abstract_cls.abs_inference_backend import AbsInferenceBackend
+from DeepCrazyhouse.src.domain.agent.player.util.inference_server import InferenceServer, Histogram
+from DeepCrazyhouse.src.domain.variants.constants import BOARD_HEIGHT, BOARD_WIDTH, NB_CHANNELS_TOTAL, NB_LABELS
+
+
+class SumBackend(AbsInferenceBackend):
+    """Backend which returns the sum of the input planes as value and a uniform policy"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.batch_lengths = []
+
+    def predict_batch(self, state_planes: np.ndarray):
+        self.batch_lengths.append(len(state_planes))
+        return state_planes.sum(axis=(1, 2, 3)), np.ones((len(state_planes), NB_LABELS)) / NB_LABELS
+
+    def get_batch_size(self):
+        return self.batch_size
+
+
+class FailingBackend(SumBackend):
+    """Backend which raises an exception as long as fail is set"""
+
+    def __init__(self, batch_size):
+        super().__init__(batch_size)
+        self.fail = True
+
+    def predict_batch(self, state_planes: np.ndarray):
+        if self.fail:
+            raise RuntimeError("out of memory")
+        return super().predict_batch(state_planes)
+
+
+class InferenceServerTests(unittest.TestCase):
+    """ Checks that every worker receives the result of its own request"""
+
+    def test_predict_given_parallel_workers_expect_own_results_and_batches(self):
+        """ Runs several workers in parallel and checks the results as well as the batch statistics"""
+        nb_workers, nb_requests = 8, 50
+        backend = SumBackend(batch_size=4)
+        server = InferenceServer(backend, nb_slots=nb_workers, max_batch_size=4, max_wait_us=2000)
+        server.start()
+        errors = []
+
+        def worker(slot_id):
+            for i in range(nb_requests):
+                planes = np.zeros((NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH), np.float32)
+                planes[0, 0, 0] = slot_id * 1000 + i
+                value, policy = server.predict(slot_id, planes)
+                if value != slot_id * 1000 + i or policy.shape != (NB_LABELS,):
+                    errors.append((slot_id, i, value))
+
+        workers = [Thread(target=worker, args=(slot_id,)) for slot_id in range(nb_workers)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        server.stop()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(backend.batch_lengths), nb_workers * nb_requests)
+        self.assertLessEqual(max(backend.batch_lengths), 4)
+        self.assertEqual(server.batch_fill_histogram.nb_values(), len(backend.batch_lengths))
+        self.assertEqual(server.queue_latency_histogram.nb_values(), nb_workers * nb_requests)
+
+    def test_predict_given_failing_backend_expect_exception_and_restart(self):
+        """ A failed batch stops the server, later requests must raise instead of waiting and start() recovers"""
+        backend = FailingBackend(batch_size=2)
+        server = InferenceServer(backend, nb_slots=2, max_batch_size=2, max_wait_us=100)
+        server.start()
+        planes = np.zeros((NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH), np.float32)
+        self.assertRaises(Exception, server.predict, 0, planes)
+        server.thread_inference.join(timeout=5)
+        self.assertFalse(server.running)
+        self.assertRaises(Exception, server.predict, 1, planes)
+
+        backend.fail = False
+        server.start()
+        value, policy = server.predict(1, planes)
+        server.stop()
+        self.assertIsNone(server.error)
+        self.assertEqual(value, 0)
+        self.assertEqual(policy.shape, (NB_LABELS,))
+        self.assertRaises(Exception, server.predict, 0, planes)
+
+    def test_histogram_given_values_expect_correct_bins(self):
+        """ Values on a bin edge belong to the upper bin and values beyond the last edge to the last bin"""
+        histogram = Histogram([0, 1, 2, 3])
+        histogram.add(np.array([0, 0.5, 1, 2.5, 10]))
+        self.assertEqual(list(histogram.counts), [2, 1, 2])
+        self.assertAlmostEqual(histogram.mean(), 14 / 5)
+        self.assertEqual(histogram.quantile(0.5), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
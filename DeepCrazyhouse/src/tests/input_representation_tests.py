@@ -0,0 +1,71 @@
+"""
+@file: input_representation_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the bitboard based plane encoding
+"""
+import unittest
+import chess
+import numpy as np
+from DeepCrazyhouse.configs.main_config import main_config
+from DeepCrazyhouse.src.domain.util import get_row_col, set_bitboard_planes
+from DeepCrazyhouse.src.domain.variants.constants import NB_LAST_MOVES
+from DeepCrazyhouse.src.domain.variants.input_representation import board_to_planes, boards_to_planes
+
+
+class InputRepresentationTests(unittest.TestCase):
+    """ Compares the bitboard unpacking with the square based indexing"""
+
+    def test_set_bitboard_planes_given_random_masks_expect_same_as_get_row_col(self):
+        """ Every set bit must end up at get_row_col() of its square for both orientations"""
+        rng = np.random.default_rng(0)
+        bitboards = [int(x) for x in rng.integers(0, 2 ** 63, 10, dtype=np.uint64)] + [chess.BB_ALL, chess.BB_EMPTY]
+        for mirror in [False, True]:
+            planes = np.zeros((len(bitboards), 8, 8))
+            set_bitboard_planes(planes, bitboards, mirror)
+            for idx, bitboard in enumerate(bitboards):
+                expected = np.zeros((8, 8))
+                for square in chess.SquareSet(bitboard):
+                    row, col = get_row_col(square, mirror=mirror)
+                    expected[row, col] = 1
+                self.assertTrue((planes[idx] == expected).all())
+
+    def test_board_to_planes_given_out_buffer_expect_same_values(self):
+        """ Writing into a reused float32 buffer must give the same planes as the default float64 output"""
+        board = chess.Board("r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4")
+        last_moves = [chess.Move.from_uci("g8f6"), chess.Move.from_uci("d1h5")] + [None] * (NB_LAST_MOVES - 2)
+        planes = board_to_planes(board, 0, normalize=True, mode=main_config["mode"], last_moves=last_moves)
+        out = np.ones(planes.shape, np.float32)
+        for _ in range(2):
+            board_to_planes(board, 0, normalize=True, mode=main_config["mode"], last_moves=last_moves, out=out)
+            self.assertTrue(np.array_equal(out, planes.astype(np.float32)))
+        board.push_uci("h5f7")
+        planes = board_to_planes(board, 0, normalize=True, mode=main_config["mode"], last_moves=last_moves)
+        board_to_planes(board, 0, normalize=True, mode=main_config["mode"], last_moves=last_moves, out=out)
+        self.assertTrue(np.array_equal(out, planes.astype(np.float32)))
+
+    def test_boards_to_planes_given_game_expect_same_as_single_encoding(self):
+        """ The batched encoding must match board_to_planes() for serial and parallel execution"""
+        board = chess.Board()
+        boards = []
+        for uci_move in ["e2e4", "e7e5", "g1f3", "b8c6", "f1b5", "a7a6"]:
+            board.push_uci(uci_move)
+            boards.append(board.copy(stack=False))
+        board_occs = list(range(len(boards)))
+        last_moves = [[None] * NB_LAST_MOVES] * len(boards)
+        expected = np.stack([board_to_planes(board, board_occ, False, main_config["mode"], moves)
+                             for board, board_occ, moves in zip(boards, board_occs, last_moves)])
+        for processes in [1, 2]:
+            planes = boards_to_planes(boards, board_occs, False, main_config["mode"], last_moves, processes=processes)
+            self.assertEqual(planes.dtype, np.int16)
+            self.assertTrue(np.array_equal(planes, expected))
+        out = np.ones((len(boards) + 2,) + expected.shape[1:], np.float32)
+        planes = boards_to_planes(boards, board_occs, False, main_config["mode"], last_moves, out=out)
+        self.assertTrue(np.shares_memory(planes, out))
+        self.assertTrue(np.array_equal(out[:len(boards)], expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
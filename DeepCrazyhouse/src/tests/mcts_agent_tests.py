@@ -0,0 +1,75 @@
+"""
+@file: mcts_agent_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the search of the MCTSAgent with its persistent pool of search workers
+"""
+import threading
+import unittest
+import chess
+from DeepCrazyhouse.src.domain.agent.player.mcts_agent import MCTSAgent
+from DeepCrazyhouse.src.domain.variants.game_state import GameState
+from DeepCrazyhouse.src.tests.fixtures import DeterministicBackend
+
+NB_PLAYOUTS = 64
+
+
+def _create_agent(**kwargs) -> MCTSAgent:
+    """ Returns an agent whose search only ends on its playout limit"""
+    return MCTSAgent([DeterministicBackend()], playouts_empty_pockets=NB_PLAYOUTS, dirichlet_epsilon=0,
+                     use_time_management=False, min_movetime=10 ** 9, verbose=False, **kwargs)
+
+
+class MCTSAgentTests(unittest.TestCase):
+    """ Checks the statistics of the search tree and the bookkeeping of the search workers"""
+
+    def test_evaluate_board_state_given_collectors_expect_consistent_tree_and_stopped_workers(self):
+        """ Every playout of the collectors must be backed up to the root and the workers must wait afterwards"""
+        agent = _create_agent(threads=2, batch_size=4, nb_collectors=2)
+        _, legal_moves, p_vec_small, _, _, nodes, _, _, _ = agent.evaluate_board_state(GameState(chess.Board()))
+
+        root_node = agent.root_node
+        self.assertGreaterEqual(nodes, NB_PLAYOUTS)
+        self.assertEqual(root_node.n_sum, root_node.child_number_visits.sum() + 1)
+        self.assertEqual(len(p_vec_small), len(legal_moves))
+        self.assertAlmostEqual(p_vec_small.sum(), 1)
+
+        self.assertEqual(len(agent.search_workers), 2)
+        self.assertTrue(all(worker.is_alive() for worker in agent.search_workers))
+        self.assertEqual(agent.nb_active_workers, 0)
+        self.assertFalse(agent.search_active)
+        self.assertIsNone(agent.search_error)
+
+    def test_evaluate_board_state_given_move_and_reply_expect_reused_subtree_and_same_workers(self):
+        """ The second search must continue on the subtree of the reply with the workers of the first search"""
+        for use_array_tree in [False, True]:
+            agent = _create_agent(threads=4, batch_size=4, use_pruning=False, use_array_tree=use_array_tree)
+            state = GameState(chess.Board())
+            agent.evaluate_board_state(state)
+            workers = list(agent.search_workers)
+            nb_threads = threading.active_count()
+
+            # follow the most visited move and the most visited reply of the opponent
+            node = agent.root_node
+            for _ in range(2):
+                child_idx = node.child_number_visits.argmax()
+                state.apply_move(node.legal_moves[child_idx])
+                node = node.child_nodes[child_idx]
+            n_sum = node.n_sum
+            self.assertGreater(n_sum, 1)
+
+            agent.evaluate_board_state(state)
+            msg = "use_array_tree %s" % use_array_tree
+            self.assertEqual(agent.total_nodes_pre_search, n_sum, msg)
+            if not use_array_tree:
+                self.assertIs(agent.root_node, node)
+            self.assertGreater(agent.root_node.n_sum, n_sum, msg)
+            self.assertEqual(agent.root_node.n_sum, agent.root_node.child_number_visits.sum() + 1, msg)
+            self.assertEqual(agent.search_workers, workers, msg)
+            self.assertEqual(threading.active_count(), nb_threads, msg)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+@file: node_store_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the array based search tree storage against the object based Node class
+"""
+import unittest
+from threading import Thread
+import chess
+import chess.variant
+import numpy as np
+from DeepCrazyhouse.src.domain.util import encode_move, decode_move
+from DeepCrazyhouse.src.domain.agent.player.util.node import Node
+from DeepCrazyhouse.src.domain.agent.player.util.node_store import NodeStore, MIN_BATCHED_BACKUP_LENGTH
+
+
+class NodeStoreTests(unittest.TestCase):
+    """ Checks that a StoreNode behaves exactly like a Node"""
+
+    def test_encode_move_given_all_crazyhouse_moves_expect_round_trip(self):
+        """ Every legal move (including drops and promotions) must be restored by decode_move()"""
+        board = chess.variant.CrazyhouseBoard("r3k2r/pPpq1ppp/2n5/8/8/2N5/PPPQ1PpP/R3K2R[NBnb] w KQkq - 0 1")
+        for move in board.legal_moves:
+            self.assertEqual(decode_move(encode_move(move)), move)
+
+    def test_store_node_given_same_updates_expect_same_statistics_as_node(self):
+        """ Applies the same virtual loss and value updates to a Node and a StoreNode and compares the statistics"""
+        board = chess.Board()
+        legal_moves = list(board.legal_moves)
+        p_vec_small = np.random.default_rng(0).dirichlet([0.3] * len(legal_moves)).astype(np.float32)
+        node = Node(board, 0.1, p_vec_small, legal_moves, clip_low_visit=False)
+        store = NodeStore()
+        store_node = store.get_node(store.add_node(board, 0.1, p_vec_small, legal_moves, clip_low_visit=False))
+
+        for child_idx, value in [(0, 0.5), (3, -0.2), (0, 1.0), (7, 0.0)]:
+            for cur in (node, store_node):
+                cur.apply_virtual_loss_to_child(child_idx, 3)
+                cur.revert_virtual_loss_and_update(child_idx, 3, value)
+
+        self.assertEqual(node.n_sum, store_node.n_sum)
+        self.assertEqual(list(store_node.legal_moves), legal_moves)
+        self.assertEqual(store_node.board.fen(), board.fen())
+        for attr in ["child_number_visits", "action_value", "q_value", "policy_prob"]:
+            np.testing.assert_allclose(getattr(node, attr), getattr(store_node, attr), rtol=1e-6, err_msg=attr)
+
+    def test_backup_given_long_path_expect_same_statistics_as_per_edge_updates(self):
+        """ The vectorized backup of a whole path must match the edge by edge updates of Node objects"""
+        board = chess.Board()
+        legal_moves = list(board.legal_moves)
+        p_vec_small = np.ones(len(legal_moves), dtype=np.float32) / len(legal_moves)
+        store = NodeStore()
+        nb_levels = MIN_BATCHED_BACKUP_LENGTH + 3
+        store_nodes = [store.get_node(store.add_node(board, 0.0, p_vec_small, legal_moves)) for _ in range(nb_levels)]
+        nodes = [Node(board, 0.0, p_vec_small, legal_moves) for _ in range(nb_levels)]
+        child_idcs = [idx % len(legal_moves) for idx in range(nb_levels)]
+
+        for path_length in [nb_levels, 2]:  # vectorized and edge by edge backup
+            for level in range(path_length):
+                store_nodes[level].apply_virtual_loss_to_child(child_idcs[level], 3)
+                nodes[level].apply_virtual_loss_to_child(child_idcs[level], 3)
+            store.backup(store_nodes[:path_length], child_idcs[:path_length], 0.4, 3)
+            value = 0.4
+            for node, child_idx in zip(nodes[:path_length], child_idcs):
+                node.revert_virtual_loss_and_update(child_idx, 3, value)
+                value = -value
+
+        for node, store_node in zip(nodes, store_nodes):
+            self.assertEqual(node.n_sum, store_node.n_sum)
+            for attr in ["child_number_visits", "action_value", "q_value"]:
+                np.testing.assert_allclose(getattr(node, attr), getattr(store_node, attr), err_msg=attr)
+
+    def test_backup_given_parallel_threads_expect_no_lost_updates(self):
+        """ Per-edge and batched backups of overlapping paths from several threads must all be applied"""
+        board = chess.Board()
+        legal_moves = list(board.legal_moves)
+        p_vec_small = np.ones(len(legal_moves), dtype=np.float32) / len(legal_moves)
+        store = NodeStore()
+        nb_levels, nb_threads, nb_playouts = MIN_BATCHED_BACKUP_LENGTH + 3, 8, 200
+        nodes = [store.get_node(store.add_node(board, 0.0, p_vec_small, legal_moves)) for _ in range(nb_levels)]
+
+        def worker(thread_id):
+            for playout in range(nb_playouts):
+                path_length = nb_levels if (thread_id + playout) % 2 else 3
+                for node in nodes[:path_length]:
+                    node.apply_virtual_loss_to_child(0, 3)
+                store.backup(nodes[:path_length], [0] * path_length, 0.0, 3)
+
+        threads = [Thread(target=worker, args=(thread_id,)) for thread_id in range(nb_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        nb_long_paths = nb_threads * nb_playouts // 2
+        for level, node in enumerate(nodes):
+            nb_visits = nb_threads * nb_playouts if level < 3 else nb_long_paths
+            self.assertEqual(node.n_sum, 1 + nb_visits)
+            self.assertEqual(node.child_number_visits[0], nb_visits)
+            self.assertEqual(node.action_value[0], 0)
+
+    def test_child_nodes_given_assigned_child_expect_same_view(self):
+        """ Assigning a child node must store its id and return an equal view afterwards"""
+        board = chess.Board()
+        legal_moves = list(board.legal_moves)
+        p_vec_small = np.ones(len(legal_moves), dtype=np.float32) / len(legal_moves)
+        store = NodeStore()
+        parent = store.get_node(store.add_node(board, 0.0, p_vec_small, legal_moves))
+        self.assertIsNone(parent.child_nodes[2])
+        board.push(legal_moves[2])
+        child_moves = list(board.legal_moves)
+        child = store.get_node(store.add_node(board, 0.0, np.ones(len(child_moves), dtype=np.float32), child_moves))
+        parent.child_nodes[2] = child
+        self.assertEqual(parent.child_nodes[2], child)
+        self.assertEqual(parent.child_nodes[2].board.fen(), board.fen())
+
+    def test_compact_given_reused_subtree_expect_only_reachable_nodes_with_same_statistics(self):
+        """ Compacting keeps the subtree of the new root (including transpositions) and drops all other nodes"""
+        board = chess.Board()
+        legal_moves = list(board.legal_moves)
+        p_vec_small = np.ones(len(legal_moves), dtype=np.float32) / len(legal_moves)
+        store = NodeStore()
+        nodes = [store.get_node(store.add_node(board, 0.1 * idx, p_vec_small, legal_moves)) for idx in range(5)]
+        # 0 -> 1, 0 -> 2, 2 -> 3, 2 -> 4, 3 -> 4 (transposition)
+        for parent, child_idx, child in [(0, 0, 1), (0, 1, 2), (2, 3, 3), (2, 5, 4), (3, 7, 4)]:
+            nodes[parent].child_nodes[child_idx] = nodes[child]
+            nodes[parent].apply_virtual_loss_to_child(child_idx, 3)
+            nodes[parent].revert_virtual_loss_and_update(child_idx, 3, 0.1 * child)
+        expected = {idx: (nodes[idx].n_sum, nodes[idx].initial_value, nodes[idx].child_number_visits.copy(),
+                          nodes[idx].q_value.copy()) for idx in (2, 3, 4)}
+
+        id_map = store.compact(nodes[2].node_id)
+        self.assertEqual(store.nb_nodes, 3)
+        self.assertEqual(list(id_map[:2]), [-1, -1])
+        root = store.get_node(0)
+        compacted = {2: root, 3: root.child_nodes[3], 4: root.child_nodes[5]}
+        self.assertEqual(compacted[3].child_nodes[7], compacted[4])
+        for idx, node in compacted.items():
+            self.assertEqual(node.node_id, id_map[idx])
+            self.assertEqual(node.n_sum, expected[idx][0])
+            self.assertAlmostEqual(node.initial_value, expected[idx][1])
+            np.testing.assert_array_equal(node.child_number_visits, expected[idx][2])
+            np.testing.assert_array_equal(node.q_value, expected[idx][3])
+            self.assertEqual(list(node.legal_moves), legal_moves)
+        # new nodes are appended after the compacted nodes
+        self.assertEqual(store.add_node(board, 0.0, p_vec_small, legal_moves), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+@file: opening_book_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the move encoding and the look-up of the memory-mapped opening book
+"""
+import os
+import tempfile
+import unittest
+import chess
+import chess.variant
+from DeepCrazyhouse.src.domain.agent.player.mcts_agent import MCTSAgent
+from DeepCrazyhouse.src.domain.agent.player.util.opening_book import (
+    OpeningBook,
+    decode_book_move,
+    encode_book_move,
+    write_opening_book,
+)
+from DeepCrazyhouse.src.domain.variants.position import compute_hash
+from DeepCrazyhouse.src.tests.fixtures import ConstantBackend
+from DeepCrazyhouse.src.tools.opening_book.create_opening_book import search_positions
+
+
+class OpeningBookTests(unittest.TestCase):
+    """ Checks the round trip of the move encoding and the book file"""
+
+    def test_encode_book_move_given_drops_and_promotions_expect_same_move_decoded(self):
+        """ Every move type must survive the 16 bit encoding"""
+        moves = [chess.Move.from_uci(uci) for uci in ["e2e4", "a7a8q", "h2h1n", "P@e6", "Q@a1", "a1h8"]]
+        for move in moves:
+            self.assertEqual(decode_book_move(encode_book_move(move)), move)
+        board = chess.variant.CrazyhouseBoard()
+        for move in board.legal_moves:
+            self.assertEqual(decode_book_move(encode_book_move(move)), move)
+
+    def test_select_move_given_book_positions_expect_most_visited_move(self):
+        """ A temperature of 0 plays the most visited legal move and unknown positions return None"""
+        board = chess.Board()
+        after_e4 = chess.Board()
+        after_e4.push_uci("e2e4")
+        entries = [
+            (compute_hash(board), 0.1, [chess.Move.from_uci(uci) for uci in ["d2d4", "e2e4", "g1f3"]], [300, 500, 200]),
+            (compute_hash(after_e4), -0.05, [chess.Move.from_uci("c7c5"), chess.Move.from_uci("e2e4")], [10, 90]),
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            book_file = os.path.join(tmp_dir, "book.bin")
+            self.assertEqual(write_opening_book(book_file, entries), 2)
+            book = OpeningBook(book_file)
+            self.assertEqual(len(book), 2)
+
+            move, value, probability, nb_visits = book.select_move(board)
+            self.assertEqual(move, chess.Move.from_uci("e2e4"))
+            self.assertAlmostEqual(value, 0.1, places=5)
+            self.assertAlmostEqual(probability, 0.5)
+            self.assertEqual(nb_visits, 1000)
+            # the illegal move e2e4 after 1.e4 is filtered out
+            self.assertEqual(book.select_move(after_e4, temperature=1.0)[0], chess.Move.from_uci("c7c5"))
+
+            board.push_uci("d2d4")
+            self.assertIsNone(book.select_move(board))
+            del book
+
+    def test_search_positions_given_earlier_parent_position_expect_same_visits(self):
+        """ The visits of a book position must not contain the visits of the search of an earlier position"""
+        board = chess.Board()
+        board.push_uci("e2e4")
+        fens = [(chess.Board().fen(), "chess"), (board.fen(), "chess")]
+        agent = MCTSAgent([ConstantBackend()], threads=1, batch_size=1, playouts_empty_pockets=16,
+                          playouts_filled_pockets=16, dirichlet_epsilon=0, use_pruning=False,
+                          use_time_management=False, min_movetime=10 ** 9, verbose=False)
+        expected_visits = list(search_positions(agent, fens[1:]))[0][3]
+        entries = list(search_positions(agent, fens))
+        self.assertEqual(entries[1][3], expected_visits)
+        self.assertEqual(sum(entries[1][3]), sum(entries[0][3]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,8 @@ Testing outputs
 
 This file contains the test cases for testing the outputs
 """
+import os
+import tempfile
 import unittest
 import chess
 import numpy as np
@@ -15,7 +17,13 @@ from DeepCrazyhouse.src.domain.variants.plane_policy_representation import (
     get_plane_index_queen_move,
     get_move_planes,
 )
-from DeepCrazyhouse.src.domain.util import get_board_position_index
+from DeepCrazyhouse.src.domain.variants.output_representation import (
+    get_move_index_lookup,
+    get_probs_of_move_list,
+    get_probs_of_move_lists,
+)
+from DeepCrazyhouse.src.domain.variants.constants import MV_LOOKUP, MV_LOOKUP_MIRRORED, NB_LABELS
+from DeepCrazyhouse.src.domain.util import get_board_position_index, encode_move
 
 
 class OutputRepresentationTests(unittest.TestCase):
@@ -132,3 +140,28 @@ class OutputRepresentationTests(unittest.TestCase):
 
         # test that all ids where selected once
         self.assertTrue(np.all(aggregated_selected_boards == 1), "some boards where selected never or more than once")
+
+    def test_get_move_index_lookup_given_cache_file_expect_same_indices_as_uci_lookup(self):
+        """ The integer lookup table must agree with the uci string look-up tables and survive a .npy round trip"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_file = os.path.join(tmp_dir, "move_index_lookup.npy")
+            for lookup in [get_move_index_lookup(cache_file), get_move_index_lookup(cache_file)]:
+                for mirror, uci_lookup in enumerate([MV_LOOKUP, MV_LOOKUP_MIRRORED]):
+                    for uci, mv_idx in uci_lookup.items():
+                        self.assertEqual(lookup[mirror, encode_move(chess.Move.from_uci(uci))], mv_idx)
+
+    def test_get_probs_of_move_lists_given_batch_expect_same_as_single_gather(self):
+        """ The batched gather must return the same normalized probabilities as get_probs_of_move_list()"""
+        rng = np.random.default_rng(0)
+        board = chess.Board()
+        mv_lists, mirror_policies = [], []
+        for uci_move in ["e2e4", "e7e5", "g1f3"]:
+            mv_lists.append(list(board.legal_moves))
+            mirror_policies.append(board.turn == chess.BLACK)
+            board.push_uci(uci_move)
+        policy_vecs = rng.random((len(mv_lists), NB_LABELS)).astype(np.float32)
+        p_vecs_small = get_probs_of_move_lists(policy_vecs, mv_lists, mirror_policies)
+        for idx, p_vec_small in enumerate(p_vecs_small):
+            expected = get_probs_of_move_list(policy_vecs[idx], mv_lists[idx], mirror_policies[idx])
+            self.assertTrue(np.allclose(p_vec_small, expected))
+        self.assertAlmostEqual(float(p_vecs_small[0].sum()), 1.0, places=5)
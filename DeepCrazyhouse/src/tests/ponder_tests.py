@@ -0,0 +1,123 @@
+"""
+@file: ponder_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the "go ponder", "ponderhit" and "stop" commands of the uci interface and the time management of the MCTSAgent
+during unbounded searches
+"""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from threading import Event
+from time import sleep, time
+import chess.variant
+from crazyara import CrazyAra
+from DeepCrazyhouse.src.domain.agent.player.mcts_agent import MCTSAgent
+from DeepCrazyhouse.src.domain.variants.game_state import GameState
+from DeepCrazyhouse.src.tests.fixtures import ConstantBackend
+
+
+class StubAgent:
+    """Agent which searches until its movetime has passed or the stop event is set and plays the first legal move"""
+
+    def __init__(self):
+        self.stop_event = Event()
+        self.movetime_ms = 0
+        self.is_unbounded_search = False
+        self.dirichlet_epsilon = 0.25
+
+    def update_movetime(self, time_ms_per_move, is_unbounded=False):
+        self.movetime_ms = time_ms_per_move
+        self.is_unbounded_search = is_unbounded
+
+    def set_max_search_depth(self, max_search_depth: int):
+        pass
+
+    def perform_action(self, state: GameState):
+        t_start = time()
+        while not self.stop_event.is_set() and (time() - t_start) * 1000 < self.movetime_ms:
+            sleep(0.005)
+        selected_move = state.get_legal_moves()[0]
+        return 0.1, selected_move, 1.0, 0, 10, 1, 100, (time() - t_start) * 1000, 1000, selected_move.uci()
+
+
+class PonderTests(unittest.TestCase):
+    """ Checks that pondering neither sends the bestmove too early nor corrupts the time management"""
+
+    def setUp(self):
+        # the engine writes its log file into the working directory
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        self.engine = CrazyAra()
+        self.engine.mcts_agent = StubAgent()
+        self.engine.ab_agent = StubAgent()
+        self.engine.gamestate = GameState(chess.variant.CrazyhouseBoard())
+
+    def tearDown(self):
+        self.engine.log_file.close()
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def _send(self, line: str):
+        self.engine.cmd_list = line.split(" ")
+        if self.engine.cmd_list[0] == "go":
+            self.engine.go()
+        elif self.engine.cmd_list[0] == "ponderhit":
+            self.engine.ponderhit()
+        else:
+            self.engine.stop()
+
+    def test_go_ponder_given_ponderhit_and_stop_expect_bounded_movetime_and_applied_move(self):
+        """ The ponder search is unbounded until the ponderhit which sets the movetime of both agents"""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self._send("go ponder movetime 1300")
+            self.assertTrue(self.engine.mcts_agent.is_unbounded_search)
+            self.assertEqual(self.engine.mcts_agent.movetime_ms, self.engine.max_search_time)
+            self.assertEqual(self.engine.ab_agent.movetime_ms, self.engine.max_search_time)
+            sleep(0.1)
+            self.assertNotIn("bestmove", output.getvalue())
+
+            self._send("ponderhit")
+            self.assertFalse(self.engine.mcts_agent.is_unbounded_search)
+            for agent in (self.engine.mcts_agent, self.engine.ab_agent):
+                self.assertGreaterEqual(agent.movetime_ms, 1000 + 100)
+                self.assertLess(agent.movetime_ms, 1000 + 1000)
+            self._send("stop")
+
+        self.assertIsNone(self.engine.search_thread)
+        self.assertIn("bestmove", output.getvalue())
+        self.assertFalse(self.engine.rebuild_gamestate)
+        self.assertEqual(len(self.engine.gamestate.get_pythonchess_board().move_stack), 1)
+
+    def test_go_ponder_given_stop_expect_ponder_miss(self):
+        """ A stop during pondering sends the bestmove without applying it to the game state"""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self._send("go ponder movetime 1300")
+            self._send("stop")
+
+        self.assertIn("bestmove", output.getvalue())
+        self.assertTrue(self.engine.rebuild_gamestate)
+        self.assertEqual(len(self.engine.gamestate.get_pythonchess_board().move_stack), 0)
+
+    def test_mcts_agent_given_unbounded_single_move_search_expect_unchanged_time_buffer(self):
+        """ The unbounded movetime of a ponder search must not be added to the time buffer"""
+        agent = MCTSAgent([ConstantBackend(batch_size=8)], threads=2, batch_size=1, verbose=False)
+        # the king must capture the checking queen
+        state = GameState(chess.variant.CrazyhouseBoard("7k/8/8/8/8/8/6q1/7K[] w - - 0 1"))
+        agent.update_movetime(self.engine.max_search_time, is_unbounded=True)
+        agent.evaluate_board_state(state)
+        self.assertEqual(agent.time_buffer_ms, 0)
+        agent.update_movetime(1000)
+        agent.evaluate_board_state(state)
+        self.assertEqual(agent.time_buffer_ms, 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
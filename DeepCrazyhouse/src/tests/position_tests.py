@@ -0,0 +1,66 @@
+"""
+@file: position_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the make/unmake of moves and the incremental Zobrist hash of the search position
+"""
+import random
+import unittest
+import chess
+import chess.variant
+from DeepCrazyhouse.src.domain.variants.position import Position, compute_hash
+
+
+class PositionTests(unittest.TestCase):
+    """ Compares the incrementally updated hash with the hash computed from scratch along random games"""
+
+    def test_make_unmake_given_random_games_expect_hash_of_board(self):
+        """ After every make() and unmake() the hash must be equal to the one of the current board"""
+        random.seed(42)
+        for board_type in [chess.Board, chess.variant.CrazyhouseBoard, chess.variant.ThreeCheckBoard,
+                           chess.variant.AtomicBoard, chess.variant.HordeBoard]:
+            position = Position(board_type())
+            hashes = [position.hash]
+            for _ in range(80):
+                legal_moves = list(position.board.legal_moves)
+                if not legal_moves or position.board.is_variant_end():
+                    break
+                position.make(random.choice(legal_moves))
+                self.assertEqual(position.hash, compute_hash(position.board), board_type.uci_variant)
+                hashes.append(position.hash)
+            while position.board.move_stack:
+                hashes.pop()
+                position.unmake()
+                self.assertEqual(position.hash, hashes[-1])
+            self.assertEqual(position.board, board_type())
+
+    def test_hash_given_transposition_expect_equal_hash(self):
+        """ The same position reached by different move orders must have the same hash"""
+        position_a = Position(chess.variant.CrazyhouseBoard())
+        position_b = Position(chess.variant.CrazyhouseBoard())
+        for move in ["e2e4", "e7e5", "g1f3", "b8c6"]:
+            position_a.make(chess.Move.from_uci(move))
+        for move in ["g1f3", "b8c6", "e2e4", "e7e5"]:
+            position_b.make(chess.Move.from_uci(move))
+        self.assertEqual(position_a.hash, position_b.hash)
+        position_b.unmake()
+        self.assertNotEqual(position_a.hash, position_b.hash)
+
+    def test_count_given_knight_moves_back_and_forth_expect_repetitions(self):
+        """ The hash stack must count the earlier occurrences of a position and forget them on unmake()"""
+        position = Position(chess.variant.CrazyhouseBoard())
+        for _ in range(2):
+            for move in ["g1f3", "g8f6", "f3g1", "f6g8"]:
+                position.make(chess.Move.from_uci(move))
+        self.assertEqual(position.count(), 2)
+        self.assertEqual(position.get_history()[position.hash], 2)
+        position.unmake()
+        self.assertEqual(position.count(), 1)
+        position.refresh()
+        self.assertEqual(position.count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
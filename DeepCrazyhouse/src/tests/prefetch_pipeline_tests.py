@@ -0,0 +1,47 @@
+"""
+@file: prefetch_pipeline_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the streaming prefetch pipeline of the pytorch training loop
+"""
+import unittest
+import numpy as np
+from DeepCrazyhouse.src.training.prefetch_pipeline import PrefetchPipeline
+
+
+def _load_part(part_id):
+    """ Returns a part with 100 samples whose ids encode the part id"""
+    sample_ids = np.arange(100) + 1000 * part_id
+    return [sample_ids.astype(np.int32), np.full(100, part_id, np.int16)]
+
+
+class PrefetchPipelineTests(unittest.TestCase):
+    """ Checks that every sample is returned exactly once and that the samples are mixed across parts"""
+
+    def test_iterate_given_small_shuffle_buffer_expect_all_samples_once(self):
+        """ Every sample of every part must be returned once, the batches must mix neighbouring parts"""
+        # a budget of 64 bytes limits the shuffle buffer to the minimum capacity of one batch
+        for max_memory_bytes in [64, 2 ** 20]:
+            pipeline = PrefetchPipeline(_load_part, batch_size=16, max_memory_bytes=max_memory_bytes, seed=0)
+            batches = list(pipeline.iterate([2, 0, 1]))
+            sample_ids = np.concatenate([batch[0].numpy() for batch in batches]).astype(np.int64)
+            self.assertEqual(sorted(sample_ids.tolist()), sorted(np.concatenate([_load_part(i)[0] for i in range(3)])))
+            self.assertTrue(all(len(batch[0]) == 16 for batch in batches[:-1]))
+            self.assertTrue(all((batch[0].numpy() // 1000 == batch[1].numpy()).all() for batch in batches))
+            if max_memory_bytes > 64:
+                self.assertTrue(any(len(np.unique(batch[1].numpy())) > 1 for batch in batches))
+
+    def test_iterate_given_early_exit_expect_pipeline_reusable(self):
+        """ Leaving the generator early must stop the threads, so that the next epoch starts cleanly"""
+        pipeline = PrefetchPipeline(_load_part, batch_size=8, max_memory_bytes=2 ** 20, seed=0)
+        for batch in pipeline.iterate([0, 1]):
+            self.assertEqual(len(batch[0]), 8)
+            break
+        nb_samples = sum(len(batch[0]) for batch in pipeline.iterate([1]))
+        self.assertEqual(nb_samples, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+"""
+@file: puct_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the PUCT selection kernel against the plain numpy formula
+"""
+import math
+import unittest
+import numpy as np
+from DeepCrazyhouse.src.domain.agent.player.util.puct import select_puct_child, MAX_CHILDREN_PYTHON_LOOP
+
+
+class PuctTests(unittest.TestCase):
+    """ Both code paths of the kernel must select the child with the highest score"""
+
+    def test_select_puct_child_given_random_nodes_expect_argmax_of_score(self):
+        """ The selected child must be the argmax of Q + U for small and large branching factors"""
+        rng = np.random.default_rng(0)
+        for nb_children in [1, 3, MAX_CHILDREN_PYTHON_LOOP, MAX_CHILDREN_PYTHON_LOOP + 1, 150]:
+            for _ in range(20):
+                policy_prob = rng.dirichlet(np.ones(nb_children)).astype(np.float32)
+                child_number_visits = rng.integers(0, 30, nb_children).astype(np.float64)
+                q_value = rng.uniform(-1, 1, nb_children)
+                n_sum = int(child_number_visits.sum()) + 1
+                cpuct = math.log((n_sum + 19652 + 1) / 19652) + 2.5
+                score = q_value + cpuct * policy_prob * (np.sqrt(n_sum) / (0.5 + child_number_visits))
+                child_idx = select_puct_child(q_value, policy_prob, child_number_visits, n_sum, 2.5, 0.5)
+                self.assertAlmostEqual(score[child_idx], score.max(), places=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
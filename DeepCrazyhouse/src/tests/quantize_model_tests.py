@@ -0,0 +1,77 @@
+"""
+@file: quantize_model_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the FX graph mode INT8 quantization and the accuracy and throughput report of quantize_model.py
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+import torch
+from torch import nn
+from DeepCrazyhouse.src.domain.variants.constants import BOARD_HEIGHT, BOARD_WIDTH, NB_CHANNELS_TOTAL, NB_LABELS
+from DeepCrazyhouse.src.preprocessing.shard_format import write_shard
+from DeepCrazyhouse.src.quanitzation.quantize_model import TorchModuleAPI, create_report, quantize_fx
+
+NB_POSITIONS = 32
+BATCH_SIZE = 8
+
+
+class TinyModel(nn.Module):
+    """ Conv2d + BatchNorm2d body whose activation maps are flattened by view() like the pytorch architectures"""
+
+    def __init__(self):
+        super().__init__()
+        self.body = nn.Sequential(nn.Conv2d(NB_CHANNELS_TOTAL, 8, 3, padding=1), nn.BatchNorm2d(8), nn.ReLU())
+        self.value_fc = nn.Linear(8 * BOARD_HEIGHT * BOARD_WIDTH, 1)
+        self.policy_fc = nn.Linear(8 * BOARD_HEIGHT * BOARD_WIDTH, NB_LABELS)
+
+    def forward(self, x):
+        x = self.body(x)
+        x = x.view(-1, 8 * BOARD_HEIGHT * BOARD_WIDTH)
+        return torch.tanh(self.value_fc(x)), self.policy_fc(x)
+
+
+def _write_synthetic_shard(filepath: str):
+    """ Writes a shard with random input planes and targets"""
+    rng = np.random.default_rng(0)
+    write_shard(filepath, {
+        "start_indices": np.zeros(1, np.int32),
+        "x": rng.integers(0, 2, (NB_POSITIONS, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH)).astype(np.int16),
+        "y_value": rng.choice([-1, 0, 1], NB_POSITIONS).astype(np.int16),
+        "y_policy": rng.integers(0, NB_LABELS, NB_POSITIONS).astype(np.int16),
+    })
+
+
+class QuantizeModelTests(unittest.TestCase):
+    """ Checks the outputs of the quantized model and the entries of the report"""
+
+    def test_quantize_fx_given_synthetic_shard_expect_output_shapes_and_report_keys(self):
+        """ The quantized model must keep the output shapes and the report must compare it with the float model"""
+        torch.manual_seed(42)
+        model = TinyModel().eval()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shard_file = os.path.join(tmp_dir, "part_0.shard")
+            _write_synthetic_shard(shard_file)
+            quantized_model = quantize_fx(model, shard_file, nb_calibration_positions=NB_POSITIONS,
+                                          batch_size=BATCH_SIZE)
+            with torch.no_grad():
+                value, policy = quantized_model(torch.rand(BATCH_SIZE, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH))
+            self.assertEqual(tuple(value.shape), (BATCH_SIZE, 1))
+            self.assertEqual(tuple(policy.shape), (BATCH_SIZE, NB_LABELS))
+
+            report = create_report(TorchModuleAPI(model, BATCH_SIZE), TorchModuleAPI(quantized_model, BATCH_SIZE),
+                                   shard_file, nb_positions=NB_POSITIONS, batch_size=BATCH_SIZE, nb_iterations=2)
+        self.assertEqual([entry["model"] for entry in report], ["float", "int8"])
+        self.assertEqual(set(report[0]), {"model", "policy_acc", "value_mse", "positions_per_s"})
+        self.assertEqual(set(report[1]), {"model", "policy_acc", "value_mse", "positions_per_s", "policy_acc_drop",
+                                          "value_mse_increase", "speed_up"})
+        self.assertAlmostEqual(report[1]["policy_acc_drop"], report[0]["policy_acc"] - report[1]["policy_acc"])
+        self.assertGreater(report[1]["speed_up"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
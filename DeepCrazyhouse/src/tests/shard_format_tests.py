@@ -0,0 +1,68 @@
+"""
+@file: shard_format_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the memory mapped training shard format
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+import zarr
+from DeepCrazyhouse.src.preprocessing.shard_format import SHARD_ALIGNMENT, convert_zarr_to_shard, open_shard,\
+    read_shard_header, write_shard
+
+
+class ShardFormatTests(unittest.TestCase):
+    """ Round trips of the shard writer, the memory mapped reader and the zarr converter"""
+
+    def test_open_shard_given_written_arrays_expect_aligned_identical_memmaps(self):
+        """ All arrays must be restored with dtype and shape and start at an aligned offset"""
+        rng = np.random.default_rng(0)
+        arrays = {"x": rng.integers(-5, 5, (7, 3, 8, 8)).astype(np.int16),
+                  "y_value": np.array([1, -1, 0, 1, 1, -1, 0], np.int16),
+                  "y_best_move_q": rng.random(7).astype(np.float32),
+                  "plys_to_end": None}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, "part.shard")
+            write_shard(filepath, arrays)
+            for descriptor in read_shard_header(filepath).values():
+                self.assertEqual(descriptor["offset"] % SHARD_ALIGNMENT, 0)
+            shard = open_shard(filepath)
+            self.assertIsNone(shard["plys_to_end"])
+            for name in ["x", "y_value", "y_best_move_q"]:
+                self.assertIsInstance(shard[name], np.memmap)
+                self.assertEqual(shard[name].dtype, arrays[name].dtype)
+                self.assertTrue(np.array_equal(shard[name], arrays[name]))
+            # copy-on-write must not modify the file
+            shard["x"][0] = 100
+            del shard
+            self.assertTrue(np.array_equal(open_shard(filepath)["x"], arrays["x"]))
+
+    def test_convert_zarr_to_shard_given_one_hot_policy_expect_move_indices(self):
+        """ One-hot policy targets are stored as move indices, all other arrays are copied unchanged"""
+        y_policy = np.zeros((4, 10), np.int16)
+        y_policy[np.arange(4), [3, 0, 9, 3]] = 1
+        arrays = {"start_indices": np.array([0, 2]), "x": np.ones((4, 2, 8, 8), np.int16),
+                  "y_value": np.array([1, -1, 1, -1], np.int16), "y_policy": y_policy,
+                  "plys_to_end": np.array([3, 2, 1, 0], np.int16), "phase_vector": np.array([0, 0, 1, 1], np.int16)}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            zarr_filepath = os.path.join(tmp_dir, "part.zip")
+            store = zarr.ZipStore(zarr_filepath, mode="w")
+            group = zarr.group(store=store)
+            for name, array in arrays.items():
+                group.create_dataset(name, data=array, shape=array.shape, dtype=array.dtype)
+            store.close()
+            shard_filepath = os.path.join(tmp_dir, "part.shard")
+            self.assertEqual(convert_zarr_to_shard(zarr_filepath, shard_filepath), 4)
+            shard = open_shard(shard_filepath)
+            self.assertTrue(np.array_equal(shard["y_policy"], [3, 0, 9, 3]))
+            for name in ["start_indices", "x", "y_value", "plys_to_end", "phase_vector"]:
+                self.assertTrue(np.array_equal(shard[name], arrays[name]))
+            self.assertIsNone(shard["y_best_move_q"])
+
+
+if __name__ == "__main__":
+    unittest.main()
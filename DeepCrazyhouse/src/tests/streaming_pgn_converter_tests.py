@@ -0,0 +1,102 @@
+"""
+@file: streaming_pgn_converter_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the chunked conversion of the streaming pgn converter against the conversion of every single game
+"""
+import io
+import os
+import tempfile
+import unittest
+import chess
+import chess.pgn
+import numpy as np
+from DeepCrazyhouse.src.preprocessing.pgn_converter_util import get_planes_from_pgn
+from DeepCrazyhouse.src.preprocessing.shard_format import open_shard
+from DeepCrazyhouse.src.preprocessing.streaming_pgn_converter import StreamingPGNConverter, split_pgn_file
+
+NB_GAMES = 8
+SHM_DIR = "/dev/shm"
+
+
+def _create_pgn(filepath: str):
+    """
+    Writes NB_GAMES games of random legal moves into a pgn file
+    :return: List of the pgn texts of the games
+    """
+    rng = np.random.default_rng(0)
+    games = []
+    for game_idx in range(NB_GAMES):
+        board = chess.Board()
+        for _ in range(20 + 2 * game_idx):
+            legal_moves = list(board.legal_moves)
+            if not legal_moves:
+                break
+            board.push(legal_moves[rng.integers(len(legal_moves))])
+        game = chess.pgn.Game.from_board(board)
+        game.headers["White"] = "white_%d" % game_idx
+        game.headers["Result"] = ["1-0", "0-1", "1/2-1/2"][game_idx % 3]
+        games.append(str(game) + "\n\n")
+    with open(filepath, "w") as file:
+        file.write("".join(games))
+    return games
+
+
+def _get_shm_blocks():
+    """ Returns the names of all shared memory blocks of the multiprocessing module"""
+    return {name for name in os.listdir(SHM_DIR) if name.startswith("psm_")} if os.path.isdir(SHM_DIR) else set()
+
+
+class StreamingPGNConverterTests(unittest.TestCase):
+    """ Checks the exported parts of several chunks and the release of the shared memory after an early exit"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pgn_filepath = os.path.join(self.tmp_dir.name, "games.pgn")
+        self.games = _create_pgn(self.pgn_filepath)
+        # about two games per chunk
+        self.chunk_size = 2 * os.path.getsize(self.pgn_filepath) // NB_GAMES
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_convert_pgn_given_several_chunks_expect_same_arrays_as_single_game_conversion(self):
+        """ Every game of the part must match get_planes_from_pgn() and start at its start index"""
+        self.assertGreater(len(split_pgn_file(self.pgn_filepath, self.chunk_size)), 2)
+        export_dir = os.path.join(self.tmp_dir.name, "parts")
+        converter = StreamingPGNConverter(nb_games_per_file=NB_GAMES, use_all_games=True, processes=2,
+                                          chunk_size=self.chunk_size, use_shards=True)
+        self.assertEqual(converter.convert_pgn(self.pgn_filepath, export_dir), NB_GAMES)
+        part = open_shard(os.path.join(export_dir, "games_0.shard"))
+
+        # the chunks are received in the order in which the workers finished them, so the games are matched by x
+        expected_games = {}
+        for game in self.games:
+            _, _, x, y_value, y_policy, plys_to_end, phase_vector = get_planes_from_pgn((io.StringIO(game), 1, False))
+            expected_games[x.astype(np.int16).tobytes()] = (x, y_value, y_policy, plys_to_end, phase_vector)
+        start_indices = np.append(part["start_indices"], len(part["x"]))
+        self.assertEqual(len(start_indices) - 1, NB_GAMES)
+        self.assertEqual(start_indices[0], 0)
+        for start, end in zip(start_indices[:-1], start_indices[1:]):
+            expected = expected_games.pop(np.asarray(part["x"][start:end]).tobytes())
+            for name, expected_array in zip(["x", "y_value", "y_policy", "plys_to_end", "phase_vector"], expected):
+                np.testing.assert_array_equal(part[name][start:end], expected_array, err_msg=name)
+        self.assertEqual(expected_games, {})
+
+    def test_convert_pgn_given_max_nb_files_expect_early_exit_without_shared_memory_blocks(self):
+        """ The chunks which are still in flight after the last part must release their shared memory blocks"""
+        shm_blocks = _get_shm_blocks()
+        export_dir = os.path.join(self.tmp_dir.name, "parts")
+        converter = StreamingPGNConverter(nb_games_per_file=1, max_nb_files=1, use_all_games=True, processes=2,
+                                          chunk_size=self.chunk_size, use_shards=True)
+        nb_games = converter.convert_pgn(self.pgn_filepath, export_dir)
+        self.assertGreaterEqual(nb_games, 1)
+        self.assertLess(nb_games, NB_GAMES)
+        self.assertEqual(os.listdir(export_dir), ["games_0.shard"])
+        self.assertEqual(_get_shm_blocks() - shm_blocks, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
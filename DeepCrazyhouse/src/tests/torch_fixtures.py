@@ -0,0 +1,34 @@
+"""
+@file: torch_fixtures.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Small PyTorch models which are shared by the training tests (kept apart from fixtures.py, so that the search tests
+don't depend on torch)
+"""
+import torch
+from torch import nn
+
+NB_CHANNELS = 4
+NB_POLICY_OUTPUTS = 16
+
+
+class SmallModel(nn.Module):
+    """ Convolutional body with a value and a policy head which flatten the activation maps by reshape()"""
+
+    def __init__(self, use_batch_norm=True):
+        """
+        Constructor
+        :param use_batch_norm: If False, the body has no batch normalisation, e.g. for the data-parallel training
+         where the batch statistics are local to every process
+        """
+        super().__init__()
+        layers = [nn.Conv2d(NB_CHANNELS, 8, 3, padding=1)] + ([nn.BatchNorm2d(8)] if use_batch_norm else [])
+        self.body = nn.Sequential(*layers, nn.ReLU())
+        self.value_fc = nn.Linear(8 * 64, 1)
+        self.policy_fc = nn.Linear(8 * 64, NB_POLICY_OUTPUTS)
+
+    def forward(self, x):
+        x = self.body(x).reshape(-1, 8 * 64)
+        return torch.tanh(self.value_fc(x)), self.policy_fc(x)
@@ -0,0 +1,61 @@
+"""
+@file: train_update_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the mixed precision, channels_last and fused optimizer switches of TrainerAgentPytorch.train_update()
+"""
+import unittest
+import torch
+from DeepCrazyhouse.configs.train_config import TrainConfig, TrainObjects
+from DeepCrazyhouse.src.training.trainer_agent_pytorch import TrainerAgentPytorch, get_amp_dtype
+from DeepCrazyhouse.src.tests.torch_fixtures import NB_CHANNELS, NB_POLICY_OUTPUTS, SmallModel
+
+
+def _train_steps(nb_steps=3, **switches):
+    """ Runs train updates on a fixed batch and returns the trained model"""
+    torch.manual_seed(42)
+    tc = TrainConfig()
+    tc.context = "cpu"
+    tc.use_wdl = tc.use_plys_to_end = False
+    tc.log_metrics_to_tensorboard = False
+    tc.nb_parts = tc.total_it = 1
+    for name, value in switches.items():
+        setattr(tc, name, value)
+    train_objects = TrainObjects()
+    train_objects.lr_schedule = lambda it: 0.01
+    train_objects.momentum_schedule = lambda it: 0.9
+    model = SmallModel()
+    trainer = TrainerAgentPytorch(model, None, tc, train_objects, use_rtpt=False)
+    trainer.cur_it = trainer.batch_proc_tmp = 0
+    batch = [torch.rand(32, NB_CHANNELS, 8, 8), torch.rand(32) * 2 - 1,
+             torch.randint(0, NB_POLICY_OUTPUTS, (32,)).float(), torch.zeros(32)]
+    for _ in range(nb_steps):
+        trainer.train_update(batch)
+    return model
+
+
+class TrainUpdateTests(unittest.TestCase):
+    """ Checks that the performance switches don't change the training result beyond the numerical precision"""
+
+    def test_train_update_given_channels_last_and_fused_optimizer_expect_same_weights(self):
+        """ The memory format and the fused optimizer must only change the speed of the training"""
+        expected_model = _train_steps()
+        model = _train_steps(use_channels_last=True, use_fused_optimizer=True)
+        self.assertTrue(model.body[0].weight.is_contiguous(memory_format=torch.channels_last))
+        for param, expected_param in zip(model.parameters(), expected_model.parameters()):
+            torch.testing.assert_close(param, expected_param, rtol=1e-4, atol=1e-5)
+
+    def test_train_update_given_bf16_expect_close_weights(self):
+        """ The bf16 forward pass must lead to a similar update as full precision"""
+        expected_model = _train_steps()
+        model = _train_steps(amp_dtype="bf16")
+        for param, expected_param in zip(model.parameters(), expected_model.parameters()):
+            self.assertEqual(param.dtype, torch.float32)
+            torch.testing.assert_close(param, expected_param, rtol=0.05, atol=0.01)
+        self.assertRaises(Exception, get_amp_dtype, "fp8")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+@file: transposition_table_tests.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Tests the look-up and the replacement policy of the bounded transposition table
+"""
+import unittest
+from threading import Thread
+from DeepCrazyhouse.src.domain.agent.player.util.transposition_table import TranspositionTable
+
+
+class _FakeNode:
+    """ Minimal node which only provides the visit count"""
+
+    def __init__(self, n_sum):
+        self.n_sum = n_sum
+
+
+class TranspositionTableTests(unittest.TestCase):
+    """ Checks the look-up, the capacity limit and the replacement of entries within a full bucket"""
+
+    def test_get_given_stored_node_expect_node_only_for_same_move_number(self):
+        """ A stored node must be found again, but not for a different move number"""
+        table = TranspositionTable(size_mb=1)
+        node = _FakeNode(0)
+        table.store(2 ** 63 + 5, 3, node, 1)
+        self.assertIs(table.get(2 ** 63 + 5, 3), node)
+        self.assertIsNone(table.get(2 ** 63 + 5, 4))
+        self.assertEqual(table.nb_entries, 1)
+        self.assertAlmostEqual(table.hit_rate(), 0.5)
+
+    def test_store_given_full_bucket_expect_replacement_by_scheme(self):
+        """ Aged entries are replaced first, afterwards the node with the fewest visits or the deepest node"""
+        for replacement, expected_key in [("visits", 0), ("depth", 1)]:
+            table = TranspositionTable(size_mb=1, replacement=replacement)
+            nb_buckets = table.nb_buckets
+            # three keys of the same bucket (the bucket holds two entries)
+            table.store(0, 1, _FakeNode(1), 1)
+            table.store(nb_buckets, 1, _FakeNode(10), 5)
+            table.store(2 * nb_buckets, 1, _FakeNode(5), 3)
+            self.assertEqual(table.nb_entries, 2)
+            self.assertIsNone(table.get(expected_key * nb_buckets, 1))
+
+            table.new_search()
+            aged_key = 2 * nb_buckets if expected_key == 0 else 0
+            table.get(aged_key, 1)  # the look-up refreshes the age of the entry
+            table.store(3 * nb_buckets, 1, _FakeNode(0), 10)
+            self.assertIsNotNone(table.get(aged_key, 1))
+            self.assertIsNotNone(table.get(3 * nb_buckets, 1))
+
+    def test_counters_given_parallel_threads_expect_no_lost_increments(self):
+        """ The probe, hit and entry counters must match the operations of all threads"""
+        table = TranspositionTable(size_mb=1)
+        nb_threads, nb_keys = 8, 2000
+        nb_hits = [0] * nb_threads
+
+        def worker(thread_id):
+            for key in range(thread_id * nb_keys, (thread_id + 1) * nb_keys):
+                table.store(key, 1, _FakeNode(key), 1)
+                # the entry might already have been replaced by another thread
+                nb_hits[thread_id] += table.get(key, 1) is not None
+
+        threads = [Thread(target=worker, args=(thread_id,)) for thread_id in range(nb_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(table.nb_probes, nb_threads * nb_keys)
+        self.assertEqual(table.nb_hits, sum(nb_hits))
+        self.assertEqual(table.nb_entries, sum(key is not None for key in table._keys))
+
+        table.remap_nodes(lambda node: node if node.n_sum % 2 else None)
+        self.assertEqual(table.nb_entries, sum(key is not None for key in table._keys))
+        self.assertGreater(table.nb_entries, 0)
+        self.assertTrue(all(node is None or node.n_sum % 2 for node in table._nodes))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+@file: inference_backend_benchmark.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Compares the CPU inference latency of the backends of domain/agent/inference_backends.py for several batch sizes.
+Every backend runs predict_batch() on random input planes and the median latency per batch, the latency per position
+and the number of positions per second are reported. The models must be exported from the same network to get a fair
+comparison, e.g. the onnx and torch_cpu directories of trainer_agent_pytorch.export_model().
+
+Usage: python inference_backend_benchmark.py --backends onnxruntime torch_cpu --onnx-dir model/onnx/
+       --torch-dir model/torch_cpu/ --batch-sizes 1 8 16 64
+"""
+import argparse
+import sys
+import numpy as np
+
+sys.path.append("../../../../")
+from DeepCrazyhouse.src.domain.agent.inference_backends import BACKENDS, create_inference_backend, measure_latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the CPU latency of the inference backends")
+    parser.add_argument("--backends", nargs="+", default=["onnxruntime", "torch_cpu"], choices=BACKENDS,
+                        help="Backends to compare")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32, 64],
+                        help="Batch sizes to measure")
+    parser.add_argument("--iterations", type=int, default=50, help="Number of measured batches per batch size")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads of onnxruntime and torch_cpu")
+    parser.add_argument("--model-architecture-dir", default="default", help="Directory of the MXNet symbol file")
+    parser.add_argument("--model-weights-dir", default="default", help="Directory of the MXNet params file")
+    parser.add_argument("--onnx-dir", default="default", help="Directory of the .onnx model")
+    parser.add_argument("--torch-dir", default="default", help="Directory of the TorchScript .pt model")
+    args = parser.parse_args()
+
+    model_dirs = {"mxnet": args.model_weights_dir, "onnxruntime": args.onnx_dir, "torch_cpu": args.torch_dir}
+    max_batch_size = max(args.batch_sizes)
+    print("%-12s %10s %14s %14s %12s" % ("backend", "batch size", "median [ms]", "ms / position", "positions/s"))
+    for backend_name in args.backends:
+        backend = create_inference_backend(backend=backend_name, ctx="cpu", batch_size=max_batch_size,
+                                           model_architecture_dir=args.model_architecture_dir,
+                                           model_weights_dir=model_dirs[backend_name], nb_threads=args.threads)
+        for batch_size in args.batch_sizes:
+            latency_ms = float(np.median(measure_latency(backend, batch_size, args.iterations)))
+            print("%-12s %10d %14.3f %14.4f %12.0f" % (backend_name, batch_size, latency_ms, latency_ms / batch_size,
+                                                       batch_size * 1000 / latency_ms))
+
+
+if __name__ == "__main__":
+    main()
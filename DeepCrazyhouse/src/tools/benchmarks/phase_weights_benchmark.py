@@ -0,0 +1,93 @@
+"""
+@file: phase_weights_benchmark.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Measures the time of a weighted pytorch train step for different ways of computing the per-sample phase weights:
+    list:   python list comprehension over the phase vector (one .item() call per sample)
+    lut:    gather from the device resident lookup tensor (get_sample_weights())
+    loader: weights were already computed in the loader (get_dataset_arrays(..., phase_weights))
+A small fully connected model is used, so that the weight computation isn't hidden by the forward and backward pass.
+
+Usage: python phase_weights_benchmark.py --batch-sizes 256 512 1024 2048 --device cpu
+"""
+import argparse
+import sys
+from time import time
+import numpy as np
+import torch
+import torch.nn as nn
+
+sys.path.append("../../../../")
+from DeepCrazyhouse.src.training.trainer_agent_pytorch import get_phase_weights_lut, get_sample_weights
+
+NB_CHANNELS = 52
+PHASE_WEIGHTS = {0: 1.0, 1: 0.8, 2: 1.2}
+
+
+def _get_model(ctx):
+    return nn.Sequential(nn.Flatten(), nn.Linear(NB_CHANNELS * 64, 128), nn.ReLU(), nn.Linear(128, 1)).to(ctx)
+
+
+def run_benchmark(mode: str, batch_size: int, nb_steps: int, ctx, seed=42):
+    """
+    Runs nb_steps weighted train steps and returns the average step time
+    :param mode: Either "list", "lut" or "loader"
+    :param batch_size: Number of samples per batch
+    :param nb_steps: Number of measured train steps
+    :param ctx: Pytorch device
+    :param seed: Random seed for the inputs and the phases
+    :return: Average step time in seconds
+    """
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+    model = _get_model(ctx)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.01)
+    data = torch.rand(batch_size, NB_CHANNELS, 8, 8)
+    value_label = torch.rand(batch_size, 1) * 2 - 1
+    phases = rng.integers(0, len(PHASE_WEIGHTS), batch_size).astype(np.int16)
+    phase_weights_lut = get_phase_weights_lut(PHASE_WEIGHTS, ctx)
+    if mode == "loader":
+        phase_vector = torch.from_numpy(get_sample_weights(get_phase_weights_lut(PHASE_WEIGHTS, "cpu"), phases))
+    else:
+        phase_vector = torch.from_numpy(phases)
+
+    t_start = None
+    for step in range(nb_steps + 5):
+        if step == 5:  # warm up
+            if ctx.type == "cuda":
+                torch.cuda.synchronize()
+            t_start = time()
+        if mode == "list":
+            sample_weights = torch.Tensor([PHASE_WEIGHTS[phase.item()] for phase in phase_vector]).to(ctx)
+        elif mode == "lut":
+            sample_weights = get_sample_weights(phase_weights_lut, phase_vector)
+        else:
+            sample_weights = phase_vector.to(ctx)
+        optimizer.zero_grad()
+        loss = (model(data.to(ctx)) - value_label.to(ctx)).pow(2).squeeze(1)
+        (loss * sample_weights).mean().backward()
+        optimizer.step()
+    if ctx.type == "cuda":
+        torch.cuda.synchronize()
+    return (time() - t_start) / nb_steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the per-sample phase weight computation")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[256, 512, 1024, 2048], help="Batch sizes")
+    parser.add_argument("--steps", type=int, default=50, help="Number of measured train steps")
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu",
+                        help="Pytorch device, e.g. cpu or cuda:0")
+    args = parser.parse_args()
+
+    ctx = torch.device(args.device)
+    for batch_size in args.batch_sizes:
+        step_times = {mode: run_benchmark(mode, batch_size, args.steps, ctx) for mode in ["list", "lut", "loader"]}
+        print("batch size: %4d - " % batch_size +
+              " - ".join("%s: %6.3f ms" % (mode, t * 1000) for mode, t in step_times.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+@file: puct_benchmark.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Measures the time of a single child selection over typical crazyhouse branching factors:
+    numpy:  previous selection which builds the u-value and the score as new temporary arrays
+    kernel: select_puct_child() with the python loop for few children and in-place ufuncs otherwise
+The statistics of the children are drawn at random, the visits follow the prior policy like in a real search.
+
+Usage: python puct_benchmark.py --branching 20 40 80 150 --repeats 20000
+"""
+import argparse
+import math
+import sys
+from time import perf_counter
+import numpy as np
+
+sys.path.append("../../../../")
+from DeepCrazyhouse.src.domain.agent.player.util.puct import select_puct_child
+
+CPUCT = 2.5
+U_INIT_DIVISOR = 1.0
+
+
+def _select_numpy(q_value, policy_prob, child_number_visits, n_sum):
+    cpuct = math.log((n_sum + 19652 + 1) / 19652) + CPUCT
+    u_value = cpuct * policy_prob * (np.sqrt(n_sum) / (U_INIT_DIVISOR + child_number_visits))
+    return (q_value + u_value).argmax()
+
+
+def _get_node_statistics(nb_children: int, rng):
+    """ Returns random q-values, priors and visits of a node with the given number of children"""
+    policy_prob = rng.dirichlet(np.full(nb_children, 0.3)).astype(np.float32)
+    child_number_visits = rng.multinomial(10 * nb_children, policy_prob).astype(np.float64)
+    q_value = np.where(child_number_visits > 0, rng.uniform(-1, 1, nb_children), -1.0)
+    return q_value, policy_prob, child_number_visits, int(child_number_visits.sum()) + 1
+
+
+def run_benchmark(nb_children: int, repeats: int, seed=42):
+    """
+    Times both selection methods on the same node
+    :param nb_children: Number of child nodes
+    :param repeats: Number of selections per method
+    :param seed: Random seed for the node statistics
+    :return: Dictionary with the average time per selection in microseconds for each method
+    """
+    q_value, policy_prob, child_number_visits, n_sum = _get_node_statistics(nb_children, np.random.default_rng(seed))
+    if _select_numpy(q_value, policy_prob, child_number_visits, n_sum) != select_puct_child(
+            q_value, policy_prob, child_number_visits, n_sum, CPUCT, U_INIT_DIVISOR):
+        print("warning: both methods selected different children for %d children" % nb_children)
+
+    results = {}
+    t_start = perf_counter()
+    for _ in range(repeats):
+        _select_numpy(q_value, policy_prob, child_number_visits, n_sum)
+    results["numpy"] = (perf_counter() - t_start) / repeats * 1e6
+    t_start = perf_counter()
+    for _ in range(repeats):
+        select_puct_child(q_value, policy_prob, child_number_visits, n_sum, CPUCT, U_INIT_DIVISOR)
+    results["kernel"] = (perf_counter() - t_start) / repeats * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the PUCT child selection")
+    parser.add_argument("--branching", type=int, nargs="+", default=[5, 10, 20, 40, 80, 150],
+                        help="Numbers of child nodes")
+    parser.add_argument("--repeats", type=int, default=20000, help="Number of selections per measurement")
+    args = parser.parse_args()
+
+    for nb_children in args.branching:
+        results = run_benchmark(nb_children, args.repeats)
+        print("children: %3d - numpy: %6.2f us - kernel: %6.2f us - speed-up: %.2fx" % (
+            nb_children, results["numpy"], results["kernel"], results["numpy"] / results["kernel"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+@file: train_speed_benchmark.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Measures the training speed of TrainerAgentPytorch.train_update() for combinations of the performance switches of
+TrainConfig. A configuration is given as "+" separated list of the switches:
+    bf16, fp16:     amp_dtype (automatic mixed precision)
+    channels_last:  use_channels_last
+    compile:        compile_mode="default"
+    fused:          use_fused_optimizer
+"fp32" runs the default configuration. Random input planes and labels are used, so the number of samples per second
+and the peak memory only depend on the architecture and the switches.
+
+Usage: python train_speed_benchmark.py --model-type risev3 --configs fp32 bf16 bf16+channels_last+fused
+       bf16+channels_last+fused+compile --batch-size 1024
+"""
+import argparse
+import sys
+from time import time
+import torch
+
+sys.path.append("../../../../")
+from DeepCrazyhouse.configs.train_config import TrainConfig, TrainObjects
+from DeepCrazyhouse.src.domain.variants.constants import NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH
+from DeepCrazyhouse.src.training.train_cli_util import create_pytorch_model
+from DeepCrazyhouse.src.training.trainer_agent_pytorch import TrainerAgentPytorch, get_context, get_peak_memory_mb
+
+SWITCHES = ["fp32", "bf16", "fp16", "channels_last", "compile", "fused"]
+
+
+def get_train_config(config: str, model_type: str, batch_size: int, context: str, device_id: int) -> TrainConfig:
+    """
+    Creates the train config for a "+" separated list of switches
+    :param config: e.g. "bf16+channels_last"
+    :param model_type: Model type of TrainConfig
+    :param batch_size: Batch size
+    :param context: "gpu" or "cpu"
+    :param device_id: GPU device index
+    :return: TrainConfig object
+    """
+    # Too many arguments (5/5)
+    tc = TrainConfig()
+    tc.model_type = model_type
+    tc.batch_size = batch_size
+    tc.context = context
+    tc.device_id = device_id
+    tc.log_metrics_to_tensorboard = False
+    tc.nb_parts = 1
+    for switch in config.split("+"):
+        if switch not in SWITCHES:
+            raise Exception(f"Unknown switch {switch}. Use one of {SWITCHES}")
+        if switch in ["bf16", "fp16"]:
+            tc.amp_dtype = switch
+        elif switch == "channels_last":
+            tc.use_channels_last = True
+        elif switch == "compile":
+            tc.compile_mode = "default"
+        elif switch == "fused":
+            tc.use_fused_optimizer = True
+    return tc
+
+
+def get_random_batch(tc: TrainConfig, nb_policy_outputs: int):
+    """
+    Returns a random batch in the format of train_update()
+    :param tc: Train config
+    :param nb_policy_outputs: Length of the policy output of the model
+    :return: List of tensors
+    """
+    data = torch.rand(tc.batch_size, NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH)
+    value_label = torch.rand(tc.batch_size) * 2 - 1
+    policy_label = torch.randint(0, nb_policy_outputs, (tc.batch_size,)).float()
+    phase_vector = torch.zeros(tc.batch_size)
+    if tc.use_wdl and tc.use_plys_to_end:
+        return [data, value_label, policy_label, torch.randint(0, 3, (tc.batch_size,)).float(),
+                torch.rand(tc.batch_size), phase_vector]
+    return [data, value_label, policy_label, phase_vector]
+
+
+def run_benchmark(tc: TrainConfig, nb_steps: int, nb_warmup: int):
+    """
+    Runs nb_steps train updates after nb_warmup steps (which include the compilation)
+    :param tc: Train config
+    :param nb_steps: Number of measured train steps
+    :param nb_warmup: Number of unmeasured train steps
+    :return: samples per second, peak memory in MB
+    """
+    torch.manual_seed(tc.seed)
+    ctx = get_context(tc.context, tc.device_id)
+    input_shape = (NB_CHANNELS_TOTAL, BOARD_HEIGHT, BOARD_WIDTH)
+    model = create_pytorch_model(input_shape, tc).to(ctx)
+    tc.total_it = nb_steps + nb_warmup
+    train_objects = TrainObjects()
+    train_objects.lr_schedule = lambda it: tc.max_lr
+    train_objects.momentum_schedule = lambda it: tc.max_momentum
+    trainer = TrainerAgentPytorch(model, None, tc, train_objects, use_rtpt=False)
+    trainer.cur_it = trainer.batch_proc_tmp = 0
+    with torch.no_grad():
+        nb_policy_outputs = model.eval()(torch.zeros(1, *input_shape).to(ctx))[1].shape[1]
+    model.train()
+    batch = get_random_batch(tc, nb_policy_outputs)
+
+    for _ in range(nb_warmup):
+        trainer.train_update(batch)
+    if ctx.type == "cuda":
+        torch.cuda.synchronize(ctx)
+    get_peak_memory_mb(ctx)  # reset the peak memory statistics
+    t_start = time()
+    for _ in range(nb_steps):
+        trainer.train_update(batch)
+    if ctx.type == "cuda":
+        torch.cuda.synchronize(ctx)
+    return nb_steps * tc.batch_size / (time() - t_start), get_peak_memory_mb(ctx)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the training speed of the performance switches")
+    parser.add_argument("--model-type", default=TrainConfig.model_type, help="Model type of TrainConfig")
+    parser.add_argument("--configs", nargs="+", default=["fp32", "bf16", "bf16+channels_last+fused"],
+                        help="'+' separated switches of %s" % SWITCHES)
+    parser.add_argument("--batch-size", type=int, default=TrainConfig.batch_size, help="Training batch size")
+    parser.add_argument("--steps", type=int, default=20, help="Number of measured train steps")
+    parser.add_argument("--warmup", type=int, default=5, help="Number of unmeasured train steps")
+    parser.add_argument("--context", default="gpu", help="'gpu' or 'cpu'")
+    parser.add_argument("--device-id", type=int, default=0, help="GPU device index")
+    args = parser.parse_args()
+
+    print("%-40s %14s %16s" % ("config", "samples/s", "peak memory [MB]"))
+    for config in args.configs:
+        tc = get_train_config(config, args.model_type, args.batch_size, args.context, args.device_id)
+        samples_per_second, peak_memory_mb = run_benchmark(tc, args.steps, args.warmup)
+        print("%-40s %14.0f %16.0f" % (config, samples_per_second, peak_memory_mb))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+@file: tree_store_benchmark.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Compares the object based Node tree with the array based NodeStore tree.
+The benchmark runs single threaded MCTS playouts on random priors (no neural network is needed) and reports the
+number of created nodes per second as well as the resident memory per 100k nodes.
+
+Usage: python tree_store_benchmark.py --nodes 100000 --variant crazyhouse
+"""
+import argparse
+import gc
+import math
+import os
+import sys
+from time import time
+import chess.variant
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import psutil
+
+sys.path.append("../../../../")
+from DeepCrazyhouse.src.domain.agent.player.util.node import Node
+from DeepCrazyhouse.src.domain.agent.player.util.node_store import NodeStore
+
+CPUCT = 2.5
+VIRTUAL_LOSS = 3
+
+
+def _select_child(node):
+    if node.check_mate_node is not None:
+        return node.check_mate_node
+    u_value = CPUCT * node.policy_prob * (math.sqrt(node.n_sum) / (1 + node.child_number_visits))
+    return int((node.q_value + u_value).argmax())
+
+
+def _run_playouts(create_node, root, board, nb_nodes, rng):
+    """
+    Expands nb_nodes new nodes in the tree below the given root node. Like the MCTSAgent, the playouts apply the moves
+    of the path on a single board and the nodes don't store their boards.
+    :param create_node: Function handle which creates a new node with the arguments of Node()
+    :param root: Root node of the tree
+    :param board: Board of the root node
+    :param nb_nodes: Number of nodes to expand
+    :param rng: Numpy random generator
+    :return:
+    """
+    for _ in range(nb_nodes):
+        path = []
+        node = root
+        while True:
+            child_idx = _select_child(node)
+            node.apply_virtual_loss_to_child(child_idx, VIRTUAL_LOSS)
+            path.append((node, child_idx))
+            board.push(node.legal_moves[child_idx])
+            child = node.child_nodes[child_idx]
+            if child is None:
+                legal_moves = list(board.legal_moves)
+                is_leaf = not legal_moves
+                value = 0.0 if is_leaf else rng.uniform(-1, 1)
+                p_vec_small = None if is_leaf else rng.dirichlet([0.3] * len(legal_moves)).astype(np.float32)
+                child = create_node(None, value, p_vec_small, legal_moves, is_leaf)
+                with node.lock:
+                    node.child_nodes[child_idx] = child
+                break
+            if child.is_leaf:
+                value = child.initial_value
+                break
+            node = child
+        for parent, child_idx in reversed(path):
+            board.pop()
+            value = -value
+            parent.revert_virtual_loss_and_update(child_idx, VIRTUAL_LOSS, value)
+
+
+def run_benchmark(tree_type: str, nb_nodes: int, variant: str, seed=42):
+    """
+    Builds a search tree of nb_nodes nodes and measures the speed and memory consumption
+    :param tree_type: Either "node" or "array"
+    :param nb_nodes: Number of nodes to create
+    :param variant: Board variant, e.g. "chess" or "crazyhouse"
+    :param seed: Random seed for the priors and values
+    :return: nodes_per_second, rss_bytes_per_100k_nodes
+    """
+    rng = np.random.default_rng(seed)
+    board = chess.variant.find_variant(variant)()
+    legal_moves = list(board.legal_moves)
+    p_vec_small = rng.dirichlet([0.3] * len(legal_moves)).astype(np.float32)
+
+    if tree_type == "node":
+        def create_node(*args):
+            return Node(*args)
+    else:
+        store = NodeStore()
+
+        def create_node(*args):
+            return store.get_node(store.add_node(*args))
+
+    gc.collect()
+    process = psutil.Process(os.getpid())
+    rss_start = process.memory_info().rss
+    t_start = time()
+    root = create_node(board, 0.0, p_vec_small, legal_moves, False, None, False)
+    _run_playouts(create_node, root, board, nb_nodes, rng)
+    t_elapsed = time() - t_start
+    rss_used = process.memory_info().rss - rss_start
+    return nb_nodes / t_elapsed, rss_used / nb_nodes * 1e5
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the object and array based MCTS trees")
+    parser.add_argument("--nodes", type=int, default=100000, help="Number of nodes to create")
+    parser.add_argument("--variant", type=str, default="crazyhouse", help="Board variant")
+    args = parser.parse_args()
+
+    for tree_type in ["node", "array"]:
+        # use a fresh process for each run so that the RSS measurement isn't affected by the previous run
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            nps, rss = executor.submit(run_benchmark, tree_type, args.nodes, args.variant).result()
+        print("tree: %-5s - nodes/s: %8.1f - RSS per 100k nodes: %7.1f MB" % (tree_type, nps, rss / 2 ** 20))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+@file: virtual_loss_benchmark.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Measures the lock contention of the virtual loss and backup updates for several numbers of search threads.
+Every thread runs playouts on a shared tree with random priors and values (no neural network is needed):
+    node/per-edge:   Node tree, every edge of the path is reverted with its own lock (previous behaviour)
+    array/per-edge:  NodeStore tree, every edge of the path is reverted on its own
+    array/batched:   NodeStore tree, the whole path is reverted by NodeStore.backup() while the striped locks of its
+                     nodes are held
+The reported contention is the number of lock acquisitions per playout, the share of acquisitions which had to wait
+and the total waiting time.
+The optional latency simulates the waiting time of a search thread for the neural network evaluation.
+
+Usage: python virtual_loss_benchmark.py --threads 4 16 64 --nodes 20000 --latency-us 0
+"""
+import argparse
+import sys
+from threading import Lock, Thread
+from time import perf_counter, sleep
+import chess
+import numpy as np
+
+sys.path.append("../../../../")
+from DeepCrazyhouse.src.domain.agent.player.util.node import Node
+from DeepCrazyhouse.src.domain.agent.player.util.node_store import NodeStore, NB_LOCKS
+from DeepCrazyhouse.src.domain.agent.player.util.puct import select_puct_child
+
+CPUCT = 2.5
+VIRTUAL_LOSS = 3
+# arbitrary distinct moves which are only used as edge labels
+MOVES = [chess.Move(from_square, to_square) for from_square in range(64) for to_square in range(64)
+         if from_square != to_square]
+
+
+class ContentionLock:
+    """Lock which records the waiting time of every acquisition"""
+
+    def __init__(self, wait_times: list):
+        self._lock = Lock()
+        self._wait_times = wait_times
+
+    def acquire(self):
+        if self._lock.acquire(blocking=False):
+            self._wait_times.append(0.0)
+        else:
+            t_start = perf_counter()
+            self._lock.acquire()
+            self._wait_times.append(perf_counter() - t_start)
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def _run_playouts(root, create_node, batched_backup, store, nb_playouts, latency_s, seed):
+    """
+    Runs nb_playouts playouts from the root node and expands one new node per playout
+    :param root: Root node of the shared tree
+    :param create_node: Function handle which creates a new node from a value and a prior policy
+    :param batched_backup: True, if the path shall be reverted by NodeStore.backup()
+    :param store: NodeStore of the tree or None
+    :param nb_playouts: Number of playouts of this thread
+    :param latency_s: Simulated waiting time for the network evaluation in seconds
+    :param seed: Random seed of this thread
+    :return:
+    """
+    rng = np.random.default_rng(seed)
+    for _ in range(nb_playouts):
+        path_nodes, child_idcs = [], []
+        node = root
+        while True:
+            child_idx = select_puct_child(node.q_value, node.policy_prob, node.child_number_visits, node.n_sum, CPUCT,
+                                          1.0)
+            node.apply_virtual_loss_to_child(child_idx, VIRTUAL_LOSS)
+            path_nodes.append(node)
+            child_idcs.append(child_idx)
+            child = node.child_nodes[child_idx]
+            if child is None:
+                break
+            node = child
+        if latency_s > 0:
+            sleep(latency_s)
+        value = rng.uniform(-1, 1)
+        node.child_nodes[child_idx] = create_node(value, rng.dirichlet([0.3] * int(rng.integers(20, 150))))
+
+        # the value of the first edge is seen from the perspective of the root node
+        value = value if len(path_nodes) % 2 == 1 else -value
+        if batched_backup:
+            store.backup(path_nodes, child_idcs, value, VIRTUAL_LOSS)
+        else:
+            for parent, child_idx in zip(path_nodes, child_idcs):
+                parent.revert_virtual_loss_and_update(child_idx, VIRTUAL_LOSS, value)
+                value = -value
+
+
+def run_benchmark(mode: str, nb_threads: int, nb_nodes: int, latency_s: float, seed=42):
+    """
+    Builds a tree of nb_nodes nodes with the given number of threads
+    :param mode: Either "node/per-edge", "array/per-edge" or "array/batched"
+    :param nb_threads: Number of search threads
+    :param nb_nodes: Total number of playouts
+    :param latency_s: Simulated waiting time for the network evaluation in seconds
+    :param seed: Random seed
+    :return: nodes_per_second, lock acquisitions per playout, share of contended lock acquisitions,
+             total waiting time in seconds
+    """
+    wait_times = []
+    store = None
+    if mode.startswith("node"):
+        def create_node(value, p_vec_small):
+            node = Node(None, value, p_vec_small.astype(np.float32), MOVES[:len(p_vec_small)])
+            node.lock = ContentionLock(wait_times)
+            return node
+    else:
+        store = NodeStore(board_type=chess.Board)
+        store.locks = [ContentionLock(wait_times) for _ in range(NB_LOCKS)]
+
+        def create_node(value, p_vec_small):
+            return store.get_node(store.add_node(None, value, p_vec_small.astype(np.float32),
+                                                 MOVES[:len(p_vec_small)]))
+
+    root = create_node(0.0, np.random.default_rng(seed).dirichlet([0.3] * 60))
+    threads = [Thread(target=_run_playouts, args=(root, create_node, mode.endswith("batched"), store,
+                                                  nb_nodes // nb_threads, latency_s, seed + thread_id))
+               for thread_id in range(nb_threads)]
+    t_start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    t_elapsed = perf_counter() - t_start
+    nb_playouts = nb_threads * (nb_nodes // nb_threads)
+    wait_times = np.array(wait_times)
+    return nb_playouts / t_elapsed, len(wait_times) / nb_playouts, (wait_times > 0).mean(), wait_times.sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the virtual loss and backup updates")
+    parser.add_argument("--threads", type=int, nargs="+", default=[4, 16, 64], help="Numbers of search threads")
+    parser.add_argument("--nodes", type=int, default=20000, help="Number of playouts per run")
+    parser.add_argument("--latency-us", type=int, default=0, help="Simulated network latency per playout")
+    args = parser.parse_args()
+
+    for nb_threads in args.threads:
+        for mode in ["node/per-edge", "array/per-edge", "array/batched"]:
+            nps, acquisitions, contended, wait_s = run_benchmark(mode, nb_threads, args.nodes,
+                                                                 args.latency_us * 1e-6)
+            print("threads: %2d - %-14s - nodes/s: %7.1f - locks per playout: %5.2f - contended: %5.2f%% - "
+                  "lock wait: %6.1f ms" % (nb_threads, mode, nps, acquisitions, contended * 100, wait_s * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+@file: create_opening_book.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Creates an opening book for the engine (see domain/agent/player/util/opening_book.py).
+The most common positions of the first plies of a PGN corpus are counted and every position which occurs at least
+min_count times is searched by the MCTSAgent with a fixed number of playouts. The book stores the visits of the root
+moves and the value of each position. In the engine the book is selected by the uci option "book_file".
+
+Usage: python create_opening_book.py --pgn games.pgn --output book.bin --plies 16 --positions 20000 --playouts 4096
+"""
+import argparse
+import logging
+import sys
+from collections import Counter
+import chess.pgn
+import chess.variant
+
+sys.path.append("../../../../")
+from DeepCrazyhouse.src.domain.agent.inference_backends import BACKENDS, create_inference_backend
+from DeepCrazyhouse.src.domain.agent.player.mcts_agent import MCTSAgent
+from DeepCrazyhouse.src.domain.agent.player.util.opening_book import write_opening_book
+from DeepCrazyhouse.src.domain.variants.game_state import GameState
+from DeepCrazyhouse.src.domain.variants.position import compute_hash
+
+
+def count_opening_positions(pgn_files: list, max_plies: int):
+    """
+    Counts how often every position of the first plies occurs in the given games
+    :param pgn_files: List of PGN files
+    :param max_plies: Number of half moves of every game which are considered
+    :return: counts - Counter of the Zobrist hashes of the positions
+             fens - Dictionary which maps every hash to the fen and the uci variant name of the position
+    """
+    counts = Counter()
+    fens = {}
+    for pgn_file in pgn_files:
+        with open(pgn_file) as pgn:
+            while True:
+                game = chess.pgn.read_game(pgn)
+                if game is None:
+                    break
+                board = game.board()
+                for ply, move in enumerate(game.mainline_moves()):
+                    if ply >= max_plies:
+                        break
+                    key = compute_hash(board)
+                    counts[key] += 1
+                    if key not in fens:
+                        fens[key] = (board.fen(), board.uci_variant)
+                    board.push(move)
+    return counts, fens
+
+
+def search_positions(agent: MCTSAgent, fens: list):
+    """
+    Runs the MCTS on every given position and returns the visits of the root moves. Every position is searched with a
+    new search tree, so the visits don't depend on the positions which have been searched before.
+    :param agent: MCTSAgent which is configured with the number of playouts per position
+    :param fens: List of (fen, uci variant) tuples
+    :return: Generator of (Zobrist hash, value, moves, visits) tuples for write_opening_book()
+    """
+    for idx, (fen, uci_variant) in enumerate(fens):
+        board = chess.variant.find_variant(uci_variant)(fen)
+        agent.clear_search_tree()
+        value, legal_moves, _, centipawn, _, nodes, _, _, pv = agent.evaluate_board_state(GameState(board))
+        visits = [int(round(nb_visits)) for nb_visits in agent.root_node.child_number_visits]
+        logging.info("%d/%d %s - cp %d - nodes %d - pv %s", idx + 1, len(fens), fen, centipawn, nodes, pv)
+        yield compute_hash(board), float(value), legal_moves, visits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Creates an opening book from the most common positions of a PGN "
+                                                 "corpus")
+    parser.add_argument("--pgn", nargs="+", required=True, help="PGN files of the corpus")
+    parser.add_argument("--output", default="book.bin", help="Output file of the opening book")
+    parser.add_argument("--plies", type=int, default=16, help="Number of half moves of every game which are counted")
+    parser.add_argument("--positions", type=int, default=20000, help="Maximum number of positions in the book")
+    parser.add_argument("--min-count", type=int, default=5, help="Minimum number of occurrences of a position")
+    parser.add_argument("--playouts", type=int, default=4096, help="Number of MCTS playouts per position")
+    parser.add_argument("--threads", type=int, default=8, help="Number of search threads")
+    parser.add_argument("--batch-size", type=int, default=8, help="Batch size of the neural network")
+    parser.add_argument("--backend", default="mxnet", choices=BACKENDS, help="Inference backend of the network")
+    parser.add_argument("--context", default="gpu", help="Context of the neural network: cpu or gpu")
+    parser.add_argument("--model-architecture-dir", default="default", help="Directory of the network architecture")
+    parser.add_argument("--model-weights-dir", default="default",
+                        help="Directory of the network weights or of the exported .onnx / .pt model")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    counts, fens = count_opening_positions(args.pgn, args.plies)
+    common_positions = [key for key, count in counts.most_common(args.positions) if count >= args.min_count]
+    logging.info("%d distinct positions, %d positions occur at least %d times", len(counts), len(common_positions),
+                 args.min_count)
+
+    net = create_inference_backend(backend=args.backend, ctx=args.context, batch_size=args.batch_size,
+                                   model_architecture_dir=args.model_architecture_dir,
+                                   model_weights_dir=args.model_weights_dir)
+    # the book stores the plain visit distribution, so there's no noise, pruning or time limit
+    agent = MCTSAgent([net], threads=args.threads, batch_size=args.batch_size, playouts_empty_pockets=args.playouts,
+                      playouts_filled_pockets=args.playouts, dirichlet_epsilon=0, use_pruning=False,
+                      use_time_management=False, min_movetime=10 ** 9, verbose=False)
+    nb_positions = write_opening_book(args.output, search_positions(agent, [fens[key] for key in common_positions]))
+    logging.info("The opening book %s contains %d positions", args.output, nb_positions)
+
+
+if __name__ == "__main__":
+    main()
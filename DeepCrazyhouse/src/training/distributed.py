@@ -0,0 +1,139 @@
+"""
+@file: distributed.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Utility functions for the distributed data-parallel (DDP) training of TrainerAgentPytorch.
+Every process trains a replica of the model on its own share of the dataset parts and the gradients are averaged by
+torch.distributed. The processes are either started locally by launch_processes() (e.g. by the RL loop) or by torchrun
+for several nodes, in which case init_distributed() reads the RANK, WORLD_SIZE and LOCAL_RANK environment variables.
+The functions return the values of a single process if no process group has been initialized.
+"""
+import os
+import socket
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from DeepCrazyhouse.configs.train_config import TrainConfig
+
+
+def init_distributed(train_config: TrainConfig, rank=None, world_size=None, master_port=None):
+    """
+    Initializes the default process group. The backend is nccl for gpu training and gloo for cpu training unless
+    train_config.dist_backend is set. For gpu training the device_id of the train config is shifted by the local rank.
+    :param train_config: Train config which is updated with the world size and the device id of the process
+    :param rank: Rank of the process. If None, the environment variables of torchrun are used.
+    :param world_size: Total number of processes (only used together with rank)
+    :param master_port: Port of the rank 0 process on localhost (only used together with rank)
+    :return:
+    """
+    if rank is None:
+        rank, world_size = int(os.environ["RANK"]), int(os.environ["WORLD_SIZE"])
+        local_rank = int(os.environ.get("LOCAL_RANK", rank))
+        init_method = "env://"
+    else:
+        local_rank = rank
+        init_method = f"tcp://127.0.0.1:{master_port}"
+    use_cuda = train_config.context == "gpu" and torch.cuda.is_available()
+    backend = train_config.dist_backend or ("nccl" if use_cuda else "gloo")
+    if use_cuda:
+        train_config.device_id += local_rank
+        torch.cuda.set_device(train_config.device_id)
+    dist.init_process_group(backend, init_method=init_method, rank=rank, world_size=world_size)
+    train_config.world_size = world_size
+
+
+def destroy_distributed():
+    """Destroys the default process group if it has been initialized"""
+    if dist.is_available() and dist.is_initialized():
+        dist.destroy_process_group()
+
+
+def get_rank() -> int:
+    """Returns the rank of the process or 0 without a process group"""
+    return dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+
+
+def get_world_size() -> int:
+    """Returns the number of processes or 1 without a process group"""
+    return dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+
+
+def is_main_process() -> bool:
+    """Returns True for the process which writes the checkpoints, the onnx models and the logs"""
+    return get_rank() == 0
+
+
+def get_free_port() -> int:
+    """Returns an unused port on localhost for the rendezvous of launch_processes()"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def launch_processes(fn, world_size: int, args=()):
+    """
+    Starts world_size processes on this machine and waits until all of them have finished. Every process calls
+    fn(rank, world_size, master_port, *args) and is expected to call init_distributed(train_config, rank, world_size,
+    master_port) first.
+    :param fn: Function at module level (it is pickled for the spawned processes)
+    :param world_size: Number of processes
+    :param args: Additional arguments of fn
+    :return:
+    """
+    mp.spawn(fn, args=(world_size, get_free_port(), *args), nprocs=world_size, join=True)
+
+
+def get_micro_batch_size(train_config: TrainConfig, world_size: int) -> int:
+    """
+    Returns the batch size of a single train update of one process. The batch of train_config.batch_size samples is
+    split across the processes and the gradient accumulation steps, so the effective batch size stays the same.
+    :param train_config: Train config
+    :param world_size: Number of processes
+    :return: Number of samples per micro batch
+    """
+    nb_micro_batches = world_size * train_config.gradient_accumulation_steps
+    if train_config.batch_size % nb_micro_batches != 0:
+        raise Exception(f"The batch_size {train_config.batch_size} must be divisible by world_size * "
+                        f"gradient_accumulation_steps = {nb_micro_batches}")
+    return train_config.batch_size // nb_micro_batches
+
+
+def get_rank_part_ids(part_ids: list, rank: int, world_size: int) -> list:
+    """
+    Shards the dataset parts of an epoch across the processes, so that every process only loads its own parts.
+    All processes get the same number of parts, the last shards are filled up with the first parts of the list.
+    :param part_ids: Ordered part ids of the epoch (identical on all processes)
+    :param rank: Rank of the process
+    :param world_size: Number of processes
+    :return: Part ids of the process
+    """
+    nb_parts_per_rank = -(-len(part_ids) // world_size)
+    return [part_ids[idx % len(part_ids)] for idx in range(rank, nb_parts_per_rank * world_size, world_size)]
+
+
+def all_ranks_have_data(has_data: bool, ctx) -> bool:
+    """
+    Checks if every process still has a batch. The shards of the processes can differ in their number of samples, but
+    all processes must run the same number of train updates because of the gradient synchronisation.
+    :param has_data: True, if this process has another batch
+    :param ctx: Device of the process (nccl requires a cuda tensor)
+    :return: True, if all processes have another batch
+    """
+    flag = torch.tensor([int(has_data)], device=ctx)
+    dist.all_reduce(flag, op=dist.ReduceOp.MIN)
+    return bool(flag.item())
+
+
+def broadcast_from_main(obj):
+    """
+    Sends a picklable object of the main process to all processes, e.g. the validation metrics which decide about
+    checkpoints and spike recoveries, so that all processes take the same decisions.
+    :param obj: Object of the main process (the objects of the other processes are ignored)
+    :return: Object of the main process
+    """
+    objects = [obj]
+    dist.broadcast_object_list(objects, src=0)
+    return objects[0]
@@ -0,0 +1,346 @@
+"""
+@file: inference_export.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Export stage which runs after the regular ONNX export and creates optimized inference models:
+* every Conv2d + BatchNorm2d pair is folded into the convolution (see fold_conv_bn())
+* the selection of the NB_LABELS moves from the policy planes (FLAT_PLANE_IDX) and the softmax become part of the
+  graph, so the model returns the move probabilities as main_config["policy_softmax_output"] (see InferenceModel)
+* optionally a FP16 variant and a static INT8 variant which is calibrated on the positions of a training part
+The stage can be run by train_cli.py (TrainConfig.inference_export_variants) or as a script. The script also checks
+the accuracy of every variant against the original model on a validation part and reports the CPU latency.
+
+Usage: python inference_export.py --model-type risev3 --tar-file best-model/model-1.23-0.456-0100.tar
+       --val-file val/part_0.zip --calibration-file train/part_0.zip --variants fp32 fp16 int8
+"""
+import argparse
+import copy
+import logging
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import onnx
+import torch
+from torch import nn
+from onnxsim import simplify
+
+sys.path.insert(0, '../../../')
+from DeepCrazyhouse.configs.main_config import main_config
+from DeepCrazyhouse.src.domain.agent.inference_backends import OnnxRuntimeAPI, measure_latency
+from DeepCrazyhouse.src.domain.variants.constants import NB_LABELS
+from DeepCrazyhouse.src.domain.variants.input_representation import MATRIX_NORMALIZER
+from DeepCrazyhouse.src.domain.variants.plane_policy_representation import FLAT_PLANE_IDX
+from DeepCrazyhouse.src.preprocessing.dataset_loader import load_dataset_file
+
+INFERENCE_VARIANTS = ["fp32", "fp16", "int8"]
+
+
+def fold_conv_bn(model: nn.Module) -> int:
+    """
+    Folds the batch normalisation layers which directly follow a convolution inside a Sequential container into the
+    weights and bias of the convolution. The folded BatchNorm2d is replaced by an Identity. Models which implement
+    merge_bn() merge their other normalisation layers first.
+    :param model: Pytorch model in evaluation mode, it's modified in place
+    :return: Number of folded layers
+    """
+    if hasattr(model, "merge_bn"):
+        model.merge_bn()
+    nb_folded = 0
+    for module in model.modules():
+        if not isinstance(module, nn.Sequential):
+            continue
+        layers = list(module._modules.items())  # pylint: disable=protected-access
+        for (_, conv), (bn_name, batch_norm) in zip(layers, layers[1:]):
+            if isinstance(conv, nn.Conv2d) and isinstance(batch_norm, nn.BatchNorm2d) \
+                    and batch_norm.running_mean is not None:
+                _fold_into_conv(conv, batch_norm)
+                module._modules[bn_name] = nn.Identity()  # pylint: disable=protected-access
+                nb_folded += 1
+    return nb_folded
+
+
+def _fold_into_conv(conv: nn.Conv2d, batch_norm: nn.BatchNorm2d) -> None:
+    """ Sets the weight and bias of conv to the result of conv followed by batch_norm"""
+    with torch.no_grad():
+        scale = torch.rsqrt(batch_norm.running_var + batch_norm.eps)
+        shift = -batch_norm.running_mean * scale
+        if batch_norm.affine:
+            scale = scale * batch_norm.weight
+            shift = shift * batch_norm.weight + batch_norm.bias
+        bias = conv.bias * scale + shift if conv.bias is not None else shift
+        conv.weight.mul_(scale.reshape(-1, 1, 1, 1))
+        conv.bias = nn.Parameter(bias)
+
+
+class InferenceModel(nn.Module):
+    """Returns the value and the softmax probabilities of the NB_LABELS moves of a trained model"""
+
+    def __init__(self, model: nn.Module):
+        """
+        Constructor
+        :param model: Pytorch model whose first two outputs are the value and the policy logits. The policy is either
+         given for the NB_LABELS moves or as flattened policy planes (select_policy_from_plane).
+        """
+        super().__init__()
+        self.model = model
+        self.register_buffer("flat_plane_idx", torch.tensor(FLAT_PLANE_IDX, dtype=torch.long))
+
+    def forward(self, x):
+        outputs = self.model(x)
+        policy = outputs[1]
+        if policy.shape[1] != NB_LABELS:
+            policy = policy.index_select(1, self.flat_plane_idx)
+        return outputs[0], torch.softmax(policy, dim=1)
+
+
+def get_input_batches(x: np.ndarray, batch_size: int, nb_positions: int):
+    """
+    Yields normalized float32 batches of the input planes of a dataset file
+    :param x: Input planes of load_dataset_file()
+    :param batch_size: Number of positions per batch
+    :param nb_positions: Maximum number of positions
+    :return: Generator of numpy arrays
+    """
+    nb_positions = min(nb_positions, len(x))
+    for start in range(0, nb_positions, batch_size):
+        yield np.asarray(x[start:min(start + batch_size, nb_positions)], np.float32) * MATRIX_NORMALIZER
+
+
+class CalibrationReader:
+    """Calibration data reader of onnxruntime.quantization.quantize_static() for the positions of a dataset file"""
+
+    def __init__(self, dataset_filepath: str, batch_size=64, nb_positions=4096, input_name="data"):
+        """
+        Constructor
+        :param dataset_filepath: Path of a .zip or .shard training part
+        :param batch_size: Number of positions per calibration batch
+        :param nb_positions: Number of positions which are used for the calibration
+        :param input_name: Name of the model input
+        """
+        self.x = load_dataset_file(dataset_filepath)["x"]
+        self.batch_size = batch_size
+        self.nb_positions = nb_positions
+        self.input_name = input_name
+        self.batches = None
+        self.rewind()
+
+    def get_next(self):
+        """ Returns the next input feed or None if all positions have been used"""
+        batch = next(self.batches, None)
+        return None if batch is None else {self.input_name: batch}
+
+    def rewind(self):
+        """ Starts again with the first position"""
+        self.batches = get_input_batches(self.x, self.batch_size, self.nb_positions)
+
+
+def export_inference_onnx(model: nn.Module, input_shape: tuple, onnx_path: str) -> None:
+    """
+    Exports the inference version of a model with a dynamic batch size to ONNX
+    :param model: Pytorch model whose first two outputs are the value and the policy
+    :param input_shape: Input shape of the model without the batch dimension
+    :param onnx_path: Output file
+    :return:
+    """
+    inference_model = copy.deepcopy(model).cpu().eval()
+    logging.info("Folded %d batch normalisation layers into convolutions", fold_conv_bn(inference_model))
+    inference_model = InferenceModel(inference_model)
+    output_names = [main_config["value_output"], main_config["policy_softmax_output"]]
+    dynamic_axes = {"data": {0: "batch_size"}}
+    for output_name in output_names:
+        dynamic_axes[output_name] = {0: "batch_size"}
+    with torch.no_grad():
+        torch.onnx.export(inference_model, torch.zeros(1, *input_shape), onnx_path, input_names=["data"],
+                          output_names=output_names, dynamic_axes=dynamic_axes, dynamo=False)
+    model_simp, check = simplify(onnx.load(onnx_path))
+    if not check:
+        raise Exception("Simplified ONNX model could not be validated")
+    onnx.save(model_simp, onnx_path)
+
+
+def convert_to_fp16(onnx_path: str, fp16_path: str) -> None:
+    """
+    Converts the weights and activations of an ONNX model to float16. The inputs and outputs stay float32.
+    :param onnx_path: Float32 model
+    :param fp16_path: Output file
+    :return:
+    """
+    from onnxruntime.transformers.float16 import convert_float_to_float16
+
+    onnx.save(convert_float_to_float16(onnx.load(onnx_path), keep_io_types=True), fp16_path)
+
+
+def quantize_to_int8(onnx_path: str, int8_path: str, calibration_file: str, nb_calibration_positions=4096) -> None:
+    """
+    Quantizes the convolutions and fully connected layers of an ONNX model statically to INT8 (per channel weights,
+    QDQ format). The softmax policy and the value head output stay float32.
+    :param onnx_path: Float32 model
+    :param int8_path: Output file
+    :param calibration_file: Training part (.zip or .shard) for the calibration of the activation ranges
+    :param nb_calibration_positions: Number of positions which are used for the calibration
+    :return:
+    """
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    quantize_static(onnx_path, int8_path, CalibrationReader(calibration_file, nb_positions=nb_calibration_positions),
+                    quant_format=QuantFormat.QDQ, per_channel=True, activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8, op_types_to_quantize=["Conv", "Gemm", "MatMul"])
+
+
+def export_inference_variants(model: nn.Module, input_shape: tuple, export_dir: str, model_prefix: str,
+                              variants=("fp32",), calibration_file=None) -> dict:
+    """
+    Exports the optimized inference models
+    :param model: Trained pytorch model, it isn't modified
+    :param input_shape: Input shape of the model without the batch dimension
+    :param export_dir: Output directory
+    :param model_prefix: Prefix of the file names, e.g. the model name of the regular ONNX export
+    :param variants: Subset of INFERENCE_VARIANTS
+    :param calibration_file: Training part for the calibration of the int8 variant
+    :return: Dictionary which maps every variant to the path of its ONNX file
+    """
+    # Too many arguments (6/5)
+    for variant in variants:
+        if variant not in INFERENCE_VARIANTS:
+            raise Exception("Unknown inference variant %s. Available variants: %s" % (variant, INFERENCE_VARIANTS))
+    if "int8" in variants and calibration_file is None:
+        raise Exception("The int8 variant requires a calibration file")
+
+    fp32_path = os.path.join(export_dir, "%s-v%d.0-inference.onnx" % (model_prefix, main_config["version"]))
+    export_inference_onnx(model, input_shape, fp32_path)
+    paths = {"fp32": fp32_path}
+    if "fp16" in variants:
+        paths["fp16"] = fp32_path.replace("-inference.onnx", "-inference-fp16.onnx")
+        convert_to_fp16(fp32_path, paths["fp16"])
+    if "int8" in variants:
+        paths["int8"] = fp32_path.replace("-inference.onnx", "-inference-int8.onnx")
+        quantize_to_int8(fp32_path, paths["int8"], calibration_file)
+    if "fp32" not in variants:
+        os.remove(fp32_path)
+        del paths["fp32"]
+    for variant, path in paths.items():
+        logging.info("Exported the %s inference model to %s", variant, path)
+    return paths
+
+
+def get_policy_accuracy_and_value_mse(value_preds, policy_preds, y_value, y_policy) -> dict:
+    """
+    Computes the policy accuracy and value mean squared error of the given predictions
+    :param value_preds: Value predictions
+    :param policy_preds: Move probabilities of shape (nb_positions, NB_LABELS)
+    :param y_value: Value targets
+    :param y_policy: Policy targets as move indices or distributions
+    :return: Dictionary with the entries "policy_acc" and "value_mse"
+    """
+    policy_labels = y_policy if y_policy.ndim == 1 else y_policy.argmax(axis=1)
+    return {"policy_acc": float(np.mean(policy_preds.argmax(axis=1) == policy_labels)),
+            "value_mse": float(np.mean((value_preds - y_value) ** 2))}
+
+
+def predict_dataset(predict_batch, x: np.ndarray, batch_size: int, nb_positions: int):
+    """
+    Runs a prediction function on the positions of a dataset
+    :param predict_batch: Function which returns the value and the move probabilities of a batch
+    :param x: Input planes of load_dataset_file()
+    :param batch_size: Number of positions per batch
+    :param nb_positions: Maximum number of positions
+    :return: value_preds, policy_preds - Numpy arrays
+    """
+    predictions = [predict_batch(batch) for batch in get_input_batches(x, batch_size, nb_positions)]
+    return np.concatenate([value for value, _ in predictions]), np.concatenate([policy for _, policy in predictions])
+
+
+def create_report(model: nn.Module, onnx_paths: dict, val_file: str, batch_size=64, nb_positions=10000,
+                  latency_batch_sizes=(1, 8, 64), nb_iterations=50) -> list:
+    """
+    Compares the inference models with the original model on the positions of a validation part and measures their
+    CPU latency with ONNX Runtime
+    :param model: Original pytorch model
+    :param onnx_paths: Dictionary of export_inference_variants() and optionally "reference" for the regular ONNX export
+    :param val_file: Validation part (.zip or .shard)
+    :param batch_size: Batch size for the accuracy check
+    :param nb_positions: Maximum number of validation positions
+    :param latency_batch_sizes: Batch sizes for the latency measurement
+    :param nb_iterations: Number of measured batches per batch size
+    :return: List of dictionaries with the metrics of every model
+    """
+    # Too many arguments (7/5) - Too many local variables (17/15)
+    dataset = load_dataset_file(val_file)
+    x, y_value, y_policy = dataset["x"], dataset["y_value"][:nb_positions], dataset["y_policy"][:nb_positions]
+    torch_model = InferenceModel(copy.deepcopy(model).cpu().eval())
+
+    def predict_torch(batch):
+        with torch.no_grad():
+            value, policy = torch_model(torch.from_numpy(batch))
+        return value.numpy().reshape(-1), policy.numpy()
+
+    ref_values, ref_policies = predict_dataset(predict_torch, x, batch_size, nb_positions)
+    report = [dict(model="pytorch", **get_policy_accuracy_and_value_mse(ref_values, ref_policies, y_value, y_policy))]
+    for variant, onnx_path in onnx_paths.items():
+        try:
+            backend = OnnxRuntimeAPI(batch_size=max(batch_size, *latency_batch_sizes), model_dir=onnx_path)
+        except Exception as exception:  # e.g. operators which aren't implemented for fp16 on the CPU
+            logging.warning("The %s model can't be run by ONNX Runtime on the CPU: %s", variant, exception)
+            continue
+        values, policies = predict_dataset(backend.predict_batch, x, batch_size, nb_positions)
+        entry = dict(model=variant, **get_policy_accuracy_and_value_mse(values, policies, y_value, y_policy))
+        entry["policy_agreement"] = float(np.mean(policies.argmax(axis=1) == ref_policies.argmax(axis=1)))
+        entry["value_max_abs_diff"] = float(np.abs(values - ref_values).max())
+        for latency_batch_size in latency_batch_sizes:
+            entry["latency_ms_bsize_%d" % latency_batch_size] = float(
+                np.median(measure_latency(backend, latency_batch_size, nb_iterations)))
+        report.append(entry)
+    return report
+
+
+def print_report(report: list) -> None:
+    """ Prints the entries of create_report() as a table"""
+    columns = []
+    for entry in report:
+        columns += [column for column in entry if column not in columns]
+    print(" ".join("%20s" % column for column in columns))
+    for entry in report:
+        print(" ".join("%20s" % (("%.5f" % entry[column]) if isinstance(entry.get(column), float)
+                                 else entry.get(column, "-")) for column in columns))
+
+
+def main():
+    from DeepCrazyhouse.configs.train_config import TrainConfig
+    from DeepCrazyhouse.src.training.train_cli_util import create_pytorch_model
+    from DeepCrazyhouse.src.training.trainer_agent_pytorch import export_to_onnx, load_torch_state
+
+    parser = argparse.ArgumentParser(description="Exports optimized inference models and compares them with the "
+                                                 "original model")
+    parser.add_argument("--model-type", default=TrainConfig.model_type, help="Model type of the checkpoint")
+    parser.add_argument("--tar-file", required=True, help="Checkpoint of the trained model")
+    parser.add_argument("--val-file", required=True, help="Validation part (.zip or .shard) for the accuracy check")
+    parser.add_argument("--calibration-file", default=None, help="Training part for the int8 calibration")
+    parser.add_argument("--variants", nargs="+", default=INFERENCE_VARIANTS, choices=INFERENCE_VARIANTS)
+    parser.add_argument("--export-dir", default=None, help="Output directory, by default next to the checkpoint")
+    parser.add_argument("--val-positions", type=int, default=10000, help="Number of validation positions")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    train_config = TrainConfig()
+    train_config.model_type = args.model_type
+    input_shape = load_dataset_file(args.val_file)["x"].shape[1:]
+    model = create_pytorch_model(input_shape, train_config)
+    load_torch_state(model, torch.optim.SGD(model.parameters(), lr=train_config.max_lr), Path(args.tar_file), 0,
+                     map_location="cpu")
+    model = model.cpu().eval()
+
+    export_dir = args.export_dir or os.path.dirname(os.path.abspath(args.tar_file))
+    model_prefix = Path(args.tar_file).stem
+    onnx_paths = export_inference_variants(model, input_shape, export_dir, model_prefix, args.variants,
+                                           args.calibration_file)
+    # the regular export selects the policy and applies the softmax in numpy
+    export_to_onnx(model, 1, torch.zeros(1, *input_shape), Path(export_dir), model_prefix, False, True)
+    onnx_paths["reference"] = os.path.join(export_dir, "%s-v%d.0.onnx" % (model_prefix, main_config["version"]))
+    print_report(create_report(model, onnx_paths, args.val_file, nb_positions=args.val_positions))
+
+
+if __name__ == "__main__":
+    main()
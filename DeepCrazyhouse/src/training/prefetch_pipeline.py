@@ -0,0 +1,232 @@
+"""
+@file: prefetch_pipeline.py
+Created on 18.10.2026
+@project: CrazyAra
+@author: HelpstoneX
+
+Streaming data pipeline for the pytorch training loop.
+A loader thread decodes the upcoming dataset parts while the current batches are trained. The samples of all loaded
+parts flow through a bounded shuffle buffer, so that a batch mixes positions of several parts. A batch thread gathers
+the batches from the shuffle buffer, converts them to float32 tensors and pins their memory for fast host to device
+transfers.
+
+The memory of the pipeline is bounded by max_memory_bytes: Half of it is used for the shuffle buffer and the other half
+for decoded parts which wait in the queue (at least one part is always allowed).
+"""
+from collections import deque
+from queue import Empty, Full, Queue
+from threading import Condition, Event, Thread
+from time import time
+import numpy as np
+import torch
+
+# number of ready batches which are queued by the batch thread
+NB_QUEUED_BATCHES = 4
+# timeout in seconds for blocking queue operations, so that the threads notice a stop request
+QUEUE_TIMEOUT = 0.1
+
+
+class PrefetchPipeline:  # Too many instance attributes (17/7)
+    """Background pipeline which loads, shuffles and batches the training parts"""
+
+    def __init__(self, load_part, batch_size: int, max_memory_bytes: int, nb_prefetch_parts=2, normalizer=None,
+                 pin_memory=False, nb_recent_batches=25, seed=None):  # Too many arguments (9/5)
+        """
+        Constructor
+        :param load_part: Function handle which returns a list of numpy arrays (one entry per sample for each array,
+         e.g. [x, y_value, y_policy, phase_vector]) for a given part id. It is called in the loader thread.
+        :param batch_size: Number of samples per batch
+        :param max_memory_bytes: Memory budget for the shuffle buffer and the queued parts
+        :param nb_prefetch_parts: Maximum number of decoded parts which wait in the queue
+        :param normalizer: Optional array which is multiplied with the first array of each batch (the input planes)
+        :param pin_memory: True, if the batch tensors shall be allocated in page-locked memory
+        :param nb_recent_batches: Number of recently returned batches which are kept for the evaluation of the
+         train metrics
+        :param seed: Seed for the shuffling
+        """
+        self.load_part = load_part
+        self.batch_size = batch_size
+        self.max_memory_bytes = max_memory_bytes
+        self.nb_prefetch_parts = nb_prefetch_parts
+        self.normalizer = None if normalizer is None else torch.from_numpy(np.asarray(normalizer, np.float32))
+        self.pin_memory = pin_memory
+        self.recent_batches = deque(maxlen=nb_recent_batches)
+        self.rng = np.random.default_rng(seed)
+        self.part_queue = deque()
+        self.part_queue_bytes = 0
+        self.part_cond = Condition()
+        self.batch_queue = Queue(maxsize=NB_QUEUED_BATCHES)
+        self.stop_event = Event()
+        self.error = None
+        # statistics of the batch thread
+        self.nb_samples = 0
+        self.t_start = None
+
+    def iterate(self, part_ids):
+        """
+        Yields all batches of the given parts. The parts are loaded in the given order, but the samples are shuffled
+        across the parts via the shuffle buffer. Leaving the generator early stops the background threads.
+        :param part_ids: Ordered list of part ids for one epoch
+        :return: Generator of batches (lists of float32 tensors)
+        """
+        self.stop_event.clear()
+        self.error = None
+        self.part_queue.clear()
+        self.part_queue_bytes = 0
+        self.nb_samples = 0
+        self.t_start = time()
+        threads = [Thread(target=self._run_loader, args=(list(part_ids),), daemon=True),
+                   Thread(target=self._run_batcher, daemon=True)]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                batch = self.batch_queue.get()
+                if batch is None:
+                    break
+                self.recent_batches.append(batch)
+                yield batch
+        finally:
+            self.stop_event.set()
+            with self.part_cond:
+                self.part_cond.notify_all()
+            # drain the batch queue so that a blocked batch thread can finish
+            while any(thread.is_alive() for thread in threads):
+                try:
+                    self.batch_queue.get(timeout=QUEUE_TIMEOUT)
+                except Empty:
+                    pass
+            while not self.batch_queue.empty():
+                self.batch_queue.get_nowait()
+        if self.error is not None:
+            raise Exception("The prefetch pipeline failed: %s" % self.error)
+
+    def get_samples_per_second(self):
+        """Returns the number of samples per second which the batch thread provided in the current epoch"""
+        t_elapsed = time() - self.t_start if self.t_start is not None else 0
+        return self.nb_samples / t_elapsed if t_elapsed > 0 else 0.0
+
+    def _run_loader(self, part_ids):
+        """
+        Loads the given parts one after another and pushes them into the part queue as long as the memory budget allows
+        :param part_ids: Part ids to load
+        :return:
+        """
+        try:
+            for part_id in part_ids:
+                arrays = self.load_part(part_id)
+                nb_bytes = sum(array.nbytes for array in arrays)
+                with self.part_cond:
+                    # always accept a part if the queue is empty, otherwise a single large part would block forever
+                    while self.part_queue and (len(self.part_queue) >= self.nb_prefetch_parts or
+                                               self.part_queue_bytes + nb_bytes > self.max_memory_bytes // 2) \
+                            and not self.stop_event.is_set():
+                        self.part_cond.wait(QUEUE_TIMEOUT)
+                    if self.stop_event.is_set():
+                        return
+                    self.part_queue.append(arrays)
+                    self.part_queue_bytes += nb_bytes
+                    self.part_cond.notify_all()
+        except Exception as err:  # pylint: disable=broad-except
+            self.error = err
+        finally:
+            with self.part_cond:
+                self.part_queue.append(None)  # end of the epoch
+                self.part_cond.notify_all()
+
+    def _get_next_part(self):
+        """
+        Waits for the next loaded part and returns its arrays together with a random sample order
+        :return: arrays, order or None, None at the end of the epoch
+        """
+        with self.part_cond:
+            while not self.part_queue and not self.stop_event.is_set():
+                self.part_cond.wait(QUEUE_TIMEOUT)
+            if self.stop_event.is_set():
+                return None, None
+            arrays = self.part_queue.popleft()
+            if arrays is not None:
+                self.part_queue_bytes -= sum(array.nbytes for array in arrays)
+            self.part_cond.notify_all()
+        if arrays is None:
+            return None, None
+        return arrays, self.rng.permutation(len(arrays[0]))
+
+    def _put_batch(self, batch):
+        """
+        Puts a batch into the batch queue
+        :param batch: Batch to put, None marks the end of the epoch
+        :return: False if the pipeline has been stopped
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.batch_queue.put(batch, timeout=QUEUE_TIMEOUT)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _to_batch(self, buffers, idcs):
+        """
+        Gathers the samples of the given shuffle buffer indices into float32 tensors
+        :param buffers: Shuffle buffer arrays
+        :param idcs: Buffer indices of the batch
+        :return: List of tensors
+        """
+        batch = []
+        for buffer in buffers:
+            tensor = torch.from_numpy(buffer[idcs]).float()
+            if self.pin_memory:
+                tensor = tensor.pin_memory()
+            batch.append(tensor)
+        if self.normalizer is not None:
+            batch[0] *= self.normalizer
+        return batch
+
+    def _run_batcher(self):  # Too many branches (13/12)
+        """
+        Fills the shuffle buffer with the samples of the loaded parts and draws random batches from it.
+        Every drawn sample is replaced by the next sample of the stream.
+        :return:
+        """
+        try:
+            buffers = None
+            capacity = nb_filled = 0
+            arrays, order = self._get_next_part()
+            pos = 0
+            while arrays is not None or nb_filled > 0:
+                if self.stop_event.is_set():
+                    return
+                if arrays is not None and buffers is None:
+                    sample_bytes = sum(array.itemsize * int(np.prod(array.shape[1:])) for array in arrays)
+                    capacity = max(self.batch_size, self.max_memory_bytes // 2 // sample_bytes)
+                    buffers = [np.empty((capacity,) + array.shape[1:], array.dtype) for array in arrays]
+
+                # refill the free slots of the buffer from the stream
+                while arrays is not None and nb_filled < capacity:
+                    nb_new = min(capacity - nb_filled, len(order) - pos)
+                    stream_idcs = np.sort(order[pos:pos + nb_new])  # sorted reads are faster on memory maps
+                    for buffer, array in zip(buffers, arrays):
+                        buffer[nb_filled:nb_filled + nb_new] = array[stream_idcs]
+                    nb_filled += nb_new
+                    pos += nb_new
+                    if pos == len(order):
+                        arrays, order = self._get_next_part()
+                        pos = 0
+
+                # draw a random batch and move the last filled samples into the gaps
+                nb_batch = min(self.batch_size, nb_filled)
+                idcs = self.rng.choice(nb_filled, nb_batch, replace=False)
+                batch = self._to_batch(buffers, idcs)
+                keep = np.setdiff1d(np.arange(nb_filled - nb_batch, nb_filled), idcs, assume_unique=True)
+                gaps = idcs[idcs < nb_filled - nb_batch]
+                for buffer in buffers:
+                    buffer[gaps] = buffer[keep]
+                nb_filled -= nb_batch
+                self.nb_samples += nb_batch
+                if not self._put_batch(batch):
+                    return
+        except Exception as err:  # pylint: disable=broad-except
+            self.error = err
+        finally:
+            self._put_batch(None)
@@ -10,9 +10,13 @@ For the main configuration files please modify
 * CrazyAra/DeepCrazyhouse/configs/train_config.py
 
 A decision was made to only support the Pytorch framework.
+
+Data-parallel training with several processes (also across nodes) is started by torchrun, e.g.:
+torchrun --nproc_per_node=4 train_cli.py --batch-size 4096
 """
 
 import argparse
+import os
 import sys
 import torch
 import logging
@@ -25,6 +29,7 @@ from DeepCrazyhouse.configs.train_config import TrainConfig, TrainObjects
 from DeepCrazyhouse.src.training.train_cli_util import create_pytorch_model, get_validation_data, fill_train_objects,\
     print_model_summary, export_best_model_state, fill_train_config, export_configs, create_export_dirs, export_cmd_args
 from DeepCrazyhouse.src.training.trainer_agent_pytorch import TrainerAgentPytorch, load_torch_state
+from DeepCrazyhouse.src.training.distributed import destroy_distributed, init_distributed, is_main_process
 
 
 def parse_args(train_config: TrainConfig):
@@ -80,13 +85,16 @@ def main():
     enable_color_logging()
 
     update_train_config_via_args(args, train_config)
+    if int(os.environ.get("WORLD_SIZE", 1)) > 1:  # started by torchrun
+        init_distributed(train_config)
 
     val_data, x_val = get_validation_data(train_config)
     input_shape = x_val[0].shape
     fill_train_config(train_config, x_val)
 
     model = create_pytorch_model(input_shape, train_config)
-    print_model_summary(input_shape, model, x_val)
+    if is_main_process():
+        print_model_summary(input_shape, model, x_val)
     if torch.cuda.is_available():
         model.cuda(torch.device(f"cuda:{train_config.device_id}"))
 
@@ -97,9 +105,10 @@ def main():
         load_torch_state(model, torch.optim.SGD(model.parameters(), lr=train_config.max_lr), Path(train_config.tar_file),
                          train_config.device_id)
 
-    create_export_dirs(train_config)
-    export_configs(args, train_config)
-    export_cmd_args(train_config)
+    if is_main_process():
+        create_export_dirs(train_config)
+        export_configs(args, train_config)
+        export_cmd_args(train_config)
 
     train_agent = TrainerAgentPytorch(model, val_data, train_config, train_objects, use_rtpt=True)
 
@@ -108,6 +117,10 @@ def main():
     (k_steps_final, value_loss_final, policy_loss_final, value_acc_sign_final, val_p_acc_final), (
         k_steps_best, val_metric_values_best) = train_agent.train(cur_it)
 
+    main_process = is_main_process()
+    destroy_distributed()
+    if not main_process:
+        return
     val_loss_best = val_metric_values_best["loss"]
     val_p_acc_best = val_metric_values_best["policy_acc"]
     logging.info('best val_loss: %.5f with v_policy_acc: %.5f at k_steps_best %d' % (val_loss_best, val_p_acc_best, k_steps_best))
@@ -34,6 +34,7 @@ from DeepCrazyhouse.src.domain.neural_net.architectures.pytorch.alpha_vile impor
 from DeepCrazyhouse.configs.train_config import TrainConfig, TrainObjects
 from DeepCrazyhouse.configs.model_config import ModelConfig
 from DeepCrazyhouse.src.preprocessing.dataset_loader import load_pgn_dataset
+from DeepCrazyhouse.src.training.inference_export import export_inference_variants
 from DeepCrazyhouse.src.training.lr_schedules.lr_schedules import plot_schedule, ConstantSchedule, OneCycleSchedule,\
     LinearWarmUp, MomentumSchedule
 from DeepCrazyhouse.src.training.train_util import get_metrics
@@ -67,7 +68,8 @@ def create_args_by_train_config(input_shape: tuple, tc: TrainConfig) -> Args:
 
 def fill_train_config(train_config: TrainConfig, x_val) -> None:
     """Fills train config items based on other items."""
-    train_config.nb_parts = len(glob.glob(main_config['planes_train_dir'] + '**/*'))
+    train_config.nb_parts = len(glob.glob(main_config['planes_train_dir'] +
+                                          ('**/*.shard' if train_config.use_memmap_shards else '**/*')))
     nb_it_per_epoch = (len(
         x_val) * train_config.nb_parts) // train_config.batch_size  # calculate how many iterations per epoch exist
     # one iteration is defined by passing 1 batch and doing backprop
@@ -239,6 +241,13 @@ def export_best_model_state(k_steps_best: int, k_steps_final: int, model, policy
     if hasattr(model, "merge_bn"):
         model.merge_bn()
     convert_model_to_onnx(input_shape, k_steps_best, model, model_name, train_config)
+    if train_config.inference_export_variants:
+        calibration_files = sorted(glob.glob(main_config['planes_train_dir'] +
+                                             ('**/*.shard' if train_config.use_memmap_shards else '**/*.zip')))
+        export_inference_variants(model, input_shape, train_config.export_dir + "best-model",
+                                  "%s-%04d" % (model_name, k_steps_best),
+                                  train_config.inference_export_variants.split(","),
+                                  calibration_files[0] if calibration_files else None)
 
     print("Saved weight & onnx files of the best model to %s" % (train_config.export_dir + "best-model"))
 
@@ -282,7 +291,9 @@ def get_validation_data(train_config: TrainConfig):
     """
     Returns the validation loader, x-Data and target-Policy object.
     """
-    pgn_dataset_arrays_dict = load_pgn_dataset(dataset_type='val', part_id=0, verbose=True, normalize=train_config.normalize)
+    pgn_dataset_arrays_dict = load_pgn_dataset(dataset_type='val', part_id=0, verbose=True,
+                                               normalize=train_config.normalize and not train_config.use_memmap_shards,
+                                               memory_map=train_config.use_memmap_shards)
     val_data = get_data_loader(pgn_dataset_arrays_dict, train_config, shuffle=False)
     return val_data, pgn_dataset_arrays_dict["x"]
 
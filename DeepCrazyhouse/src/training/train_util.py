@@ -106,11 +106,18 @@ def prepare_policy(y_policy, select_policy_from_plane, sparse_policy_label, is_p
     :return: modified y_policy
     """
     if sparse_policy_label:
+        if y_policy.ndim == 1:
+            # the labels are already given as move indices (e.g. in memory mapped shards)
+            if select_policy_from_plane:
+                y_policy = FLAT_PLANE_IDX[y_policy]
+            return y_policy
         y_policy = y_policy.argmax(axis=1)
 
         if select_policy_from_plane:
             y_policy[:] = FLAT_PLANE_IDX[y_policy]
     else:
+        if y_policy.ndim == 1:
+            raise Exception("Sparse policy labels can't be used for training with sparse_policy_label=False")
         if select_policy_from_plane and not is_policy_from_plane_data:
             tmp = np.zeros((len(y_policy), NB_LABELS_POLICY_MAP), np.float32)
             tmp[:, FLAT_PLANE_IDX] = y_policy[:, :]
@@ -11,6 +11,9 @@ https://gitlab.com/jweil/PommerLearn/-/blob/master/pommerlearn/training/train_cn
 
 import random
 import os
+from contextlib import nullcontext
+from itertools import chain
+import numpy as np
 import logging
 import glob
 from pathlib import Path
@@ -21,7 +24,8 @@ import datetime
 import onnx
 from rtpt import RTPT
 from tqdm import tqdm_notebook
-from torch.utils.data import TensorDataset, DataLoader
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import TensorDataset, DataLoader, default_collate
 from torch.optim.optimizer import Optimizer
 from torch.nn.modules.loss import _Loss
 from torch import Tensor
@@ -29,7 +33,11 @@ from onnxsim import simplify
 
 from DeepCrazyhouse.configs.main_config import main_config
 from DeepCrazyhouse.configs.train_config import TrainConfig, TrainObjects
+from DeepCrazyhouse.src.domain.variants.input_representation import MATRIX_NORMALIZER
 from DeepCrazyhouse.src.preprocessing.dataset_loader import load_pgn_dataset
+from DeepCrazyhouse.src.training.distributed import all_ranks_have_data, broadcast_from_main, get_micro_batch_size,\
+    get_rank, get_rank_part_ids, get_world_size
+from DeepCrazyhouse.src.training.prefetch_pipeline import PrefetchPipeline
 from DeepCrazyhouse.src.training.train_util import prepare_policy, return_metrics_and_stop_training,\
     value_to_wdl_label, prepare_plys_label
 
@@ -55,6 +63,9 @@ class TrainerAgentPytorch:
         :param use_rtpt: If True, an RTPT object will be created and modified within this class.
         :param additional_loaders: optional dictionary of {dataset_name: DataLoader} whose dataloaders will also be
          used for evaluation (only used for informative purposes)
+        If a torch.distributed process group has been initialized (see distributed.py), the model is trained
+        data-parallel: every process trains on its own share of the parts and only the main process writes the
+        checkpoints, the onnx models and the tensorboard logs.
         """
         self.additional_loaders = additional_loaders
         self.tc = train_config
@@ -64,9 +75,16 @@ class TrainerAgentPytorch:
         self._model = model
         self._val_loader = val_loader
         self._ctx = get_context(train_config.context, train_config.device_id)
+        self._rank = get_rank()
+        self._world_size = get_world_size()
+        self._is_main_process = self._rank == 0
+        self._log_to_tensorboard = self.tc.log_metrics_to_tensorboard and self._is_main_process
+        # number of samples of one forward pass of this process
+        self._micro_batch_size = get_micro_batch_size(self.tc, self._world_size)
+        self._nb_accumulated_batches = 0
 
         # define a summary writer that logs data and flushes to the file every 5 seconds
-        if self.tc.log_metrics_to_tensorboard:
+        if self._log_to_tensorboard:
             from torch.utils.tensorboard import SummaryWriter
             self.sum_writer = SummaryWriter(log_dir=self.tc.export_dir+"logs", flush_secs=5)
         # Define the two loss functions
@@ -78,8 +96,23 @@ class TrainerAgentPytorch:
         self.wdl_loss = SampleWeightedLoss(nn.CrossEntropyLoss)
         self.ply_loss = SampleWeightedLoss(nn.MSELoss)
 
+        # use the channels_last memory format for the weights before the optimizer state is created
+        self._memory_format = torch.channels_last if self.tc.use_channels_last else torch.preserve_format
+        self._model = self._model.to(memory_format=self._memory_format)
         # Define the optimizer
         self.optimizer = create_optimizer(self._model, self.tc)
+        self._amp_dtype = get_amp_dtype(self.tc.amp_dtype)
+        # only fp16 requires loss scaling, bf16 has the same exponent range as fp32
+        self._grad_scaler = torch.amp.GradScaler(self._ctx.type, enabled=self._amp_dtype == torch.float16)
+        # the ddp model averages the gradients of all processes during the backward pass
+        self._ddp_model = None
+        if self._world_size > 1:
+            self._ddp_model = DistributedDataParallel(self._model, device_ids=[self._ctx.index]
+                                                      if self._ctx.type == "cuda" else None)
+        # the compiled model shares its parameters with self._model which is still used for the evaluation and export
+        self._train_model = self._model if self._ddp_model is None else self._ddp_model
+        if self.tc.compile_mode:
+            self._train_model = torch.compile(self._train_model, mode=self.tc.compile_mode)
 
         self.ordering = list(range(self.tc.nb_parts))  # define a list which describes the order of the processed batches
 
@@ -95,9 +128,20 @@ class TrainerAgentPytorch:
         self._train_iter = self.graph_exported = self.val_metric_values = self.val_loss = self.val_p_acc = None
         self.val_metric_values_best = None
 
-        self.use_rtpt = use_rtpt
+        self.use_rtpt = use_rtpt and self._is_main_process
 
-        if use_rtpt:
+        self.t_data_wait = 0  # time in seconds in which the training loop waited for data since the last log
+        self._phase_weights_lut = get_phase_weights_lut(self.to.phase_weights, self._ctx)
+        self._pipeline = None
+        if self.tc.use_prefetch_pipeline:
+            normalizer = MATRIX_NORMALIZER if self.tc.normalize and self.tc.use_memmap_shards else None
+            self._pipeline = PrefetchPipeline(lambda part_id: get_dataset_arrays(self._load_train_part(part_id), self.tc,
+                                                                                 self._get_loader_phase_weights()),
+                                              self._micro_batch_size, self.tc.prefetch_memory_mb * 2 ** 20,
+                                              self.tc.nb_prefetch_parts, normalizer,
+                                              pin_memory=self._ctx.type == "cuda", seed=self.tc.seed)
+
+        if self.use_rtpt:
             # we use k-steps instead of epochs here
             self.rtpt = RTPT(name_initials=self.tc.name_initials, experiment_name='crazyara',
                              max_iterations=self.k_steps_end-self.tc.k_steps_initial)
@@ -112,6 +156,9 @@ class TrainerAgentPytorch:
 
         self._setup_variables(cur_it)
         self._model.train()  # set training mode
+        logging.info("amp_dtype: %s - use_channels_last: %s - compile_mode: %s - use_fused_optimizer: %s",
+                     self.tc.amp_dtype or "fp32", self.tc.use_channels_last, self.tc.compile_mode or "off",
+                     self.tc.use_fused_optimizer)
 
         while self.continue_training:
             # reshuffle the ordering of the training game batches (shuffle works in place)
@@ -122,150 +169,159 @@ class TrainerAgentPytorch:
             logging.info("=========================")
             self.t_s_steps = time()
 
-            for part_id in tqdm_notebook(self.ordering):
-                train_loader = self._get_train_loader(part_id)
-
-                for _, batch in enumerate(train_loader):
-                    data = self.train_update(batch)
-
-                    # add the graph representation of the network to the tensorboard log file
-                    if not self.graph_exported and self.tc.log_metrics_to_tensorboard:
-                        self.sum_writer.add_graph(self._model, data)
-                        self.graph_exported = True
-
-                    if self.batch_proc_tmp >= self.tc.batch_steps or self.cur_it >= self.tc.total_it:  # show metrics every thousands steps
-                        train_metric_values, val_metric_values, additional_metric_values = self.evaluate(train_loader)
-
-                        if self.use_rtpt:
-                            # update process title according to loss
-                            self.rtpt.step(subtitle=f"loss={val_metric_values['loss']:2.2f}")
-                        if self.tc.use_spike_recovery and (
-                                self.old_val_loss * self.tc.spike_thresh < val_metric_values["loss"]
-                                or torch.isnan(val_metric_values["loss"])
-                        ):  # check for spikes
-                            self.nb_spikes += 1
-                            logging.warning(
-                                "Spike %d/%d occurred - val_loss: %.3f",
-                                self.nb_spikes,
-                                self.tc.max_spikes,
-                                val_metric_values["loss"],
+            for train_loader, batch in self._iterate_train_batches():
+                data = self.train_update(batch)
+
+                # add the graph representation of the network to the tensorboard log file
+                if not self.graph_exported and self._log_to_tensorboard:
+                    self.sum_writer.add_graph(self._model, data)
+                    self.graph_exported = True
+
+                if self.batch_proc_tmp >= self.tc.batch_steps or self.cur_it >= self.tc.total_it:  # show metrics every thousands steps
+                    train_metric_values, val_metric_values, additional_metric_values = self.evaluate(train_loader)
+
+                    if self.use_rtpt:
+                        # update process title according to loss
+                        self.rtpt.step(subtitle=f"loss={val_metric_values['loss']:2.2f}")
+                    if self.tc.use_spike_recovery and (
+                            self.old_val_loss * self.tc.spike_thresh < val_metric_values["loss"]
+                            or torch.isnan(val_metric_values["loss"])
+                    ):  # check for spikes
+                        self.nb_spikes += 1
+                        logging.warning(
+                            "Spike %d/%d occurred - val_loss: %.3f",
+                            self.nb_spikes,
+                            self.tc.max_spikes,
+                            val_metric_values["loss"],
+                        )
+                        if self.nb_spikes >= self.tc.max_spikes:
+                            self.val_loss = val_metric_values["loss"]
+                            self.val_p_acc = val_metric_values["policy_acc"]
+                            logging.debug("The maximum number of spikes has been reached. Stop training.")
+                            # finally stop training because the number of lr drops has been achieved
+                            print()
+                            print(
+                                "Elapsed time for training(hh:mm:ss): "
+                                + str(datetime.timedelta(seconds=round(time() - self.t_s)))
                             )
-                            if self.nb_spikes >= self.tc.max_spikes:
-                                self.val_loss = val_metric_values["loss"]
-                                self.val_p_acc = val_metric_values["policy_acc"]
-                                logging.debug("The maximum number of spikes has been reached. Stop training.")
-                                # finally stop training because the number of lr drops has been achieved
-                                print()
-                                print(
-                                    "Elapsed time for training(hh:mm:ss): "
-                                    + str(datetime.timedelta(seconds=round(time() - self.t_s)))
-                                )
-
-                                if self.tc.log_metrics_to_tensorboard:
-                                    self.sum_writer.close()
-                                return return_metrics_and_stop_training(self.k_steps, val_metric_values, self.k_steps_best,
-                                                                        self.val_metric_values_best)
-
-                            logging.debug("Recover to latest checkpoint")
-                            model_path = self.tc.export_dir + "weights/model-%.5f-%.3f-%04d.tar" % (
-                                self.val_loss_best,
-                                self.val_p_acc_best,
-                                self.k_steps_best,
-                            )  # Load the best model once again
-                            logging.debug("load current best model:%s", model_path)
-                            load_torch_state(self._model, self.optimizer, model_path, self.tc.device_id)
-                            self.k_steps = self.k_steps_best
-                            logging.debug("k_step is back at %d", self.k_steps_best)
-                            # print the elapsed time
-                            self.t_delta = time() - self.t_s_steps
-                            print(" - %.ds" % self.t_delta)
-                            self.t_s_steps = time()
-                        else:
-                            # update the val_loss_value to compare with using spike recovery
-                            self.old_val_loss = val_metric_values["loss"]
-                            # log the metric values to tensorboard
-                            self._log_metrics(train_metric_values, global_step=self.k_steps, prefix="train_")
-                            self._log_metrics(val_metric_values, global_step=self.k_steps, prefix="val_")
-                            if self.additional_loaders is not None:
-                                for dataset_name, metric_values in additional_metric_values.items():
-                                    self._log_metrics(metric_values, global_step=self.k_steps, prefix=f"{dataset_name}_")
-
-                            if self.tc.log_metrics_to_tensorboard and self.tc.export_grad_histograms:
-                                grads = []
-                                # logging the gradients of parameters for checking convergence
-                                for name, param in self._model.named_parameters():
-                                    if "bn" not in name and "batch" not in name and name != "policy_flat_plane_idx":
-                                        self.sum_writer.add_histogram(
-                                            tag=name, values=param, global_step=self.k_steps,
-                                        )
-
-                            # check if a new checkpoint shall be created
-                            if self.val_loss_best is None or val_metric_values["loss"] < self.val_loss_best:
-                                # update val_loss_best
-                                self.val_loss_best = val_metric_values["loss"]
-                                self.val_p_acc_best = val_metric_values["policy_acc"]
-                                self.val_metric_values_best = val_metric_values
-                                self.k_steps_best = self.k_steps
-
-                                if self.tc.export_weights:
-                                    model_prefix = "model-%.5f-%.3f-%04d"\
-                                                   % (self.val_loss_best, self.val_p_acc_best, self.k_steps_best)
-                                    filepath = Path(self.tc.export_dir + f"weights/{model_prefix}.tar")
-                                    self.delete_previous_weights()
-
-                                    # the export function saves both the architecture and the weights
-                                    save_torch_state(self._model, self.optimizer, filepath)
-                                    print()
-                                    logging.info("Saved checkpoint to %s", filepath)
-                                    with torch.no_grad():
-                                        ctx = get_context(self.tc.context, self.tc.device_id)
-                                        dummy_input = torch.zeros(1, data.shape[1], data.shape[2], data.shape[3]).to(
-                                            ctx)
-                                        export_to_onnx(self._model, 1,
-                                                       dummy_input,
-                                                       Path(self.tc.export_dir) / Path("weights"), model_prefix,
-                                                       self.tc.use_wdl and self.tc.use_plys_to_end,
-                                                       True)
-
-                                self.patience_cnt = 0  # reset the patience counter
-                            # print the elapsed time
-                            self.t_delta = time() - self.t_s_steps
-                            print(" - %.ds" % self.t_delta)
-                            self.t_s_steps = time()
-
-                            if self.tc.log_metrics_to_tensorboard:
-                                # log the samples per second metric to tensorboard
-                                self.sum_writer.add_scalar(
-                                    tag="samples_per_second",
-                                    scalar_value=data.shape[0] * self.tc.batch_steps / self.t_delta,
-                                    global_step=self.k_steps,
-                                )
-
-                                # log the current learning rate
-                                self.sum_writer.add_scalar(tag="lr", scalar_value=self.to.lr_schedule(self.cur_it), global_step=self.k_steps)
-                                # log the current momentum value
-                                self.sum_writer.add_scalar(
-                                    tag="momentum", scalar_value=self.to.momentum_schedule(self.cur_it), global_step=self.k_steps
-                                )
-
-                            if self.cur_it >= self.tc.total_it:
-                                logging.debug("The number of given iterations has been reached")
-                                # finally stop training because the number of lr drops has been achieved
+
+                            if self._log_to_tensorboard:
+                                self.sum_writer.close()
+                            return return_metrics_and_stop_training(self.k_steps, val_metric_values, self.k_steps_best,
+                                                                    self.val_metric_values_best)
+
+                        logging.debug("Recover to latest checkpoint")
+                        model_path = self.tc.export_dir + "weights/model-%.5f-%.3f-%04d.tar" % (
+                            self.val_loss_best,
+                            self.val_p_acc_best,
+                            self.k_steps_best,
+                        )  # Load the best model once again
+                        logging.debug("load current best model:%s", model_path)
+                        load_torch_state(self._model, self.optimizer, model_path, self.tc.device_id)
+                        self.k_steps = self.k_steps_best
+                        logging.debug("k_step is back at %d", self.k_steps_best)
+                        # print the elapsed time
+                        self.t_delta = time() - self.t_s_steps
+                        print(" - %.ds" % self.t_delta)
+                        self.t_s_steps = time()
+                        self.t_data_wait = 0
+                    else:
+                        # update the val_loss_value to compare with using spike recovery
+                        self.old_val_loss = val_metric_values["loss"]
+                        # log the metric values to tensorboard
+                        self._log_metrics(train_metric_values, global_step=self.k_steps, prefix="train_")
+                        self._log_metrics(val_metric_values, global_step=self.k_steps, prefix="val_")
+                        if self.additional_loaders is not None:
+                            for dataset_name, metric_values in additional_metric_values.items():
+                                self._log_metrics(metric_values, global_step=self.k_steps, prefix=f"{dataset_name}_")
+
+                        if self._log_to_tensorboard and self.tc.export_grad_histograms:
+                            grads = []
+                            # logging the gradients of parameters for checking convergence
+                            for name, param in self._model.named_parameters():
+                                if "bn" not in name and "batch" not in name and name != "policy_flat_plane_idx":
+                                    self.sum_writer.add_histogram(
+                                        tag=name, values=param, global_step=self.k_steps,
+                                    )
+
+                        # check if a new checkpoint shall be created
+                        if self.val_loss_best is None or val_metric_values["loss"] < self.val_loss_best:
+                            # update val_loss_best
+                            self.val_loss_best = val_metric_values["loss"]
+                            self.val_p_acc_best = val_metric_values["policy_acc"]
+                            self.val_metric_values_best = val_metric_values
+                            self.k_steps_best = self.k_steps
+
+                            # the checkpoint is loaded by all processes during a spike recovery
+                            if self.tc.export_weights and self._is_main_process:
+                                model_prefix = "model-%.5f-%.3f-%04d"\
+                                               % (self.val_loss_best, self.val_p_acc_best, self.k_steps_best)
+                                filepath = Path(self.tc.export_dir + f"weights/{model_prefix}.tar")
+                                self.delete_previous_weights()
+
+                                # the export function saves both the architecture and the weights
+                                save_torch_state(self._model, self.optimizer, filepath)
                                 print()
-                                print(
-                                    "Elapsed time for training(hh:mm:ss): "
-                                    + str(datetime.timedelta(seconds=round(time() - self.t_s)))
-                                )
+                                logging.info("Saved checkpoint to %s", filepath)
+                                with torch.no_grad():
+                                    ctx = get_context(self.tc.context, self.tc.device_id)
+                                    dummy_input = torch.zeros(1, data.shape[1], data.shape[2], data.shape[3]).to(
+                                        ctx)
+                                    export_to_onnx(self._model, 1,
+                                                   dummy_input,
+                                                   Path(self.tc.export_dir) / Path("weights"), model_prefix,
+                                                   self.tc.use_wdl and self.tc.use_plys_to_end,
+                                                   True)
+
+                            self.patience_cnt = 0  # reset the patience counter
+                        # print the elapsed time
+                        self.t_delta = time() - self.t_s_steps
+                        print(" - %.ds" % self.t_delta)
+                        self.t_s_steps = time()
+
+                        if self._log_to_tensorboard:
+                            # log the samples per second metric to tensorboard
+                            self.sum_writer.add_scalar(
+                                tag="samples_per_second",
+                                scalar_value=self.tc.batch_size * self.tc.batch_steps / self.t_delta,
+                                global_step=self.k_steps,
+                            )
+                            # log the share of the time in which the training loop waited for data
+                            self.sum_writer.add_scalar(tag="data_wait_ratio",
+                                                       scalar_value=self.t_data_wait / self.t_delta,
+                                                       global_step=self.k_steps)
+                            if self._pipeline is not None:
+                                # log the rate in which the prefetch pipeline provides samples
+                                self.sum_writer.add_scalar(tag="pipeline_samples_per_second",
+                                                           scalar_value=self._pipeline.get_samples_per_second(),
+                                                           global_step=self.k_steps)
+
+                            # log the current learning rate
+                            self.sum_writer.add_scalar(tag="lr", scalar_value=self.to.lr_schedule(self.cur_it), global_step=self.k_steps)
+                            # log the current momentum value
+                            self.sum_writer.add_scalar(
+                                tag="momentum", scalar_value=self.to.momentum_schedule(self.cur_it), global_step=self.k_steps
+                            )
+                        self.t_data_wait = 0
+
+                        if self.cur_it >= self.tc.total_it:
+                            logging.debug("The number of given iterations has been reached")
+                            # finally stop training because the number of lr drops has been achieved
+                            print()
+                            print(
+                                "Elapsed time for training(hh:mm:ss): "
+                                + str(datetime.timedelta(seconds=round(time() - self.t_s)))
+                            )
 
-                                if self.tc.log_metrics_to_tensorboard:
-                                    self.sum_writer.close()
+                            if self._log_to_tensorboard:
+                                self.sum_writer.close()
 
-                                # make sure to empty cache
-                                if torch.cuda.is_available():
-                                    torch.cuda.empty_cache()
+                            # make sure to empty cache
+                            if torch.cuda.is_available():
+                                torch.cuda.empty_cache()
 
-                                return return_metrics_and_stop_training(self.k_steps, val_metric_values, self.k_steps_best,
-                                                                        self.val_metric_values_best)
+                            return return_metrics_and_stop_training(self.k_steps, val_metric_values, self.k_steps_best,
+                                                                    self.val_metric_values_best)
 
     def delete_previous_weights(self):
         """
@@ -276,29 +332,83 @@ class TrainerAgentPytorch:
         for f in files:
             os.remove(f)
 
-    def _get_train_loader(self, part_id):
+    def _load_train_part(self, part_id):
         # load one chunk of the dataset from memory
-
-        pgn_dataset_arrays_dict = load_pgn_dataset(
+        return load_pgn_dataset(
             dataset_type="train",
             part_id=part_id,
-            normalize=self.tc.normalize,
+            normalize=self.tc.normalize and not self.tc.use_memmap_shards,
             verbose=False,
-            q_value_ratio=self.tc.q_value_ratio)
+            q_value_ratio=self.tc.q_value_ratio,
+            memory_map=self.tc.use_memmap_shards)
 
-        train_loader = get_data_loader(pgn_dataset_arrays_dict, self.tc, shuffle=True)
+    def _get_loader_phase_weights(self):
+        """Returns the phase weights which are applied by the loader or None if train_update() applies them"""
+        return self.to.phase_weights if self.tc.sample_weights_in_loader else None
 
-        return train_loader
+    def _get_train_loader(self, part_id):
+        return get_data_loader(self._load_train_part(part_id), self.tc, shuffle=True,
+                               phase_weights=self._get_loader_phase_weights(), batch_size=self._micro_batch_size)
+
+    def _iterate_train_batches(self):
+        """
+        Yields all training batches of one epoch of this process. With several processes every process loads its own
+        share of the parts and the epoch ends as soon as one of the processes has no batch left, so that all processes
+        run the same number of train updates.
+        :return: Generator of (batches for the train metric evaluation, batch)
+        """
+        part_ids = get_rank_part_ids(self.ordering, self._rank, self._world_size)
+        batches = self._iterate_part_batches(part_ids)
+        if self._world_size == 1:
+            yield from batches
+            return
+        for item in chain(batches, [None]):
+            if not all_ranks_have_data(item is not None, self._ctx):
+                batches.close()  # stops the threads of the prefetch pipeline
+                return
+            yield item
+
+    def _iterate_part_batches(self, part_ids):
+        """
+        Yields all training batches of the given parts either from the prefetch pipeline or part by part from a
+        DataLoader. The time in which the training loop waits for the next batch is added to self.t_data_wait.
+        :param part_ids: Ordered part ids of this process
+        :return: Generator of (batches for the train metric evaluation, batch)
+        """
+        if self._pipeline is not None:
+            batches = self._pipeline.iterate(part_ids)
+            t_wait = time()
+            for batch in batches:
+                self.t_data_wait += time() - t_wait
+                yield self._pipeline.recent_batches, batch
+                t_wait = time()
+            return
+
+        for part_id in tqdm_notebook(part_ids):
+            t_wait = time()
+            train_loader = self._get_train_loader(part_id)
+            for batch in train_loader:
+                self.t_data_wait += time() - t_wait
+                yield train_loader, batch
+                t_wait = time()
 
     def evaluate(self, train_loader):
         # log the current learning rate
         # update batch_proc_tmp counter by subtracting the batch_steps
         self.batch_proc_tmp -= self.tc.batch_steps
         ms_step = ((time() - self.t_s_steps) / self.tc.batch_steps) * 1000  # measure elapsed time
+        samples_per_second = self.tc.batch_size * 1000 / ms_step
+        peak_memory_mb = get_peak_memory_mb(self._ctx)
         # update the counters
         self.k_steps += 1
         self.patience_cnt += 1
-        logging.info("Step %dK/%dK - %dms/step", self.k_steps, self.k_steps_end, ms_step)
+        logging.info("Step %dK/%dK - %dms/step - %d samples/s - peak memory: %.0fMB", self.k_steps, self.k_steps_end,
+                     ms_step, samples_per_second, peak_memory_mb)
+        if self._log_to_tensorboard:
+            # the training speed without the evaluation time allows to compare the amp, channels_last and compile modes
+            self.sum_writer.add_scalar(tag="train_samples_per_second", scalar_value=samples_per_second,
+                                       global_step=self.k_steps)
+            self.sum_writer.add_scalar(tag="peak_memory_mb", scalar_value=peak_memory_mb, global_step=self.k_steps)
         logging.info("-------------------------")
         logging.debug("Iteration %d/%d", self.cur_it, self.tc.total_it)
         logging.debug("lr: %.7f - momentum: %.7f", self.to.lr_schedule(self.cur_it),
@@ -315,6 +425,7 @@ class TrainerAgentPytorch:
             apply_select_policy_from_plane=self.tc.select_policy_from_plane and not self.tc.is_policy_from_plane_data,
             use_wdl=self.tc.use_wdl,
             use_plys_to_end=self.tc.use_plys_to_end,
+            sample_weights_in_batch=self.tc.sample_weights_in_loader,
         )
 
         print("starting val eval")
@@ -330,6 +441,9 @@ class TrainerAgentPytorch:
             use_wdl=self.tc.use_wdl,
             use_plys_to_end=self.tc.use_plys_to_end,
         )
+        if self._world_size > 1:
+            # all processes must take the same checkpoint and spike recovery decisions
+            val_metric_values = broadcast_from_main(val_metric_values)
 
         # do additional evaluations based on self.additional_loaders
         additional_metric_values = dict()
@@ -354,18 +468,31 @@ class TrainerAgentPytorch:
         return train_metric_values, val_metric_values, additional_metric_values
 
     def train_update(self, batch):
-        self.optimizer.zero_grad()
+        """
+        Runs the forward and backward pass of a micro batch. The optimizer step is done after
+        gradient_accumulation_steps micro batches, the gradients of all processes are averaged during the last backward
+        pass.
+        :param batch: List of tensors of get_dataset_arrays()
+        :return: Input planes of the batch
+        """
+        if self._nb_accumulated_batches == 0:
+            self.optimizer.zero_grad()
+        self._nb_accumulated_batches += 1
+        is_update_step = self._nb_accumulated_batches == self.tc.gradient_accumulation_steps
         if self.tc.use_wdl and self.tc.use_plys_to_end:
             data, value_label, policy_label, wdl_label, plys_label, phase_vector = batch
             plys_label = plys_label.to(self._ctx)
             wdl_label = wdl_label.to(self._ctx).long()
         else:
             data, value_label, policy_label, phase_vector = batch
-        data = data.to(self._ctx)
+        data = data.to(self._ctx, memory_format=self._memory_format)
         value_label = value_label.to(self._ctx)
         policy_label = policy_label.to(self._ctx)
-        sample_weights = torch.Tensor([self.to.phase_weights[phase.item()] for phase in phase_vector])
-        sample_weights = sample_weights.to(self._ctx)
+        if self.tc.sample_weights_in_loader:
+            # the loader already replaced the phase vector by the sample weights
+            sample_weights = phase_vector.to(self._ctx)
+        else:
+            sample_weights = get_sample_weights(self._phase_weights_lut, phase_vector)
         if self.tc.sparse_policy_label:
             policy_label = policy_label.long()
         # update a dummy metric to see a proper progress bar
@@ -373,31 +500,39 @@ class TrainerAgentPytorch:
         # if self.batch_proc_tmp > 0:
         #     self.to.metrics["value_loss"].update(self.old_label, value_out)
         self.old_label = value_label
-        if self.tc.use_wdl and self.tc.use_plys_to_end:
-            value_out, policy_out, _, wdl_out, plys_out = self._model(data)
-            wdl_loss = self.wdl_loss(wdl_out, wdl_label, sample_weights)
-            ply_loss = self.ply_loss(torch.flatten(plys_out), plys_label, sample_weights)
-        else:
-            value_out, policy_out = self._model(data)
-        # policy_out = policy_out.softmax(dim=1)
-        value_loss = self.value_loss(torch.flatten(value_out), value_label, sample_weights)
-        policy_loss = self.policy_loss(policy_out, policy_label, sample_weights)
-        # weight the components of the combined loss
-        if self.tc.use_wdl and self.tc.use_wdl:
-            combined_loss = (
-                    self.tc.val_loss_factor * value_loss + self.tc.policy_loss_factor * policy_loss +
-                    self.tc.wdl_loss_factor * wdl_loss + self.tc.plys_to_end_loss_factor * ply_loss
-            )
-        else:
-            combined_loss = (
-                    self.tc.val_loss_factor * value_loss + self.tc.policy_loss_factor * policy_loss
-            )
-        combined_loss.backward()
+        # skip the gradient synchronisation of the processes for all but the last micro batch
+        with self._ddp_model.no_sync() if self._ddp_model is not None and not is_update_step else nullcontext():
+            with torch.autocast(self._ctx.type, dtype=self._amp_dtype, enabled=self._amp_dtype is not None):
+                if self.tc.use_wdl and self.tc.use_plys_to_end:
+                    value_out, policy_out, _, wdl_out, plys_out = self._train_model(data)
+                    wdl_loss = self.wdl_loss(wdl_out, wdl_label, sample_weights)
+                    ply_loss = self.ply_loss(torch.flatten(plys_out), plys_label, sample_weights)
+                else:
+                    value_out, policy_out = self._train_model(data)
+                # policy_out = policy_out.softmax(dim=1)
+                value_loss = self.value_loss(torch.flatten(value_out), value_label, sample_weights)
+                policy_loss = self.policy_loss(policy_out, policy_label, sample_weights)
+                # weight the components of the combined loss
+                if self.tc.use_wdl and self.tc.use_wdl:
+                    combined_loss = (
+                            self.tc.val_loss_factor * value_loss + self.tc.policy_loss_factor * policy_loss +
+                            self.tc.wdl_loss_factor * wdl_loss + self.tc.plys_to_end_loss_factor * ply_loss
+                    )
+                else:
+                    combined_loss = (
+                            self.tc.val_loss_factor * value_loss + self.tc.policy_loss_factor * policy_loss
+                    )
+            self._grad_scaler.scale(combined_loss / self.tc.gradient_accumulation_steps).backward()
+        if not is_update_step:
+            return data
+        self._nb_accumulated_batches = 0
         for param_group in self.optimizer.param_groups:
             param_group['lr'] = self.to.lr_schedule(self.cur_it)  # update the learning rate
             if 'momentum' in param_group:
                 param_group['momentum'] = self.to.momentum_schedule(self.cur_it)  # update the momentum
-        self.optimizer.step()
+        # the scaler skips the update if the fp16 gradients contain inf or nan values
+        self._grad_scaler.step(self.optimizer)
+        self._grad_scaler.update()
         self.cur_it += 1
         self.batch_proc_tmp += 1
         return data
@@ -414,7 +549,7 @@ class TrainerAgentPytorch:
         for name in metric_values.keys():  # show the metric stats
             print(" - %s%s: %.4f" % (prefix, name, metric_values[name]), end="")
             # add the metrics to the tensorboard event file
-            if self.tc.log_metrics_to_tensorboard:
+            if self._log_to_tensorboard:
                 self.sum_writer.add_scalar(tag="lr", scalar_value=self.to.lr_schedule(self.cur_it),
                                            global_step=self.k_steps)
 
@@ -448,16 +583,59 @@ class TrainerAgentPytorch:
 
 
 def create_optimizer(model: nn.Module, train_config: TrainConfig):
+    if train_config.use_fused_optimizer:
+        try:
+            return _create_optimizer(model, train_config, fused=True)
+        except (RuntimeError, TypeError) as e:
+            # older pytorch versions and some devices don't provide the fused kernels
+            logging.warning("The fused optimizer isn't available: %s. Fallback to the default implementation.", e)
+    return _create_optimizer(model, train_config)
+
+
+def _create_optimizer(model: nn.Module, train_config: TrainConfig, **kwargs):
     if train_config.optimizer_name == "nag":  # torch.optim.SGD uses Nestorov momentum already
         return torch.optim.SGD(model.parameters(), lr=train_config.max_lr, momentum=train_config.max_momentum,
-                               weight_decay=train_config.wd)
+                               weight_decay=train_config.wd, **kwargs)
     elif train_config.optimizer_name == "adam":
-        return torch.optim.Adam(model.parameters(), lr=train_config.max_lr, weight_decay=train_config.wd)
+        return torch.optim.Adam(model.parameters(), lr=train_config.max_lr, weight_decay=train_config.wd, **kwargs)
     elif train_config.optimizer_name == "adamw":
-        return torch.optim.AdamW(model.parameters(), lr=train_config.max_lr, weight_decay=train_config.wd)
+        return torch.optim.AdamW(model.parameters(), lr=train_config.max_lr, weight_decay=train_config.wd, **kwargs)
     raise Exception(f"Selected optimizer {train_config.optimizer_name} is not supported.")
 
 
+def get_amp_dtype(amp_dtype: str):
+    """
+    Returns the torch data type of the automatic mixed precision
+    :param amp_dtype: Either "bf16", "fp16" or an empty string for fp32 training
+    :return: torch.bfloat16, torch.float16 or None
+    """
+    if not amp_dtype:
+        return None
+    if amp_dtype == "bf16":
+        return torch.bfloat16
+    if amp_dtype == "fp16":
+        return torch.float16
+    raise Exception(f"Selected amp_dtype {amp_dtype} is not supported. Use 'bf16', 'fp16' or an empty string.")
+
+
+def get_peak_memory_mb(ctx) -> float:
+    """
+    Returns the peak memory since the last call in MB. On cuda devices the allocated tensor memory is measured,
+    otherwise the maximum resident set size of the process (which isn't reset).
+    :param ctx: Pytorch device
+    :return: Peak memory in MB
+    """
+    if ctx.type == "cuda":
+        peak_memory = torch.cuda.max_memory_allocated(ctx)
+        torch.cuda.reset_peak_memory_stats(ctx)
+        return peak_memory / 2 ** 20
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
 class SoftCrossEntropyLoss(_Loss):
     """
     Computes cross entropy loss for continuous target distribution.
@@ -499,8 +677,17 @@ def get_context(context: str, device_id: int):
         return torch.device("cpu")
 
 
-def load_torch_state(model: nn.Module, optimizer: Optimizer, path: Path, device_id: int):
-    checkpoint = torch.load(path, map_location=f"cuda:{device_id}")
+def load_torch_state(model: nn.Module, optimizer: Optimizer, path: Path, device_id: int, map_location=None):
+    """
+    Loads the model and optimizer state of a checkpoint which has been written by save_torch_state()
+    :param model: Model which receives the weights
+    :param optimizer: Optimizer which receives the optimizer state
+    :param path: Path of the checkpoint file
+    :param device_id: GPU on which the tensors are loaded if no map_location is given
+    :param map_location: Optional device for the tensors, e.g. "cpu" for tools which don't need a GPU
+    :return:
+    """
+    checkpoint = torch.load(path, map_location=f"cuda:{device_id}" if map_location is None else map_location)
     model.load_state_dict(checkpoint['model_state_dict'])
     optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
 
@@ -676,7 +863,8 @@ def reset_metrics(metrics):
 
 
 def evaluate_metrics(metrics, data_iterator, model, nb_batches, ctx, phase_weights, sparse_policy_label=False,
-                     apply_select_policy_from_plane=True, use_wdl=False, use_plys_to_end=False):
+                     apply_select_policy_from_plane=True, use_wdl=False, use_plys_to_end=False,
+                     sample_weights_in_batch=False):
     """
     Runs inference of the network on a data_iterator object and evaluates the given metrics.
     The metric results are returned as a dictionary object.
@@ -692,9 +880,12 @@ def evaluate_metrics(metrics, data_iterator, model, nb_batches, ctx, phase_weigh
     :param sparse_policy_label: Should be set to true if the policy uses one-hot encoded targets
      (e.g. supervised learning)
     :param apply_select_policy_from_plane: If true, given policy label is converted to policy map index
+    :param sample_weights_in_batch: True, if the last batch entry already contains the sample weights instead of the
+     phase vector (see TrainConfig.sample_weights_in_loader)
     :return: Metric values
     """
     reset_metrics(metrics)
+    phase_weights_lut = get_phase_weights_lut(phase_weights, ctx)
     model.eval()  # set model to evaluation mode
     with torch.no_grad():  # operations inside don't track history
         print("eval iterator length:", len(data_iterator), "eval phase weights:", phase_weights)
@@ -708,8 +899,10 @@ def evaluate_metrics(metrics, data_iterator, model, nb_batches, ctx, phase_weigh
             data = data.to(ctx)
             value_label = value_label.to(ctx)
             policy_label = policy_label.to(ctx)
-            sample_weights = torch.Tensor([phase_weights.get(phase.item(), 1.0) for phase in phase_vector])
-            sample_weights = sample_weights.to(ctx)
+            if sample_weights_in_batch:
+                sample_weights = phase_vector.to(ctx)
+            else:
+                sample_weights = get_sample_weights(phase_weights_lut, phase_vector)
 
             if use_wdl and use_plys_to_end:
                 value_out, policy_out, _, wdl_out, plys_out = model(data)
@@ -741,29 +934,98 @@ def evaluate_metrics(metrics, data_iterator, model, nb_batches, ctx, phase_weigh
     return metric_values
 
 
-def get_data_loader(pgn_dataset_arrays_dict: dict, tc: TrainConfig, shuffle=True):
+def get_phase_weights_lut(phase_weights: dict, ctx, default_weight=1.0):
     """
-    Returns a DataLoader object for the given numpy arrays.
+    Builds a lookup tensor which maps a phase index to its sample weight. The last entry holds the default weight
+    which is used for all phases that aren't part of phase_weights.
+    :param phase_weights: dictionary with the weights of each phase as phase: weight kv pairs
+    :param ctx: Pytorch device on which the lookup tensor is stored
+    :param default_weight: Weight for unknown phases
+    :return: Float32 tensor of length max(phase) + 2
+    """
+    lut = torch.full((max(phase_weights, default=-1) + 2,), default_weight)
+    for phase, weight in phase_weights.items():
+        lut[int(phase)] = weight
+    return lut.to(ctx)
+
+
+def get_sample_weights(phase_weights_lut: torch.Tensor, phase_vector):
+    """
+    Gathers the sample weights of a batch from the phase weights lookup tensor without leaving the device.
+    :param phase_weights_lut: Lookup tensor of get_phase_weights_lut()
+    :param phase_vector: Tensor or numpy array of phase indices
+    :return: Sample weights on the device of the lookup tensor (tensor input) or as numpy array (numpy input)
+    """
+    if isinstance(phase_vector, np.ndarray):
+        return phase_weights_lut.cpu().numpy()[np.clip(phase_vector.astype(np.int64), 0, len(phase_weights_lut) - 1)]
+    phase_idcs = phase_vector.to(phase_weights_lut.device, non_blocking=True).long()
+    return phase_weights_lut[phase_idcs.clamp_(0, len(phase_weights_lut) - 1)]
+
+
+def get_dataset_arrays(pgn_dataset_arrays_dict: dict, tc: TrainConfig, phase_weights=None):
+    """
+    Returns the list of numpy arrays which form one training sample in the order expected by train_update():
+    [x, y_value, y_policy, (wdl_label, plys_label,) phase_vector]
     !Note: This function modifies the y_policy!
     :param pgn_dataset_arrays_dict: Dict object containing the numpy arrays of load_pgn_dataset
     :param tc: Training config object
-    :param shuffle: Decide whether to shuffle the dataset or not
-    :return: Returns the data loader object
+    :param phase_weights: If given, the phase vector is replaced by the sample weights of each position, so that the
+     weights are computed once per part in the loader (see TrainConfig.sample_weights_in_loader)
+    :return: List of numpy arrays
     """
     d = pgn_dataset_arrays_dict
     y_policy_prep = prepare_policy(y_policy=d['y_policy'], select_policy_from_plane=tc.select_policy_from_plane,
                                    sparse_policy_label=tc.sparse_policy_label,
                                    is_policy_from_plane_data=tc.is_policy_from_plane_data)
-
-    # update the train_data object
+    phase_vector = d['phase_vector']
+    if phase_weights is not None:
+        phase_vector = get_sample_weights(get_phase_weights_lut(phase_weights, "cpu"), np.asarray(phase_vector))
     if tc.use_wdl and tc.use_plys_to_end:
-        dataset = TensorDataset(torch.Tensor(d['x']), torch.Tensor(d['y_value']),
-                                torch.Tensor(y_policy_prep),
-                                torch.Tensor(value_to_wdl_label(d['y_value'])),
-                                torch.Tensor(prepare_plys_label(d['plys_to_end'])),
-                                torch.Tensor(d['phase_vector']))
+        return [d['x'], d['y_value'], y_policy_prep, value_to_wdl_label(d['y_value']),
+                prepare_plys_label(d['plys_to_end']), phase_vector]
+    return [d['x'], d['y_value'], y_policy_prep, phase_vector]
+
+
+def get_data_loader(pgn_dataset_arrays_dict: dict, tc: TrainConfig, shuffle=True, phase_weights=None,
+                    batch_size=None):
+    """
+    Returns a DataLoader object for the given numpy arrays.
+    !Note: This function modifies the y_policy!
+    :param pgn_dataset_arrays_dict: Dict object containing the numpy arrays of load_pgn_dataset
+    :param tc: Training config object
+    :param shuffle: Decide whether to shuffle the dataset or not
+    :param phase_weights: Optional phase weights which replace the phase vector by the sample weights
+     (see get_dataset_arrays())
+    :param batch_size: Batch size of the loader, by default tc.batch_size
+    :return: Returns the data loader object
+    """
+    if tc.use_memmap_shards:
+        # wrap the memory mapped arrays without copying them, the conversion to float32 is done for each batch
+        to_tensor = torch.from_numpy
+        collate_fn = ShardBatchCollate(tc.normalize)
     else:
-        dataset = TensorDataset(torch.Tensor(d['x']), torch.Tensor(d['y_value']),
-                                torch.Tensor(y_policy_prep), torch.Tensor(d['phase_vector']))
-    train_loader = DataLoader(dataset, shuffle=shuffle, batch_size=tc.batch_size, num_workers=tc.cpu_count)
+        to_tensor = torch.Tensor
+        collate_fn = None
+
+    # update the train_data object
+    dataset = TensorDataset(*[to_tensor(array) for array in get_dataset_arrays(pgn_dataset_arrays_dict, tc,
+                                                                               phase_weights)])
+    train_loader = DataLoader(dataset, shuffle=shuffle, batch_size=batch_size or tc.batch_size,
+                              num_workers=tc.cpu_count, collate_fn=collate_fn)
     return train_loader
+
+
+class ShardBatchCollate:
+    """
+    Collate function for memory mapped shards. It stacks the samples of a batch and converts all entries to float32
+    as torch.Tensor() does for the in-memory datasets. The input planes are normalized if requested.
+    """
+
+    def __init__(self, normalize: bool):
+        self.normalizer = torch.from_numpy(MATRIX_NORMALIZER.astype(np.float32)) if normalize else None
+
+    def __call__(self, samples):
+        batch = [entry.float() for entry in default_collate(samples)]
+        if self.normalizer is not None:
+            batch[0] *= self.normalizer
+        return batch
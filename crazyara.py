@@ -10,9 +10,10 @@ http://wbec-ridderkerk.nl/html/UCIProtocol.html
 """
 
 from __future__ import print_function
-import collections
 import sys
 import traceback
+from threading import Event, Thread
+from time import time
 import chess.variant
 import numpy as np
 import multiprocessing
@@ -46,8 +47,14 @@ class CrazyAra:  # Too many instance attributes (25/7)
         self.client = {"name": "CrazyAra", "version": "0.5.1", "authors": "Johannes Czech, Moritz Willig, Alena Beyer"}
         self.mcts_agent = (
             self.rawnet_agent
-        ) = self.ab_agent = self.gamestate = self.bestmove_value = self.move_time = self.score = None
+        ) = self.ab_agent = self.eval_cache = self.opening_book = self.gamestate = self.bestmove_value = None
+        self.move_time = self.score = None
         self.engine_played_move = 0
+        # the search runs in a background thread, so that the main loop can react to "stop" and "ponderhit"
+        self.search_thread = self.search_error = None
+        self.search_released = Event()  # is set by "stop" or "ponderhit" to allow sending the bestmove
+        self.pondering = self.wait_for_release = self.ponder_miss = self.rebuild_gamestate = False
+        self.ponder_movetime_ms = self.t_search_start = 0
         self.log_file_path = "CrazyAra-log.txt"
         self.score_file_path = "score-log.txt"
         self.settings = {
@@ -55,12 +62,18 @@ class CrazyAra:  # Too many instance attributes (25/7)
             "search_type": "mcts",  # mcts, alpha_beta
             "ab_depth": 5,  # depth to reach for alpha_beta
             "ab_candidate_moves": 7,  # candidate moves to consider for ab-search, clipped according to NN policy
+            "ab_workers": 1,  # threads which search the root moves of the ab-search in parallel
             # set the context in which the neural networks calculation will be done
             # choose 'gpu' using the settings if there is one available
             "context": "cpu",
+            # mxnet: symbol and params files, onnxruntime: .onnx model, torch_cpu: TorchScript model of the trainer
+            "backend": "mxnet",
+            "backend_threads": 0,  # intra-op threads of onnxruntime and torch_cpu, 0 uses the library default
             "use_raw_network": False,
             "threads": min(8, multiprocessing.cpu_count()),
             "batch_size": 8,
+            "max_batch_wait_us": 500,
+            "nb_collectors": 0,  # 0: search threads with inference servers, >0: batch collecting search
             "neural_net_services": 1,
             "playouts_empty_pockets": 99999,
             "playouts_filled_pockets": 99999,
@@ -86,6 +99,15 @@ class CrazyAra:  # Too many instance attributes (25/7)
             "use_future_q_values": False,
             "use_time_management": True,
             "use_transposition_table": True,
+            "Hash": 64,  # MB of the transposition table, the nodes of the search tree itself aren't bounded by it
+            "tt_replacement": "visits",
+            "use_array_tree": False,
+            "eval_cache_mb": 64,  # memory budget of the network evaluation cache which is shared by all agents
+            "eval_cache_policy": "sparse",  # sparse: policy of the legal moves, full: complete policy vector
+            "eval_cache_file": "<empty>",  # file for the evaluations of opening positions between engine restarts
+            "book_file": "<empty>",  # opening book of tools/opening_book/create_opening_book.py
+            "centi_book_temperature": 0,  # 0 plays the most visited book move, otherwise the move is sampled
+            "Ponder": False,
             "verbose": False,
             "model_architecture_dir": "default",
             "model_weights_dir": "default"
@@ -156,22 +178,38 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
         """
         if not self.setup_done:
             from DeepCrazyhouse.src.domain.variants.game_state import GameState
-            from DeepCrazyhouse.src.domain.agent.neural_net_api import NeuralNetAPI
+            from DeepCrazyhouse.src.domain.agent.inference_backends import create_inference_backend
             from DeepCrazyhouse.src.domain.agent.player.raw_net_agent import RawNetAgent
             from DeepCrazyhouse.src.domain.agent.player.mcts_agent import MCTSAgent
+            from DeepCrazyhouse.src.domain.agent.player.util.eval_cache import EvalCache
+            from DeepCrazyhouse.src.domain.agent.player.util.opening_book import OpeningBook
 
             self.param_validity_check()  # check for valid parameter setup and do auto-corrections if possible
 
             nets = []
             for _ in range(self.settings["neural_net_services"]):
-                nets.append(NeuralNetAPI(ctx=self.settings["context"], batch_size=self.settings["batch_size"],
-                                         model_architecture_dir=self.settings["model_architecture_dir"],
-                                         model_weights_dir=self.settings["model_weights_dir"]))
+                nets.append(create_inference_backend(backend=self.settings["backend"], ctx=self.settings["context"],
+                                                     batch_size=self.settings["batch_size"],
+                                                     model_architecture_dir=self.settings["model_architecture_dir"],
+                                                     model_weights_dir=self.settings["model_weights_dir"],
+                                                     nb_threads=self.settings["backend_threads"]))
+
+            persist_file = self.settings["eval_cache_file"]
+            self.eval_cache = EvalCache(
+                size_mb=self.settings["eval_cache_mb"],
+                policy_mode=self.settings["eval_cache_policy"],
+                persist_file=None if persist_file == "<empty>" else persist_file,
+                model_name=nets[0].get_model_name(),
+            )
+            if self.settings["book_file"] != "<empty>":
+                self.opening_book = OpeningBook(self.settings["book_file"])
+                self.log_print("info string Loaded %d positions of the opening book" % len(self.opening_book))
 
             self.rawnet_agent = RawNetAgent(
                 nets[0],
                 temperature=self.settings["centi_temperature"] / 100,
                 temperature_moves=self.settings["temperature_moves"],
+                eval_cache=self.eval_cache,
             )
 
             self.mcts_agent = MCTSAgent(
@@ -198,6 +236,12 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
                 use_transposition_table=self.settings["use_transposition_table"],
                 opening_guard_moves=self.settings["opening_guard_moves"],
                 u_init_divisor=self.settings["centi_u_init_divisor"] / 100,
+                use_array_tree=self.settings["use_array_tree"],
+                max_batch_wait_us=self.settings["max_batch_wait_us"],
+                nb_collectors=self.settings["nb_collectors"],
+                eval_cache=self.eval_cache,
+                tt_size_mb=self.settings["Hash"],
+                tt_replacement=self.settings["tt_replacement"],
             )
 
             self.ab_agent = AlphaBetaAgent(
@@ -205,6 +249,8 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
                 depth=self.settings["ab_depth"],
                 nb_candidate_moves=self.settings["ab_candidate_moves"],
                 include_check_moves=False,
+                nb_workers=self.settings["ab_workers"],
+                eval_cache=self.eval_cache,
             )
 
             if self.settings["UCI_Variant"] == "crazyhouse":
@@ -249,7 +295,8 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
         :return:
         """
 
-        self.validity_with_threads("batch_size")
+        if not self.settings["nb_collectors"]:  # the batch of the collectors doesn't depend on the threads
+            self.validity_with_threads("batch_size")
         self.validity_with_threads("neural_net_services")
 
     def _get_wtime_btime_idx(self):
@@ -358,17 +405,96 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
 
         return movetime_ms
     
-    def perform_action(self):  # Probably needs refactoring
+    def go(self):
         """
-        Computes the 'best move' according to the engine and the given settings.
-        After the search is done it will print out ' bestmove e2e4' for example on std-out.
+        Starts the search for the current position in a background thread. The main loop stays responsive and can
+        stop the search or switch from pondering to the normal search. "go ponder" and "go infinite" search until
+        "ponderhit" or "stop" has been received, the bestmove is only sent afterwards.
         :return:
         """
+        self.wait_for_search()
+        ponder = "ponder" in self.cmd_list
+        infinite = "infinite" in self.cmd_list
+        # remove the flags, so that the time arguments are at the expected positions of the command list
+        self.cmd_list = [cmd for cmd in self.cmd_list if cmd not in ("ponder", "infinite")]
 
         if self.gamestate.is_variant_end():
             self.log_print("info string The requested position %s doesn't have any legal move." % self.gamestate)
             return
 
+        movetime_ms = self._prepare_search()
+        self.pondering = ponder
+        self.wait_for_release = ponder or infinite
+        self.ponder_miss = False
+        self.search_released.clear()
+        self.mcts_agent.stop_event.clear()
+        if self.wait_for_release:
+            # search until "ponderhit" or "stop" and keep the movetime for the case of a ponderhit
+            self.ponder_movetime_ms = movetime_ms
+            movetime_ms = self.max_search_time
+            self.mcts_agent.update_movetime(movetime_ms, is_unbounded=True)
+        # the movetime of the agents is set before the search thread starts, so a ponderhit can't be overwritten
+        self.ab_agent.update_movetime(movetime_ms)
+        self.t_search_start = time()
+        self.search_thread = Thread(target=self._run_search_thread, args=(movetime_ms,), daemon=True)
+        self.search_thread.start()
+
+    def _run_search_thread(self, movetime_ms):
+        """
+        Entry point of the search thread. Errors are stored and handled by the main loop.
+        :param movetime_ms: Time for the search in ms
+        :return:
+        """
+        try:
+            self.perform_action(movetime_ms)
+        except Exception:  # all possible exceptions
+            self.search_error = traceback.format_exc()
+            self.log_print(self.search_error)
+
+    def stop(self):
+        """
+        Stops the current search and waits until the bestmove has been sent. If the engine was pondering, the
+        opponent played a different move than expected and the search result isn't applied to the game state.
+        :return:
+        """
+        if self.search_thread is None:
+            return
+        if self.pondering:
+            self.pondering = False
+            self.ponder_miss = True
+        self.mcts_agent.stop_event.set()
+        self.ab_agent.update_movetime(0)  # the alpha beta search returns the result of its last finished iteration
+        self.search_released.set()
+        self.wait_for_search()
+
+    def ponderhit(self):
+        """
+        The opponent played the expected move: The ponder search continues as a normal search. The time which was
+        spent pondering is added to the movetime, because the search time is measured from the start of pondering.
+        :return:
+        """
+        if not self.pondering:
+            return
+        self.pondering = False
+        t_ponder_ms = (time() - self.t_search_start) * 1000
+        self.mcts_agent.update_movetime(t_ponder_ms + self.ponder_movetime_ms)
+        self.ab_agent.update_movetime(t_ponder_ms + self.ponder_movetime_ms)
+        self.log_print("info string Ponderhit after %dms, time for this move is %dms"
+                       % (t_ponder_ms, self.ponder_movetime_ms))
+        self.search_released.set()
+
+    def wait_for_search(self):
+        """ Blocks until the current search thread has finished"""
+        if self.search_thread is not None:
+            self.search_thread.join()
+            self.search_thread = None
+
+    def _prepare_search(self):
+        """
+        Sets the search parameters of the agents according to the current go command.
+        This is done in the main thread, because the command list is overwritten by the following commands.
+        :return: movetime_ms - Time for the search in ms
+        """
         movetime_ms = self.get_movetime()
 
         self.mcts_agent.update_movetime(movetime_ms)
@@ -380,7 +506,7 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
             # we try to extract the search depth from the cmd list
             self.mcts_agent.set_max_search_depth(int(self.cmd_list[self.cmd_list.index("depth") + 1]))
             movetime_ms = self.max_search_time  # increase the movetime to maximum to make sure to reach the given depth
-            self.mcts_agent.update_movetime(movetime_ms)
+            self.mcts_agent.update_movetime(movetime_ms, is_unbounded=True)
         except ValueError:
             pass  # the given command wasn't found in the command list
 
@@ -390,8 +516,39 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
         elif movetime_ms < 7000:
             # reduce noise for very short move times
             self.mcts_agent.dirichlet_epsilon = 0.2
+        return movetime_ms
 
-        if self.settings["search_type"] == "alpha_beta":
+    def _probe_opening_book(self):
+        """
+        Looks up the current position in the opening book
+        :return: value, selected_move, centipawn, depth, nodes, time_elapsed_s, nps, pv of the book move or None if
+         there's no book or the position isn't in the book
+        """
+        if self.opening_book is None:
+            return None
+        from DeepCrazyhouse.src.domain.variants.output_representation import value_to_centipawn
+
+        t_start = time()
+        board = self.gamestate.get_pythonchess_board()
+        book_entry = self.opening_book.select_move(board, self.settings["centi_book_temperature"] / 100)
+        if book_entry is None:
+            return None
+        selected_move, value, probability, nodes = book_entry
+        time_elapsed_s = (time() - t_start) * 1000  # the agents report the search time in ms
+        self.log_print("info string Book move %s with probability %.3f" % (selected_move.uci(), probability))
+        return value, selected_move, value_to_centipawn(value), 1, nodes, time_elapsed_s, 0, selected_move.uci()
+
+    def perform_action(self, movetime_ms):  # Probably needs refactoring
+        """
+        Computes the 'best move' according to the engine and the given settings.
+        After the search is done it will print out ' bestmove e2e4' for example on std-out.
+        :param movetime_ms: Time for the search in ms which was set by _prepare_search()
+        :return:
+        """
+        book_result = self._probe_opening_book()
+        if book_result is not None:
+            value, selected_move, centipawn, depth, nodes, time_elapsed_s, nps, pv = book_result
+        elif self.settings["search_type"] == "alpha_beta":
             value, selected_move, _, _, centipawn, depth, nodes, time_elapsed_s, nps, pv = self.ab_agent.perform_action(
                 self.gamestate
             )
@@ -423,18 +580,31 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
                 traceback.print_exc()
 
         self.log_print("info %s" % self.score)  # print out the search information
-        # Save the bestmove value [-1.0 to 1.0] to modify the next movetime
-        self.bestmove_value = float(value)
-        self.engine_played_move += 1
-
-        # apply CrazyAra's selected move the global gamestate
-        if self.gamestate.get_pythonchess_board().is_legal(selected_move):
-            # apply the last move CrazyAra played
-            self._apply_move(selected_move)
+        if self.wait_for_release:
+            # the bestmove must not be sent before "ponderhit" or "stop"
+            self.search_released.wait()
+
+        if self.ponder_miss:
+            # the search was done on the position after the expected move, the GUI sends the actual position next
+            self.rebuild_gamestate = True
         else:
-            raise Exception("all_ok is false! - crazyara_last_move")
+            # Save the bestmove value [-1.0 to 1.0] to modify the next movetime
+            self.bestmove_value = float(value)
+            self.engine_played_move += 1
+
+            # apply CrazyAra's selected move the global gamestate
+            if self.gamestate.get_pythonchess_board().is_legal(selected_move):
+                # apply the last move CrazyAra played
+                self._apply_move(selected_move)
+            else:
+                raise Exception("all_ok is false! - crazyara_last_move")
 
-        self.log_print("bestmove %s" % selected_move.uci())
+        pv_moves = pv.split(" ")
+        if self.settings["Ponder"] and len(pv_moves) > 1 and pv_moves[0] == selected_move.uci():
+            # propose the expected reply of the opponent for pondering
+            self.log_print("bestmove %s ponder %s" % (selected_move.uci(), pv_moves[1]))
+        else:
+            self.log_print("bestmove %s" % selected_move.uci())
 
     def setup_gamestate(self):  # Too many branches (13/12)
         """
@@ -454,7 +624,7 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
                 mv_list = self.cmd_list[9:]
 
             # try to apply opponent last move to the board state
-            if mv_list:
+            if mv_list and not self.rebuild_gamestate:
                 # the move the opponent just played is the last move in the list
                 opponent_last_move = chess.Move.from_uci(mv_list[-1])
                 if self.gamestate.get_pythonchess_board().is_legal(opponent_last_move):
@@ -480,34 +650,28 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
 
                 for move in mv_list:
                     self._apply_move(chess.Move.from_uci(move))
+                self.rebuild_gamestate = False
             else:
                 self.log_print("info string Move Compatible")
         else:
             if position_type == "fen":
                 fen = " ".join(self.cmd_list[2:8])
                 self.gamestate.set_fen(fen)
-                self.mcts_agent.update_transposition_table((self.gamestate.get_transposition_key(),))
-                # log_print("info string Added %s - count %d" % (gamestate.get_board_fen(),
-                #                                    mcts_agent.transposition_table[gamestate.get_transposition_key()]))
 
     def _apply_move(self, selected_move: chess.Move):
         """
-        Applies the given move on the gamestate and updates the transposition table of the environment
+        Applies the given move on the gamestate. The game state keeps the hashes of all earlier positions from which
+        the mcts agent rebuilds its repetition table for every search.
         :param selected_move: Move in python chess format
         :return:
         """
 
         self.gamestate.apply_move(selected_move)
-        self.mcts_agent.update_transposition_table((self.gamestate.get_transposition_key(),))
-        # log_print("info string Added %s - count %d" % (gamestate.get_board_fen(),
-        #                                               mcts_agent.transposition_table[
-        #                                                   gamestate.get_transposition_key()]))
 
     def new_game(self):
         """Group everything related to start the game"""
         self.log_print("info string >> New Game")
         self.gamestate.new_game()
-        self.mcts_agent.transposition_table = collections.Counter()
         self.mcts_agent.time_buffer_ms = 0
         self.mcts_agent.dirichlet_epsilon = self.settings["centi_dirichlet_epsilon"] / 100
 
@@ -534,6 +698,7 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
                         "UCI_Variant",
                         "search_type",
                         "context",
+                        "backend",
                         "use_raw_network",
                         "extend_time_on_bad_position",
                         "verbose",
@@ -543,6 +708,12 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
                         "use_future_q_values",
                         "use_time_management",
                         "use_transposition_table",
+                        "tt_replacement",
+                        "use_array_tree",
+                        "eval_cache_policy",
+                        "eval_cache_file",
+                        "book_file",
+                        "Ponder",
                         "model_architecture_dir",
                         "model_weights_dir",
                     ]:
@@ -568,6 +739,10 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
                         self.settings["use_time_management"] = value == "true"
                     elif option_name == "use_transposition_table":
                         self.settings["use_transposition_table"] = value == "true"
+                    elif option_name == "use_array_tree":
+                        self.settings["use_array_tree"] = value == "true"
+                    elif option_name == "Ponder":
+                        self.settings["Ponder"] = value == "true"
                     else:
                         self.settings[option_name] = value  # by default all options are treated as integers
                         # Guard threads limits
@@ -619,13 +794,25 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
         self.log_print(
             "option name ab_candidate_moves type spin default %d min 1 max 4096" % self.settings["ab_candidate_moves"]
         )
+        self.log_print("option name ab_workers type spin default %d min 1 max 64" % self.settings["ab_workers"])
         self.log_print("option name context type combo default %s var cpu var gpu" % self.settings["context"])
+        self.log_print(
+            "option name backend type combo default %s var mxnet var onnxruntime var torch_cpu"
+            % self.settings["backend"]
+        )
+        self.log_print(
+            "option name backend_threads type spin default %d min 0 max 256" % self.settings["backend_threads"]
+        )
         self.log_print(
             "option name use_raw_network type check default %s"
             % ("false" if not self.settings["use_raw_network"] else "true")
         )
         self.log_print("option name threads type spin default %d min 1 max 4096" % self.settings["threads"])
         self.log_print("option name batch_size type spin default %d min 1 max 4096" % self.settings["batch_size"])
+        self.log_print(
+            "option name max_batch_wait_us type spin default %d min 0 max 100000" % self.settings["max_batch_wait_us"]
+        )
+        self.log_print("option name nb_collectors type spin default %d min 0 max 64" % self.settings["nb_collectors"])
         self.log_print(
             "option name neural_net_services type spin default %d min 1 max 10" % self.settings["neural_net_services"]
         )
@@ -708,6 +895,28 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
             "option name use_transposition_table type check default %s"
             % ("false" if not self.settings["use_transposition_table"] else "true")
         )
+        self.log_print("option name Hash type spin default %d min 1 max 65536" % self.settings["Hash"])
+        self.log_print(
+            "option name tt_replacement type combo default %s var visits var depth" % self.settings["tt_replacement"]
+        )
+        self.log_print(
+            "option name use_array_tree type check default %s"
+            % ("false" if not self.settings["use_array_tree"] else "true")
+        )
+        self.log_print("option name eval_cache_mb type spin default %d min 0 max 65536" % self.settings["eval_cache_mb"])
+        self.log_print(
+            "option name eval_cache_policy type combo default %s var sparse var full"
+            % self.settings["eval_cache_policy"]
+        )
+        self.log_print("option name eval_cache_file type string default %s" % self.settings["eval_cache_file"])
+        self.log_print("option name book_file type string default %s" % self.settings["book_file"])
+        self.log_print(
+            "option name centi_book_temperature type spin default %d min 0 max 100"
+            % self.settings["centi_book_temperature"]
+        )
+        self.log_print(
+            "option name Ponder type check default %s" % ("false" if not self.settings["Ponder"] else "true")
+        )
         self.log_print(
             "option name verbose type check default %s" % ("false" if not self.settings["verbose"] else "true")
         )
@@ -735,6 +944,12 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
                 self.log(line)  # write the given command to the log-file
 
                 try:
+                    if main_cmd in ("ucinewgame", "position", "setoption", "go"):
+                        # these commands aren't expected during a search, so the running search is finished first
+                        self.stop()
+                    if self.search_error is not None:
+                        return -1
+
                     if main_cmd == "uci":
                         self.uci_reply()
                     elif main_cmd == "isready":
@@ -749,8 +964,15 @@ jgs.-` __.'|  Developers: Johannes Czech, Moritz Willig, Alena Beyer
                     elif main_cmd == "setoption":
                         self.set_options()
                     elif main_cmd == "go":
-                        self.perform_action()
+                        self.go()
+                    elif main_cmd == "stop":
+                        self.stop()
+                    elif main_cmd == "ponderhit":
+                        self.ponderhit()
                     elif main_cmd in ("quit", "exit"):
+                        self.stop()
+                        if self.eval_cache is not None:
+                            self.eval_cache.save()  # keep the evaluations of the opening positions
                         if self.log_file:
                             self.log_file.close()
                         return 0
@@ -19,6 +19,8 @@ from DeepCrazyhouse.src.training.lr_schedules.lr_schedules import MomentumSchedu
     CosineAnnealingSchedule
 from DeepCrazyhouse.src.training.train_util import get_metrics
 from DeepCrazyhouse.src.training.train_cli_util import create_pytorch_model, get_validation_data
+from DeepCrazyhouse.src.training.distributed import destroy_distributed, init_distributed, is_main_process,\
+    launch_processes
 from DeepCrazyhouse.src.training.trainer_agent_pytorch import TrainerAgentPytorch, load_torch_state, save_torch_state,\
     get_context, export_to_onnx
 
@@ -39,7 +41,39 @@ def update_network(queue, nn_update_idx: int, tar_filename: Path, convert_to_onn
     :param model_contender_dir: String of the contender directory path
     :return: k_steps_final
     """
+    if train_config.world_size > 1:
+        # train data-parallel in train_config.world_size processes, the main process returns k_steps_final
+        result_queue = torch.multiprocessing.get_context("spawn").SimpleQueue()
+        launch_processes(_update_network_process, train_config.world_size,
+                         (result_queue, nn_update_idx, tar_filename, convert_to_onnx, main_config, train_config,
+                          model_contender_dir))
+        queue.put(result_queue.get())
+        return
+    _update_network(queue, nn_update_idx, tar_filename, convert_to_onnx, main_config, train_config,
+                    model_contender_dir)
+
+
+def _update_network_process(rank: int, world_size: int, master_port: int, queue, nn_update_idx: int,
+                            tar_filename: Path, convert_to_onnx: bool, main_config, train_config: TrainConfig,
+                            model_contender_dir: Path):
+    """
+    Runs _update_network() in one of the processes of launch_processes()
+    """
+    # Too many arguments (10/5)
+    init_distributed(train_config, rank, world_size, master_port)
+    try:
+        _update_network(queue, nn_update_idx, tar_filename, convert_to_onnx, main_config, train_config,
+                        model_contender_dir)
+    finally:
+        destroy_distributed()
+
 
+def _update_network(queue, nn_update_idx: int, tar_filename: Path, convert_to_onnx: bool, main_config,
+                    train_config: TrainConfig, model_contender_dir: Path):
+    """
+    Trains the network in the current process (see update_network()). With several processes only the main process
+    exports the network and puts k_steps_final into the queue.
+    """
     # set a specific seed value for reproducibility
     train_config.nb_parts = len(glob.glob(main_config["planes_train_dir"] + '**/*.zip'))
     logging.info("number parts for training: %d" % train_config.nb_parts)
@@ -49,7 +83,7 @@ def update_network(queue, nn_update_idx: int, tar_filename: Path, convert_to_onn
         raise Exception('No .zip files for training available. Check the path in main_config["planes_train_dir"]:'
                         ' %s' % main_config["planes_train_dir"])
 
-    val_data, x_val, _ = get_validation_data(train_config)
+    val_data, x_val = get_validation_data(train_config)
 
     input_shape = x_val[0].shape
     # calculate how many iterations per epoch exist
@@ -75,6 +109,8 @@ def update_network(queue, nn_update_idx: int, tar_filename: Path, convert_to_onn
     prefix = "%smodel-%.5f-%.5f-%.3f-%.3f" % (model_contender_dir, val_value_loss_final, val_policy_loss_final,
                                                                    val_value_acc_sign_final, val_policy_acc_final)
 
+    if not is_main_process():
+        return
     _export_net(convert_to_onnx, input_shape, k_steps_final, net, nn_update_idx, prefix, train_config, model_contender_dir)
 
     logging.info("k_steps_final %d" % k_steps_final)